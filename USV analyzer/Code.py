@@ -3,37 +3,253 @@ from tkinter import ttk, filedialog, messagebox
 import os
 import pandas as pd
 import numpy as np
-from scipy import stats
-from statsmodels.formula.api import ols
-import statsmodels.api as sm
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from itertools import combinations
-import pingouin as pg
-import traceback
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.figure import Figure
 import webbrowser  # For opening plot folder
 import sys
+import time
+import threading
+import argparse
+from datetime import datetime
+
+from usv_core import (JobScheduler, Reporter, USVSession, analyze, analyze_all_metrics, analyze_metric,
+                      assumption_policy, descriptive_cube_long, load_cohorts, load_data, load_from_catalog,
+                      peak_memory_mb, preload_heavy_modules, select_dataset)
+
+
+# --- Helper class buffering the log (and print statements) before they reach the Tkinter Text widget ---
+class LogSink(object):
+    """
+    File-like log behind log_to_gui and, while an analysis runs, sys.stdout. Writes from any thread
+    only append to a buffer and to the log file (which keeps everything); update_widget() moves the
+    buffer into the Text widget with one insert, on the Tk thread, keeping only its last `max_lines`.
+    """
+    LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # A bigger log is moved to <log>.1 when the app starts
+
+    def __init__(self, log_path=None, max_lines=5000, interval_ms=100):
+        self.widget = None
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self._pending = []  # Writes not shown yet, bounded by their line count (see _trim_pending)
+        self._pending_lines = 0
+        self._lock = threading.Lock()
+        self._last_update = 0.0
+        self.log_file = None
+        if log_path:
+            try:
+                if os.path.exists(log_path) and os.path.getsize(log_path) > self.LOG_FILE_MAX_BYTES:
+                    os.replace(log_path, log_path + '.1')
+                self.log_file = open(log_path, 'a', encoding='utf-8')
+                self.log_file.write(f"\n===== USV Analyzer started {datetime.now():%Y-%m-%d %H:%M:%S} =====\n")
+            except OSError:
+                self.log_file = None  # The log still reaches the window
+
+    def write(self, text):
+        with self._lock:
+            self._pending.append(text)
+            self._pending_lines += text.count("\n")
+            if self._pending_lines > 2 * self.max_lines:  # Trimmed now and then, not at every write
+                self._trim_pending()
+            if self.log_file is not None:
+                self.log_file.write(text)
+        return len(text)
+
+    def _trim_pending(self):
+        """Keeps the last `max_lines` whole lines of the buffer (the widget would not show older ones)."""
+        text = "".join(self._pending)
+        cut = 0
+        for _ in range(self._pending_lines - self.max_lines):
+            cut = text.index("\n", cut) + 1
+        self._pending = [text[cut:]]
+        self._pending_lines = self.max_lines
 
+    def flush(self):  # Required for file-like objects
+        with self._lock:
+            if self.log_file is not None:
+                self.log_file.flush()
 
-# --- Helper class to redirect print statements to the Tkinter Text widget ---
-class TextRedirector(object):
-    def __init__(self, widget):
+    def attach(self, widget):
+        """Sets the Text widget the buffer is written to (what was logged before shows up at the next update)."""
         self.widget = widget
 
-    def write(self, str_val):
-        self.widget.insert(tk.END, str_val)
-        self.widget.see(tk.END)
+    def start(self, master):
+        """Updates the widget every `interval_ms` from the Tk event loop."""
+        def tick():
+            self.update_widget(force=True)
+            master.after(self.interval_ms, tick)
+        master.after(self.interval_ms, tick)
 
-    def flush(self):  # Required for file-like objects
-        pass
+    def update_widget(self, force=False):
+        """Writes the buffered text to the widget (not more often than every `interval_ms` unless forced)."""
+        if self.widget is None or threading.current_thread() is not threading.main_thread():
+            return
+        now = time.perf_counter()
+        if not force and now - self._last_update < self.interval_ms / 1000:
+            return
+        self._last_update = now
+        with self._lock:
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._pending_lines = 0
+        if not text:
+            return
+        self.flush()
+        self.widget.config(state='normal')
+        self.widget.insert(tk.END, text)
+        lines = int(self.widget.index('end-1c').split('.')[0])
+        if lines > self.max_lines:
+            self.widget.delete('1.0', f"{lines - self.max_lines + 1}.0")
+        self.widget.see(tk.END)
+        self.widget.config(state='disabled')
+
+    def clear(self):
+        """Empties the widget and what is waiting for it (the log file keeps everything)."""
+        with self._lock:
+            self._pending.clear()
+            self._pending_lines = 0
+        if self.widget is not None and threading.current_thread() is threading.main_thread():
+            self.widget.config(state='normal')
+            self.widget.delete(1.0, tk.END)
+            self.widget.config(state='disabled')
+
+
+# --- Helper class showing large tables in a Treeview that only holds the rows in view ---
+class VirtualTable(object):
+    """
+    Headings-only Treeview whose few item rows are refilled as it scrolls, so a table of any length
+    costs the same to show. Cells are formatted once, a column at a time; sorting (click a heading)
+    and filtering only reorder an index of the rows, the widget is never rebuilt.
+    """
+    FLOAT_FORMAT = '%.3f'
+    COMPARISONS = {'<=': np.less_equal, '>=': np.greater_equal, '<': np.less, '>': np.greater, '=': np.isclose}
+
+    def __init__(self, parent):
+        self.tree = ttk.Treeview(parent, show="headings", selectmode="none")
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.on_scrollbar)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, 'units'))  # Mouse wheel on X11
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, 'units'))
+        self.tree.bind("<Up>", lambda event: self.scroll(-1, 'units'))
+        self.tree.bind("<Down>", lambda event: self.scroll(1, 'units'))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-1, 'pages'))
+        self.tree.bind("<Next>", lambda event: self.scroll(1, 'pages'))
+        self.visible_rows = 10  # Updated from the widget height
+        self.set_data(pd.DataFrame())
+
+    def set_data(self, df):
+        """Shows `df` (unsorted, unfiltered); its cells are formatted here, once."""
+        self.df = df.reset_index(drop=True)
+        self.columns = list(self.df.columns)
+        self.cells = np.empty((len(self.df), len(self.columns)), dtype=object)
+        for i, col in enumerate(self.columns):
+            self.cells[:, i] = self.format_column(self.df[col])
+        self.mask = np.ones(len(self.df), dtype=bool)
+        self.sort_column, self.descending = None, False
+        self.tree["columns"] = self.columns
+        for col in self.columns:
+            self.tree.heading(col, text=col.replace('_', ' '), anchor=tk.CENTER,
+                              command=lambda col=col: self.sort_by(col))
+            self.tree.column(col, anchor=tk.CENTER, width=max(100, len(col) * 10))
+        self.apply_order()
+
+    def clear(self):
+        self.set_data(pd.DataFrame())
+
+    def format_column(self, series):
+        """Display strings of a whole column (missing values shown empty)."""
+        missing = series.isna().to_numpy()
+        if pd.api.types.is_float_dtype(series.dtype):
+            text = np.char.mod(self.FLOAT_FORMAT, series.to_numpy(dtype=float, na_value=np.nan))
+        else:
+            text = series.astype(str).to_numpy(dtype=object)
+        return np.where(missing, '', text).astype(object)
+
+    def sort_by(self, col):
+        """Sorts by `col` (ascending first, a second click reverses); missing values go last."""
+        self.descending = not self.descending if self.sort_column == col else False
+        self.sort_column = col
+        for column in self.columns:
+            arrow = (' \u25bc' if self.descending else ' \u25b2') if column == col else ''
+            self.tree.heading(column, text=column.replace('_', ' ') + arrow)
+        self.apply_order()
+
+    def filter(self, col, text):
+        """
+        Keeps the rows whose `col` matches `text`: a case-insensitive substring for text columns, a
+        comparison such as '<0.05' or '>=2' for numeric ones (a bare number means '<=').
+        An empty `text` shows every row.
+        """
+        text = text.strip()
+        if not text or col not in self.columns:
+            self.mask = np.ones(len(self.df), dtype=bool)
+        elif pd.api.types.is_numeric_dtype(self.df[col].dtype):
+            operator = next((op for op in self.COMPARISONS if text.startswith(op)), '<=')
+            try:
+                threshold = float(text[len(operator):] if text.startswith(operator) else text)
+            except ValueError:
+                return False  # Incomplete number: keep the current rows
+            values = self.df[col].to_numpy(dtype=float, na_value=np.nan)
+            self.mask = self.COMPARISONS[operator](values, threshold) & ~np.isnan(values)
+        else:
+            self.mask = self.df[col].astype(str).str.contains(text, case=False, regex=False).to_numpy()
+        self.apply_order()
+        return True
+
+    def apply_order(self):
+        """Recomputes the shown rows (filter, then sort) and goes back to the top."""
+        rows = pd.Series(np.flatnonzero(self.mask))
+        if self.sort_column is not None:
+            keys = self.df[self.sort_column].iloc[rows.to_numpy()].reset_index(drop=True)
+            keys = keys.sort_values(ascending=not self.descending, na_position='last', kind='stable')
+            rows = rows[keys.index]
+        self.order = rows.to_numpy()
+        self.first = 0
+        self.render()
+
+    def scroll(self, amount, what='units'):
+        step = self.visible_rows if what == 'pages' else 1
+        self.first = int(np.clip(self.first + int(amount) * step, 0, max(0, len(self.order) - self.visible_rows)))
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, action, amount, what=None):
+        if action == 'moveto':
+            self.first = int(float(amount) * len(self.order))
+            self.scroll(0)
+        else:
+            self.scroll(amount, what)
+
+    def on_resize(self, event):
+        # Header and row heights from the first item row (defaults until one is drawn)
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else ''
+        header, row_height = (bbox[1], bbox[3]) if bbox else (25, 20)
+        visible_rows = max(1, (event.height - header) // max(1, row_height))
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.scroll(0)
+
+    def render(self):
+        """Writes the rows in view into the item rows (adding or removing item rows as needed)."""
+        shown = self.order[self.first:self.first + self.visible_rows]
+        items = list(self.tree.get_children())
+        if len(items) > len(shown):
+            self.tree.delete(*items[len(shown):])
+            items = items[:len(shown)]
+        while len(items) < len(shown):
+            items.append(self.tree.insert("", "end"))
+        for item, row in zip(items, shown):
+            self.tree.item(item, values=list(self.cells[row]))
+        total = max(1, len(self.order))
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible_rows) / total))
 
 
 # --- Main Application Class ---
-class USVAnalyzerApp:
+class USVAnalyzerApp(object):
     def __init__(self, master):
+        # The analysis itself is usv_core (a USVSession and the functions taking it); this class builds the
+        # window, keeps the options in Tk variables and shows what the analyses report and return
         self.master = master
         master.title("USV Analyzer")
         master.geometry("1200x800")  # Adjusted initial window size for results display
@@ -42,41 +258,58 @@ class USVAnalyzerApp:
         master.grid_rowconfigure(0, weight=1)
         master.grid_columnconfigure(0, weight=1)
 
-        # --- Configuration (as class attributes) ---
-        self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.plot_output_dir = os.path.join(self.script_dir, 'plots')
-        self.analysis_results_dir = os.path.join(self.script_dir, 'analysis_results')
-
-        # Change here if you have other variables to be test or add more subgroups
-        self.SEX_LABELS = {'F': 'Females', 'M': 'Males'}
-        self.GENOTYPE_LABELS = {'WT': 'Wild Type', 'MUT': 'Mutant'}
-        self.TIMEPOINT_ORDER = ['P4', 'P6']
-
-        # Ensure output directories exist
-        os.makedirs(self.plot_output_dir, exist_ok=True)
-        os.makedirs(self.analysis_results_dir, exist_ok=True)
-
-        # --- Data Storage ---
-        self.df_aggregated = None
-        self.selected_folder_path = None
-        self.available_metrics = []
-        self.available_grouping_variables = []
+        self.session = USVSession()  # Configuration, options and the loaded data
+        self.create_option_variables()  # Tk variables behind the option widgets (copied to session.options)
+        self.selected_cohort_paths = []  # Selected cohort folders/archives (several are merged into one dataset)
+        self.last_status = ""
+        self._last_progress_repaint = 0.0
         self.last_generated_plot_path = None  # To store path of the last plot
+        self._current_statistical_results_df = pd.DataFrame()  # Results/descriptive tables shown (saved on request)
+        self._current_descriptive_stats_df = pd.DataFrame()
+        self.log_path = os.path.join(self.session.analysis_results_dir, 'usv_analyzer.log')  # Full log of every session
+        self.RESULTS_FILTER_COLUMNS = ['Metric', 'Significance', 'P_Value', 'Test_Type', 'P_Adjusted_Family',
+                                       'Significance_Family']  # Filterable in the results table
+        self.LOG_MAX_LINES = 5000  # Lines kept in the Raw Log Output (the log file has everything)
+        self.LOG_UPDATE_INTERVAL_MS = 100  # How often the buffered log is written to the window
+        self.plot_canvas = None  # Tk canvas/toolbar of the plot shown in the Graphic tab
+        self.plot_toolbar = None
+        self.JOB_REFRESH_INTERVAL_MS = 2000  # How often the Job Queue tab is refreshed while shown
+        self.job_scheduler = None  # JobScheduler running the queued jobs in the background (Job Queue tab)
 
         # --- Notebook (Tabbed Interface) ---
         self.notebook = ttk.Notebook(master)
         self.notebook.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
 
-        # --- Tabs ---
+        # --- Tabs (only the first is built now; the others when first shown or filled, see build_tab) ---
+        self._tab_builders = {}  # frame name -> method building the widgets of a tab not built yet
+        # Log buffered until the Statistical Output tab (and its Raw Log Output) is built, and between updates
+        self.log_sink = LogSink(self.log_path, self.LOG_MAX_LINES, self.LOG_UPDATE_INTERVAL_MS)
+        self.log_sink.start(master)
+        # Loading and analyses report to the window: raw log (also their print() output), status bar,
+        # progress bar, dialogs and the Report tab
+        self.reporter = Reporter(stream=self.log_sink, log=self.log_to_gui, status=self.update_status,
+                                 progress=self.show_progress, notify=self.notify,
+                                 validation_report=self.show_validation_report)
         self.create_data_input_tab()
-        self.create_report_tab()
-        self.create_analysis_tab()
-        self.create_statistical_output_tab()  # New tab for tables
-        self.create_graphic_tab()  # New tab for plot
+        self.add_tab('report_frame', "2. Data Report", self.create_report_tab)
+        self.add_tab('analysis_frame', "3. Analysis Options", self.create_analysis_tab)
+        self.add_tab('statistical_output_frame', "4. Statistical Output",
+                     self.create_statistical_output_tab)  # New tab for tables
+        self.add_tab('graphic_frame', "5. Graphic", self.create_graphic_tab)  # New tab for plot
+        self.add_tab('jobs_frame', "6. Job Queue", self.create_jobs_tab)  # Batches run unattended
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
         # --- Status Bar ---
-        self.status_bar = ttk.Label(master, text="Ready", relief=tk.SUNKEN, anchor="w")
-        self.status_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
+        self.status_frame = ttk.Frame(master)
+        self.status_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
+        self.status_frame.grid_columnconfigure(0, weight=1)
+        self.status_bar = ttk.Label(self.status_frame, text="Ready", relief=tk.SUNKEN, anchor="w")
+        self.status_bar.grid(row=0, column=0, sticky="ew")
+        self.progress_label = ttk.Label(self.status_frame, text="", anchor="e")
+        self.progress_label.grid(row=0, column=1, sticky="e", padx=(10, 5))
+        self.progress_bar = ttk.Progressbar(self.status_frame, orient="horizontal", length=200, mode="determinate",
+                                            maximum=100)
+        self.progress_bar.grid(row=0, column=2, sticky="e")
         self.update_status("Welcome to USV Analyzer!")
 
         # Disable tabs initially, except the first one
@@ -88,10 +321,98 @@ class USVAnalyzerApp:
         # --- Menu Bar ---
         self.create_menu_bar()
 
+        # scipy, pingouin, seaborn and matplotlib are imported in the background while the user picks a folder
+        master.after_idle(preload_heavy_modules)
+
+    def create_option_variables(self):
+        """Creates the Tk variables behind the loading and analysis options (defaults from session.options)."""
+        options = self.session.options
+        # Loading options
+        self.flag_outliers_var = tk.BooleanVar(value=options.flag_outliers)
+        self.outlier_threshold_var = tk.DoubleVar(value=options.outlier_threshold)
+        self.store_calls_var = tk.BooleanVar(value=options.store_calls)
+        # Analysis options
+        self.secondary_group_enabled_var = tk.BooleanVar(value=False)  # Default to unchecked
+        self.exclude_outliers_var = tk.BooleanVar(value=options.exclude_outliers)
+        self.subset_filter_vars = {factor: tk.StringVar(value=self.session.SUBSET_FILTER_ALL)
+                                   for factor in self.session.SUBSET_FILTER_FACTORS}
+        self.assumption_policy_var = tk.StringVar(value=options.assumption_policy)
+        self.correction_method_var = tk.StringVar(value=options.correction_method)
+        self.correction_family_var = tk.StringVar(value=options.correction_family)
+        self.profile_run_var = tk.BooleanVar(value=options.profile_run)
+
+    def read_options(self):
+        """Copies the option widgets to session.options, which loading and analyses use."""
+        self.session.options.update(
+            flag_outliers=self.flag_outliers_var.get(), outlier_threshold=self.outlier_threshold_var.get(),
+            store_calls=self.store_calls_var.get(), exclude_outliers=self.exclude_outliers_var.get(),
+            subset_filters={factor: var.get() for factor, var in self.subset_filter_vars.items()
+                            if var.get() != self.session.SUBSET_FILTER_ALL},
+            assumption_policy=self.assumption_policy_var.get(), correction_method=self.correction_method_var.get(),
+            correction_family=self.correction_family_var.get(), profile_run=self.profile_run_var.get())
+
+    def notify(self, kind, title, message):
+        """Shows a message of loading or an analysis in a dialog (kind 'info', 'warning' or 'error')."""
+        {'info': messagebox.showinfo, 'warning': messagebox.showwarning, 'error': messagebox.showerror}[kind](
+            title, message)
+
+    def choose_parametric(self):
+        """Assumption policy callback of the analyses: the selected policy, 'Ask' as a Yes/No dialog."""
+        return assumption_policy(self.session.options.assumption_policy, ask=messagebox.askyesno)
+
+    def add_tab(self, frame_name, text, builder):
+        """Adds an empty notebook tab as `frame_name`; `builder` fills it in the first time it is needed."""
+        frame = ttk.Frame(self.notebook, padding="10 10 10 10")
+        setattr(self, frame_name, frame)
+        self.notebook.add(frame, text=text)
+        self._tab_builders[frame_name] = builder
+
+    def tab_built(self, frame_name):
+        return frame_name not in self._tab_builders
+
+    def build_tab(self, frame_name):
+        """Builds the widgets of a tab if that was not done yet (first activation, or first output sent to it)."""
+        builder = self._tab_builders.pop(frame_name, None)
+        if builder is not None:
+            builder()
+
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        for frame_name in list(self._tab_builders):
+            if str(getattr(self, frame_name)) == selected:
+                self.build_tab(frame_name)
+
+    def update_tab(self, frame_name, state=None, select=False):
+        """Enables/disables and/or selects the notebook tab of `frame_name`."""
+        frame = getattr(self, frame_name)
+        if state is not None:
+            self.notebook.tab(frame, state=state)
+        if select:
+            self.build_tab(frame_name)
+            self.notebook.select(frame)
+
     def update_status(self, message):
         """Updates the message in the status bar."""
+        self.last_status = message
         self.status_bar.config(text=message)
-        self.master.update_idletasks()  # Ensures the status bar updates immediately
+        self.show_progress()  # Repainted at most PROGRESS_MAX_FPS times a second
+
+    def show_progress(self, tracker=None, force=False):
+        """
+        Draws the progress of the running job (bar, rate, ETA) and repaints the window, at most
+        PROGRESS_MAX_FPS times a second; only the Tk thread draws, other threads just update session.progress.
+        """
+        now = time.perf_counter()
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if not force and now - self._last_progress_repaint < 1 / self.session.PROGRESS_MAX_FPS:
+            return
+        self._last_progress_repaint = now
+        progress = tracker or self.session.progress
+        self.progress_bar['value'] = 100 * progress.snapshot()['fraction'] if progress.active else 0
+        self.progress_label.config(text=progress.describe())
+        self.log_sink.update_widget(force=True)  # Long runs block the event loop: show the log as they go
+        self.master.update_idletasks()
 
     def create_menu_bar(self):
         menubar = tk.Menu(self.master)
@@ -118,13 +439,16 @@ class USVAnalyzerApp:
         # Configure grid for this frame
         self.data_input_frame.grid_rowconfigure(0, weight=0)  # Label
         self.data_input_frame.grid_rowconfigure(1, weight=0)  # Entry/Button
-        self.data_input_frame.grid_rowconfigure(2, weight=1)  # Spacer
-        self.data_input_frame.grid_rowconfigure(3, weight=0)  # Next button
+        self.data_input_frame.grid_rowconfigure(2, weight=0)  # Loading options
+        self.data_input_frame.grid_rowconfigure(3, weight=1)  # Spacer
+        self.data_input_frame.grid_rowconfigure(4, weight=0)  # Next button
         self.data_input_frame.grid_columnconfigure(0, weight=1)  # Entry
         self.data_input_frame.grid_columnconfigure(1, weight=0)  # Button
+        self.data_input_frame.grid_columnconfigure(2, weight=0)  # Archive button
+        self.data_input_frame.grid_columnconfigure(3, weight=0)  # Add cohort button
 
         # Widgets for folder selection
-        ttk.Label(self.data_input_frame, text="Select Folder with Animal Data:").grid(
+        ttk.Label(self.data_input_frame, text="Select Folder(s) (or zipped cohorts) with Animal Data:").grid(
             row=0, column=0, sticky="w", pady=(20, 5)
         )
 
@@ -133,243 +457,123 @@ class USVAnalyzerApp:
 
         self.browse_button = ttk.Button(self.data_input_frame, text="Browse Folder", command=self.browse_folder)
         self.browse_button.grid(row=1, column=1, sticky="e")
+        self.browse_archive_button = ttk.Button(self.data_input_frame, text="Browse Archive",
+                                                command=self.browse_archive)
+        self.browse_archive_button.grid(row=1, column=2, sticky="e", padx=(5, 0))
+        self.add_cohort_button = ttk.Button(self.data_input_frame, text="Add Cohort", command=self.add_cohort_folder)
+        self.add_cohort_button.grid(row=1, column=3, sticky="e", padx=(5, 0))
+
+        # Loading options
+        self.loading_options_frame = ttk.LabelFrame(self.data_input_frame, text="Loading Options")
+        self.loading_options_frame.grid(row=2, column=0, columnspan=4, sticky="ew", pady=(20, 0))
+        ttk.Checkbutton(
+            self.loading_options_frame, text="Flag outlier calls before aggregation (per-session median/MAD)",
+            variable=self.flag_outliers_var
+        ).grid(row=0, column=0, sticky="w", padx=5, pady=5)
+        ttk.Label(self.loading_options_frame, text="Modified z-score threshold:").grid(row=0, column=1, sticky="e",
+                                                                                       padx=5, pady=5)
+        ttk.Spinbox(self.loading_options_frame, from_=1.0, to=20.0, increment=0.5, width=6,
+                    textvariable=self.outlier_threshold_var).grid(row=0, column=2, sticky="w", padx=5, pady=5)
+        ttk.Checkbutton(
+            self.loading_options_frame, text="Also store call-level data in the session catalog",
+            variable=self.store_calls_var
+        ).grid(row=1, column=0, sticky="w", padx=5, pady=5)
+
+        # Sessions stored by earlier loads can be analyzed without rereading their files
+        self.load_catalog_button = ttk.Button(self.data_input_frame, text="Load from Catalog",
+                                              command=self.load_catalog)
+        self.load_catalog_button.grid(row=4, column=0, sticky="sw", pady=(20, 0))
 
         # Next button for navigation
         self.next_button_data_input = ttk.Button(
             self.data_input_frame, text="Next", command=self.process_data_input, state=tk.DISABLED
         )
-        self.next_button_data_input.grid(row=3, column=1, sticky="se", pady=(20, 0))  # Aligned to bottom right
+        self.next_button_data_input.grid(row=4, column=3, sticky="se", pady=(20, 0))  # Aligned to bottom right
 
         # Spacer row for better layout
-        self.data_input_frame.grid_rowconfigure(2, weight=1)
+        self.data_input_frame.grid_rowconfigure(3, weight=1)
 
     def browse_folder(self):
         folder_selected = filedialog.askdirectory()
         if folder_selected:
-            self.selected_folder_path = folder_selected
-            self.folder_path_entry.config(state='normal')
-            self.folder_path_entry.delete(0, tk.END)
-            self.folder_path_entry.insert(0, self.selected_folder_path)
-            self.folder_path_entry.config(state='readonly')
-            self.next_button_data_input.config(state=tk.NORMAL)
-            self.update_status(f"Folder selected: {self.selected_folder_path}")
+            self.selected_cohort_paths = [folder_selected]
+            self._show_selected_cohorts()
+            self.update_status(f"Folder selected: {folder_selected}")
         else:
-            self.selected_folder_path = None
-            self.folder_path_entry.config(state='normal')
-            self.folder_path_entry.delete(0, tk.END)
-            self.folder_path_entry.config(state='readonly')
-            self.next_button_data_input.config(state=tk.DISABLED)
+            self.selected_cohort_paths = []
+            self._show_selected_cohorts()
             self.update_status("Folder selection cancelled.")
 
+    def add_cohort_folder(self):
+        """Adds one more cohort folder to the selection (cohorts are loaded together and merged)."""
+        folder_selected = filedialog.askdirectory()
+        if folder_selected:
+            if folder_selected not in self.selected_cohort_paths:
+                self.selected_cohort_paths.append(folder_selected)
+            self._show_selected_cohorts()
+            self.update_status(f"{len(self.selected_cohort_paths)} cohort(s) selected.")
+        else:
+            self.update_status("Cohort selection cancelled.")
+
+    def _show_selected_cohorts(self):
+        self.folder_path_entry.config(state='normal')
+        self.folder_path_entry.delete(0, tk.END)
+        self.folder_path_entry.insert(0, "; ".join(self.selected_cohort_paths))
+        self.folder_path_entry.config(state='readonly')
+        self.next_button_data_input.config(state=tk.NORMAL if self.selected_cohort_paths else tk.DISABLED)
+
+    def browse_archive(self):
+        """Selects one or more zipped cohorts (animal_metadata.csv + session files) to analyze in place."""
+        archives_selected = filedialog.askopenfilenames(filetypes=[("Zip archives", "*.zip"), ("All files", "*.*")])
+        if archives_selected:
+            self.selected_cohort_paths = list(archives_selected)
+            self._show_selected_cohorts()
+            self.update_status(f"Archive(s) selected: {'; '.join(self.selected_cohort_paths)}")
+        else:
+            self.update_status("Archive selection cancelled.")
+
     def process_data_input(self):
-        if not self.selected_folder_path:
+        if not self.selected_cohort_paths:
             messagebox.showwarning("Input Error", "Please select a data folder first.")
             return
-
-        self.update_status("Loading and merging data... This may take a moment.")
-
-        # --- CALL TO THE INTEGRATED DATA LOADING/MERGING LOGIC ---
-        self.df_aggregated = self._load_and_merge_data_backend(self.selected_folder_path)
-
-        if self.df_aggregated is not None:
-            self.update_status("Data loaded and merged successfully!")
-
-            # Identify available metrics and variables from the loaded DataFrame
-            all_cols = self.df_aggregated.columns.tolist()
-
-            # Define common grouping variables that you expect
-            # NOTE: These names MUST match the columns in your aggregated DataFrame
-            common_grouping_vars = ['Sex', 'Genotype', 'Timepoint']
-
-            # Filter for only those common grouping variables that actually exist in the DataFrame
-            self.available_grouping_variables = [col for col in common_grouping_vars if
-                                                 col in self.df_aggregated.columns]
-
-            # Metrics are typically numerical columns that are not 'animal_id' or a grouping variable
-            identifying_cols = ['animal_id'] + self.available_grouping_variables
-            self.available_metrics = [
-                col for col in all_cols
-                if col not in identifying_cols and pd.api.types.is_numeric_dtype(self.df_aggregated[col])
-            ]
-
+        self.read_options()
+        load_data(self.session, self.selected_cohort_paths, self.reporter)
+        self.show_loaded_data()
+
+    def load_catalog(self):
+        """Loads every cohort stored in the session catalog without rereading any CSV file."""
+        self.read_options()
+        load_from_catalog(self.session, self.reporter)
+        self.show_loaded_data()
+
+    def show_validation_report(self, text):
+        """Shows the pre-flight report in the Report tab while the heavy parsing runs."""
+        self.build_tab('report_frame')
+        self.report_text_area.config(state='normal')
+        self.report_text_area.delete(1.0, tk.END)
+        self.report_text_area.insert(tk.END, text)
+        self.report_text_area.config(state='disabled')
+        self.notebook.tab(self.report_frame, state='normal')
+        self.notebook.select(self.report_frame)
+        self.master.update_idletasks()
+
+    def show_loaded_data(self):
+        """Shows the report of the load (and enables the next tabs) once the data is loaded."""
+        self.exclude_outliers_var.set(False)  # A fresh load always starts from all accepted calls
+        for filter_var in self.subset_filter_vars.values():
+            filter_var.set(self.session.SUBSET_FILTER_ALL)
+        if self.tab_built('statistical_output_frame'):
+            self.populate_performance_table()  # Otherwise shown when the tab is built
+        if self.session.df_aggregated is not None:
             # Proceed to the next tab (Report)
             self.notebook.tab(self.report_frame, state='normal')
             self.notebook.select(self.report_frame)
             self.populate_report_tab()  # Call to populate report details
         else:
-            self.update_status("Data loading failed.")
-
-    # --- INTEGRATED CORE BACKBONE FOR DATA LOADING AND MERGING ---
-    def _load_and_merge_data_backend(self, raw_data_folder):
-        """
-        Integrates the original data loading and merging logic.
-        This function now internally manages loading metadata and individual USV files.
-        """
-        metadata_file_name = 'animal_metadata.csv'  # Assumed name for metadata file within the folder, change if you need
-        full_metadata_path = os.path.join(raw_data_folder, metadata_file_name)
-
-        # --- Core Backbone 1.1: Load Metadata ---
-        def load_metadata_internal(file_path):
-            if not os.path.exists(file_path):
-                messagebox.showerror("Metadata Error", f"Metadata file not found at expected path: {file_path}\n"
-                                                       "Please ensure 'animal_metadata.csv' is in the selected folder.")
-                return None
-            try:
-                df_meta = pd.read_csv(file_path)
-                print(f"Loaded metadata from: {file_path}")
-                return df_meta
-            except Exception as e:
-                messagebox.showerror("Metadata Error", f"Error loading metadata file: {e}")
-                return None
-
-        # --- Core Backbone 1.2: Process Individual USV Files and Aggregate ---
-        def process_single_usv_file_internal(file_path, animal_id, timepoint):
-            if not os.path.exists(file_path):
-                return None
-            try:
-                df_usv = pd.read_csv(file_path)
-                df_usv['animal_id'] = animal_id
-                df_usv['Timepoint'] = timepoint
-
-                if 'Accepted' not in df_usv.columns:
-                    return None
-                df_usv['Accepted'] = df_usv['Accepted'].astype(str).str.lower().isin(['true', '1'])
-                df_accepted_usv = df_usv[df_usv['Accepted'] == True].copy()
-
-                def sanitize_col_name(col_name):
-                    return col_name.replace(" ", "_").replace("(", "").replace(")", "").replace("/", "_").replace(".",
-                                                                                                                  "")
-
-                # Initialize all expected metrics with pd.NA or 0 for counts
-                all_expected_metrics_init = {
-                    'animal_id': animal_id,
-                    'Timepoint': timepoint,
-                    'Total_USVs_Count': 0,
-                    'Call_Length_s_Mean': pd.NA,
-                    'Call_Length_s_Sum': pd.NA,
-                    'Principal_Frequency_kHz_Mean': pd.NA,
-                    'Low_Freq_kHz_Mean': pd.NA,
-                    'High_Freq_kHz_Mean': pd.NA,
-                    'Delta_Freq_kHz_Mean': pd.NA,
-                    'Frequency_Standard_Deviation_kHz_Mean': pd.NA,
-                    'Slope_kHz_s_Mean': pd.NA,
-                    'Sinuosity_Mean': pd.NA,
-                    'Mean_Power_dB_Hz_Mean': pd.NA,
-                    'Tonality_Mean': pd.NA,
-                    'Peak_Freq_kHz_Mean': pd.NA,
-                }
-                # Dynamically add all Label_X_Count columns based on common labels from typical USV analysis
-                # This makes the output consistent even if a specific label is missing in a file
-                common_usv_labels = ['Downward', '2Syllabes', 'Complex', 'Chevron', 'Harmonic', 'Composite', 'Flat',
-                                     'Frequency_Step', 'DChevron', 'Upward']
-                for label in common_usv_labels:
-                    all_expected_metrics_init[f'Label_{label}_Count'] = 0
-
-                if df_accepted_usv.empty:
-                    return pd.Series(all_expected_metrics_init)
-
-                aggregated_metrics = {
-                    'animal_id': animal_id,
-                    'Timepoint': timepoint,
-                    'Total_USVs_Count': len(df_accepted_usv)
-                }
-
-                numerical_mean_cols = [
-                    'Call Length (s)', 'Principal Frequency (kHz)', 'Low Freq (kHz)',
-                    'High Freq (kHz)', 'Delta Freq (kHz)', 'Frequency Standard Deviation (kHz)',
-                    'Slope (kHz/s)', 'Sinuosity', 'Mean Power (dB/Hz)', 'Tonality', 'Peak Freq (kHz)'
-                ]
-
-                for col in numerical_mean_cols:
-                    if col in df_accepted_usv.columns and pd.api.types.is_numeric_dtype(df_accepted_usv[col]):
-                        aggregated_metrics[f'{sanitize_col_name(col)}_Mean'] = df_accepted_usv[col].mean()
-                    else:
-                        aggregated_metrics[f'{sanitize_col_name(col)}_Mean'] = pd.NA
-
-                if 'Call Length (s)' in df_accepted_usv.columns and pd.api.types.is_numeric_dtype(
-                        df_accepted_usv['Call Length (s)']):
-                    aggregated_metrics['Call_Length_s_Sum'] = df_accepted_usv['Call Length (s)'].sum()
-                else:
-                    aggregated_metrics['Call_Length_s_Sum'] = pd.NA
-
-                if 'Label' in df_accepted_usv.columns:
-                    label_counts = df_accepted_usv['Label'].value_counts().to_dict()
-                    for label, count in label_counts.items():
-                        sanitized_label = label.replace(" ", "_").replace(".", "").replace("/", "_").replace("(",
-                                                                                                             "").replace(
-                            ")", "")
-                        aggregated_metrics[f'Label_{sanitized_label}_Count'] = count
-                else:
-                    pass
-
-                final_series_data = {**all_expected_metrics_init, **aggregated_metrics}
-                return pd.Series(final_series_data)
-
-            except pd.errors.EmptyDataError:
-                return None
-            except Exception as e:
-                messagebox.showerror("File Processing Error",
-                                     f"Error processing USV file {os.path.basename(file_path)} for {animal_id} at {timepoint}: {e}. Skipping.")
-                return None
-
-        # --- Core Backbone 1.3: Process All USV Files and Combine into a DataFrame ---
-        def process_all_usv_files_internal(df_meta, folder_path):
-            all_aggregated_data = []
-            self.update_status(f"Starting aggregation of all USV files from {folder_path}...")
-
-            # Ensure df_meta has 'Filename', 'animal_id', 'Timepoint'
-            required_meta_cols = ['Filename', 'animal_id', 'Timepoint']
-            if not all(col in df_meta.columns for col in required_meta_cols):
-                messagebox.showerror("Metadata Error",
-                                     f"Metadata file must contain '{', '.join(required_meta_cols)}' columns.")
-                return None
-
-            total_files = len(df_meta)
-            for index, row in df_meta.iterrows():
-                animal_id = row['animal_id']
-                timepoint = row['Timepoint']
-                filename = row['Filename']
-
-                file_path = os.path.join(folder_path, filename)
-                self.update_status(f"Processing file {index + 1}/{total_files}: {filename}")
-
-                aggregated_series = process_single_usv_file_internal(file_path, animal_id, timepoint)
-
-                if aggregated_series is not None:
-                    all_aggregated_data.append(aggregated_series)
-
-            if not all_aggregated_data:
-                messagebox.showerror("Data Aggregation Error",
-                                     "No data was successfully aggregated from any USV files. Check file names and structure.")
-                return None
-
-            df_aggregated_raw = pd.DataFrame(all_aggregated_data)
-
-            # Merge the metadata columns (Sex, Genotype) into the aggregated DataFrame
-            metadata_cols_for_merge = df_meta[['animal_id', 'Timepoint', 'Sex', 'Genotype']].drop_duplicates()
-            df_final_results = pd.merge(
-                df_aggregated_raw,
-                metadata_cols_for_merge,
-                on=['animal_id', 'Timepoint'],
-                how='left'
-            )
-            self.update_status("Successfully aggregated and merged data.")
-            return df_final_results
-
-        # --- Main orchestration within _load_and_merge_data_backend ---
-        df_metadata = load_metadata_internal(full_metadata_path)
-
-        if df_metadata is not None:
-            final_aggregated_df = process_all_usv_files_internal(df_metadata, raw_data_folder)
-            return final_aggregated_df
-        else:
-            return None
+            self.populate_report_tab()  # Still show the pre-flight report explaining what went wrong
 
     # --- Tab 2: Data Report ---
     def create_report_tab(self):
-        self.report_frame = ttk.Frame(self.notebook, padding="10 10 10 10")
-        self.notebook.add(self.report_frame, text="2. Data Report")
-
         # Text widget for scrollable report
         self.report_text_area = tk.Text(self.report_frame, wrap="word", height=15, width=80, state='disabled')
         self.report_text_area.pack(pady=10, padx=10, expand=True, fill="both")
@@ -379,48 +583,91 @@ class USVAnalyzerApp:
         report_text_scroll.pack(side="right", fill="y")
         self.report_text_area.config(yscrollcommand=report_text_scroll.set)
 
+        self.report_buttons_frame = ttk.Frame(self.report_frame)
+        self.report_buttons_frame.pack(side="bottom", fill="x", pady=(20, 0))
         self.next_button_report = ttk.Button(
-            self.report_frame, text="Next", command=self.go_to_analysis_tab
+            self.report_buttons_frame, text="Next", command=self.go_to_analysis_tab
         )
-        self.next_button_report.pack(side="bottom", anchor="se", pady=(20, 0))
+        self.next_button_report.pack(side="right")
+        ttk.Button(self.report_buttons_frame, text="Export Descriptive Statistics",
+                   command=self.export_descriptive_cube).pack(side="left")
 
     def populate_report_tab(self):
         """Populates the report tab with detailed information."""
+        session = self.session
+        self.build_tab('report_frame')
         self.report_text_area.config(state='normal')  # Enable editing
         self.report_text_area.delete(1.0, tk.END)  # Clear previous content
 
-        if self.df_aggregated is not None:
-            num_animals = len(self.df_aggregated['animal_id'].unique())
+        if session.df_aggregated is not None:
+            num_animals = len(session.df_aggregated['animal_id'].unique())
 
-            report_text = f"Your dataset contains data for {num_animals} animals.\n\n"
+            report_text = session.validation_report_text + "\n" if session.validation_report_text else ""
+            if session.load_errors:
+                report_text += f"Problems while parsing ({len(session.load_errors)}):\n"
+                report_text += "".join(f"  - {error}\n" for error in session.load_errors) + "\n"
+            report_text += f"Your dataset contains data for {num_animals} animals.\n\n"
 
             report_text += "Identified variables:\n"
-            for var in self.available_grouping_variables:
+            for var in session.available_grouping_variables:
                 report_text += f"  - {var}\n"
 
+            if session.label_dtype is not None:
+                report_text += f"\nCall labels found across all files ({len(session.label_dtype.categories)}):\n"
+                report_text += f"  {', '.join(map(str, session.label_dtype.categories))}\n"
+
             report_text += "\nAvailable metrics:\n"
-            for metric in self.available_metrics:
+            for metric in session.available_metrics:
                 report_text += f"  - {metric}\n"
 
+            if session.df_calls is not None and 'Is_Outlier' in session.df_calls.columns:
+                flagged_per_animal = session.df_calls.groupby('animal_id')['Is_Outlier'].agg(['sum', 'size'])
+                report_text += (f"\nOutlier calls flagged (median/MAD, threshold {session.options.outlier_threshold}): "
+                                f"{int(flagged_per_animal['sum'].sum())} of {int(flagged_per_animal['size'].sum())}\n")
+                for animal_id, row in flagged_per_animal.iterrows():
+                    report_text += (f"  - {animal_id}: {int(row['sum'])} of {int(row['size'])} calls "
+                                    f"({100 * row['sum'] / row['size']:.1f}%)\n")
+
             self.report_text_area.insert(tk.END, report_text)
             self.notebook.tab(self.analysis_frame, state='normal')  # Enable next tab after report is shown
         else:
-            self.report_text_area.insert(tk.END, "No data loaded to generate report.")
+            report_text = session.validation_report_text + "\n" if session.validation_report_text else ""
+            self.report_text_area.insert(tk.END, report_text + "No data loaded to generate report.")
 
         self.report_text_area.config(state='disabled')  # Disable editing
 
+    def export_descriptive_cube(self):
+        """Saves the full descriptive statistics cube (every metric, every grouping) as one table."""
+        if not self.session.descriptive_cube:
+            messagebox.showwarning("No Data", "Load data first to export its descriptive statistics.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx")],
+            initialdir=self.session.analysis_results_dir,
+            initialfile="descriptive_statistics_all.csv"
+        )
+        if not file_path:
+            return
+        try:
+            df_cube = descriptive_cube_long(self.session.descriptive_cube, self.session.available_grouping_variables)
+            if file_path.endswith('.xlsx'):
+                df_cube.to_excel(file_path, index=False)
+            else:
+                df_cube.to_csv(file_path, index=False)
+            messagebox.showinfo("Export", f"Descriptive statistics saved to:\n{file_path}")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to export descriptive statistics: {e}")
+
     # --- Tab 3: Analysis Options ---
     def create_analysis_tab(self):
-        self.analysis_frame = ttk.Frame(self.notebook, padding="10 10 10 10")
-        self.notebook.add(self.analysis_frame, text="3. Analysis Options")
-
         # Configure grid for this tab's frame
         self.analysis_frame.grid_columnconfigure(0, weight=1)
         self.analysis_frame.grid_columnconfigure(1, weight=1)
         self.analysis_frame.grid_rowconfigure(0, weight=0)  # Labels and dropdowns
         self.analysis_frame.grid_rowconfigure(1, weight=0)
         self.analysis_frame.grid_rowconfigure(2, weight=0)
-        self.analysis_frame.grid_rowconfigure(3, weight=1)  # Spacer
+        self.analysis_frame.grid_rowconfigure(3, weight=1)  # Analysis options (fills the spare space)
         self.analysis_frame.grid_rowconfigure(4, weight=0)  # Run button
 
         # Metric Selection
@@ -437,7 +684,6 @@ class USVAnalyzerApp:
                                          self.update_secondary_grouping_options)  # Bind to update secondary
 
         # Secondary Grouping Variable
-        self.secondary_group_enabled_var = tk.BooleanVar(value=False)  # Default to unchecked
         self.secondary_group_checkbox = ttk.Checkbutton(
             self.analysis_frame, text="Enable Secondary Grouping Variable",
             variable=self.secondary_group_enabled_var,
@@ -448,15 +694,85 @@ class USVAnalyzerApp:
         self.secondary_group_combobox = ttk.Combobox(self.analysis_frame, state="disabled")
         self.secondary_group_combobox.grid(row=2, column=1, sticky="ew", pady=5, padx=5)
 
-        # Run Analysis Button
-        self.run_analysis_button = ttk.Button(self.analysis_frame, text="Run Analysis", command=self.run_analysis)
-        self.run_analysis_button.grid(row=4, column=1, sticky="se", pady=(20, 0))
+        # Additional analysis options
+        self.analysis_options_frame = ttk.LabelFrame(self.analysis_frame, text="Options")
+        self.analysis_options_frame.grid(row=3, column=0, columnspan=2, sticky="new", pady=(15, 5), padx=5)
+        self.exclude_outliers_checkbox = ttk.Checkbutton(
+            self.analysis_options_frame, text="Exclude flagged outlier calls from the metrics",
+            variable=self.exclude_outliers_var, command=self.toggle_outlier_exclusion, state="disabled"
+        )
+        self.exclude_outliers_checkbox.grid(row=0, column=0, columnspan=4, sticky="w", padx=5, pady=5)
+
+        # Subset filters: answered by indexed queries on the session catalog
+        ttk.Label(self.analysis_options_frame, text="Analyze subset:").grid(row=1, column=0, sticky="w", padx=5,
+                                                                            pady=5)
+        self.subset_filter_comboboxes = {}
+        for col_index, factor in enumerate(self.session.SUBSET_FILTER_FACTORS, start=1):
+            ttk.Label(self.analysis_options_frame, text=f"{factor}:").grid(row=1, column=2 * col_index - 1,
+                                                                            sticky="e", padx=(10, 2), pady=5)
+            combobox = ttk.Combobox(self.analysis_options_frame, state="readonly", width=10,
+                                    textvariable=self.subset_filter_vars[factor],
+                                    values=[self.session.SUBSET_FILTER_ALL])
+            combobox.grid(row=1, column=2 * col_index, sticky="w", padx=(0, 5), pady=5)
+            combobox.bind("<<ComboboxSelected>>", lambda event: self.refresh_analysis_dataset())
+            self.subset_filter_comboboxes[factor] = combobox
+
+        # What to do when normality/variance assumptions fail (batch runs should not ask for every metric)
+        ttk.Label(self.analysis_options_frame, text="Assumption violations:").grid(row=2, column=0, sticky="w",
+                                                                                   padx=5, pady=5)
+        ttk.Combobox(self.analysis_options_frame, state="readonly", width=22, textvariable=self.assumption_policy_var,
+                     values=self.session.ASSUMPTION_POLICIES).grid(row=2, column=1, columnspan=3, sticky="w",
+                                                                   padx=(0, 5), pady=5)
+
+        # Family-wide correction applied by "Run All Metrics"
+        ttk.Label(self.analysis_options_frame, text="Batch correction:").grid(row=3, column=0, sticky="w", padx=5,
+                                                                              pady=5)
+        ttk.Combobox(self.analysis_options_frame, state="readonly", width=22, textvariable=self.correction_method_var,
+                     values=list(self.session.FAMILY_CORRECTION_METHODS)).grid(row=3, column=1, columnspan=3,
+                                                                               sticky="w", padx=(0, 5), pady=5)
+        ttk.Label(self.analysis_options_frame, text="Family:").grid(row=3, column=4, sticky="e", padx=(10, 2), pady=5)
+        ttk.Combobox(self.analysis_options_frame, state="readonly", width=14, textvariable=self.correction_family_var,
+                     values=list(self.session.CORRECTION_FAMILIES)).grid(row=3, column=5, columnspan=2, sticky="w",
+                                                                         padx=(0, 5), pady=5)
+
+        # Function-level profile of the next runs (cProfile)
+        ttk.Checkbutton(
+            self.analysis_options_frame, text="Profile this run (cProfile, saved to analysis_results)",
+            variable=self.profile_run_var
+        ).grid(row=4, column=0, columnspan=4, sticky="w", padx=5, pady=5)
+
+        # Run Analysis Buttons
+        self.run_buttons_frame = ttk.Frame(self.analysis_frame)
+        self.run_buttons_frame.grid(row=4, column=1, sticky="se", pady=(20, 0))
+        self.run_analysis_button = ttk.Button(self.run_buttons_frame, text="Run Analysis", command=self.run_analysis)
+        self.run_analysis_button.pack(side="right")
+        self.run_all_metrics_button = ttk.Button(self.run_buttons_frame, text="Run All Metrics",
+                                                 command=self.run_all_metrics)
+        self.run_all_metrics_button.pack(side="right", padx=(0, 10))
+        # ...or queue them to run unattended (Job Queue tab)
+        self.job_priority_var = tk.IntVar(value=0)
+        ttk.Button(self.run_buttons_frame, text="Queue All Metrics",
+                   command=lambda: self.queue_analysis(all_metrics=True)).pack(side="right", padx=(0, 20))
+        ttk.Button(self.run_buttons_frame, text="Queue Analysis", command=self.queue_analysis).pack(side="right",
+                                                                                                   padx=(0, 10))
+        ttk.Spinbox(self.run_buttons_frame, from_=-10, to=10, width=4, textvariable=self.job_priority_var).pack(
+            side="right", padx=(0, 10))
+        ttk.Label(self.run_buttons_frame, text="Job priority:").pack(side="right", padx=(0, 2))
 
         # Back button for navigation
         ttk.Button(self.analysis_frame, text="Back", command=lambda: self.notebook.select(self.report_frame)).grid(
             row=4, column=0, sticky="sw", pady=(20, 0)
         )
 
+    def toggle_outlier_exclusion(self):
+        """Switches between the cached metrics computed with and without the flagged outlier calls."""
+        self.refresh_analysis_dataset()
+
+    def refresh_analysis_dataset(self):
+        """Analyzes the metric variant and subset selected in the options (see usv_core.select_dataset)."""
+        self.read_options()
+        select_dataset(self.session, self.reporter)
+
     def toggle_secondary_group_state(self):
         """Enables/disables secondary group combobox and populates it."""
         if self.secondary_group_enabled_var.get():
@@ -470,9 +786,10 @@ class USVAnalyzerApp:
         """Populates secondary grouping combobox based on primary selection."""
         if self.secondary_group_enabled_var.get():
             selected_primary = self.primary_group_combobox.get()
-            if self.df_aggregated is not None and selected_primary:
+            if self.session.df_aggregated is not None and selected_primary:
                 # Secondary grouping cannot be the same as primary
-                filtered_secondary_options = [gv for gv in self.available_grouping_variables if gv != selected_primary]
+                filtered_secondary_options = [gv for gv in self.session.available_grouping_variables
+                                              if gv != selected_primary]
                 self.secondary_group_combobox['values'] = filtered_secondary_options
                 # If current secondary selection is the same as new primary, or not in new options, reset it
                 current_secondary_selection = self.secondary_group_combobox.get()
@@ -488,13 +805,27 @@ class USVAnalyzerApp:
 
     def go_to_analysis_tab(self):
         # Populate comboboxes before going to the tab
-        self.metric_combobox['values'] = self.available_metrics
-        if self.available_metrics:
-            self.metric_combobox.set(self.available_metrics[0])  # Select first by default
-
-        self.primary_group_combobox['values'] = self.available_grouping_variables
-        if self.available_grouping_variables:
-            self.primary_group_combobox.set(self.available_grouping_variables[0])  # Select first by default
+        self.build_tab('analysis_frame')
+        self.metric_combobox['values'] = self.session.available_metrics
+        if self.session.available_metrics:
+            self.metric_combobox.set(self.session.available_metrics[0])  # Select first by default
+
+        self.primary_group_combobox['values'] = self.session.available_grouping_variables
+        if self.session.available_grouping_variables:
+            self.primary_group_combobox.set(self.session.available_grouping_variables[0])  # Select first by default
+
+        # Subset filter choices come from the loaded data
+        for factor, combobox in self.subset_filter_comboboxes.items():
+            df_all = self.session.aggregated_variants.get('all')
+            levels = sorted(df_all[factor].dropna().astype(str).unique()) if df_all is not None and factor in \
+                df_all.columns else []
+            combobox['values'] = [self.session.SUBSET_FILTER_ALL] + levels
+
+        # Outlier exclusion is only available when the calls were flagged during loading
+        self.exclude_outliers_checkbox.config(
+            state="normal" if 'without_outliers' in self.session.aggregated_variants else "disabled")
+        if 'without_outliers' not in self.session.aggregated_variants:
+            self.exclude_outliers_var.set(False)
 
         # Initialize secondary combobox and checkbox
         self.secondary_group_enabled_var.set(False)  # Ensure it's unchecked by default
@@ -502,1267 +833,107 @@ class USVAnalyzerApp:
 
         self.notebook.select(self.analysis_frame)
 
-    # --- Statistical Analysis & Plotting Methods (integrated from your code) ---
-
-    def get_significance_label(self, p_value):
-        if p_value < 0.001:
-            return '***'
-        elif p_value < 0.01:
-            return '**'
-        elif p_value < 0.05:
-            return '*'
-        else:
-            return 'ns'
-
-    def calculate_cohens_d(self, group1_data, group2_data):
-        n1, n2 = len(group1_data), len(group2_data)
-        if n1 == 0 or n2 == 0: return np.nan
-        s1, s2 = np.std(group1_data, ddof=1), np.std(group2_data, ddof=1)
-        pooled_std = np.sqrt(((n1 - 1) * s1 ** 2 + (n2 - 1) * s2 ** 2) / (n1 + n2 - 2)) if (n1 + n2 - 2) > 0 else 0
-        if pooled_std == 0: return 0.0
-        return (np.mean(group1_data) - np.mean(group2_data)) / pooled_std
-
-    def calculate_partial_eta_squared(self, anova_table, effect_row_name):
-        ss_effect = anova_table.loc[effect_row_name, 'sum_sq']
-        if 'Residual' in anova_table.index:
-            ss_error = anova_table.loc['Residual', 'sum_sq']
-        else:
-            ss_error = 0  # Fallback
-        if ss_effect + ss_error == 0: return np.nan
-        return ss_effect / (ss_effect + ss_error)
-
-    def check_normality(self, df, group_var, metric):
-        is_normal_all_groups = True
-        normality_results_str = "\n  - Assessing Normality (Shapiro-Wilk Test):\n"
-        for name, group in df.groupby(group_var, observed=False):
-            data = group[metric].dropna()
-            if len(data) >= 3:
-                stat, p = stats.shapiro(data)
-                normality_results_str += f"    - Group '{name}' (p={p:.3f}) {'is normally distributed.' if p >= 0.05 else 'is NOT normally distributed.'}\n"
-                if p < 0.05: is_normal_all_groups = False
-            else:
-                normality_results_str += f"    - Group '{name}' has too few samples ({len(data)}) for Shapiro-Wilk test. Skipping normality check.\n"
-                is_normal_all_groups = False
-        return is_normal_all_groups, normality_results_str
-
-    def check_homogeneity_of_variance(self, df, group_var, metric):
-        groups_data = [group[metric].dropna() for name, group in
-                       df.groupby(group_var, observed=False)]
-        groups_data = [g for g in groups_data if len(g) > 1]
-
-        if len(groups_data) < 2:
-            return True, np.nan, "    - Not enough groups or data points per group for Levene's test. Skipping homogeneity of variance check."
-
-        stat, p = stats.levene(*groups_data)
-        homogeneity_str = f"  - Assessing Homogeneity of Variances (Levene's Test):\n"
-        homogeneity_str += f"    - Levene's test (p={p:.3f}) indicates {'equal variances (homoscedasticity).' if p >= 0.05 else 'unequal variances (heteroscedasticity).'} \n"
-        return p >= 0.05, p, homogeneity_str
-
-    def _get_user_choice_on_assumptions_gui(self, assumption_type, test_name, default_to_parametric=False):
-        """
-        Presents a Tkinter messagebox for user choice on assumption violation.
-        Returns True for "Yes, run parametric", False for "No, run non-parametric".
-        """
-        if default_to_parametric:
-            title = "Assumption Warning"
-            message = f"Statistical assumptions ({assumption_type}) for {test_name} (parametric) were not met.\n" \
-                      "Do you want to proceed with the parametric test anyway? (Selecting 'No' will run non-parametric alternative)"
-            return messagebox.askyesno(title, message)
-        else:
-            title = "Assumption Violation - Proceeding Non-Parametric"
-            message = f"Statistical assumptions ({assumption_type}) for {test_name} (parametric) were not met.\n" \
-                      "Proceeding with non-parametric alternative. Do you wish to override and run parametric anyway?"
-            # In this case, 'No' means stick to non-parametric (default behavior if assumptions are violated)
-            # 'Yes' means override and run parametric
-            return messagebox.askyesno(title, message)
-
-    def perform_statistical_analysis(self, df, metric, group_var1, group_var2=None):
-        all_statistical_results = []
-        significant_comparisons_for_plot = []
-
-        self.log_to_gui(f"\n--- Statistical Analysis for '{metric}' ---")
-
-        df_analysis = df.copy()
-        # Explicitly convert to categorical AFTER replacing labels
-        if 'Sex' in df_analysis.columns:
-            df_analysis['Sex'] = df_analysis['Sex'].replace(self.SEX_LABELS).astype('category')
-        if 'Genotype' in df_analysis.columns:
-            df_analysis['Genotype'] = df_analysis['Genotype'].replace(self.GENOTYPE_LABELS).astype('category')
-        if 'Timepoint' in df_analysis.columns:
-            present_timepoints = [tp for tp in self.TIMEPOINT_ORDER if tp in df_analysis['Timepoint'].unique()]
-            if present_timepoints:
-                df_analysis['Timepoint'] = pd.Categorical(df_analysis['Timepoint'], categories=present_timepoints,
-                                                          ordered=True)
-            else:
-                df_analysis['Timepoint'] = df_analysis['Timepoint'].astype(
-                    'category')  # Convert even if no specific order
-
-        grouping_vars_for_dropna = [metric] + [gv for gv in [group_var1, group_var2, 'animal_id'] if gv is not None]
-        df_cleaned = df_analysis.dropna(
-            subset=grouping_vars_for_dropna).copy()
-
-        if df_cleaned.empty:
-            self.log_to_gui(f"Not enough complete data for statistical analysis of '{metric}' after dropping NaNs.")
-            return [], []
-
-        min_samples_per_group = 3
-        actual_grouping_for_counts = [gv for gv in [group_var1, group_var2] if gv is not None]
-        if actual_grouping_for_counts:
-            group_counts = df_cleaned.groupby(actual_grouping_for_counts, observed=False).size()
-            if any(group_counts < min_samples_per_group):
-                self.log_to_gui(f"Warning: Some groups have fewer than {min_samples_per_group} samples.")
-                self.log_to_gui("Statistical tests may not be reliable. Group counts:")
-                self.log_to_gui(group_counts.to_string())
-        else:
-            if len(df_cleaned) < min_samples_per_group:
-                self.log_to_gui(
-                    f"Warning: Total samples ({len(df_cleaned)}) less than {min_samples_per_group}. Statistical tests may not be reliable.")
-
-        is_time_as_factor = ('Timepoint' == group_var1) or ('Timepoint' == group_var2)
-
-        # Determine if it's a Repeated Measures design based on 'animal_id' and 'Timepoint'
-        is_repeated_measures = False
-        if 'animal_id' in df_cleaned.columns and 'Timepoint' in df_cleaned.columns:
-            # Check if each animal_id has multiple entries across timepoints
-            animal_timepoint_counts = df_cleaned.groupby('animal_id', observed=False)[
-                'Timepoint'].nunique()
-            if (animal_timepoint_counts > 1).any():
-                # For this specific analysis, assuming Timepoint is within-subject
-                if 'Timepoint' == group_var1 or 'Timepoint' == group_var2:  # Only flag as RM if timepoint is a factor being analyzed
-                    is_repeated_measures = True
-
-        # --- Case 1: One-way independent (e.g., Genotype, Sex) or One-way RM (Timepoint only) ---
-        if group_var2 is None:
-            if is_repeated_measures:  # One-way Repeated Measures ANOVA
-                self.log_to_gui(f"\n  - Considering One-way Repeated Measures ANOVA for '{metric}' by '{group_var1}':")
-                try:
-                    self.log_to_gui(f"  - Dataframe head for RM ANOVA:\n{df_cleaned.head()}")
-                    self.log_to_gui(
-                        f"  - Dataframe dtypes for RM ANOVA:\n{df_cleaned[[metric, group_var1, 'animal_id']].dtypes}")
-                    self.log_to_gui(f"  - Unique subjects: {df_cleaned['animal_id'].nunique()}")
-                    self.log_to_gui(f"  - Unique within-levels ({group_var1}): {df_cleaned[group_var1].unique()}")
-
-                    aov_rm = pg.rm_anova(data=df_cleaned, dv=metric, within=group_var1, subject='animal_id',
-                                         effsize='np2', correction='auto')  # Removed 'detailed=True'
-                    self.log_to_gui(str(aov_rm))
-
-                    mauchly_spher = pg.sphericity(data=df_cleaned, dv=metric, within=group_var1, subject='animal_id')
-                    sphericity_p = mauchly_spher['p-unc'].iloc[0] if isinstance(mauchly_spher,
-                                                                                pd.DataFrame) and not mauchly_spher.empty else np.nan
-
-                    self.log_to_gui(
-                        f"  - Mauchly's Test for Sphericity (p={sphericity_p:.3f}): {'Sphericity assumed.' if sphericity_p >= 0.05 else 'Sphericity violated. Greenhouse-Geisser/Huynh-Feldt correction applied.'}")
-
-                    p_value_rm = aov_rm['p-unc'].iloc[0]
-                    partial_eta_sq_rm = aov_rm['np2'].iloc[0]
-
-                    all_statistical_results.append({
-                        'Metric': metric, 'Test_Type': 'One-Way Repeated Measures ANOVA', 'Comparison': group_var1,
-                        'F_Statistic': aov_rm['F'].iloc[0], 'P_Value': p_value_rm, 'Effect_Size': partial_eta_sq_rm,
-                        'Significance': self.get_significance_label(p_value_rm),
-                        'Details': f"Sphericity p: {sphericity_p:.3f}"
-                    })
-                    self.log_to_gui(
-                        f"    - Effect of {group_var1}: F-statistic={aov_rm['F'].iloc[0]:.3f}, p-value={p_value_rm:.3f}, Partial Eta-squared={partial_eta_sq_rm:.3f}")
-                    if p_value_rm < 0.05:
-                        self.log_to_gui(f"      -> Statistically significant effect of {group_var1}.")
-                        self.log_to_gui("\n    - Performing pairwise post-hoc tests (Bonferroni corrected):")
-                        # Changed from pairwise_t-tests to pairwise_tests
-                        posthoc_rm = pg.pairwise_tests(data=df_cleaned, dv=metric, within=group_var1,
-                                                       subject='animal_id', padjust='bonferroni')
-                        self.log_to_gui(str(posthoc_rm))
-                        for _, row in posthoc_rm.iterrows():
-                            # Add individual post-hoc results to the table
-                            all_statistical_results.append({
-                                'Metric': metric,
-                                'Test_Type': 'Pairwise t-test (Bonferroni)',
-                                'Comparison': f"{row['A']} vs {row['B']}",
-                                'F_Statistic': np.nan,  # Not applicable for pairwise t-test
-                                'P_Value': row['p-corr'],
-                                'Effect_Size': row['cohen-d'] if 'cohen-d' in row else np.nan,
-                                'Significance': self.get_significance_label(row['p-corr']),
-                                'Details': 'Post-hoc for RM ANOVA'
-                            })
-                            if row['p-corr'] < 0.05:
-                                significant_comparisons_for_plot.append({
-                                    'groups': (row['A'], row['B']), 'p': row['p-corr'],
-                                    'label': self.get_significance_label(row['p-corr'])
-                                })
-                    else:
-                        self.log_to_gui(
-                            f"      -> No statistically significant effect of {group_var1} (p={p_value_rm:.3f}).")
-
-
-                except Exception as e:
-                    self.log_to_gui(f"Error performing Repeated Measures ANOVA: {e}")
-                    self.log_to_gui(traceback.format_exc())  # Log the full traceback
-                    messagebox.showerror("Analysis Error",
-                                         "Failed to perform Repeated Measures ANOVA. Check data structure and raw log output for details. Falling back to non-parametric Friedman test.")
-                    # Fallback to Friedman test
-                    try:
-                        df_friedman = df_cleaned.pivot_table(index='animal_id', columns=group_var1, values=metric,
-                                                             aggfunc='first')
-                        df_friedman = df_friedman.dropna()
-                        if df_friedman.empty:
-                            self.log_to_gui(
-                                "    - Not enough complete cases for Friedman test after pivoting and dropping NaNs.")
-                            return [], []
-                        friedman_stat, friedman_p = stats.friedmanchisquare(
-                            *[df_friedman[col].values for col in df_friedman.columns])
-                        self.log_to_gui(
-                            f"    - Friedman Test: Chi-square={friedman_stat:.3f}, p-value={friedman_p:.3f}")
-
-                        all_statistical_results.append({
-                            'Metric': metric, 'Test_Type': 'Friedman Test', 'Comparison': group_var1,
-                            'F_Statistic': friedman_stat, 'P_Value': friedman_p, 'Effect_Size': np.nan,
-                            'Significance': self.get_significance_label(friedman_p),
-                            'Details': 'Non-parametric alternative due to RM ANOVA failure.'
-                        })
-
-                        if friedman_p < 0.05:
-                            self.log_to_gui(
-                                f"    - Conclusion: Statistically significant difference in ranks of {metric} across {group_var1} timepoints.")
-                            self.log_to_gui(
-                                "\n    - Performing post-hoc Wilcoxon signed-rank tests (Bonferroni corrected):")
-                            timepoints = df_friedman.columns.tolist()
-                            for t1, t2 in combinations(timepoints, 2):
-                                data1 = df_friedman[t1].dropna()
-                                data2 = df_friedman[t2].dropna()
-                                if len(data1) > 0 and len(data2) > 0:
-                                    wilcox_stat, wilcox_p = stats.wilcoxon(data1, data2, alternative='two-sided')
-                                    num_comparisons = len(list(combinations(timepoints, 2)))
-                                    corrected_p = wilcox_p * num_comparisons
-
-                                    all_statistical_results.append({
-                                        'Metric': metric,
-                                        'Test_Type': 'Wilcoxon Signed-Rank Test (Bonferroni)',
-                                        'Comparison': f"{t1} vs {t2}",
-                                        'F_Statistic': np.nan,
-                                        'P_Value': corrected_p,
-                                        'Effect_Size': np.nan,  # No standard effect size from scipy wilcoxon
-                                        'Significance': self.get_significance_label(corrected_p),
-                                        'Details': 'Post-hoc for Friedman Test'
-                                    })
-
-                                    if corrected_p < 0.05:
-                                        significant_comparisons_for_plot.append({
-                                            'groups': (t1, t2), 'p': corrected_p,
-                                            'label': self.get_significance_label(corrected_p)
-                                        })
-                                    self.log_to_gui(
-                                        f"      - {t1} vs {t2}: W={wilcox_stat:.3f}, p={wilcox_p:.3f} (Bonferroni corrected p={corrected_p:.3f})")
-                        else:
-                            self.log_to_gui(
-                                f"    - Conclusion: No statistically significant difference in ranks of {metric} across {group_var1} timepoints.")
-
-                    except Exception as fe:
-                        self.log_to_gui(f"Error performing Friedman test: {fe}")
-                        self.log_to_gui(traceback.format_exc())  # Log the full traceback for fallback
-                        messagebox.showerror("Analysis Error",
-                                             "Cannot perform repeated measures analysis (Friedman fallback also failed).")
-                        return [], []
-
-            else:  # One-way independent ANOVA (or t-test)
-                unique_groups = df_cleaned[group_var1].unique()
-                if len(unique_groups) < 2:
-                    self.log_to_gui(
-                        f"  - Not enough unique groups in {group_var1} for statistical comparison ({len(unique_groups)} groups found).")
-                    return [], []
-
-                self.log_to_gui(f"\n  - Considering analysis for {metric} by {group_var1}:")
-
-                is_normal_all_groups, normality_str = self.check_normality(df_cleaned, group_var1, metric)
-                self.log_to_gui(normality_str)
-                is_homogeneous_variance, levene_p, homogeneity_str = self.check_homogeneity_of_variance(df_cleaned,
-                                                                                                        group_var1,
-                                                                                                        metric)
-                self.log_to_gui(homogeneity_str)
-
-                run_parametric = is_normal_all_groups and is_homogeneous_variance
-
-                if not run_parametric:
-                    self.log_to_gui("\n  - Assumptions not fully met for parametric test.")
-                    user_choice = messagebox.askyesno(
-                        "Assumption Violation",
-                        "Statistical assumptions (Normality and/or Homogeneity of Variances) were not met.\n"
-                        "Do you want to proceed with the parametric test (ANOVA/t-test) anyway?\n"
-                        "Click 'No' to run a non-parametric alternative (Kruskal-Wallis/Mann-Whitney U)."
-                    )
-                    run_parametric = user_choice
-                    if run_parametric:
-                        self.log_to_gui(
-                            "  - Proceeding with parametric test despite assumption warnings. Interpret results with caution.")
-                    else:
-                        self.log_to_gui("  - Proceeding with non-parametric alternative as requested.")
-                else:
-                    self.log_to_gui("\n  - Assumptions met for parametric test.")
-
-                if run_parametric:
-                    if len(unique_groups) == 2:
-                        self.log_to_gui("\n  - Performing Independent Samples t-test (parametric):")
-                        group1_data = df_cleaned[df_cleaned[group_var1] == unique_groups[0]][metric]
-                        group2_data = df_cleaned[df_cleaned[group_var1] == unique_groups[1]][metric]
-
-                        test_name_full = "Independent t-test"
-                        t_stat = np.nan
-                        p_value = np.nan
-                        cohens_d_val = np.nan
-
-                        if not is_homogeneous_variance:
-                            t_stat, p_value = stats.ttest_ind(group1_data, group2_data, equal_var=False)
-                            test_name_full = "Welch's Independent t-test"
-                            self.log_to_gui("    (Using Welch's t-test due to unequal variances)")
-                        else:
-                            t_stat, p_value = stats.ttest_ind(group1_data, group2_data, equal_var=True)
-
-                        cohens_d_val = self.calculate_cohens_d(group1_data, group2_data)
-
-                        self.log_to_gui(
-                            f"    - {test_name_full}: t-statistic={t_stat:.3f}, p-value={p_value:.3f}, Cohen's d={cohens_d_val:.3f}")
-
-                        all_statistical_results.append({
-                            'Metric': metric, 'Test_Type': test_name_full,
-                            'Comparison': f'{unique_groups[0]} vs {unique_groups[1]}',
-                            'F_Statistic': t_stat, 'P_Value': p_value, 'Effect_Size': cohens_d_val,
-                            'Significance': self.get_significance_label(p_value),
-                            'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
-                        })
-                        if p_value < 0.05:
-                            self.log_to_gui(
-                                f"    - Conclusion: Statistically significant difference in {metric} between {unique_groups[0]} and {unique_groups[1]}.")
-                            significant_comparisons_for_plot.append({
-                                'groups': (unique_groups[0], unique_groups[1]), 'p': p_value,
-                                'label': self.get_significance_label(p_value)
-                            })
-                        else:
-                            self.log_to_gui(
-                                f"    - Conclusion: No statistically significant difference in {metric} between {unique_groups[0]} and {unique_groups[1]}.")
-
-                    else:  # More than 2 unique groups -> One-way ANOVA (parametric)
-                        self.log_to_gui("\n  - Performing One-way ANOVA (parametric):")
-                        formula = f'{metric} ~ C({group_var1})'
-                        model = ols(formula, data=df_cleaned).fit()
-                        anova_table = sm.stats.anova_lm(model, typ=2)
-                        self.log_to_gui(str(anova_table))
-
-                        p_value = anova_table['PR(>F)'][f'C({group_var1})']
-                        partial_eta_sq = self.calculate_partial_eta_squared(anova_table, f'C({group_var1})')
-
-                        all_statistical_results.append({
-                            'Metric': metric, 'Test_Type': 'One-Way ANOVA', 'Comparison': group_var1,
-                            'F_Statistic': anova_table['F'][f'C({group_var1})'], 'P_Value': p_value,
-                            'Effect_Size': partial_eta_sq,
-                            'Significance': self.get_significance_label(p_value),
-                            'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
-                        })
-
-                        if p_value < 0.05:
-                            self.log_to_gui(
-                                f"    - Conclusion: Statistically significant effect of {group_var1} on {metric}.")
-                            self.log_to_gui("\n    - Performing Tukey HSD post-hoc test:")
-                            tukey_results = pairwise_tukeyhsd(endog=df_cleaned[metric], groups=df_cleaned[group_var1],
-                                                              alpha=0.05)
-                            self.log_to_gui(str(tukey_results))
-                            for row in tukey_results.summary().data[1:]:
-                                group1, group2, mean_diff, lower_ci, upper_ci, p_val, reject = row[
-                                                                                               :7]  # Extract relevant columns
-                                # Only add significant comparisons to the plot annotations, but add all to table
-                                all_statistical_results.append({
-                                    'Metric': metric,
-                                    'Test_Type': 'Tukey HSD Post-hoc',
-                                    'Comparison': f"{group1} vs {group2}",
-                                    'F_Statistic': np.nan,  # Not applicable for post-hoc
-                                    'P_Value': p_val,
-                                    'Effect_Size': mean_diff,  # Using mean difference as effect size for Tukey
-                                    'Significance': self.get_significance_label(p_val),
-                                    'Details': f"Mean Diff: {mean_diff:.3f}, CI: [{lower_ci:.3f}, {upper_ci:.3f}]"
-                                })
-                                if p_val < 0.05:
-                                    significant_comparisons_for_plot.append({
-                                        'groups': (group1, group2), 'p': p_val,
-                                        'label': self.get_significance_label(p_val)
-                                    })
-                        else:
-                            self.log_to_gui(
-                                f"    - Conclusion: No statistically significant effect of {group_var1} on {metric} (p={p_value:.3f}).")
-
-                else:  # Non-parametric alternative (if parametric test declined or assumptions not met)
-                    if len(unique_groups) == 2:
-                        self.log_to_gui("\n  - Performing Mann-Whitney U test (non-parametric):")
-                        group1_data = df_cleaned[df_cleaned[group_var1] == unique_groups[0]][metric]
-                        group2_data = df_cleaned[df_cleaned[group_var1] == unique_groups[1]][metric]
-                        stat, p_value = stats.mannwhitneyu(group1_data, group2_data, alternative='two-sided')
-
-                        r_effect_size = \
-                        pg.pairwise_tests(x=group1_data, y=group2_data, alternative='two-sided', parametric=False)[
-                            'RBC'].iloc[0] if not group1_data.empty and not group2_data.empty else np.nan
-
-                        self.log_to_gui(
-                            f"    - Mann-Whitney U test: U-statistic={stat:.3f}, p-value={p_value:.3f}, Rank-Biserial Correlation={r_effect_size:.3f}")
-                        all_statistical_results.append({
-                            'Metric': metric, 'Test_Type': 'Mann-Whitney U test',
-                            'Comparison': f'{unique_groups[0]} vs {unique_groups[1]}',
-                            'F_Statistic': stat, 'P_Value': p_value, 'Effect_Size': r_effect_size,
-                            'Significance': self.get_significance_label(p_value),
-                            'Details': 'Non-parametric alternative.'
-                        })
-                        if p_value < 0.05:
-                            self.log_to_gui(
-                                f"    - Conclusion: Statistically significant difference in ranks of {metric} between {unique_groups[0]} and {unique_groups[1]}.")
-                            significant_comparisons_for_plot.append({
-                                'groups': (unique_groups[0], unique_groups[1]), 'p': p_value,
-                                'label': self.get_significance_label(p_value)
-                            })
-                        else:
-                            self.log_to_gui(
-                                f"    - Conclusion: No statistically significant difference in ranks of {metric} between {unique_groups[0]} and {unique_groups[1]}.")
-
-                    else:  # More than 2 unique groups -> Kruskal-Wallis H-test (non-parametric)
-                        self.log_to_gui("\n  - Performing Kruskal-Wallis H-test (non-parametric):")
-                        groups_data_kruskal = [df_cleaned[metric][df_cleaned[group_var1] == g].dropna() for g in
-                                               unique_groups]
-                        stat, p_value = stats.kruskal(*groups_data_kruskal)
-
-                        all_statistical_results.append({
-                            'Metric': metric, 'Test_Type': 'Kruskal-Wallis H-test', 'Comparison': group_var1,
-                            'F_Statistic': stat, 'P_Value': p_value, 'Effect_Size': np.nan,
-                            'Significance': self.get_significance_label(p_value),
-                            'Details': 'Non-parametric alternative due to assumption violation or user choice.'
-                        })
-                        self.log_to_gui(f"    - Kruskal-Wallis H-test: H-statistic={stat:.3f}, p-value={p_value:.3f}")
-                        if p_value < 0.05:
-                            self.log_to_gui(
-                                f"    - Conclusion: Statistically significant difference in ranks of {metric} between groups.")
-                            self.log_to_gui(
-                                "\n    - Performing Dunn's Post-hoc test (using Bonferroni correction for pairwise comparisons):")
-                            # Changed from pairwise_ttests to pairwise_tests
-                            posthoc_kw = pg.pairwise_tests(data=df_cleaned, dv=metric, between=group_var1,
-                                                           parametric=False,
-                                                           padjust='bonferroni')
-                            self.log_to_gui(str(posthoc_kw))
-
-                            for _, row in posthoc_kw.iterrows():
-                                p_val_to_use = row['p-corr'] if 'p-corr' in row else row['p-unc']
-                                # Add individual post-hoc results to the table
-                                all_statistical_results.append({
-                                    'Metric': metric,
-                                    'Test_Type': 'Dunn\'s Post-hoc (Bonferroni)',
-                                    'Comparison': f"{row['A']} vs {row['B']}",
-                                    'F_Statistic': np.nan,
-                                    'P_Value': p_val_to_use,
-                                    'Effect_Size': row['RBC'] if 'RBC' in row else np.nan,  # Rank-Biserial Correlation
-                                    'Significance': self.get_significance_label(p_val_to_use),
-                                    'Details': 'Post-hoc for Kruskal-Wallis'
-                                })
-                                if p_val_to_use < 0.05:
-                                    significant_comparisons_for_plot.append({
-                                        'groups': (row['A'], row['B']),
-                                        'p': p_val_to_use,
-                                        'label': self.get_significance_label(p_val_to_use)
-                                    })
-                        else:
-                            self.log_to_gui(
-                                f"    - Conclusion: No statistically significant difference in ranks of {metric} between groups.")
-
-        # --- Case 2: Two-way independent ANOVA or Case 3: Mixed ANOVA ---
-        elif group_var2 is not None:
-            if is_repeated_measures:  # Mixed ANOVA (Timepoint as one factor, other as between-subjects)
-                independent_factor = group_var1 if group_var1 != 'Timepoint' else group_var2
-                repeated_factor = 'Timepoint'
-
-                if independent_factor not in df_cleaned.columns:
-                    self.log_to_gui(f"Independent factor '{independent_factor}' not found in data for mixed ANOVA.")
-                    return [], []
-
-                self.log_to_gui(
-                    f"\n  - Considering Mixed ANOVA for '{metric}' with between-subject factor '{independent_factor}' and within-subject factor '{repeated_factor}':")
-
-                try:
-                    self.log_to_gui(f"  - Dataframe head for Mixed ANOVA:\n{df_cleaned.head()}")
-                    self.log_to_gui(
-                        f"  - Dataframe dtypes for Mixed ANOVA:\n{df_cleaned[[metric, repeated_factor, independent_factor, 'animal_id']].dtypes}")
-                    self.log_to_gui(f"  - Unique subjects: {df_cleaned['animal_id'].nunique()}")
-                    self.log_to_gui(
-                        f"  - Unique within-levels ({repeated_factor}): {df_cleaned[repeated_factor].unique()}")
-                    self.log_to_gui(
-                        f"  - Unique between-levels ({independent_factor}): {df_cleaned[independent_factor].unique()}")
-
-                    aov_mixed = pg.mixed_anova(data=df_cleaned, dv=metric, within=repeated_factor,
-                                               between=independent_factor, subject='animal_id', effsize='np2',
-                                               correction='auto')
-                    self.log_to_gui(str(aov_mixed))
-
-                    mauchly_sphericity = pg.sphericity(data=df_cleaned, dv=metric, within=repeated_factor,
-                                                       subject='animal_id')
-                    sphericity_p = np.nan
-                    if isinstance(mauchly_sphericity, pd.DataFrame) and not mauchly_sphericity.empty:
-                        sphericity_p = mauchly_sphericity['p-unc'].iloc[0]
-                    else:
-                        self.log_to_gui(
-                            f"  - Mauchly's Test for Sphericity returned non-DataFrame result (type: {type(mauchly_sphericity)}). Assuming sphericity or test not applicable.")
-
-                    self.log_to_gui(
-                        f"  - Mauchly's Test for Sphericity (p={sphericity_p:.3f}): {'Sphericity assumed.' if (sphericity_p >= 0.05 or pd.isna(sphericity_p)) else 'Sphericity violated. Greenhouse-Geisser correction applied.'}")
-
-                    effects = [independent_factor, repeated_factor, f'{independent_factor} * {repeated_factor}']
-                    for effect in effects:
-                        row_source = effect
-                        if effect == f'{independent_factor} * {repeated_factor}':
-                            row_source = f'{independent_factor} * {repeated_factor}'
-
-                        if row_source in aov_mixed['Source'].values:
-                            row_data = aov_mixed[aov_mixed['Source'] == row_source].iloc[0]
-                            p_value = row_data['p-unc']
-                            partial_eta_sq = row_data['np2']
-
-                            all_statistical_results.append({
-                                'Metric': metric, 'Test_Type': 'Mixed ANOVA',
-                                'Comparison': effect.replace(' * ', ' x '),
-                                'F_Statistic': row_data['F'], 'P_Value': p_value,
-                                'Effect_Size': partial_eta_sq, 'Significance': self.get_significance_label(p_value),
-                                'Details': f"Sphericity p: {sphericity_p:.3f}"
-                            })
-                            self.log_to_gui(
-                                f"    - Effect of {effect}: F-statistic={row_data['F']:.3f}, p-value={p_value:.3f}, Partial Eta-squared={partial_eta_sq:.3f}")
-                            if p_value < 0.05:
-                                self.log_to_gui(f"      -> Statistically significant effect of {effect}.")
-
-                    # Post-hoc for interaction if significant
-                    interaction_term = f'{independent_factor} * {repeated_factor}'
-                    interaction_row = aov_mixed[aov_mixed['Source'] == interaction_term]
-                    if not interaction_row.empty and interaction_row['p-unc'].iloc[0] < 0.05:
-                        self.log_to_gui("\n    - Significant interaction detected. Performing post-hoc comparisons:")
-                        # Changed from pairwise_ttests to pairwise_tests
-                        posthoc_interaction = pg.pairwise_tests(data=df_cleaned, dv=metric, within=repeated_factor,
-                                                                between=independent_factor, subject='animal_id',
-                                                                padjust='bonferroni')
-                        self.log_to_gui(str(posthoc_interaction))
-                        for _, row in posthoc_interaction.iterrows():
-                            # For plotting, need a way to identify the groups. Format as (between_group, within_group)
-                            # Example: (Males, P4) vs (Males, P6)
-                            g1_between_level = row[independent_factor]
-                            g1_within_level = row['A']
-                            g2_within_level = row['B']  # Only within-subject is changing in these comparisons
-
-                            all_statistical_results.append({
-                                'Metric': metric,
-                                'Test_Type': f'Pairwise t-test (Mixed ANOVA Post-hoc)',
-                                'Comparison': f"{independent_factor} ({g1_between_level}): {g1_within_level} vs {g2_within_level}",
-                                'F_Statistic': np.nan,
-                                'P_Value': row['p-corr'],
-                                'Effect_Size': row['cohen-d'] if 'cohen-d' in row else np.nan,
-                                'Significance': self.get_significance_label(row['p-corr']),
-                                'Details': f'Post-hoc for significant {independent_factor} x {repeated_factor} interaction'
-                            })
-                            if row['p-corr'] < 0.05:
-                                # For plot annotations, pass the tuple that represents the full group
-                                significant_comparisons_for_plot.append({
-                                    'groups': (
-                                    (g1_between_level, g1_within_level), (g1_between_level, g2_within_level)),
-                                    'p': row['p-corr'], 'label': self.get_significance_label(row['p-corr'])
-                                })
-
-                    else:
-                        self.log_to_gui("\n    - No significant interaction. Checking main effects for post-hoc:")
-                        # Post-hoc for main effect of independent_factor if significant
-                        independent_effect_row = aov_mixed[aov_mixed['Source'] == independent_factor]
-                        if not independent_effect_row.empty and independent_effect_row['p-unc'].iloc[0] < 0.05:
-                            self.log_to_gui(
-                                f"\n    - Significant main effect of {independent_factor}. Performing post-hoc (Tukey HSD):")
-                            tukey_results = pairwise_tukeyhsd(endog=df_cleaned[metric],
-                                                              groups=df_cleaned[independent_factor], alpha=0.05)
-                            self.log_to_gui(str(tukey_results))
-                            for row in tukey_results.summary().data[1:]:
-                                group1, group2, mean_diff, lower_ci, upper_ci, p_val, reject = row[:7]
-                                all_statistical_results.append({
-                                    'Metric': metric,
-                                    'Test_Type': f'Tukey HSD Post-hoc (Main Effect {independent_factor})',
-                                    'Comparison': f"{group1} vs {group2}",
-                                    'F_Statistic': np.nan,
-                                    'P_Value': p_val,
-                                    'Effect_Size': mean_diff,
-                                    'Significance': self.get_significance_label(p_val),
-                                    'Details': 'Post-hoc for Mixed ANOVA Main Effect'
-                                })
-                                if p_val < 0.05:
-                                    significant_comparisons_for_plot.append({
-                                        'groups': (group1, group2), 'p': p_val,
-                                        'label': self.get_significance_label(p_val)
-                                    })
-
-                        # Post-hoc for main effect of repeated_factor if significant
-                        repeated_effect_row = aov_mixed[aov_mixed['Source'] == repeated_factor]
-                        if not repeated_effect_row.empty and repeated_effect_row['p-unc'].iloc[0] < 0.05:
-                            self.log_to_gui(
-                                f"\n    - Significant main effect of {repeated_factor}. Performing pairwise post-hoc (Bonferroni corrected):")
-                            posthoc_rm_main = pg.pairwise_tests(data=df_cleaned, dv=metric, within=repeated_factor,
-                                                                subject='animal_id', padjust='bonferroni')
-                            self.log_to_gui(str(posthoc_rm_main))
-                            for _, row in posthoc_rm_main.iterrows():
-                                all_statistical_results.append({
-                                    'Metric': metric,
-                                    'Test_Type': f'Pairwise t-test (Main Effect {repeated_factor}, Bonferroni)',
-                                    'Comparison': f"{row['A']} vs {row['B']}",
-                                    'F_Statistic': np.nan,
-                                    'P_Value': row['p-corr'],
-                                    'Effect_Size': row['cohen-d'] if 'cohen-d' in row else np.nan,
-                                    'Significance': self.get_significance_label(row['p-corr']),
-                                    'Details': 'Post-hoc for Mixed ANOVA Main Effect'
-                                })
-                                if row['p-corr'] < 0.05:
-                                    significant_comparisons_for_plot.append({
-                                        'groups': (row['A'], row['B']), 'p': row['p-corr'],
-                                        'label': self.get_significance_label(row['p-corr'])
-                                    })
-
-                except Exception as e:
-                    self.log_to_gui(f"Error performing Mixed ANOVA: {e}")
-                    self.log_to_gui(traceback.format_exc())  # Log the full traceback
-                    messagebox.showerror("Analysis Error",
-                                         "Failed to perform Mixed ANOVA. Check data structure and raw log output for details.")
-                    return [], []
-
-            else:  # Two-way independent ANOVA
-                self.log_to_gui(f"\n  - Considering Two-way ANOVA for {metric} by {group_var1} and {group_var2}:")
-
-                df_cleaned['__combined_group__'] = df_cleaned[group_var1].astype(str) + '_' + df_cleaned[
-                    group_var2].astype(str)
-                is_normal_all_groups, normality_str = self.check_normality(df_cleaned, '__combined_group__', metric)
-                self.log_to_gui(normality_str)
-                is_homogeneous_variance, levene_p, homogeneity_str = self.check_homogeneity_of_variance(df_cleaned,
-                                                                                                        '__combined_group__',
-                                                                                                        metric)
-                self.log_to_gui(homogeneity_str)
-                df_cleaned = df_cleaned.drop(columns='__combined_group__')
-
-                run_parametric = is_normal_all_groups and is_homogeneous_variance
-                if not run_parametric:
-                    self.log_to_gui("\n  - Assumptions not fully met for Parametric Two-Way ANOVA.")
-                    user_choice = messagebox.askyesno(
-                        "Assumption Violation",
-                        "Statistical assumptions (Normality and/or Homogeneity of Variances) were not met.\n"
-                        "Do you want to proceed with the parametric Two-Way ANOVA anyway?\n"
-                        "Click 'No' to attempt a non-parametric alternative (Rank-transformed ANOVA)."
-                    )
-                    run_parametric = user_choice
-                    if run_parametric:
-                        self.log_to_gui(
-                            "  - Proceeding with Two-Way ANOVA despite assumption warnings. Interpret results with caution.")
-                    else:
-                        self.log_to_gui("  - Proceeding with non-parametric alternative as requested.")
-
-                if run_parametric:
-                    self.log_to_gui("\n  - Performing Two-way ANOVA (parametric):")
-                    formula = f'{metric} ~ C({group_var1}) * C({group_var2})'
-                    model = ols(formula, data=df_cleaned).fit()
-                    anova_table = sm.stats.anova_lm(model, typ=2)
-                    self.log_to_gui(str(anova_table))
-
-                    effects = [group_var1, group_var2, f'{group_var1}:{group_var2}']
-                    for effect in effects:
-                        effect_col_name = f'C({effect})' if ':' not in effect else f'C({group_var1}):C({group_var2})'
-                        if effect_col_name in anova_table.index:
-                            p_value = anova_table['PR(>F)'][effect_col_name]
-                            partial_eta_sq = self.calculate_partial_eta_squared(anova_table, effect_col_name)
-
-                            all_statistical_results.append({
-                                'Metric': metric, 'Test_Type': 'Two-Way ANOVA',
-                                'Comparison': effect.replace(':', ' x '),
-                                'F_Statistic': anova_table['F'][effect_col_name], 'P_Value': p_value,
-                                'Effect_Size': partial_eta_sq, 'Significance': self.get_significance_label(p_value),
-                                'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
-                            })
-                            self.log_to_gui(
-                                f"    - Effect of {effect}: F-statistic={anova_table['F'][effect_col_name]:.3f}, p-value={p_value:.3f}, Partial Eta-squared={partial_eta_sq:.3f}")
-                            if p_value < 0.05:
-                                self.log_to_gui(
-                                    f"      -> Statistically significant effect of {effect.replace(':', ' x ')}.")
-
-                    interaction_term_formula = f'C({group_var1}):C({group_var2})'
-                    interaction_p = anova_table['PR(>F)'][
-                        interaction_term_formula] if interaction_term_formula in anova_table.index else 1.0
-
-                    if interaction_p < 0.05:
-                        self.log_to_gui(
-                            "\n    - Significant interaction detected. Performing post-hoc comparisons (Tukey HSD) on combined groups:")
-                        df_cleaned['combined_group_for_posthoc'] = df_cleaned[group_var1].astype(str) + ' x ' + \
-                                                                   df_cleaned[group_var2].astype(str)
-                        tukey_results = pairwise_tukeyhsd(endog=df_cleaned[metric],
-                                                          groups=df_cleaned['combined_group_for_posthoc'], alpha=0.05)
-                        self.log_to_gui(str(tukey_results))
-                        for row in tukey_results.summary().data[1:]:
-                            group1, group2, mean_diff, lower_ci, upper_ci, p_val, reject = row[:7]
-                            all_statistical_results.append({
-                                'Metric': metric,
-                                'Test_Type': 'Tukey HSD Post-hoc (Interaction)',
-                                'Comparison': f"{group1} vs {group2}",
-                                'F_Statistic': np.nan,
-                                'P_Value': p_val,
-                                'Effect_Size': mean_diff,
-                                'Significance': self.get_significance_label(p_val),
-                                'Details': f"Mean Diff: {mean_diff:.3f}, CI: [{lower_ci:.3f}, {upper_ci:.3f}]"
-                            })
-                            if p_val < 0.05:
-                                significant_comparisons_for_plot.append({
-                                    'groups': (group1, group2), 'p': p_val, 'label': self.get_significance_label(p_val)
-                                })
-                    else:
-                        self.log_to_gui("\n    - No significant interaction. Checking main effects for post-hoc:")
-                        for g_var in [group_var1, group_var2]:
-                            main_effect_p = anova_table['PR(>F)'][f'C({g_var})']
-                            if main_effect_p < 0.05:
-                                self.log_to_gui(
-                                    f"\n    - Significant main effect of {g_var}. Performing post-hoc (Tukey HSD):")
-                                tukey_results = pairwise_tukeyhsd(endog=df_cleaned[metric], groups=df_cleaned[g_var],
-                                                                  alpha=0.05)
-                                self.log_to_gui(str(tukey_results))
-                                for row in tukey_results.summary().data[1:]:
-                                    group1, group2, mean_diff, lower_ci, upper_ci, p_val, reject = row[:7]
-                                    all_statistical_results.append({
-                                        'Metric': metric,
-                                        'Test_Type': f'Tukey HSD Post-hoc (Main Effect {g_var})',
-                                        'Comparison': f"{group1} vs {group2}",
-                                        'F_Statistic': np.nan,
-                                        'P_Value': p_val,
-                                        'Effect_Size': mean_diff,
-                                        'Significance': self.get_significance_label(p_val),
-                                        'Details': 'Post-hoc for Non-parametric Two-Way ANOVA Main Effect'
-                                    })
-                                    if p_val < 0.05:
-                                        significant_comparisons_for_plot.append({
-                                            'groups': (group1, group2), 'p': p_val,
-                                            'label': self.get_significance_label(p_val)
-                                        })
-                else:  # Non-parametric two-way alternative (Rank-transformed ANOVA)
-                    self.log_to_gui("\n  - Assumptions not met or parametric test declined for Two-Way ANOVA.")
-                    self.log_to_gui("    Proceeding with Non-parametric Two-way ANOVA (Rank-transformed ANOVA).")
-
-                    try:
-                        df_cleaned['__ranked_metric__'] = df_cleaned[metric].rank(method='average')
-                        formula_ranked = f'__ranked_metric__ ~ C({group_var1}) * C({group_var2})'
-                        model_ranked = ols(formula_ranked, data=df_cleaned).fit()
-                        anova_table_non_parametric = sm.stats.anova_lm(model_ranked, typ=2)
-                        self.log_to_gui(str(anova_table_non_parametric))
-
-                        for effect_name_raw in [group_var1, group_var2, f'{group_var1}:{group_var2}']:
-                            effect_name_formula = f'C({effect_name_raw})' if ':' not in effect_name_raw else f'C({group_var1}):C({group_var2})'
-                            if effect_name_formula in anova_table_non_parametric.index:
-                                p_val = anova_table_non_parametric['PR(>F)'][effect_name_formula]
-                                F_stat = anova_table_non_parametric['F'][effect_name_formula]
-                                partial_eta_sq = self.calculate_partial_eta_squared(anova_table_non_parametric,
-                                                                                    effect_name_formula)
-
-                                all_statistical_results.append({
-                                    'Metric': metric, 'Test_Type': 'Non-parametric Two-Way ANOVA (on ranks)',
-                                    'Comparison': effect_name_raw.replace(':', ' x '),
-                                    'F_Statistic': F_stat, 'P_Value': p_val, 'Effect_Size': partial_eta_sq,
-                                    'Significance': self.get_significance_label(p_val),
-                                    'Details': 'Non-parametric alternative (Rank-transformed).'
-                                })
-                                self.log_to_gui(
-                                    f"    - Effect of {effect_name_raw.replace(':', ' x ')}: p-value={p_val:.3f}, Partial Eta Squared={partial_eta_sq:.3f}")
-                                if p_val < 0.05:
-                                    self.log_to_gui(f"      -> Statistically significant effect (non-parametric).")
-
-                        p_val_interaction = anova_table_non_parametric['PR(>F)'][
-                            f'C({group_var1}):C({group_var2})'] if f'C({group_var1}):C({group_var2})' in anova_table_non_parametric.index else 1.0
-
-                        if p_val_interaction < 0.05:
-                            self.log_to_gui(
-                                "\n    - Statistically significant interaction (non-parametric). Performing Simple Effects Analysis (Mann-Whitney U) for significant interaction:")
-                            for level_g2 in df_cleaned[group_var2].unique():
-                                self.log_to_gui(
-                                    f"\n--- Simple Effect of {group_var1} for {group_var2} = {level_g2} ---")
-                                subset_df = df_cleaned[df_cleaned[group_var2] == level_g2].copy()
-                                unique_g1_in_subset = subset_df[group_var1].unique()
-
-                                if len(unique_g1_in_subset) < 2:
-                                    self.log_to_gui(
-                                        f"  Not enough unique groups for simple effect analysis for {group_var1} at {group_var2}={level_g2}.")
-                                    continue
-
-                                posthoc_simple = pg.pairwise_tests(data=subset_df, dv=metric, between=group_var1,
-                                                                   parametric=False, padjust='bonferroni')
-                                self.log_to_gui(str(posthoc_simple))
-
-                                for _, row_simple in posthoc_simple.iterrows():
-                                    p_value_to_use = row_simple['p-corr'] if 'p-corr' in row_simple else row_simple[
-                                        'p-unc']
-
-                                    all_statistical_results.append({
-                                        'Metric': metric,
-                                        'Test_Type': f'Mann-Whitney U (Simple Effect {group_var1} at {group_var2}={level_g2})',
-                                        'Comparison': f"{row_simple['A']} vs {row_simple['B']}",
-                                        'F_Statistic': np.nan,
-                                        'P_Value': p_value_to_use,
-                                        'Effect_Size': row_simple['RBC'] if 'RBC' in row_simple else np.nan,
-                                        'Significance': self.get_significance_label(p_value_to_use),
-                                        'Details': 'Post-hoc for Non-parametric Two-Way ANOVA Interaction'
-                                    })
-                                    if p_value_to_use < 0.05:
-                                        g1_name = row_simple['A']
-                                        g2_name = row_simple['B']
-                                        significant_comparisons_for_plot.append({
-                                            'groups': ((g1_name, level_g2), (g2_name, level_g2)),
-                                            'p': p_value_to_use, 'label': self.get_significance_label(p_value_to_use)
-                                        })
-
-                        elif p_val_interaction >= 0.05:
-                            self.log_to_gui("\n  - No statistically significant interaction (non-parametric).")
-                            for effect_src in [group_var1, group_var2]:
-                                effect_name_formula = f'C({effect_src})'
-                                p_main_effect = anova_table_non_parametric['PR(>F)'][
-                                    effect_name_formula] if effect_name_formula in anova_table_non_parametric.index else np.nan
-                                if p_main_effect < 0.05:
-                                    self.log_to_gui(
-                                        f"\n  - Statistically significant main effect of {effect_src} (non-parametric).")
-                                    self.log_to_gui(
-                                        f"    Performing post-hoc (Dunn's) for main effect of {effect_src}:")
-                                    posthoc_main = pg.pairwise_tests(data=df_cleaned, dv=metric, between=effect_src,
-                                                                     parametric=False, padjust='bonferroni')
-                                    self.log_to_gui(str(posthoc_main))
-
-                                    for _, row_main in posthoc_main.iterrows():
-                                        p_value_to_use = row_main['p-corr'] if 'p-corr' in row_main else row_main[
-                                            'p-unc']
-
-                                        all_statistical_results.append({
-                                            'Metric': metric,
-                                            'Test_Type': f'Dunn\'s Post-hoc (Main Effect {effect_src})',
-                                            'Comparison': f"{row_main['A']} vs {row_main['B']}",
-                                            'F_Statistic': np.nan,
-                                            'P_Value': p_value_to_use,
-                                            'Effect_Size': row_main['RBC'] if 'RBC' in row_main else np.nan,
-                                            'Significance': self.get_significance_label(p_value_to_use),
-                                            'Details': 'Post-hoc for Non-parametric Two-Way ANOVA Main Effect'
-                                        })
-                                        if p_value_to_use < 0.05:
-                                            significant_comparisons_for_plot.append({
-                                                'groups': (row_main['A'], row_main['B']),
-                                                'p': p_value_to_use,
-                                                'label': self.get_significance_label(p_value_to_use)
-                                            })
-                    except Exception as e:
-                        self.log_to_gui(f"Error performing Non-parametric Two-way ANOVA: {e}")
-                        self.log_to_gui(traceback.format_exc())  # Log the full traceback for fallback
-                        messagebox.showerror("Analysis Error",
-                                             "Could not perform non-parametric analysis. Returning no results.")
-                        return [], []
-                    finally:
-                        if '__ranked_metric__' in df_cleaned.columns:
-                            df_cleaned = df_cleaned.drop(columns='__ranked_metric__')
-
-        self.log_to_gui("\n--- Statistical Analysis Complete ---")
-        return all_statistical_results, significant_comparisons_for_plot
-
-    def calculate_descriptive_statistics(self, df, metric, grouping_vars):
-        """
-        Calculates and prints descriptive statistics for a given metric,
-        grouped by specified variables. Outputs to the GUI's log.
-        """
-        self.log_to_gui(f"\n--- Descriptive Statistics for '{metric}' ---")
-
-        if not grouping_vars:
-            desc_stats = df[metric].describe()
-            self.log_to_gui("\nOverall Descriptive Statistics:")
-            self.log_to_gui(str(desc_stats))
-        else:
-            df_display = df.copy()
-            if 'Sex' in df_display.columns:
-                df_display['Sex'] = df_display['Sex'].replace(self.SEX_LABELS)
-            if 'Genotype' in df_display.columns:
-                df_display['Genotype'] = df_display['Genotype'].replace(self.GENOTYPE_LABELS)
-
-            # Use original grouping_vars for groupby, then display with labels
-            grouped_stats = df_display.groupby(grouping_vars, observed=False)[metric].agg(
-                ['count', 'mean', 'std', 'min', 'max', 'median', 'sem']).round(3)
-            grouped_stats.rename(columns={'sem': 'standard_error_of_mean'}, inplace=True)
-            self.log_to_gui(f"\nDescriptive Statistics by {', '.join(grouping_vars)}:")
-            self.log_to_gui(str(grouped_stats))
-
-        self.log_to_gui("\n--- Descriptive Statistics Complete ---")
-        return grouped_stats
-
-    def plot_dot_plot_with_mean_sd_reinstated(self, df, metric, primary_grouping, secondary_grouping, output_dir,
-                                              sex_labels, genotype_labels, timepoint_order,
-                                              significant_comparisons=None):
-        """
-        Generates a plot with mean and standard deviation, with
-        optional secondary grouping and significance annotations.
-        Returns the matplotlib Figure object.
-        """
-        self.log_to_gui(f"Generating plot for {metric} by {primary_grouping}" + (
-            f" and {secondary_grouping}" if secondary_grouping else "") + " (Means and SDs Only)...")
-
-        fig, ax = plt.subplots(figsize=(10, 7))
-        sns.set_style("whitegrid")
-
-        df_plot = df.copy()
-
-        # Apply readable labels for plotting
-        if 'Sex' in df_plot.columns:
-            df_plot['Sex'] = df_plot['Sex'].replace(sex_labels)
-        if 'Genotype' in df_plot.columns:
-            df_plot['Genotype'] = df_plot['Genotype'].replace(genotype_labels)
-        if 'Timepoint' in df_plot.columns:
-            present_timepoints = [tp for tp in timepoint_order if tp in df_plot['Timepoint'].unique()]
-            if present_timepoints:
-                df_plot['Timepoint'] = pd.Categorical(df_plot['Timepoint'], categories=present_timepoints, ordered=True)
-
-        # Determine x_axis and hue variables
-        x_axis_var = primary_grouping
-
-        pointplot_hue_var = None
-
-        # Color palettes and marker maps
-        SEX_COLOR_MAP_PLOT = {'Females': 'pink', 'Males': 'blue'}
-        GENOTYPE_COLOR_MAP_PLOT = {'Wild Type': 'green', 'Mutant': 'purple'}
-
-        point_palette_arg = None  # Will be either a dict
-        point_hue_order = None  # Will be explicitly set or left for seaborn to infer
-
-        plot_order_x = None
-        if x_axis_var == 'Timepoint':
-            plot_order_x = timepoint_order
-        else:
-            plot_order_x = sorted(df_plot[x_axis_var].dropna().unique())
-
-        if secondary_grouping:
-            pointplot_hue_var = secondary_grouping
-
-            if secondary_grouping == 'Sex':
-                point_palette_dict = {label: SEX_COLOR_MAP_PLOT.get(label, 'gray') for label in
-                                      self.SEX_LABELS.values()}
-                point_palette_arg = point_palette_dict
-                # Ensure hue order matches the palette keys and available data
-                point_hue_order = [lbl for lbl in point_palette_dict.keys() if
-                                   lbl in df_plot[pointplot_hue_var].dropna().unique()]
-            elif secondary_grouping == 'Genotype':
-                point_palette_dict = {label: GENOTYPE_COLOR_MAP_PLOT.get(label, 'gray') for label in
-                                      self.GENOTYPE_LABELS.values()}
-                point_palette_arg = point_palette_dict
-                # Ensure hue order matches the palette keys and available data
-                point_hue_order = [lbl for lbl in point_palette_dict.keys() if
-                                   lbl in df_plot[pointplot_hue_var].dropna().unique()]
-            else:
-                # For other secondary grouping variables, generate a palette dynamically
-                unique_hue_levels = sorted(df_plot[pointplot_hue_var].dropna().unique().tolist())
-                if not unique_hue_levels:
-                    self.log_to_gui(
-                        f"Warning: No valid data for hue variable '{pointplot_hue_var}' to plot. Plotting skipped.")
-                    plt.close(fig)  # Close the empty figure
-                    return None, None
-
-                    # Generate a default color palette if not Sex/Genotype and create a dictionary
-                colors = sns.color_palette("viridis", n_colors=len(unique_hue_levels))
-                point_palette_arg = {level: colors[i] for i, level in enumerate(unique_hue_levels)}
-                point_hue_order = unique_hue_levels  # Set hue order to all unique levels
-
-            # Display Mean and SD only
-            sns.pointplot(x=x_axis_var, y=metric, hue=pointplot_hue_var, data=df_plot,
-                          linestyle='none', estimator=np.mean, errorbar='sd', capsize=0.1,
-                          # Replaced join=False with linestyle='none'
-                          palette=point_palette_arg, dodge=0.6, ax=ax, markers='D',
-                          # Diamond marker for mean, explicit dodge width
-                          order=plot_order_x, hue_order=point_hue_order)
-
-            # --- Calculate x_group_positions for significance bars ---
-            x_group_positions = {}
-
-            num_x_categories = len(plot_order_x)
-            num_hue_categories = len(point_hue_order)
-
-            # Match the dodge width used in sns.pointplot
-            explicit_dodge_width = 0.6
-            if num_hue_categories > 1:
-                point_width_in_dodge = explicit_dodge_width / num_hue_categories
-                # The first point for an x-category is offset from the center of the x-tick
-                start_offset = -(explicit_dodge_width / 2) + (point_width_in_dodge / 2)
-            else:
-                point_width_in_dodge = 0
-                start_offset = 0
-
-            for i, x_cat in enumerate(plot_order_x):
-                for j, hue_cat in enumerate(point_hue_order):
-                    actual_x_pos = i + start_offset + j * point_width_in_dodge
-                    x_group_positions[(x_cat, hue_cat)] = actual_x_pos
-
-            # Create a combined legend for means (diamond)
-            handles = []
-            labels = []
-            for hue_val in point_hue_order:
-                label = f"{hue_val}"
-                handles.append(plt.Line2D([0], [0], marker='D',  # Diamond marker for mean
-                                          color='w', markerfacecolor=point_palette_arg.get(hue_val, 'gray'),
-                                          markeredgecolor='k', markersize=10, linestyle='None'))
-                labels.append(label)
-
-            ax.legend(handles, labels, title=pointplot_hue_var, bbox_to_anchor=(1.05, 1), loc='upper left')
-
-        else:  # Only one grouping variable
-            sns.pointplot(x=x_axis_var, y=metric, data=df_plot,
-                          linestyle='none', estimator=np.mean, errorbar='sd', capsize=0.1,
-                          # Replaced join=False with linestyle='none'
-                          color='black', ax=ax, markers='D',  # Diamond marker for mean
-                          order=plot_order_x)
-
-            # For single grouping variable, x_coords for significance bars are simply 0, 1, 2...
-            x_group_positions = {val: i for i, val in enumerate(plot_order_x)}
-
-            # Add legend for single variable case: mean
-            handles = [
-                plt.Line2D([0], [0], marker='D', color='w', markerfacecolor='black', markeredgecolor='black',
-                           markersize=10, linestyle='None', label='Mean ± SD')
-            ]
-            ax.legend(handles=handles, title="Legend", bbox_to_anchor=(1.05, 1), loc='upper left')
-
-        plt.title(f'{metric} by {primary_grouping}' + (f' and {secondary_grouping}' if secondary_grouping else ''))
-        plt.ylabel(metric)
-        plt.xlabel(primary_grouping)
-        plt.tight_layout(rect=[0, 0, 0.85, 1])  # Adjust layout to make space for legend
-
-        # Add significance annotations
-        if significant_comparisons:
-            # Recalculate y_max_overall based on means + SDs visible in the plot, not just raw data points
-            y_vals_upper_sd = []
-            if secondary_grouping:
-                for x_cat in plot_order_x:
-                    for hue_cat in point_hue_order:
-                        subset = df_plot[(df_plot[x_axis_var] == x_cat) & (df_plot[pointplot_hue_var] == hue_cat)]
-                        if not subset.empty:
-                            mean_val = subset[metric].mean()
-                            std_val = subset[metric].std()
-                            if pd.notna(mean_val) and pd.notna(std_val):
-                                y_vals_upper_sd.append(mean_val + std_val)
-            else:
-                for x_cat in plot_order_x:
-                    subset = df_plot[df_plot[x_axis_var] == x_cat]
-                    if not subset.empty:
-                        mean_val = subset[metric].mean()
-                        std_val = subset[metric].std()
-                        if pd.notna(mean_val) and pd.notna(std_val):
-                            y_vals_upper_sd.append(mean_val + std_val)
-
-            if y_vals_upper_sd:
-                y_max_overall_plot = max(y_vals_upper_sd)
-            else:
-                y_max_overall_plot = df_plot[metric].max() if not df_plot.empty else 1  # Fallback if no data
-
-            y_min_overall = df_plot[metric].min() if not df_plot.empty else 0
-            y_range_overall = y_max_overall_plot - y_min_overall
-            if y_range_overall == 0: y_range_overall = y_max_overall_plot * 0.2 if y_max_overall_plot != 0 else 1  # Avoid division by zero
-
-            # Start position for significance bars
-            y_pos_start = y_max_overall_plot + y_range_overall * 0.1
-
-            # Store the current y-position to avoid overlaps
-            current_y_pos = y_pos_start
-
-            # Filter and sort comparisons to prevent overlap
-            filtered_comparisons = []
-            for comp in significant_comparisons:
-                g1, g2 = comp['groups']
-
-                formatted_g1 = g1
-                formatted_g2 = g2
-
-                if formatted_g1 in x_group_positions and formatted_g2 in x_group_positions:
-                    filtered_comparisons.append(
-                        {'groups': (formatted_g1, formatted_g2), 'p': comp['p'], 'label': comp['label']})
-                else:
-                    self.log_to_gui(
-                        f"Warning: Comparison groups {g1} and {g2} (formatted as {formatted_g1} and {formatted_g2}) not found in plot positions. Skipping annotation.")
-
-            filtered_comparisons.sort(
-                key=lambda c: abs(x_group_positions[c['groups'][0]] - x_group_positions[c['groups'][1]]))
-
-            for i, comp in enumerate(filtered_comparisons):
-                g1_key, g2_key = comp['groups']
-                p_label = comp['label']
-
-                x1 = x_group_positions[g1_key]
-                x2 = x_group_positions[g2_key]
-
-
-                if secondary_grouping:
-                    group1_primary_level = g1_key[0]
-                    group1_secondary_level = g1_key[1]
-                    group2_primary_level = g2_key[0]
-                    group2_secondary_level = g2_key[1]
-
-
-                    subset_g1 = df_plot[(df_plot[primary_grouping] == group1_primary_level) &
-                                        (df_plot[secondary_grouping] == group1_secondary_level)]
-                    subset_g2 = df_plot[(df_plot[primary_grouping] == group2_primary_level) &
-                                        (df_plot[secondary_grouping] == group2_secondary_level)]
-
-                    mean_g1 = subset_g1[metric].mean() if not subset_g1.empty else np.nan
-                    std_g1 = subset_g1[metric].std() if not subset_g1.empty else np.nan
-                    mean_g2 = subset_g2[metric].mean() if not subset_g2.empty else np.nan
-                    std_g2 = subset_g2[metric].std() if not subset_g2.empty else np.nan
-
-                    y_val1 = mean_g1 + std_g1 if pd.notna(mean_g1) and pd.notna(std_g1) else y_max_overall_plot
-                    y_val2 = mean_g2 + std_g2 if pd.notna(mean_g2) and pd.notna(std_g2) else y_max_overall_plot
-
-                else:  # Only primary grouping
-                    subset_g1 = df_plot[df_plot[primary_grouping] == g1_key]
-                    subset_g2 = df_plot[df_plot[primary_grouping] == g2_key]
-
-                    mean_g1 = subset_g1[metric].mean() if not subset_g1.empty else np.nan
-                    std_g1 = subset_g1[metric].std() if not subset_g1.empty else np.nan
-                    mean_g2 = subset_g2[metric].mean() if not subset_g2.empty else np.nan
-                    std_g2 = subset_g2[metric].std() if not subset_g2.empty else np.nan
-
-                    y_val1 = mean_g1 + std_g1 if pd.notna(mean_g1) and pd.notna(std_g1) else y_max_overall_plot
-                    y_val2 = mean_g2 + std_g2 if pd.notna(mean_g2) and pd.notna(std_g2) else y_max_overall_plot
-
-                # Ensure y_val1 and y_val2 are finite numbers for comparison
-                y_val1 = y_val1 if np.isfinite(y_val1) else y_max_overall_plot
-                y_val2 = y_val2 if np.isfinite(y_val2) else y_max_overall_plot
-
-                potential_bar_level = max(y_val1, y_val2) + y_range_overall * 0.05  # Initial buffer above the points
-
-                # Ensure current_y_pos is always at least the potential bar level
-                current_y_pos = max(current_y_pos + y_range_overall * 0.03, potential_bar_level)
-
-                # Draw the bar
-                ax.plot([x1, x1, x2, x2],
-                        [current_y_pos, current_y_pos + y_range_overall * 0.01, current_y_pos + y_range_overall * 0.01,
-                         current_y_pos],
-                        lw=1.5, c='k')
-                # Add the text label
-                ax.text((x1 + x2) / 2, current_y_pos + y_range_overall * 0.01 + y_range_overall * 0.005, p_label,
-                        ha='center', va='bottom', color='k', fontsize=10)
-
-            # Adjust y-limit to ensure significance bars are visible
-            # Maximize y-limit based on the highest `current_y_pos` used
-            ax.set_ylim(top=current_y_pos + y_range_overall * 0.05)
-            # Add autoscale to ensure all elements fit
-            ax.autoscale_view()
+    # --- Run Analysis Method ---
+    def selected_design(self, all_metrics=False):
+        """(metric, primary, secondary grouping) chosen above, or None after saying what is missing."""
+        metric = None if all_metrics else self.metric_combobox.get()
+        primary_grouping = self.primary_group_combobox.get()
+        secondary_grouping = self.secondary_group_combobox.get() if self.secondary_group_enabled_var.get() else None
 
-        plt.tight_layout(rect=[0, 0, 0.85, 1])  # Re-adjust layout after adding sig bars
+        if not primary_grouping or not (all_metrics or metric):
+            messagebox.showerror("Input Error", "Please select a Primary Grouping Variable." if all_metrics else
+                                 "Please select a Metric and a Primary Grouping Variable.")
+            return None
 
-        # Save plot and return Figure object
-        file_name = f'{metric}_by_{primary_grouping}'
-        if secondary_grouping:
-            file_name += f'_{secondary_grouping}'
-        file_name = file_name.replace(' ', '_').replace('/',
-                                                        '_') + '_mean_sd_plot.png'  # Changed filename to reflect plot type
+        if self.secondary_group_enabled_var.get() and not secondary_grouping:
+            messagebox.showwarning("Input Error", "Please select a Secondary Grouping Variable or uncheck the option.")
+            return None
 
-        plot_path = os.path.join(output_dir, file_name)
-        fig.savefig(plot_path, dpi=300, bbox_inches='tight')
-        plt.close(fig)  # Close the figure to free memory
-        return fig, plot_path  # Return both the figure and its save path
+        if secondary_grouping and primary_grouping == secondary_grouping:
+            messagebox.showerror("Input Error", "Primary and Secondary grouping variables cannot be the same.")
+            return None
+        return metric, primary_grouping, secondary_grouping
 
-    # --- Run Analysis Method ---
     def run_analysis(self):
-        if self.df_aggregated is None:
+        if self.session.df_aggregated is None:
             messagebox.showerror("Error", "Please load data first.")
             return
 
-        selected_metric = self.metric_combobox.get()
-        primary_grouping = self.primary_group_combobox.get()
-        secondary_grouping = self.secondary_group_combobox.get()
-
-        if not selected_metric or not primary_grouping:
-            messagebox.showerror("Input Error", "Please select a Metric and a Primary Grouping Variable.")
+        design = self.selected_design()
+        if design is None:
             return
+        self.prepare_run()
+        output = analyze_metric(self.session, *design, self.reporter, self.choose_parametric())
+        self.last_generated_plot_path = output.plot_path
+        if output.figure is not None and output.plot_path:
+            # Display plot in GUI
+            with self.session.perf.span("Display"):
+                self.display_plot(output.figure)
+            self.update_tab('graphic_frame', state='normal')
+        else:
+            self.update_tab('graphic_frame', state='disabled')  # Keep plot tab disabled if no plot
+        self.show_analysis_output(output)
 
-        if self.secondary_group_enabled_var.get() and not secondary_grouping:
-            messagebox.showwarning("Input Error", "Please select a Secondary Grouping Variable or uncheck the option.")
+    def run_all_metrics(self):
+        """Runs the selected design for every metric (no plots) and corrects all p-values family-wide."""
+        if self.session.df_aggregated is None:
+            messagebox.showerror("Error", "Please load data first.")
             return
 
-        if not self.secondary_group_enabled_var.get():
-            secondary_grouping = None  # Ensure it's None if checkbox is unchecked
-
-        if secondary_grouping and primary_grouping == secondary_grouping:
-            messagebox.showerror("Input Error", "Primary and Secondary grouping variables cannot be the same.")
+        design = self.selected_design(all_metrics=True)
+        if design is None:
             return
+        self.prepare_run()
+        self.show_analysis_output(analyze_all_metrics(self.session, *design[1:], self.reporter,
+                                                      self.choose_parametric()))
 
+    def prepare_run(self):
+        """Takes the options from the widgets and clears the outputs of the previous analysis."""
+        self.read_options()
         self.clear_output()
-        self.log_to_gui(f"Starting analysis for Metric: {selected_metric}, Primary Group: {primary_grouping}" +
-                        (f", Secondary Group: {secondary_grouping}" if secondary_grouping else ""))
-
-        # Redirect print statements to the GUI's text widget
-        old_stdout = sys.stdout
-        sys.stdout = TextRedirector(self.raw_log_output_text)  # Directs prints to raw log output
-
         # Ensure the statistical output tab is always enabled for logging
-        self.notebook.tab(self.statistical_output_frame, state='normal')
-
-        try:
-            # 1. Calculate Descriptive Statistics
-            grouping_for_desc_stats = [primary_grouping]
-            if secondary_grouping:
-                grouping_for_desc_stats.append(secondary_grouping)
-
-            descriptive_stats_df = self.calculate_descriptive_statistics(self.df_aggregated, selected_metric,
-                                                                         grouping_for_desc_stats)
-            self._current_descriptive_stats_df = descriptive_stats_df  # Store for potential saving and display
-            self.populate_descriptive_stats_table(descriptive_stats_df)  # Populate the new descriptive stats table
-
-            # 2. Perform Statistical Analysis
-            statistical_results_list, significant_comparisons = self.perform_statistical_analysis(
-                self.df_aggregated, selected_metric, primary_grouping, secondary_grouping
-            )
-
-            # 3. Generate Plot
-            # Only attempt to generate plot if analysis was successful or didn't explicitly fail
-            plot_fig, plot_path = None, None
-            try:
-                plot_fig, plot_path = self.plot_dot_plot_with_mean_sd_reinstated(
-                    self.df_aggregated, selected_metric, primary_grouping, secondary_grouping,
-                    self.plot_output_dir, self.SEX_LABELS, self.GENOTYPE_LABELS,
-                    self.TIMEPOINT_ORDER, significant_comparisons
-                )
-            except Exception as plot_e:
-                self.log_to_gui(f"\nAn error occurred during plot generation: {plot_e}")
-                self.log_to_gui(traceback.format_exc())
-                messagebox.showwarning("Plotting Error",
-                                       f"Failed to generate plot: {plot_e}\nCheck 'Statistical Output' tab for details.")
-
-            self.last_generated_plot_path = plot_path
-
-            if plot_fig and plot_path:
-                # Display plot in GUI
-                self.display_plot(plot_fig)
-                self.log_to_gui(f"\nPlot saved to: {plot_path}")
-                self.notebook.tab(self.graphic_frame, state='normal')
+        self.update_tab('statistical_output_frame', state='normal')
+
+    def show_analysis_output(self, output):
+        """Shows the tables returned by an analysis (kept for "Save Results Table") and its stage timings."""
+        self._current_statistical_results_df = output.results
+        self._current_descriptive_stats_df = output.descriptive
+        with self.session.perf.span("Display"):
+            if not output.descriptive.empty:
+                self.populate_descriptive_stats_table(output.descriptive)
+            if not output.results.empty:
+                self.populate_results_table(output.results)
             else:
-                self.log_to_gui("\nPlot generation skipped due to previous errors or no valid data.")
-                self.notebook.tab(self.graphic_frame, state='disabled')  # Keep plot tab disabled if no plot
-
-            # Display statistical results in GUI (Treeview)
-            if statistical_results_list:
-                results_df = pd.DataFrame(statistical_results_list)
-                self.populate_results_table(results_df)
-                self._current_statistical_results_df = results_df  # Store for potential saving
-                # Save statistical results to CSV
-                output_file = os.path.join(self.analysis_results_dir, f'statistical_results_{selected_metric}.csv')
-                results_df.to_csv(output_file, index=False)
-                self.log_to_gui(f"\n--- Statistical results saved to '{output_file}' ---")
-            else:
-                self.log_to_gui("\nNo statistical results to display or save.")
                 self.clear_results_table()
+        self.populate_performance_table()
+        # Switch to Statistical Output tab by default if analysis completed (even with plot errors)
+        self.update_tab('statistical_output_frame', select=True)
+
+    def queue_analysis(self, all_metrics=False):
+        """Adds the selected analysis (or all metrics) of the selected cohorts to the job queue."""
+        if self.session.df_aggregated is None or not self.session.selected_cohort_paths:
+            messagebox.showerror("Error", "Please load data from cohort folders or archives first.")
+            return
 
-            self.update_status("Analysis complete!")
-            # Switch to Statistical Output tab by default if analysis completed (even with plot errors)
-            self.notebook.select(self.statistical_output_frame)
+        design = self.selected_design(all_metrics)
+        if design is None:
+            return
+        try:
+            priority = self.job_priority_var.get()
+        except tk.TclError:
+            messagebox.showerror("Input Error", "The job priority must be a whole number.")
+            return
 
-        except Exception as e:
-            self.log_to_gui(f"\nAn unexpected error occurred during analysis: {e}")
-            self.log_to_gui(traceback.format_exc())  # Log the full traceback
-            messagebox.showerror("Analysis Error",
-                                 f"An error occurred during analysis: {e}\nCheck the 'Statistical Output' tab for details.")
-            self.notebook.select(self.statistical_output_frame)  # Switch to statistical output tab on error
-        finally:
-            sys.stdout = old_stdout  # Restore stdout
+        self.read_options()
+        job_id = self.session.submit_job(*design, priority=priority)
+        note = " (jobs cannot ask: assumption violations get the non-parametric test)" \
+            if self.assumption_policy_var.get() == 'Ask' else ""
+        self.update_status(f"Queued job {job_id}{note}. Start the workers in the Job Queue tab.")
+        if self.tab_built('jobs_frame'):
+            self.refresh_jobs_view()
 
     # --- New Tab: Statistical Output ---
     def create_statistical_output_tab(self):
-        self.statistical_output_frame = ttk.Frame(self.notebook, padding="10 10 10 10")
-        self.notebook.add(self.statistical_output_frame, text="4. Statistical Output")
-
         # Configure grid for this tab
         self.statistical_output_frame.grid_rowconfigure(0, weight=1)  # Inferential table
         self.statistical_output_frame.grid_rowconfigure(1, weight=0)  # Separator
@@ -1775,12 +946,21 @@ class USVAnalyzerApp:
         # Inferential Statistical Results Table
         self.results_table_frame = ttk.LabelFrame(self.statistical_output_frame, text="Inferential Statistical Results")
         self.results_table_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        self.results_table = ttk.Treeview(self.results_table_frame, show="headings")
-        self.results_table.pack(side="left", fill="both", expand=True)
-        self.results_table_scroll_y = ttk.Scrollbar(self.results_table_frame, orient="vertical",
-                                                    command=self.results_table.yview)
-        self.results_table_scroll_y.pack(side="right", fill="y")
-        self.results_table.config(yscrollcommand=self.results_table_scroll_y.set)
+        # Filter applied as you type (click a column heading to sort)
+        results_filter_frame = ttk.Frame(self.results_table_frame)
+        results_filter_frame.pack(side="top", fill="x", padx=5, pady=(5, 0))
+        self.results_filter_column_var = tk.StringVar(value=self.RESULTS_FILTER_COLUMNS[0])
+        self.results_filter_text_var = tk.StringVar()
+        ttk.Label(results_filter_frame, text="Filter:").pack(side="left")
+        ttk.Combobox(results_filter_frame, state="readonly", width=18, textvariable=self.results_filter_column_var,
+                     values=self.RESULTS_FILTER_COLUMNS).pack(side="left", padx=5)
+        ttk.Entry(results_filter_frame, width=24, textvariable=self.results_filter_text_var).pack(side="left")
+        ttk.Label(results_filter_frame, text="(text, or e.g. <0.05 for p-values)").pack(side="left", padx=5)
+        ttk.Button(results_filter_frame, text="Clear",
+                   command=lambda: self.results_filter_text_var.set("")).pack(side="left")
+        self.results_filter_column_var.trace_add('write', lambda *args: self.filter_results_table())
+        self.results_filter_text_var.trace_add('write', lambda *args: self.filter_results_table())
+        self.results_table = VirtualTable(self.results_table_frame)
 
         # Separator between Inferential and Descriptive Tables
         ttk.Separator(self.statistical_output_frame, orient='horizontal').grid(row=1, column=0, sticky='ew', padx=5,
@@ -1789,22 +969,37 @@ class USVAnalyzerApp:
         # Descriptive Statistics Table
         self.descriptive_stats_frame = ttk.LabelFrame(self.statistical_output_frame, text="Descriptive Statistics")
         self.descriptive_stats_frame.grid(row=2, column=0, sticky="nsew", padx=5, pady=5)
-        self.descriptive_stats_table = ttk.Treeview(self.descriptive_stats_frame, show="headings")
-        self.descriptive_stats_table.pack(side="left", fill="both", expand=True)
-        self.descriptive_stats_scroll_y = ttk.Scrollbar(self.descriptive_stats_frame, orient="vertical",
-                                                        command=self.descriptive_stats_table.yview)
-        self.descriptive_stats_scroll_y.pack(side="right", fill="y")
-        self.descriptive_stats_table.config(yscrollcommand=self.descriptive_stats_scroll_y.set)
+        self.descriptive_stats_table = VirtualTable(self.descriptive_stats_frame)
 
         # Raw Log Output (for general messages - still here for consistency with console output)
-        self.raw_log_output_frame = ttk.LabelFrame(self.statistical_output_frame, text="Raw Log Output")
-        self.raw_log_output_frame.grid(row=3, column=0, sticky="nsew", padx=5, pady=5)
+        # and, next to it, the Performance pane with the stage timings of the last run
+        self.log_and_performance_frame = ttk.Frame(self.statistical_output_frame)
+        self.log_and_performance_frame.grid(row=3, column=0, sticky="nsew")
+        self.log_and_performance_frame.grid_rowconfigure(0, weight=1)
+        self.log_and_performance_frame.grid_columnconfigure(0, weight=3)
+        self.log_and_performance_frame.grid_columnconfigure(1, weight=2)
+        self.raw_log_output_frame = ttk.LabelFrame(self.log_and_performance_frame, text="Raw Log Output")
+        self.raw_log_output_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         self.raw_log_output_text = tk.Text(self.raw_log_output_frame, wrap="word", height=8, state='disabled')
         self.raw_log_output_text.pack(side="left", fill="both", expand=True, padx=5, pady=5)
         self.raw_log_output_scroll = ttk.Scrollbar(self.raw_log_output_frame, command=self.raw_log_output_text.yview)
         self.raw_log_output_scroll.pack(side="right", fill="y")
         self.raw_log_output_text.config(yscrollcommand=self.raw_log_output_scroll.set)
 
+        self.performance_frame = ttk.LabelFrame(self.log_and_performance_frame, text="Performance")
+        self.performance_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+        performance_columns = ['Calls', 'Wall (s)', 'CPU (s)', 'Peak Mem (MB)', '+Mem (MB)']
+        self.performance_table = ttk.Treeview(self.performance_frame, columns=performance_columns, height=8)
+        self.performance_table.heading('#0', text='Stage', anchor='w')
+        self.performance_table.column('#0', width=200, stretch=True)
+        for col in performance_columns:
+            self.performance_table.heading(col, text=col)
+            self.performance_table.column(col, width=70, anchor='e', stretch=False)
+        self.performance_table.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.performance_scroll = ttk.Scrollbar(self.performance_frame, command=self.performance_table.yview)
+        self.performance_scroll.pack(side="right", fill="y")
+        self.performance_table.config(yscrollcommand=self.performance_scroll.set)
+
         # Buttons specific to statistical output
         self.statistical_buttons_frame = ttk.Frame(self.statistical_output_frame)
         self.statistical_buttons_frame.grid(row=4, column=0, sticky="ew", padx=5, pady=5)
@@ -1820,11 +1015,13 @@ class USVAnalyzerApp:
             row=0, column=2, padx=5, pady=5, sticky="e"
         )
 
+        # Messages logged and stages timed while loading, before this tab existed
+        self.log_sink.attach(self.raw_log_output_text)
+        if self.session.perf.rows():
+            self.populate_performance_table()
+
     # --- Tab: Graphic ---
     def create_graphic_tab(self):
-        self.graphic_frame = ttk.Frame(self.notebook, padding="10 10 10 10")
-        self.notebook.add(self.graphic_frame, text="5. Graphic")
-
         # Configure grid for this tab
         self.graphic_frame.grid_rowconfigure(0, weight=1)  # Plot area
         self.graphic_frame.grid_rowconfigure(1, weight=0)  # Buttons
@@ -1833,8 +1030,6 @@ class USVAnalyzerApp:
         # Plot Display Area
         self.plot_canvas_frame = ttk.LabelFrame(self.graphic_frame, text="Generated Plot")
         self.plot_canvas_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        self.plot_canvas = None
-        self.plot_toolbar = None
 
         # Buttons specific to graphic
         self.graphic_buttons_frame = ttk.Frame(self.graphic_frame)
@@ -1857,6 +1052,8 @@ class USVAnalyzerApp:
 
     def display_plot(self, fig):
         """Displays a Matplotlib figure in the GUI."""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk  # Needs a window
+        self.build_tab('graphic_frame')
         # Clear previous plot if exists
         for widget in self.plot_canvas_frame.winfo_children():
             widget.destroy()
@@ -1871,9 +1068,8 @@ class USVAnalyzerApp:
         self.plot_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
     def populate_results_table(self, df_results):
-        """Populates the Treeview widget with statistical results."""
-        # Clear existing table
-        self.clear_results_table()
+        """Populates the results table with statistical results (the current filter is kept)."""
+        self.build_tab('statistical_output_frame')
 
         # Define columns for the inferential table
         # Ensure 'F_Statistic' is included, even if NaN for non-ANOVA tests
@@ -1883,97 +1079,85 @@ class USVAnalyzerApp:
             if col not in df_results.columns:
                 df_results[col] = np.nan  # Add missing columns with NaN
 
-        # Reorder columns to ensure F_Statistic is in a consistent place
-        df_results = df_results[required_cols]
-
-        self.results_table["columns"] = list(df_results.columns)
-        for col in df_results.columns:
-            self.results_table.heading(col, text=col.replace('_', ' '),
-                                       anchor=tk.CENTER)  # Make column headers more readable
-            # Adjust column width based on content or a sensible default
-            self.results_table.column(col, anchor=tk.CENTER, width=max(100, len(col) * 10))
-
-            # Add data rows
-        for index, row in df_results.iterrows():
-            # Format numerical values for display
-            display_values = []
-            for col_name, value in row.items():
-                if col_name in ['F_Statistic', 'P_Value', 'Effect_Size'] and pd.isna(value):
-                    display_values.append('')  # Display NaN as empty string
-                elif isinstance(value, (float, np.float32, np.float64)):
-                    display_values.append(f"{value:.3f}")
-                else:
-                    display_values.append(value)
-            self.results_table.insert("", "end", values=display_values)
+        # Reorder columns to ensure F_Statistic is in a consistent place (family-wide correction of batch runs last)
+        df_results = df_results[required_cols + [col for col in ['P_Adjusted_Family', 'Significance_Family']
+                                                 if col in df_results.columns]]
+
+        # Numbers are formatted per column and only the rows in view are drawn (see VirtualTable)
+        self.results_table.set_data(df_results)
+        self.filter_results_table()
+
+    def filter_results_table(self):
+        """Applies the filter of the results table (column and text/comparison typed above it)."""
+        self.results_table.filter(self.results_filter_column_var.get(), self.results_filter_text_var.get())
 
     def clear_results_table(self):
         """Clears all data from the inferential results table."""
-        for item in self.results_table.get_children():
-            self.results_table.delete(item)
-        self.results_table["columns"] = ()  # Clear column definitions
+        if not self.tab_built('statistical_output_frame'):
+            return  # Nothing shown yet
+        self.results_table.clear()
 
     def populate_descriptive_stats_table(self, df_descriptive_stats):
-        """Populates the new Treeview widget with descriptive statistics."""
-        # Clear existing table
-        self.clear_descriptive_stats_table()
+        """Populates the descriptive statistics table (sortable by clicking a column heading)."""
+        self.build_tab('statistical_output_frame')
 
-        # Add index as a column if it has a name (e.g., grouping variables)
-        if df_descriptive_stats.index.name:
-            columns = [df_descriptive_stats.index.name] + list(df_descriptive_stats.columns)
+        # Add index as a column if it has a name (e.g., grouping variables, one level per variable)
+        if any(name is not None for name in df_descriptive_stats.index.names):
             # Reset index to make it a regular column
             df_display = df_descriptive_stats.reset_index()
         else:
-            columns = list(df_descriptive_stats.columns)
             df_display = df_descriptive_stats
+        self.descriptive_stats_table.set_data(df_display)
+
+    def populate_performance_table(self):
+        """Shows the stage timings of the last load or analysis run (nested stages as a tree)."""
+        self.build_tab('statistical_output_frame')
+        self.performance_table.delete(*self.performance_table.get_children())
 
-        self.descriptive_stats_table["columns"] = columns
-        for col in columns:
-            self.descriptive_stats_table.heading(col, text=col.replace('_', ' '),
-                                                 anchor=tk.CENTER)  # Make column headers readable
-            self.descriptive_stats_table.column(col, anchor=tk.CENTER, width=max(100, len(col) * 10))
+        def number(value, digits=3):
+            return '' if value is None else f"{value:.{digits}f}"
 
-        # Add data rows
-        for index, row in df_display.iterrows():
-            self.descriptive_stats_table.insert("", "end", values=list(row))
+        self.performance_table.insert('', 'end', text='Total', values=(
+            '', number(self.session.perf.elapsed()), '', number(peak_memory_mb(), 1), ''))
+        items = {}
+        for row in self.session.perf.rows():
+            parent = items.get(row['stage'].rsplit(' / ', 1)[0], '') if row['depth'] else ''
+            items[row['stage']] = self.performance_table.insert(parent, 'end', text=row['name'], open=True, values=(
+                row['calls'], number(row['wall_s']), number(row['cpu_s']), number(row['peak_memory_mb'], 1),
+                number(row['memory_growth_mb'], 1)))
 
     def clear_descriptive_stats_table(self):
         """Clears all data from the descriptive statistics table."""
-        for item in self.descriptive_stats_table.get_children():
-            self.descriptive_stats_table.delete(item)
-        self.descriptive_stats_table["columns"] = ()  # Clear column definitions
+        self.descriptive_stats_table.clear()
 
     def log_to_gui(self, message):
-        """Inserts a message into the raw log output area."""
-        # raw_log_output_text is now in the statistical_output_frame
-        self.raw_log_output_text.config(state='normal')
-        self.raw_log_output_text.insert(tk.END, message + "\n")
-        self.raw_log_output_text.see(tk.END)
-        self.raw_log_output_text.config(state='disabled')
+        """Adds a message to the raw log output area (buffered, safe from worker threads)."""
+        self.log_sink.write(message + "\n")
 
     def clear_output(self):
         """Clears all output areas in the new result tabs."""
+        self.build_tab('statistical_output_frame')  # The analysis logs and fills its tables
         # Clear raw log output
-        self.raw_log_output_text.config(state='normal')
-        self.raw_log_output_text.delete(1.0, tk.END)
-        self.raw_log_output_text.config(state='disabled')
+        self.log_sink.clear()
 
         # Clear tables
         self.clear_results_table()
         self.clear_descriptive_stats_table()
 
         # Clear plot area
-        for widget in self.plot_canvas_frame.winfo_children():
-            widget.destroy()
+        if self.tab_built('graphic_frame'):
+            for widget in self.plot_canvas_frame.winfo_children():
+                widget.destroy()
         self.plot_canvas = None
         self.plot_toolbar = None
 
     def open_plot_folder(self):
         """Opens the directory where plots are saved."""
-        if os.path.exists(self.plot_output_dir):
-            webbrowser.open(os.path.realpath(self.plot_output_dir))
+        if os.path.exists(self.session.plot_output_dir):
+            webbrowser.open(os.path.realpath(self.session.plot_output_dir))
         else:
             messagebox.showinfo("Folder Not Found",
-                                f"The plots output directory does not exist: {self.plot_output_dir}")
+                                f"The plots output directory does not exist: {self.session.plot_output_dir}")
 
     def save_current_plot(self):
         """Saves the currently displayed plot."""
@@ -1981,7 +1165,7 @@ class USVAnalyzerApp:
             initial_dir = os.path.dirname(self.last_generated_plot_path)
             initial_file = os.path.basename(self.last_generated_plot_path)
         else:
-            initial_dir = self.plot_output_dir
+            initial_dir = self.session.plot_output_dir
             initial_file = "analysis_plot.png"
 
         file_path = filedialog.asksaveasfilename(
@@ -2043,7 +1227,7 @@ class USVAnalyzerApp:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".csv",
                 filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx")],
-                initialdir=self.analysis_results_dir,
+                initialdir=self.session.analysis_results_dir,
                 initialfile=default_filename
             )
             if file_path:
@@ -2058,9 +1242,214 @@ class USVAnalyzerApp:
             else:
                 messagebox.showinfo("Save Table", "Save operation cancelled.")
 
+    # --- Tab: Job Queue ---
+    def create_jobs_tab(self):
+        self.jobs_frame.grid_rowconfigure(1, weight=1)  # Jobs table
+        self.jobs_frame.grid_columnconfigure(0, weight=1)
+
+        # Worker pool
+        controls_frame = ttk.Frame(self.jobs_frame)
+        controls_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        ttk.Label(controls_frame, text="Parallel jobs:").pack(side="left")
+        self.job_workers_var = tk.IntVar(value=self.session.JOB_WORKERS)
+        ttk.Spinbox(controls_frame, from_=1, to=os.cpu_count() or 1, width=4,
+                    textvariable=self.job_workers_var).pack(side="left", padx=(2, 10))
+        self.job_workers_button = ttk.Button(controls_frame, text="Start Workers", command=self.toggle_job_workers)
+        self.job_workers_button.pack(side="left")
+        self.jobs_summary_label = ttk.Label(controls_frame, text="")
+        self.jobs_summary_label.pack(side="left", padx=10)
+        ttk.Button(controls_frame, text="Refresh", command=self.refresh_jobs_view).pack(side="right")
+
+        # Jobs, newest first
+        columns = ('id', 'name', 'priority', 'status', 'attempts', 'submitted', 'finished', 'error')
+        self.jobs_table = ttk.Treeview(self.jobs_frame, columns=columns, show='headings')
+        for col, width in zip(columns, (50, 320, 60, 80, 70, 140, 140, 300)):
+            self.jobs_table.heading(col, text=col.title())
+            self.jobs_table.column(col, width=width, anchor='w', stretch=col in ('name', 'error'))
+        self.jobs_table.grid(row=1, column=0, sticky="nsew")
+        scrollbar = ttk.Scrollbar(self.jobs_frame, orient="vertical", command=self.jobs_table.yview)
+        scrollbar.grid(row=1, column=1, sticky="ns")
+        self.jobs_table.configure(yscrollcommand=scrollbar.set)
+        self.jobs_table.bind("<Double-1>", lambda event: self.show_job_results())
+
+        # Actions on the selected jobs
+        actions_frame = ttk.Frame(self.jobs_frame)
+        actions_frame.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        ttk.Button(actions_frame, text="Show Results", command=self.show_job_results).pack(side="left")
+        ttk.Button(actions_frame, text="Open Folder", command=self.open_job_folder).pack(side="left", padx=(10, 0))
+        ttk.Button(actions_frame, text="Retry", command=lambda: self.change_jobs('retry')).pack(side="right")
+        ttk.Button(actions_frame, text="Cancel", command=lambda: self.change_jobs('cancel')).pack(side="right",
+                                                                                                 padx=(0, 10))
+
+        self.refresh_jobs_view()
+        self.master.after(self.JOB_REFRESH_INTERVAL_MS, self.poll_jobs)
+
+    def poll_jobs(self):
+        """Refreshes the Job Queue tab while it is shown."""
+        if self.notebook.select() == str(self.jobs_frame):
+            self.refresh_jobs_view()
+        self.master.after(self.JOB_REFRESH_INTERVAL_MS, self.poll_jobs)
+
+    def refresh_jobs_view(self):
+        """Shows the jobs of the queue, their status and whether the workers run."""
+        queue = self.session.get_job_queue()
+        selection = self.jobs_table.selection()
+        self.jobs_table.delete(*self.jobs_table.get_children())
+        for job in queue.jobs().fillna('').itertuples(index=False):
+            self.jobs_table.insert('', 'end', iid=str(job.id), values=(
+                job.id, job.name, job.priority, job.status, f"{job.attempts}/{job.max_attempts}", job.submitted,
+                job.finished, job.error))
+        self.jobs_table.selection_set([iid for iid in selection if self.jobs_table.exists(iid)])
+
+        scheduler = self.job_scheduler
+        if scheduler is not None and scheduler.stopping():
+            workers = "Workers stopping (running jobs finish)"
+        elif scheduler is not None and scheduler.is_alive():
+            workers = f"{scheduler.max_workers} worker(s) running"
+        else:
+            workers = "Workers stopped"
+        counts = ", ".join(f"{count} {status}" for status, count in queue.counts().items() if count)
+        self.jobs_summary_label.config(text=f"{workers}. {counts or 'No jobs'}.")
+        self.job_workers_button.config(text="Stop Workers" if scheduler is not None and scheduler.is_alive()
+                                       and not scheduler.stopping() else "Start Workers")
+
+    def toggle_job_workers(self):
+        """Starts the scheduler (queued jobs then run in worker processes) or stops it."""
+        if self.job_scheduler is not None and self.job_scheduler.is_alive():
+            if self.job_scheduler.stopping():
+                return
+            self.job_scheduler.stop()
+        else:
+            try:
+                workers = self.job_workers_var.get()
+            except tk.TclError:
+                workers = self.session.JOB_WORKERS
+            # Job events go to the raw log; the output of each job to job.log in its folder
+            self.job_scheduler = JobScheduler(self.session.get_job_queue(), self.session.job_output_root, workers,
+                                              console=self.log_sink)
+            self.job_scheduler.start()
+        self.refresh_jobs_view()
+
+    def selected_job_ids(self):
+        return [int(iid) for iid in self.jobs_table.selection()]
+
+    def change_jobs(self, action):
+        """Retries (failed/cancelled) or cancels (queued) the selected jobs."""
+        job_ids = self.selected_job_ids()
+        if not job_ids:
+            messagebox.showinfo("Job Queue", "Select one or more jobs first.")
+            return
+        getattr(self.session.get_job_queue(), action)(job_ids)
+        self.refresh_jobs_view()
+
+    def show_job_results(self):
+        """Shows the results of the selected completed jobs in the Statistical Output tab."""
+        job_ids = self.selected_job_ids()
+        if not job_ids:
+            messagebox.showinfo("Job Results", "Select a completed job first.")
+            return
+        df_results = self.session.get_job_queue().results(job_ids)
+        if df_results.empty:
+            messagebox.showinfo("Job Results", "The selected job(s) have no results yet.")
+            return
+        self._current_statistical_results_df = df_results.drop(columns='job_id')  # What "Save Results" saves
+        self._current_descriptive_stats_df = pd.DataFrame()
+        self.populate_results_table(self._current_statistical_results_df.copy())
+        self.clear_descriptive_stats_table()
+        self.update_tab('statistical_output_frame', state='normal', select=True)
+        self.update_status(f"Showing the results of job(s) {', '.join(map(str, job_ids))}.")
+
+    def open_job_folder(self):
+        """Opens the output folder (plots, tables, job.log) of the selected job."""
+        job_ids = self.selected_job_ids()
+        if not job_ids:
+            messagebox.showinfo("Job Queue", "Select a job first.")
+            return
+        folder = os.path.join(self.session.job_output_root, f"job_{job_ids[0]}")
+        if os.path.exists(folder):
+            webbrowser.open(os.path.realpath(folder))
+        else:
+            messagebox.showinfo("Folder Not Found", f"Job {job_ids[0]} has not written any output yet.")
+
+
+# --- Command line (headless runs) ---
+def parse_command_line(argv=None):
+    parser = argparse.ArgumentParser(
+        description="USV Analyzer. Without --data the GUI opens; with it the analysis runs headless.")
+    parser.add_argument('--data', nargs='+', metavar='COHORT', help="Cohort folder(s) or zipped cohort(s) to load")
+    parser.add_argument('--metric', help="Metric to analyze (default: all metrics, like 'Run All Metrics')")
+    parser.add_argument('--primary', default='Genotype', help="Primary grouping variable (default: Genotype)")
+    parser.add_argument('--secondary', help="Secondary grouping variable")
+    parser.add_argument('--assumption-policy', default='Always non-parametric',
+                        choices=['Always parametric', 'Always non-parametric'],
+                        help="Test to run when the parametric assumptions are not met")
+    parser.add_argument('--profile', action='store_true', help="Profile the analysis with cProfile")
+    parser.add_argument('--profile-top', type=int, help="Functions in the saved profile summary")
+    jobs = parser.add_argument_group("job queue (analysis_results/usv_jobs.sqlite)")
+    jobs.add_argument('--queue', action='store_true', help="With --data: add the analysis to the job queue instead")
+    jobs.add_argument('--priority', type=int, default=0, help="Priority of the queued job (higher runs first)")
+    jobs.add_argument('--run-queue', action='store_true', help="Run the queued jobs until none is left")
+    jobs.add_argument('--workers', type=int, help="Jobs run at once by --run-queue")
+    jobs.add_argument('--jobs', action='store_true', help="Show the jobs and their status")
+    jobs.add_argument('--job-results', type=int, metavar='JOB_ID', help="Show the results of a completed job")
+    return parser.parse_args(argv)
+
+
+def run_headless(args):
+    """Loads the cohorts and runs the analysis without a window; returns the exit status."""
+    session = load_cohorts(args.data, assumption_policy=args.assumption_policy, profile_run=args.profile)
+    if session.df_aggregated is None:
+        return 1
+    for grouping in [args.primary, args.secondary]:
+        if grouping and grouping not in session.available_grouping_variables:
+            print(f"Unknown grouping variable '{grouping}' (available: "
+                  f"{', '.join(session.available_grouping_variables)}).", file=sys.stderr)
+            return 2
+    if args.metric and args.metric not in session.available_metrics:
+        print(f"Unknown metric '{args.metric}'.", file=sys.stderr)
+        return 2
+    if args.profile_top:
+        session.PROFILE_TOP_N = args.profile_top
+    analyze(session, args.metric, args.primary, args.secondary)
+    return 0
+
+
+def run_job_commands(args):
+    """--queue, --run-queue, --jobs and --job-results; returns the exit status."""
+    session = USVSession()
+    queue = session.get_job_queue()
+    if args.queue:
+        if not args.data:
+            print("--queue needs the cohorts to analyze (--data).", file=sys.stderr)
+            return 2
+        session.options.update(assumption_policy=args.assumption_policy, profile_run=args.profile)
+        session.selected_cohort_paths = list(args.data)
+        job_id = session.submit_job(args.metric, args.primary, args.secondary, args.priority)
+        print(f"Queued job {job_id} ({queue.pending()} job(s) waiting or running).")
+    if args.run_queue:
+        JobScheduler(queue, session.job_output_root, args.workers or session.JOB_WORKERS).run()
+    if args.jobs or args.run_queue:
+        df_jobs = queue.jobs()
+        print(df_jobs.drop(columns='output_dir').fillna('').to_string(index=False) if not df_jobs.empty
+              else "The job queue is empty.")
+        print(", ".join(f"{status}: {count}" for status, count in queue.counts().items()))
+    if args.job_results is not None:
+        df_results = queue.results(args.job_results)
+        if df_results.empty:
+            print(f"No results for job {args.job_results} (not completed yet?).", file=sys.stderr)
+            return 1
+        print(df_results.drop(columns='job_id').to_string(index=False))
+    return 0
+
 
 # --- Main execution ---
 if __name__ == "__main__":
+    command_line = parse_command_line()
+    if command_line.queue or command_line.run_queue or command_line.jobs or command_line.job_results is not None:
+        sys.exit(run_job_commands(command_line))
+    if command_line.data:
+        sys.exit(run_headless(command_line))
     root = tk.Tk()
     app = USVAnalyzerApp(root)
+    app.profile_run_var.set(command_line.profile)
     root.mainloop()
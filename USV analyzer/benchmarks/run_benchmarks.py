@@ -0,0 +1,272 @@
+"""
+End-to-end benchmark of the USV Analyzer on synthetic cohorts.
+
+Runs the analysis core (usv_core, no window) on cohorts written by synthetic_cohort.py and
+times every stage separately: ingest (metadata + header pre-flight), aggregation (streaming the calls
+into per-session metrics and merging), the analysis view, descriptive statistics, each test path of
+perform_statistical_analysis and plotting. Results are written as JSON to benchmarks/results/;
+--compare checks them against an earlier results file and exits with status 1 on a regression.
+
+    python run_benchmarks.py --scale small
+    python run_benchmarks.py --scale medium --compare results/baseline_medium.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import usv_core  # noqa: E402
+from synthetic_cohort import generate_cohort  # noqa: E402
+
+# 24 files is the size of the bundled Test Data; 'large' is 10,000 files / ~50M calls
+SCALES = {
+    'tiny': {'animals': 12, 'calls_per_file': 545},
+    'small': {'animals': 100, 'calls_per_file': 1000},
+    'medium': {'animals': 1000, 'calls_per_file': 2500},
+    'large': {'animals': 5000, 'calls_per_file': 5000},
+}
+TIMEPOINTS = ('P4', 'P6')
+GENOTYPES = ('WT', 'MUT', 'HET')  # Three genotypes so the ANOVA / Kruskal-Wallis paths run too
+
+# Test paths of perform_statistical_analysis: (name, primary, secondary, assumption policies to run)
+TEST_PATHS = [
+    ('two_groups', 'Sex', None, ('parametric', 'non_parametric')),  # t-test / Mann-Whitney U
+    ('three_groups', 'Genotype', None, ('parametric', 'non_parametric')),  # ANOVA + Tukey / Kruskal-Wallis
+    ('repeated_measures', 'Timepoint', None, ('parametric',)),  # RM ANOVA (Friedman only as its fallback)
+    ('two_way', 'Genotype', 'Sex', ('parametric', 'non_parametric')),  # Two-way ANOVA / ART ANOVA
+    ('mixed', 'Timepoint', 'Genotype', ('parametric',)),  # Mixed ANOVA
+]
+POLICIES = {'parametric': 'Always parametric', 'non_parametric': 'Always non-parametric'}
+PLOT_DESIGNS = [('Genotype', None), ('Genotype', 'Sex')]
+MIN_REGRESSION_SECONDS = 0.05  # Slowdowns smaller than this are timer noise, whatever the ratio
+
+
+class StageTimer(object):
+    """Collects the wall-clock time of named stages (the best of several repeats is kept)."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def time(self, name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(name, time.perf_counter() - start)
+        return result
+
+    def record(self, name, seconds):
+        self.seconds[name] = min(seconds, self.seconds.get(name, float('inf')))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def package_versions():
+    versions = {}
+    for name in ('numpy', 'pandas', 'scipy', 'statsmodels', 'pingouin', 'matplotlib', 'seaborn'):
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+def cohort_folder(data_dir, scale, seed):
+    """The cached synthetic cohort of a scale, generated on first use."""
+    folder = os.path.join(data_dir, f"{scale}_seed{seed}")
+    info_path = os.path.join(folder, 'synthetic_cohort.json')
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            return folder, json.load(f)
+    print(f"Generating the '{scale}' cohort in {folder}...")
+    start = time.perf_counter()
+    info = generate_cohort(folder, n_animals=SCALES[scale]['animals'], timepoints=TIMEPOINTS, genotypes=GENOTYPES,
+                           calls_per_file=SCALES[scale]['calls_per_file'], seed=seed, workers=os.cpu_count() or 1)
+    info['generate_seconds'] = time.perf_counter() - start
+    with open(info_path, 'w') as f:
+        json.dump(info, f)
+    return folder, info
+
+
+def headless_session(work_dir):
+    """An analysis session without a window whose outputs go to `work_dir`."""
+    session = usv_core.USVSession(output_dir=work_dir)
+    session.TIMEPOINT_ORDER = list(TIMEPOINTS)
+    return session
+
+
+def benchmark_load(session, folder, reporter, timer):
+    """ingest / aggregation / catalog / analysis_view / descriptive_stats stages of one load (from its spans)."""
+    usv_core.load_data(session, [folder], reporter)
+    if session.df_aggregated is None:
+        raise RuntimeError(f"Loading {folder} failed: {reporter.last_status}")
+    spans = {row['stage']: row['wall_s'] for row in session.perf.rows()}
+    statistics = usv_core.StatisticalAnalysis(session, reporter)
+    timer.record('ingest', spans['Load data / Metadata and header checks'])
+    timer.record('aggregation', spans['Load data / Aggregation'] + spans.get('Load data / Merge cohorts', 0.0))
+    timer.record('catalog', spans['Load data / Catalog'])
+    timer.record('analysis_view', spans['Load data / Analysis view'])
+
+    def descriptive_tables():
+        for _, primary, secondary, _ in TEST_PATHS:
+            grouping = [primary] + ([secondary] if secondary else [])
+            for metric in session.available_metrics:
+                statistics.calculate_descriptive_statistics(session.df_prepared, metric, grouping)
+
+    start = time.perf_counter()
+    descriptive_tables()
+    timer.record('descriptive_stats', spans['Load data / Descriptive statistics cube'] + time.perf_counter() - start)
+    return {stage: round(seconds, 6) for stage, seconds in spans.items()}
+
+
+def benchmark_statistics(session, metrics, reporter, timer):
+    """
+    One stage per test path and assumption policy; returns the test types each of them ran and
+    its profile (the session's spans: assumption checks, fits, post-hocs...).
+    """
+    statistics = usv_core.StatisticalAnalysis(session, reporter)
+    test_types, profiles = {}, {}
+    for name, primary, secondary, policies in TEST_PATHS:
+        for policy in policies:
+            stage = f"statistics.{name}.{policy}"
+            session.options.assumption_policy = POLICIES[policy]
+            session.anova_cache = {}  # Every path pays for its own batched fits
+            session.perf.reset()
+
+            def analyze_all():
+                results = []
+                for metric in metrics:
+                    results.extend(statistics.perform_statistical_analysis(session.df_prepared, metric, primary,
+                                                                           secondary)[0])
+                return results
+
+            results = timer.time(stage, analyze_all)
+            test_types[stage] = dict(Counter(row['Test_Type'] for row in results))
+            profiles[stage] = {row['stage']: round(row['wall_s'], 6) for row in session.perf.rows()}
+    return test_types, profiles
+
+
+def benchmark_plotting(session, metrics, reporter, timer):
+    plotter = usv_core.MetricPlotter(session, reporter)
+    for primary, secondary in PLOT_DESIGNS:
+        stage = f"plotting.{primary}" + (f"_{secondary}" if secondary else "")
+        timer.time(stage, lambda: [plotter.plot_dot_plot_with_mean_sd_reinstated(
+            session.df_prepared, metric, primary, secondary, session.plot_output_dir, session.SEX_LABELS,
+            session.GENOTYPE_LABELS, session.TIMEPOINT_ORDER) for metric in metrics])
+
+
+def run_scale(scale, args):
+    folder, info = cohort_folder(args.data_dir, scale, args.seed)
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+        console = sys.stdout if args.verbose else devnull
+        reporter = usv_core.Reporter(stream=console)
+        for repeat in range(args.repeat):
+            print(f"[{scale}] run {repeat + 1}/{args.repeat}: {info['files']} files, {info['calls']} calls")
+            session = headless_session(os.path.join(work_dir, str(repeat)))
+            with redirect_stdout(console):  # print() output of the statistics and plots
+                load_profile = benchmark_load(session, folder, reporter, timer)
+                metrics = session.available_metrics[:args.metrics] if args.metrics else session.available_metrics
+                test_types, profiles = benchmark_statistics(session, metrics, reporter, timer)
+                benchmark_plotting(session, metrics[:args.plot_metrics], reporter, timer)
+            session.catalog.connection.close()
+    return {
+        'scale': scale,
+        'dataset': dict(info, sessions=len(session.df_aggregated), metrics=len(metrics), seed=args.seed),
+        'repeats': args.repeat,
+        'stages': {name: round(seconds, 6) for name, seconds in timer.seconds.items()},
+        'test_types': test_types,
+        'profiles': dict(load=load_profile, **profiles),  # Last repeat
+        'peak_memory_mb': usv_core.peak_memory_mb(),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Prints the stage times next to the baseline's; returns the stages slower than (1 + tolerance) x baseline."""
+    with open(baseline_path) as f:
+        baseline = {run['scale']: run for run in json.load(f)['runs']}
+    regressions = []
+    for run in results['runs']:
+        if run['scale'] not in baseline:
+            print(f"No baseline for scale '{run['scale']}'.")
+            continue
+        if run['dataset'] != baseline[run['scale']]['dataset']:
+            print(f"Scale '{run['scale']}': the baseline used a different dataset or metric count (not compared).")
+            continue
+        print(f"\n{'Stage (' + run['scale'] + ')':<44}{'baseline':>10}{'now':>10}{'ratio':>8}")
+        for stage, seconds in run['stages'].items():
+            before = baseline[run['scale']]['stages'].get(stage)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = ''
+            if ratio > 1 + tolerance and seconds - before > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{run['scale']}/{stage}")
+                flag = '  <- regression'
+            print(f"{stage:<44}{before:>10.3f}{seconds:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the USV Analyzer end to end on synthetic cohorts.")
+    parser.add_argument('--scale', nargs='+', choices=list(SCALES), default=['tiny'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="Repeats per scale (best time per stage is kept)")
+    parser.add_argument('--metrics', type=int, default=0, help="Analyze only the first N metrics (0: all)")
+    parser.add_argument('--plot-metrics', type=int, default=3, help="Metrics plotted per plot design")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'),
+                        help="Where synthetic cohorts are cached")
+    parser.add_argument('--output', help="Results file (default: results/benchmark_<timestamp>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before a stage regresses")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's log")
+    args = parser.parse_args(argv)
+
+    np.seterr(all='ignore')
+    pd.options.mode.chained_assignment = None
+    results = {
+        'schema': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': package_versions(),
+        'runs': [run_scale(scale, args) for scale in args.scale],
+    }
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results',
+                                         f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    for run in results['runs']:
+        print(f"\n[{run['scale']}] " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in run['stages'].items()))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
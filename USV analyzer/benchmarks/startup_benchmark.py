@@ -0,0 +1,119 @@
+"""
+Startup benchmark of the USV Analyzer: time from a fresh interpreter to the first window.
+
+Every measurement runs in a new Python process (module caches do not carry over) that imports Code.py,
+builds the app and draws its window once. Without a display the app is built headless instead, which
+still shows the import cost. --baseline also measures Code.py as it was at an earlier git revision,
+so the two can be compared side by side.
+
+    python startup_benchmark.py --baseline HEAD~1 --repeat 5
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARK_DIR)
+
+# Runs in the child process: prints the timings as one JSON line
+STARTUP_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import Code
+timings = {'import_s': time.perf_counter() - start}
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:  # No display: build the app without a window
+    root = None
+if root is not None:
+    app = Code.USVAnalyzerApp(root)
+    root.update()  # First window drawn
+    timings['mode'] = 'window'
+    root.destroy()
+else:
+    try:
+        if hasattr(Code, 'USVSession'):
+            app = Code.USVSession()
+        else:  # Earlier revisions: the analysis class (or the app itself) without a window
+            app = Code.USVAnalysis() if hasattr(Code, 'USVAnalysis') else Code.USVAnalyzerApp()
+        timings['mode'] = 'headless'
+    except Exception:  # Revisions without a headless mode
+        timings['mode'] = 'import only'
+timings['first_window_s'] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def measure_startup(code_dir, repeat):
+    """Median import and first-window times of the Code.py in `code_dir` over `repeat` fresh processes."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, code_dir], capture_output=True,
+                                   text=True, cwd=code_dir, check=True)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {'mode': runs[-1]['mode'],
+            'import_s': statistics.median(run['import_s'] for run in runs),
+            'first_window_s': statistics.median(run['first_window_s'] for run in runs),
+            'runs': runs}
+
+
+def code_at_revision(revision, folder):
+    """Writes Code.py (and usv_core.py, in revisions that have it) as they were at `revision` to `folder`."""
+    for filename in ['Code.py', 'usv_core.py']:
+        shown = subprocess.run(['git', 'show', f"{revision}:./{filename}"], cwd=APP_DIR, capture_output=True,
+                               text=True)
+        if shown.returncode != 0:
+            if filename == 'Code.py':
+                raise RuntimeError(f"Code.py not found at {revision}: {shown.stderr.strip()}")
+            continue
+        with open(os.path.join(folder, filename), 'w', encoding='utf-8') as f:
+            f.write(shown.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the USV Analyzer from interpreter start to first window.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh processes per version (median is kept)")
+    parser.add_argument('--baseline', metavar='REVISION', help="Also measure Code.py at this git revision")
+    parser.add_argument('--output', help="Results file (default: results/startup_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    results = {
+        'schema': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {},
+    }
+    if args.baseline:
+        # The copy runs in a scratch folder so its plots/analysis_results folders do not touch the app's own
+        scratch = tempfile.mkdtemp(prefix='usv_startup_')
+        try:
+            code_at_revision(args.baseline, scratch)
+            results['versions'][args.baseline] = measure_startup(scratch, args.repeat)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    results['versions']['current'] = measure_startup(APP_DIR, args.repeat)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results', f"startup_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'Version':<16}{'mode':>14}{'import (s)':>12}{'first window (s)':>18}")
+    for version, timings in results['versions'].items():
+        print(f"{version:<16}{timings['mode']:>14}{timings['import_s']:>12.3f}{timings['first_window_s']:>18.3f}")
+    print(f"\nResults saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Generator of realistic synthetic cohorts for benchmarking the USV Analyzer.
+
+A cohort is written exactly like a DeepSqueak export prepared for the app: one animal_metadata.csv
+(animal_id, Sex, Genotype, Timepoint, Filename) and one {animal_id}_{Timepoint}_USVs.csv file per
+session with the 17 DeepSqueak columns. Feature distributions follow the bundled Test Data; genotype,
+sex, timepoint and animal effects are added so every statistical path has something to find.
+
+    python synthetic_cohort.py OUTPUT_FOLDER --animals 5000 --calls-per-file 5000 --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+USV_COLUMNS = [
+    'ID', 'Label', 'Accepted', 'Score', 'Begin Time (s)', 'End Time (s)', 'Call Length (s)',
+    'Principal Frequency (kHz)', 'Low Freq (kHz)', 'High Freq (kHz)', 'Delta Freq (kHz)',
+    'Frequency Standard Deviation (kHz)', 'Slope (kHz/s)', 'Sinuosity', 'Mean Power (dB/Hz)', 'Tonality',
+    'Peak Freq (kHz)'
+]
+METADATA_COLUMNS = ['animal_id', 'Sex', 'Genotype', 'Timepoint', 'Filename']
+# Call types and their frequencies in the Test Data
+LABELS = {'2Syllabes': 0.256, 'Downward': 0.243, 'Composite': 0.194, 'Complex': 0.101, 'Frequency_Step': 0.068,
+          'Chevron': 0.056, 'Upward': 0.044, 'Harmonic': 0.029, 'Flat': 0.007, 'D.Chevron': 0.002}
+SESSION_LENGTH_S = 300.0
+ACCEPTED_FRACTION = 0.95
+
+# Shifts of the session means (in within-session SDs) per factor level; levels not listed get 0
+GENOTYPE_EFFECTS = {'WT': 0.0, 'MUT': 0.35, 'HET': 0.15}
+SEX_EFFECTS = {'M': 0.0, 'F': -0.1}
+TIMEPOINT_EFFECT = 0.25  # Per timepoint step
+
+
+def cohort_design(n_animals, timepoints=('P4', 'P6'), genotypes=('WT', 'MUT'), sexes=('M', 'F')):
+    """animal_metadata.csv rows: animals balanced over sex x genotype, each recorded at every timepoint."""
+    n_digits = max(2, len(str(n_animals)))
+    animals = [f"A{index:0{n_digits}d}" for index in range(1, n_animals + 1)]
+    cells = [(sex, genotype) for genotype in genotypes for sex in sexes]
+    rows = []
+    for index, animal_id in enumerate(animals):
+        sex, genotype = cells[index % len(cells)]
+        for timepoint in timepoints:
+            rows.append((animal_id, sex, genotype, timepoint, f"{animal_id}_{timepoint}_USVs.csv"))
+    return pd.DataFrame(rows, columns=METADATA_COLUMNS)
+
+
+def session_calls(rng, n_calls, shift):
+    """One session's calls (DeepSqueak columns) whose features are shifted by `shift` SDs."""
+    call_length = np.clip(rng.gamma(4.8, 0.0096, n_calls) * (1 + 0.2 * shift), 0.0015, 0.3)
+    begin = np.sort(rng.uniform(0.0, SESSION_LENGTH_S, n_calls))
+    principal = 70.3 + 11.3 * (rng.standard_normal(n_calls) + shift)
+    delta = rng.gamma(2.3, 12.4, n_calls) * (1 + 0.15 * shift)
+    low = principal - delta * rng.uniform(0.2, 0.7, n_calls)
+    labels = rng.choice(list(LABELS), n_calls, p=np.array(list(LABELS.values())) / sum(LABELS.values()))
+    return pd.DataFrame({
+        'ID': np.arange(1, n_calls + 1),
+        'Label': labels,
+        'Accepted': np.where(rng.random(n_calls) < ACCEPTED_FRACTION, 'TRUE', 'FALSE'),
+        'Score': np.clip(rng.normal(0.73, 0.095, n_calls), 0.5, 1.0),
+        'Begin Time (s)': begin,
+        'End Time (s)': begin + call_length,
+        'Call Length (s)': call_length,
+        'Principal Frequency (kHz)': principal,
+        'Low Freq (kHz)': low,
+        'High Freq (kHz)': low + delta,
+        'Delta Freq (kHz)': delta,
+        'Frequency Standard Deviation (kHz)': rng.gamma(1.8, 4.1, n_calls),
+        'Slope (kHz/s)': rng.standard_t(2, n_calls) * 250.0 - 110.0 * (1 + shift),
+        'Sinuosity': 1.0 + rng.lognormal(0.0 + 0.1 * shift, 0.8, n_calls),
+        'Mean Power (dB/Hz)': -90.7 + 9.6 * (rng.standard_normal(n_calls) + 0.5 * shift),
+        'Tonality': np.clip(rng.beta(5.4, 4.1, n_calls) + 0.03 * shift, 0.0, 1.0),
+        'Peak Freq (kHz)': principal + rng.normal(2.2, 4.0, n_calls),
+    }, columns=USV_COLUMNS)
+
+
+def _write_sessions(folder, sessions, seed, calls_per_file):
+    """Worker: writes the USV files of a block of sessions (own random stream per block)."""
+    rng = np.random.default_rng(seed)
+    n_calls_written = 0
+    for filename, shift in sessions:
+        n_calls = max(1, rng.poisson(calls_per_file))
+        session_calls(rng, n_calls, shift).to_csv(os.path.join(folder, filename), index=False,
+                                                  encoding='utf-8-sig', float_format='%.6g')
+        n_calls_written += n_calls
+    return n_calls_written
+
+
+def generate_cohort(folder, n_animals=12, timepoints=('P4', 'P6'), genotypes=('WT', 'MUT'),
+                    calls_per_file=545, seed=0, workers=1, block_size=64):
+    """
+    Writes a synthetic cohort to `folder` and returns its size as {'files', 'calls', 'animals'}.
+    `calls_per_file` is the mean number of calls of a session (Poisson); the same seed always
+    gives the same cohort, whatever the number of workers.
+    """
+    os.makedirs(folder, exist_ok=True)
+    df_meta = cohort_design(n_animals, timepoints, genotypes)
+    df_meta.to_csv(os.path.join(folder, 'animal_metadata.csv'), index=False, encoding='utf-8-sig')
+
+    # Session shifts: fixed factor effects plus a heavy-tailed animal effect (not every metric is normal)
+    rng = np.random.default_rng(seed)
+    animal_effects = dict(zip(df_meta['animal_id'].unique(), 0.3 * rng.standard_t(4, n_animals)))
+    timepoint_steps = {timepoint: step for step, timepoint in enumerate(timepoints)}
+    shifts = (df_meta['Genotype'].map(GENOTYPE_EFFECTS).fillna(0.0) + df_meta['Sex'].map(SEX_EFFECTS).fillna(0.0)
+              + df_meta['Timepoint'].map(timepoint_steps) * TIMEPOINT_EFFECT + df_meta['animal_id'].map(animal_effects)
+              + 0.1 * rng.standard_normal(len(df_meta)))
+    sessions = list(zip(df_meta['Filename'], shifts))
+    blocks = [sessions[start:start + block_size] for start in range(0, len(sessions), block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            n_calls = sum(executor.map(_write_sessions, [folder] * len(blocks), blocks, seeds,
+                                       [calls_per_file] * len(blocks)))
+    else:
+        n_calls = sum(_write_sessions(folder, block, block_seed, calls_per_file)
+                      for block, block_seed in zip(blocks, seeds))
+    return {'files': len(df_meta), 'calls': int(n_calls), 'animals': n_animals}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic DeepSqueak cohort (metadata + USV files).")
+    parser.add_argument('folder', help="Output folder (created if needed)")
+    parser.add_argument('--animals', type=int, default=12, help="Number of animals (default: 12)")
+    parser.add_argument('--timepoints', nargs='+', default=['P4', 'P6'], help="Timepoints (default: P4 P6)")
+    parser.add_argument('--genotypes', nargs='+', default=['WT', 'MUT'], help="Genotypes (default: WT MUT)")
+    parser.add_argument('--calls-per-file', type=int, default=545, help="Mean calls per session (default: 545)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Writer processes")
+    args = parser.parse_args(argv)
+    size = generate_cohort(args.folder, args.animals, args.timepoints, args.genotypes, args.calls_per_file,
+                           args.seed, args.workers)
+    print(f"Wrote {size['files']} files ({size['calls']} calls, {size['animals']} animals) to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))  # usv_core.py lives next to tests/
+
+import usv_core  # noqa: E402
+
+TEST_DATA = os.path.join(os.path.dirname(TESTS_DIR), 'Test Data')
+UNBALANCED_METRICS = ['Total_USVs_Count', 'Call_Length_s_Mean', 'Peak_Freq_kHz_Median', 'Tonality_Mean',
+                      'Sparse_Metric']
+
+
+@pytest.fixture(scope='session')
+def test_data(tmp_path_factory):
+    """Session with Test Data loaded (outputs in a temporary folder)."""
+    session = usv_core.load_cohorts([TEST_DATA], usv_core.Reporter(stream=io.StringIO()),
+                                    output_dir=str(tmp_path_factory.mktemp('test_data')))
+    assert session.df_aggregated is not None
+    return session
+
+
+def make_unbalanced_cohort(seed=0):
+    """
+    Analysis view of a synthetic cohort: 9 wild-type and 5 mutant animals of both sexes in unequal
+    numbers, recorded at P4/P6/P8 with three sessions missing, and a metric missing in some sessions.
+    """
+    rng = np.random.default_rng(seed)
+    genotypes = ['Wild Type'] * 9 + ['Mutant'] * 5
+    sexes = ['Males', 'Females', 'Males', 'Males', 'Females', 'Males', 'Females', 'Males', 'Males',
+             'Females', 'Males', 'Females', 'Females', 'Males']
+    rows = []
+    for number, (genotype, sex) in enumerate(zip(genotypes, sexes), start=1):
+        animal_level = rng.normal(0, 0.5)  # Repeated sessions of one animal are correlated
+        for step, timepoint in enumerate(['P4', 'P6', 'P8']):
+            if (number, timepoint) in [(3, 'P8'), (11, 'P8'), (6, 'P4')]:
+                continue
+            mutant = genotype == 'Mutant'
+            rows.append({'animal_id': f'S{number:02d}', 'Sex': sex, 'Genotype': genotype, 'Timepoint': timepoint,
+                         'Total_USVs_Count': float(rng.poisson(200 + 60 * step - 50 * mutant)),
+                         'Call_Length_s_Mean': 0.05 + 0.01 * animal_level + 0.004 * step + rng.normal(0, 0.006),
+                         'Peak_Freq_kHz_Median': 60 * rng.lognormal(0.1 * mutant + 0.3 * animal_level, 0.2),
+                         'Tonality_Mean': 0.5 + 0.08 * mutant * step + 0.05 * animal_level + rng.normal(0, 0.05),
+                         'Sparse_Metric': rng.normal(1 + 0.5 * (sex == 'Males'), 1)})
+    df = pd.DataFrame(rows)
+    df.loc[rng.random(len(df)) < 0.15, 'Sparse_Metric'] = np.nan
+    return df.assign(Sex=df['Sex'].astype('category'), Genotype=df['Genotype'].astype('category'),
+                     Timepoint=pd.Categorical(df['Timepoint'], categories=['P4', 'P6', 'P8'], ordered=True))
+
+
+@pytest.fixture
+def unbalanced_cohort():
+    return make_unbalanced_cohort()
+
+
+def varying_metrics(df, metrics):
+    """Metrics that are not constant (tests of constant metrics are undefined in every library)."""
+    return [metric for metric in metrics if df[metric].nunique(dropna=True) > 2]
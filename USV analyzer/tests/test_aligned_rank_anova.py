@@ -0,0 +1,135 @@
+"""AlignedRankAnova against the ART procedure done per metric with pandas and statsmodels' anova_lm."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from statsmodels.formula.api import ols
+from statsmodels.stats.anova import anova_lm
+from statsmodels.stats.multicomp import pairwise_tukeyhsd
+
+from conftest import UNBALANCED_METRICS, varying_metrics
+from usv_core import AlignedRankAnova, MultiResponseAnova, Reporter, StatisticalAnalysis, USVSession
+
+DESIGNS = [['Genotype', 'Sex'], ['Genotype', 'Timepoint'], ['Timepoint', 'Sex']]
+
+
+def ranks(aligned):
+    """Average ranks, values equal up to rounding noise tied (relative to the largest |value|)."""
+    return stats.rankdata(np.round(aligned / np.abs(aligned).max(), 9))
+
+
+def aligned_responses(data, metric, factors):
+    """{term: data aligned for it} (Wobbrock et al., 2011): residual + estimated effect of the term."""
+    a, b = factors
+    y = data[metric]
+    grand = y.mean()
+    mean_a = y.groupby(data[a], observed=True).transform('mean')
+    mean_b = y.groupby(data[b], observed=True).transform('mean')
+    cell = y.groupby([data[a], data[b]], observed=True).transform('mean')
+    residual = y - cell
+    return {f'C({a})': residual + mean_a - grand, f'C({b})': residual + mean_b - grand,
+            f'C({a}):C({b})': residual + cell - mean_a - mean_b + grand}
+
+
+def reference_table(df, metric, factors):
+    """One full-factorial Type II ANOVA of the ranks per aligned response; only its own term is kept."""
+    data = df.dropna(subset=[metric, 'animal_id'] + factors)
+    rows = {}
+    for term, aligned in aligned_responses(data, metric, factors).items():
+        ranked = data.assign(__ranks__=ranks(aligned))
+        table = anova_lm(ols(f'__ranks__ ~ C({factors[0]}) * C({factors[1]})', data=ranked).fit(), typ=2)
+        rows[term] = {'sum_sq': table.loc[term, 'sum_sq'], 'df': table.loc[term, 'df'], 'F': table.loc[term, 'F'],
+                      'PR(>F)': table.loc[term, 'PR(>F)'], 'resid_sum_sq': table.loc['Residual', 'sum_sq'],
+                      'resid_df': table.loc['Residual', 'df']}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def assert_tables_equal(table, reference):
+    assert list(table.index) == list(reference.index)
+    for col in reference.columns:
+        np.testing.assert_allclose(table[col], reference[col], rtol=1e-7, atol=1e-9, err_msg=col)
+
+
+@pytest.mark.parametrize('factors', DESIGNS)
+def test_test_data(test_data, factors):
+    df = test_data.df_prepared
+    metrics = varying_metrics(df, test_data.available_metrics)
+    tables = AlignedRankAnova(df, factors, ['animal_id']).fit(metrics)
+    assert set(tables) == set(metrics)
+    for metric in metrics:
+        assert_tables_equal(tables[metric], reference_table(df, metric, factors))
+
+
+@pytest.mark.parametrize('factors', DESIGNS)
+def test_unbalanced_cohort(unbalanced_cohort, factors):
+    tables = AlignedRankAnova(unbalanced_cohort, factors, ['animal_id']).fit(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        assert_tables_equal(tables[metric], reference_table(unbalanced_cohort, metric, factors))
+
+
+def test_one_factor_is_the_rank_transformed_anova(unbalanced_cohort):
+    """With a single factor the aligned data are the data minus the grand mean: plain ranks."""
+    art = AlignedRankAnova(unbalanced_cohort, ['Genotype'], ['animal_id']).fit(UNBALANCED_METRICS)
+    ranked = MultiResponseAnova(unbalanced_cohort, ['Genotype'], ['animal_id']).fit(UNBALANCED_METRICS, True)
+    for metric in UNBALANCED_METRICS:
+        for col in ['sum_sq', 'df', 'F', 'PR(>F)']:
+            np.testing.assert_allclose(art[metric].loc['C(Genotype)', col], ranked[metric].loc['C(Genotype)', col],
+                                       rtol=1e-9)
+
+
+def test_summary_uses_each_terms_residual(unbalanced_cohort):
+    factors = ['Genotype', 'Timepoint']
+    summary = AlignedRankAnova(unbalanced_cohort, factors, ['animal_id']).summary(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        reference = reference_table(unbalanced_cohort, metric, factors)
+        rows = summary[summary['Metric'] == metric].set_index('Effect')
+        expected = reference['sum_sq'] / (reference['sum_sq'] + reference['resid_sum_sq'])
+        np.testing.assert_allclose(rows['Partial_Eta_Squared'], expected, rtol=1e-7)
+
+
+def contrast_reference(data, metric, factors, contrast_factors):
+    """ART-C (Elkin et al., 2021): residual + the means of the contrasted levels, ranked."""
+    y = data[metric]
+    residual = y - y.groupby([data[factor] for factor in factors], observed=True).transform('mean')
+    means = y.groupby([data[factor] for factor in contrast_factors], observed=True).transform('mean')
+    return pd.Series(ranks(residual + means), index=data.index)
+
+
+@pytest.mark.parametrize('contrast_factors', [['Genotype'], ['Timepoint'], ['Genotype', 'Timepoint']])
+def test_contrast_ranks(unbalanced_cohort, contrast_factors):
+    factors = ['Genotype', 'Timepoint']
+    ranks = AlignedRankAnova(unbalanced_cohort, factors, ['animal_id']).contrast_ranks(UNBALANCED_METRICS,
+                                                                                       contrast_factors)
+    for metric in UNBALANCED_METRICS:
+        data = unbalanced_cohort.dropna(subset=[metric])
+        expected = contrast_reference(data, metric, factors, contrast_factors)
+        np.testing.assert_allclose(ranks.loc[data.index, metric], expected, rtol=1e-12)
+        assert ranks[metric].drop(data.index).isna().all()
+
+
+@pytest.mark.parametrize('contrast_factors', [['Timepoint'], ['Genotype', 'Timepoint']])
+def test_art_contrast_table(unbalanced_cohort, tmp_path, contrast_factors):
+    """The analysis' ART-C post-hoc is Tukey's HSD of the contrast ranks."""
+    factors = ['Genotype', 'Timepoint']
+    analysis = StatisticalAnalysis(USVSession(str(tmp_path)), Reporter(stream=io.StringIO()))
+    for metric in ['Call_Length_s_Mean', 'Sparse_Metric']:
+        table = analysis.art_contrast_table(unbalanced_cohort, metric, factors, contrast_factors)
+        data = unbalanced_cohort.dropna(subset=[metric])
+        labels = data[contrast_factors[0]].astype(str)
+        if len(contrast_factors) == 2:
+            labels = labels.str.cat(data[contrast_factors[1]].astype(str), sep=' x ')
+        reference = pairwise_tukeyhsd(contrast_reference(data, metric, factors, contrast_factors), labels)
+        first, second = np.triu_indices(len(reference.groupsunique), 1)
+        levels = reference.groupsunique
+        pairs = {(levels[a], levels[b]): i for i, (a, b) in enumerate(zip(first, second))}
+        assert len(table) == len(pairs)
+        for _, row in table.iterrows():
+            i, sign = (pairs[(row['A'], row['B'])], 1) if (row['A'], row['B']) in pairs else \
+                (pairs[(row['B'], row['A'])], -1)
+            assert row['diff'] == pytest.approx(sign * reference.meandiffs[i], rel=1e-9, abs=1e-12)
+            assert row['se'] == pytest.approx(reference.std_pairs[i], rel=1e-9)
+            assert row['p-corr'] == pytest.approx(
+                stats.studentized_range.sf(row['q'], len(levels), reference.df_total), rel=1e-6,
+                abs=1e-9)
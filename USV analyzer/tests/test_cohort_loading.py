@@ -0,0 +1,36 @@
+"""CohortLoader: every session file is opened for its header check and one chunked parse, nothing more."""
+import io
+import re
+from collections import Counter
+
+import pandas as pd
+
+import usv_core
+from conftest import TEST_DATA
+
+
+def test_each_file_opened_for_header_and_parse_only(tmp_path, monkeypatch):
+    opened = Counter()
+    folder_open = usv_core.FolderSource.open
+
+    def counting_open(source, filename):
+        opened[filename] += 1
+        return folder_open(source, filename)
+
+    monkeypatch.setattr(usv_core.FolderSource, 'open', counting_open)
+    session = usv_core.USVSession(str(tmp_path), usv_core.AnalysisOptions(store_calls=True))
+    session.CSV_CHUNK_SIZE = 13
+    usv_core.load_data(session, [TEST_DATA], usv_core.Reporter(stream=io.StringIO()))
+    assert session.df_aggregated is not None
+
+    session_files = [name for name in opened if name != 'animal_metadata.csv']
+    assert len(session_files) == len(session.df_aggregated)
+    assert all(opened[name] == 2 for name in session_files)
+
+    # Label columns from the parse equal the counts of the whole accepted-call frame
+    calls = session.df_calls
+    counts = pd.crosstab([calls['animal_id'], calls['Timepoint']], calls['Label'])
+    aggregated = session.df_aggregated.set_index(['animal_id', 'Timepoint'])
+    for label in counts.columns:
+        column = f"Label_{re.sub(r'[().]', '', re.sub(r'[ /]', '_', label))}_Count"
+        assert (aggregated.loc[counts.index, column].to_numpy() == counts[label].to_numpy()).all()
@@ -0,0 +1,95 @@
+"""adjust_p_values_family against statsmodels' multipletests, on its own and in 'Run All Metrics'."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.stats.multitest import multipletests
+
+import usv_core
+from conftest import TEST_DATA
+from usv_core import adjust_p_values_family
+
+METHODS = ['fdr_bh', 'fdr_by', 'holm']
+
+
+def reference(p_values, families, method):
+    """multipletests on every family separately (NaN p-values left out)."""
+    p_values = np.asarray(p_values, dtype=float)
+    families = pd.Series(families if families is not None else np.zeros(len(p_values)))
+    expected = np.full(len(p_values), np.nan)
+    for _, rows in families.groupby(families, dropna=True).indices.items():
+        rows = rows[~np.isnan(p_values[rows])]
+        if len(rows):
+            expected[rows] = multipletests(p_values[rows], method=method)[1]
+    return expected
+
+
+def sample_p_values(seed, n=400):
+    """Uniform and small p-values with ties, exact 0 and 1, NaNs, in families of very different sizes."""
+    rng = np.random.default_rng(seed)
+    p_values = np.where(rng.random(n) < 0.3, rng.random(n) * 1e-3, rng.random(n))
+    p_values[rng.choice(n, 30, replace=False)] = 0.04
+    p_values[:3] = [0.0, 1.0, np.nan]
+    p_values[rng.random(n) < 0.05] = np.nan
+    sizes = [1, 2, 3, 7, 40, 100, n - 153]
+    families = np.repeat([f'Metric_{i}' for i in range(len(sizes))], sizes)
+    return p_values, rng.permutation(families)
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_families(method, seed):
+    p_values, families = sample_p_values(seed)
+    np.testing.assert_allclose(adjust_p_values_family(p_values, families, method),
+                               reference(p_values, families, method), rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_single_family(method):
+    p_values, _ = sample_p_values(3)
+    np.testing.assert_allclose(adjust_p_values_family(p_values, None, method), reference(p_values, None, method),
+                               rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_missing_family_is_left_out(method):
+    p_values = np.array([0.01, 0.02, 0.03, 0.04])
+    families = pd.Series(['A', None, 'A', 'B'])
+    adjusted = adjust_p_values_family(p_values, families, method)
+    assert np.isnan(adjusted[1])
+    np.testing.assert_allclose(adjusted[[0, 2]], multipletests([0.01, 0.03], method=method)[1])
+    assert adjusted[3] == pytest.approx(0.04)
+
+
+def test_empty_and_all_nan():
+    for method in METHODS:
+        assert adjust_p_values_family([], None, method).shape == (0,)
+        assert np.isnan(adjust_p_values_family([np.nan, np.nan], ['A', 'B'], method)).all()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        adjust_p_values_family([0.01, 0.5], None, 'bonferroni-ish')
+
+
+@pytest.mark.parametrize('method_name, family_name', [('Benjamini-Hochberg (FDR)', 'Per metric'),
+                                                      ('Benjamini-Yekutieli (FDR)', 'Per test type'),
+                                                      ('Holm (FWER)', 'Global')])
+def test_run_all_metrics(tmp_path, method_name, family_name):
+    """P_Adjusted_Family of the combined Test Data results is multipletests within each family."""
+    session = usv_core.load_cohorts([TEST_DATA], usv_core.Reporter(stream=io.StringIO()), output_dir=str(tmp_path),
+                                    correction_method=method_name, correction_family=family_name,
+                                    assumption_policy='Always non-parametric')
+    output = usv_core.analyze_all_metrics(session, 'Genotype', 'Sex', usv_core.Reporter(stream=io.StringIO()))
+    results = output.results
+    assert len(results) > 100
+    family_column = session.CORRECTION_FAMILIES[family_name]
+    p_values = pd.to_numeric(results['P_Value'], errors='coerce').to_numpy()
+    expected = reference(p_values, results[family_column] if family_column else None,
+                         session.FAMILY_CORRECTION_METHODS[method_name])
+    np.testing.assert_allclose(results['P_Adjusted_Family'].to_numpy(dtype=float), expected, rtol=1e-12,
+                               atol=1e-15)
+    significant = results['P_Adjusted_Family'] < 0.05
+    assert (results.loc[significant, 'Significance_Family'] != 'ns').all()
+    assert (results.loc[results['P_Adjusted_Family'] >= 0.05, 'Significance_Family'] == 'ns').all()
@@ -0,0 +1,69 @@
+"""MultiResponseAnova: every metric's table equals statsmodels' anova_lm(ols(...).fit(), typ=2)."""
+import numpy as np
+import pytest
+from scipy import stats
+from statsmodels.formula.api import ols
+from statsmodels.stats.anova import anova_lm
+
+from conftest import UNBALANCED_METRICS, varying_metrics
+from usv_core import MultiResponseAnova
+
+DESIGNS = [['Genotype'], ['Timepoint'], ['Genotype', 'Sex'], ['Genotype', 'Timepoint'], ['Sex', 'Timepoint']]
+
+
+def reference_table(df, metric, factors, rank_transform=False):
+    data = df.dropna(subset=[metric, 'animal_id'] + factors).copy()
+    if rank_transform:
+        data[metric] = stats.rankdata(data[metric])
+    formula = f'Q("{metric}") ~ ' + ' * '.join(f'C({factor})' for factor in factors)
+    return anova_lm(ols(formula, data=data).fit(), typ=2)
+
+
+def assert_tables_equal(table, reference):
+    assert list(table.index) == list(reference.index)
+    scale = reference['sum_sq'].sum()  # Null effects: rounding noise around zero
+    np.testing.assert_allclose(table['sum_sq'], reference['sum_sq'], rtol=1e-7, atol=1e-9 * scale)
+    np.testing.assert_array_equal(table['df'], reference['df'])
+    np.testing.assert_allclose(table['F'], reference['F'], rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(table['PR(>F)'], reference['PR(>F)'], rtol=1e-6, atol=1e-12)
+
+
+@pytest.mark.parametrize('factors', DESIGNS)
+@pytest.mark.parametrize('rank_transform', [False, True])
+def test_test_data(test_data, factors, rank_transform):
+    df = test_data.df_prepared
+    metrics = varying_metrics(df, test_data.available_metrics)
+    tables = MultiResponseAnova(df, factors, ['animal_id']).fit(metrics, rank_transform)
+    assert set(tables) == set(metrics)
+    for metric in metrics:
+        assert_tables_equal(tables[metric], reference_table(df, metric, factors, rank_transform))
+
+
+@pytest.mark.parametrize('factors', DESIGNS)
+@pytest.mark.parametrize('rank_transform', [False, True])
+def test_unbalanced_cohort(unbalanced_cohort, factors, rank_transform):
+    tables = MultiResponseAnova(unbalanced_cohort, factors, ['animal_id']).fit(UNBALANCED_METRICS, rank_transform)
+    for metric in UNBALANCED_METRICS:
+        assert_tables_equal(tables[metric], reference_table(unbalanced_cohort, metric, factors, rank_transform))
+
+
+def test_missing_values_only_drop_their_metric(unbalanced_cohort):
+    """A session without Sparse_Metric still counts for the other metrics fitted in the same call."""
+    tables = MultiResponseAnova(unbalanced_cohort, ['Genotype'], ['animal_id']).fit(UNBALANCED_METRICS)
+    n_sessions = len(unbalanced_cohort)
+    assert tables['Call_Length_s_Mean'].loc['Residual', 'df'] == n_sessions - 2
+    assert tables['Sparse_Metric'].loc['Residual', 'df'] == unbalanced_cohort['Sparse_Metric'].notna().sum() - 2
+
+
+def test_summary_partial_eta_squared(unbalanced_cohort):
+    factors = ['Genotype', 'Timepoint']
+    summary = MultiResponseAnova(unbalanced_cohort, factors, ['animal_id']).summary(UNBALANCED_METRICS)
+    assert len(summary) == 3 * len(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        reference = reference_table(unbalanced_cohort, metric, factors)
+        rows = summary[summary['Metric'] == metric].set_index('Effect')
+        ss_error = reference.loc['Residual', 'sum_sq']
+        expected = reference['sum_sq'].drop('Residual') / (reference['sum_sq'].drop('Residual') + ss_error)
+        np.testing.assert_allclose(rows['Partial_Eta_Squared'], expected, rtol=1e-7, atol=1e-12)
+        np.testing.assert_allclose(rows['P_Value'], reference['PR(>F)'].drop('Residual'), rtol=1e-6)
+
@@ -0,0 +1,135 @@
+"""studentized_range_sf and PairwiseComparisons against scipy, statsmodels' pairwise_tukeyhsd and pingouin."""
+import numpy as np
+import pingouin as pg
+import pytest
+from scipy import stats
+from statsmodels.stats.multicomp import pairwise_tukeyhsd
+
+from conftest import UNBALANCED_METRICS, varying_metrics
+from usv_core import PairwiseComparisons, normalize_pingouin_columns, studentized_range_sf
+
+TUKEY_GROUPS = ['Genotype', 'Sex', 'Timepoint', ['Genotype', 'Sex'], ['Genotype', 'Timepoint']]
+
+
+@pytest.mark.parametrize('k', [2, 3, 4, 6, 10])
+@pytest.mark.parametrize('dof', [2, 5, 20, 120])
+def test_studentized_range_sf(k, dof):
+    q = np.array([0.05, 0.5, 1.0, 2.0, 3.0, 4.0, 5.5, 7.0, 9.0])
+    expected = np.array([stats.studentized_range.sf(value, k, dof) for value in q])
+    np.testing.assert_allclose(studentized_range_sf(q, k, dof), expected, rtol=1e-6, atol=1e-9)
+
+
+def test_studentized_range_sf_shapes_and_chunks():
+    q = np.linspace(0, 8, 600).reshape(20, 30)
+    result = studentized_range_sf(q, 5, 17, chunk=7)
+    assert result.shape == q.shape
+    np.testing.assert_allclose(result.ravel(), studentized_range_sf(q.ravel(), 5, 17), rtol=1e-12)
+    assert np.all(np.diff(result.ravel()) <= 1e-12)  # Decreasing in q
+    assert result.ravel()[0] == pytest.approx(1.0)
+
+
+def labels_of(df, group):
+    if isinstance(group, str):
+        return df[group].astype(str)
+    return df[group[0]].astype(str).str.cat([df[col].astype(str) for col in group[1:]], sep=' x ')
+
+
+def assert_matches_tukeyhsd(table, df, metric, group, alpha=0.05):
+    data = df.dropna(subset=[metric, 'animal_id'] + ([group] if isinstance(group, str) else group))
+    reference = pairwise_tukeyhsd(data[metric].to_numpy(dtype=float), labels_of(data, group).to_numpy(), alpha)
+    first, second = np.triu_indices(len(reference.groupsunique), 1)
+    levels = reference.groupsunique
+    expected = {(levels[a], levels[b]): i for i, (a, b) in enumerate(zip(first, second))}
+    rows = table[table['Metric'] == metric]
+    assert len(rows) == len(expected)
+    for _, row in rows.iterrows():
+        if (row['A'], row['B']) in expected:
+            i, sign = expected[(row['A'], row['B'])], 1
+        else:
+            i, sign = expected[(row['B'], row['A'])], -1
+        assert row['diff'] == pytest.approx(sign * reference.meandiffs[i], rel=1e-9, abs=1e-12)
+        assert row['se'] == pytest.approx(reference.std_pairs[i], rel=1e-9)
+        assert row['dof'] == reference.df_total
+        # statsmodels' p-values and confidence limits use an approximate studentized range (psturng/qsturng)
+        limits = sorted(sign * reference.confint[i])
+        assert [row['lower'], row['upper']] == pytest.approx(limits, rel=5e-3, abs=1e-3 * row['se'])
+        expected_p = stats.studentized_range.sf(row['q'], len(levels), reference.df_total)
+        assert row['p-corr'] == pytest.approx(expected_p, rel=1e-6, abs=1e-9)
+        if abs(row['p-corr'] - alpha) > 0.005:  # Far from alpha, the approximate p of statsmodels agrees
+            assert row['reject'] == reference.reject[i]
+
+
+@pytest.mark.parametrize('group', TUKEY_GROUPS)
+def test_tukey_hsd_test_data(test_data, group):
+    df = test_data.df_prepared
+    metrics = varying_metrics(df, test_data.available_metrics)
+    table = PairwiseComparisons(df, group, 'animal_id').tukey_hsd(metrics)
+    # Every metric is fitted together; the references (scipy's adaptive studentized range) are slow
+    for metric in metrics[::6]:
+        assert_matches_tukeyhsd(table, df, metric, group)
+
+
+@pytest.mark.parametrize('group', TUKEY_GROUPS)
+def test_tukey_hsd_unbalanced_cohort(unbalanced_cohort, group):
+    table = PairwiseComparisons(unbalanced_cohort, group, 'animal_id').tukey_hsd(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        assert_matches_tukeyhsd(table, unbalanced_cohort, metric, group)
+
+
+def reference_paired_tests(df, metric, within):
+    table = pg.pairwise_tests(data=df.dropna(subset=[metric]), dv=metric, within=within, subject='animal_id',
+                              padjust='bonf', effsize='cohen')
+    table = normalize_pingouin_columns(table)
+    if 'p-corr' not in table.columns:  # A single comparison: nothing to correct
+        table['p-corr'] = table['p-unc']
+    return table
+
+
+def assert_matches_paired_tests(table, reference):
+    assert list(zip(table['A'], table['B'])) == list(zip(reference['A'].astype(str), reference['B'].astype(str)))
+    for col, expected in [('T', 'T'), ('dof', 'dof'), ('p-unc', 'p-unc'), ('p-corr', 'p-corr'), ('cohen-d', 'cohen')]:
+        np.testing.assert_allclose(table[col].to_numpy(dtype=float), reference[expected].to_numpy(dtype=float),
+                                   rtol=1e-6, atol=1e-12, err_msg=col)
+
+
+@pytest.mark.parametrize('cohort', ['test_data', 'unbalanced_cohort'])
+def test_paired_tests(cohort, request):
+    fixture = request.getfixturevalue(cohort)
+    df = fixture.df_prepared if cohort == 'test_data' else fixture
+    metrics = varying_metrics(df, fixture.available_metrics if cohort == 'test_data' else UNBALANCED_METRICS)
+    table = PairwiseComparisons(df, 'Timepoint', 'animal_id').paired_tests(metrics)
+    for metric in metrics:
+        rows = table[table['Metric'] == metric].reset_index(drop=True)
+        assert_matches_paired_tests(rows, reference_paired_tests(df, metric, 'Timepoint'))
+
+
+@pytest.mark.parametrize('by', ['Genotype', 'Sex'])
+def test_paired_tests_simple_effects(unbalanced_cohort, by):
+    """With `by`: one pingouin call (and Bonferroni family) per level of the between-subject column."""
+    table = PairwiseComparisons(unbalanced_cohort, 'Timepoint', 'animal_id').paired_tests(UNBALANCED_METRICS, by=by)
+    for metric in UNBALANCED_METRICS:
+        for level in unbalanced_cohort[by].cat.categories:
+            rows = table[(table['Metric'] == metric) & (table[by] == level)].reset_index(drop=True)
+            subset = unbalanced_cohort[unbalanced_cohort[by] == level]
+            assert_matches_paired_tests(rows, reference_paired_tests(subset, metric, 'Timepoint'))
+
+
+def test_mann_whitney(unbalanced_cohort):
+    table = PairwiseComparisons(unbalanced_cohort, 'Timepoint', 'animal_id').mann_whitney(UNBALANCED_METRICS)
+    for _, row in table.iterrows():
+        data = unbalanced_cohort.dropna(subset=[row['Metric']])
+        x = data.loc[data['Timepoint'] == row['A'], row['Metric']]
+        y = data.loc[data['Timepoint'] == row['B'], row['Metric']]
+        reference = pg.mwu(x, y)
+        assert row['U-val'] == pytest.approx(reference['U_val'].iloc[0])
+        assert row['p-unc'] == pytest.approx(reference['p_val'].iloc[0], rel=1e-9)
+        assert row['RBC'] == pytest.approx(reference['RBC'].iloc[0], rel=1e-9)
+    n_pairs = table.groupby('Metric')['p-unc'].transform('size')
+    np.testing.assert_allclose(table['p-corr'], np.minimum(table['p-unc'] * n_pairs, 1.0))
+
+
+def test_missing_values_only_drop_their_metric(unbalanced_cohort):
+    table = PairwiseComparisons(unbalanced_cohort, 'Genotype', 'animal_id').tukey_hsd(UNBALANCED_METRICS)
+    dof = table.set_index('Metric')['dof']
+    assert dof['Call_Length_s_Mean'] == len(unbalanced_cohort) - 2
+    assert dof['Sparse_Metric'] == unbalanced_cohort['Sparse_Metric'].notna().sum() - 2
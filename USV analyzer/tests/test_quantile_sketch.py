@@ -0,0 +1,101 @@
+"""QuantileSketch: exact below its capacity, within its rank-error bound above it, mergeable across chunks."""
+import numpy as np
+import pytest
+
+from usv_core import QuantileSketch
+
+QS = [0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0]
+
+
+def sketch_of(values, chunks, capacity=512):
+    """A sketch fed `values` in `chunks` consecutive blocks."""
+    sketch = QuantileSketch(capacity)
+    for block in np.array_split(values, chunks):
+        sketch.update(block)
+    return sketch
+
+
+def rank_error(sketch, values, qs):
+    """Largest |rank(estimate) / n - q| over `qs` (the rank of the estimate among the sorted values)."""
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(qs)
+    low = np.searchsorted(ordered, estimates, side='left') / ordered.size
+    high = np.searchsorted(ordered, estimates, side='right') / ordered.size
+    # Ties: any rank between the first and last copy of the estimate is exact
+    return np.max(np.where(qs < low, low - qs, np.where(qs > high, qs - high, 0.0)))
+
+
+def rank_error_bound(sketch):
+    """
+    Each compaction of level h (items of weight 2**h) moves the rank of any value by at most 2**h, and
+    at most n / (2**h * capacity) compactions happen there: levels / capacity bounds every level's
+    share plus the half-weight interpolation between neighbouring items.
+    """
+    return len(sketch.levels) / sketch.capacity
+
+
+@pytest.mark.parametrize('n', [1, 2, 17, 511, 512])
+@pytest.mark.parametrize('chunks', [1, 7])
+def test_exact_up_to_capacity(n, chunks):
+    values = np.random.default_rng(n).lognormal(size=n)
+    sketch = sketch_of(values, min(chunks, n))
+    assert sketch.count == n
+    assert len(sketch.levels) == 1
+    np.testing.assert_array_equal(sketch.quantiles(QS), np.quantile(values, QS))
+
+
+def test_merge_exact_up_to_capacity():
+    values = np.random.default_rng(0).normal(size=500)
+    merged = sketch_of(values[:120], 3).merge(sketch_of(values[120:], 5))
+    assert merged.count == values.size
+    np.testing.assert_array_equal(merged.quantiles(QS), np.quantile(values, QS))
+
+
+def test_nan_ignored():
+    values = np.random.default_rng(1).normal(size=300)
+    with_nan = values.copy()
+    with_nan[::10] = np.nan
+    sketch = sketch_of(with_nan, 4)
+    assert sketch.count == np.count_nonzero(~np.isnan(with_nan))
+    np.testing.assert_array_equal(sketch.quantiles(QS), np.nanquantile(with_nan, QS))
+
+
+def test_empty_is_nan():
+    sketch = QuantileSketch()
+    sketch.update([np.nan])
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantiles(QS)).all()
+
+
+@pytest.mark.parametrize('n', [513, 5000, 200_000])
+@pytest.mark.parametrize('distribution', ['normal', 'lognormal', 'integers'])
+def test_rank_error_within_bound(n, distribution):
+    rng = np.random.default_rng(n)
+    values = {'normal': lambda: rng.normal(size=n), 'lognormal': lambda: rng.lognormal(sigma=2, size=n),
+              'integers': lambda: rng.integers(0, 50, size=n).astype(float)}[distribution]()
+    sketch = sketch_of(values, max(1, n // 3000))
+    assert sketch.count == n
+    assert len(sketch.levels) > 1
+    qs = np.linspace(0, 1, 101)
+    assert rank_error(sketch, values, qs) <= rank_error_bound(sketch)
+    estimates = sketch.quantiles(qs)
+    assert np.all(np.diff(estimates) >= 0)
+    assert estimates[0] >= values.min() and estimates[-1] <= values.max()
+
+
+@pytest.mark.parametrize('workers', [2, 8, 33])
+def test_merged_sketches_within_bound(workers):
+    """Sessions split across chunks or workers: sketches of the parts merged in any grouping."""
+    values = np.random.default_rng(workers).gamma(2.0, size=100_000)
+    parts = [sketch_of(part, 5) for part in np.array_split(values, workers)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == values.size
+    assert rank_error(merged, values, np.linspace(0, 1, 101)) <= rank_error_bound(merged)
+
+
+def test_smaller_capacity_bound():
+    values = np.random.default_rng(2).normal(size=20_000)
+    sketch = sketch_of(values, 10, capacity=64)
+    assert rank_error(sketch, values, np.linspace(0, 1, 101)) <= rank_error_bound(sketch)
@@ -0,0 +1,101 @@
+"""RepeatedMeasuresAnova against pingouin's rm_anova / mixed_anova, and the pingouin fallback of the analysis."""
+import io
+
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+
+from conftest import UNBALANCED_METRICS, varying_metrics
+from usv_core import RepeatedMeasuresAnova, Reporter, StatisticalAnalysis, USVSession, normalize_pingouin_columns
+
+COMPARED_COLUMNS = ['ddof1', 'ddof2', 'SS', 'DF1', 'DF2', 'MS', 'F', 'p-unc', 'p-GG-corr', 'np2', 'eps', 'W-spher',
+                    'p-spher']
+
+
+def reference_table(df, metric, within, between=None):
+    data = df.dropna(subset=[metric, within, 'animal_id'] + ([between] if between else []))
+    if between is None:
+        table = pg.rm_anova(data=data, dv=metric, within=within, subject='animal_id', effsize='np2', correction=True)
+    else:
+        table = pg.mixed_anova(data=data, dv=metric, within=within, between=between, subject='animal_id',
+                               effsize='np2', correction=True)
+    return normalize_pingouin_columns(table)
+
+
+def assert_tables_equal(table, reference):
+    assert list(table['Source']) == list(reference['Source'])
+    columns = [col for col in COMPARED_COLUMNS if col in reference.columns]
+    assert {'F', 'p-unc', 'np2'} <= set(columns)
+    for col in columns:
+        np.testing.assert_allclose(table[col].to_numpy(dtype=float), reference[col].to_numpy(dtype=float),
+                                   rtol=1e-6, atol=1e-10, err_msg=col)
+    if 'sphericity' in reference.columns:
+        within_rows = reference['sphericity'].notna()
+        assert list(table.loc[within_rows, 'sphericity']) == list(reference.loc[within_rows, 'sphericity'])
+
+
+@pytest.mark.parametrize('between', [None, 'Genotype', 'Sex'])
+def test_test_data(test_data, between):
+    df = test_data.df_prepared
+    metrics = varying_metrics(df, test_data.available_metrics)
+    tables = RepeatedMeasuresAnova(df, 'Timepoint', 'animal_id', between).fit(metrics)
+    assert set(tables) == set(metrics)
+    for metric in metrics:
+        assert_tables_equal(tables[metric], reference_table(df, metric, 'Timepoint', between))
+
+
+@pytest.mark.parametrize('between', [None, 'Genotype', 'Sex'])
+def test_unbalanced_cohort(unbalanced_cohort, between):
+    """Unequal groups, subjects missing a timepoint (left out, as pingouin does) and three levels (sphericity)."""
+    tables = RepeatedMeasuresAnova(unbalanced_cohort, 'Timepoint', 'animal_id', between).fit(UNBALANCED_METRICS)
+    assert set(tables) == set(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        reference = reference_table(unbalanced_cohort, metric, 'Timepoint', between)
+        assert 'p-GG-corr' in reference.columns
+        assert_tables_equal(tables[metric], reference)
+
+
+def test_huynh_feldt_epsilon(unbalanced_cohort):
+    tables = RepeatedMeasuresAnova(unbalanced_cohort, 'Timepoint').fit(UNBALANCED_METRICS)
+    for metric in UNBALANCED_METRICS:
+        data = unbalanced_cohort.dropna(subset=[metric])
+        expected = min(pg.epsilon(data, dv=metric, within='Timepoint', subject='animal_id', correction='hf'), 1.0)
+        np.testing.assert_allclose(tables[metric]['eps-HF'].iloc[0], expected, rtol=1e-6)
+
+
+def unbalanced_for_the_engine(df):
+    """S01 recorded twice at P4: several rows for one subject and level."""
+    return pd.concat([df, df[(df['animal_id'] == 'S01') & (df['Timepoint'] == 'P4')].assign(
+        Call_Length_s_Mean=0.07, Tonality_Mean=0.4)], ignore_index=True)
+
+
+def test_engine_leaves_out_designs_it_cannot_fit(unbalanced_cohort):
+    duplicated = unbalanced_for_the_engine(unbalanced_cohort)
+    assert RepeatedMeasuresAnova(duplicated, 'Timepoint').fit(UNBALANCED_METRICS) == {}
+    two_groups = unbalanced_cohort.copy()
+    two_groups.loc[(two_groups['animal_id'] == 'S01') & (two_groups['Timepoint'] == 'P8'), 'Genotype'] = 'Mutant'
+    assert RepeatedMeasuresAnova(two_groups, 'Timepoint', 'animal_id', 'Genotype').fit(UNBALANCED_METRICS) == {}
+    two_subjects = unbalanced_cohort[unbalanced_cohort['animal_id'].isin(['S01', 'S02'])]
+    assert RepeatedMeasuresAnova(two_subjects, 'Timepoint').fit(UNBALANCED_METRICS) == {}
+
+
+@pytest.mark.parametrize('between', [None, 'Genotype'])
+def test_analysis_falls_back_to_pingouin(unbalanced_cohort, tmp_path, between):
+    df = unbalanced_for_the_engine(unbalanced_cohort)
+    log = io.StringIO()
+    analysis = StatisticalAnalysis(USVSession(str(tmp_path)), Reporter(stream=log))
+    for metric in UNBALANCED_METRICS:
+        table = analysis.repeated_measures_table(df, metric, 'Timepoint', between)
+        pd.testing.assert_frame_equal(table, reference_table(df, metric, 'Timepoint', between))
+    assert log.getvalue().count("using pingouin") == len(UNBALANCED_METRICS)
+
+
+def test_analysis_uses_the_engine_on_the_prepared_dataset(test_data):
+    log = io.StringIO()
+    analysis = StatisticalAnalysis(test_data, Reporter(stream=log))
+    df = test_data.df_prepared
+    for metric in varying_metrics(df, test_data.available_metrics)[:10]:
+        assert_tables_equal(analysis.repeated_measures_table(df, metric, 'Timepoint', 'Genotype'),
+                            reference_table(df, metric, 'Timepoint', 'Genotype'))
+    assert "using pingouin" not in log.getvalue()
@@ -0,0 +1,121 @@
+"""RunningStats / SessionAccumulator: chunked updates and Chan merges equal the full-array statistics."""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import usv_core
+from usv_core import RunningStats, SessionAccumulator, metric_column_name
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Test Data')
+
+
+def sample_block(seed, n=5000):
+    """(n x 4) values on very different scales, with NaNs and one all-NaN feature."""
+    rng = np.random.default_rng(seed)
+    values = np.column_stack([rng.normal(1e6, 1.0, n), rng.lognormal(0, 2, n), rng.integers(0, 5, n),
+                              np.full(n, np.nan)]).astype(float)
+    values[rng.random(n) < 0.1, 1] = np.nan
+    return values
+
+
+def assert_matches_full_array(running, values):
+    with np.errstate(invalid='ignore'):
+        counts = (~np.isnan(values)).sum(axis=0)
+        np.testing.assert_array_equal(running.count, counts)
+        used = counts > 0
+        np.testing.assert_allclose(running.mean[used], np.nanmean(values[:, used], axis=0), rtol=1e-12)
+        np.testing.assert_allclose(running.sum[used], np.nansum(values[:, used], axis=0), rtol=1e-12)
+        np.testing.assert_allclose(running.std[used], np.nanstd(values[:, used], axis=0, ddof=1), rtol=1e-9)
+        np.testing.assert_allclose(running.sem[used], np.nanstd(values[:, used], axis=0, ddof=1) /
+                                   np.sqrt(counts[used]), rtol=1e-9)
+        np.testing.assert_array_equal(running.min[used], np.nanmin(values[:, used], axis=0))
+        np.testing.assert_array_equal(running.max[used], np.nanmax(values[:, used], axis=0))
+    # A feature without values: no mean, no spread
+    assert np.isnan(running.std[~used]).all() and np.isnan(running.sem[~used]).all()
+
+
+@pytest.mark.parametrize('chunks', [1, 2, 37, 5000])
+def test_chunked_updates(chunks):
+    values = sample_block(chunks)
+    running = RunningStats(values.shape[1])
+    for block in np.array_split(values, chunks):
+        running.update(block)
+    assert_matches_full_array(running, values)
+
+
+@pytest.mark.parametrize('workers', [2, 5, 16])
+def test_merged_workers(workers):
+    """Workers each update their part in chunks; the parts are merged pairwise (as a tree)."""
+    values = sample_block(workers)
+    parts = []
+    for part in np.array_split(values, workers):
+        running = RunningStats(values.shape[1])
+        for block in np.array_split(part, 3):
+            running.update(block)
+        parts.append(running)
+    while len(parts) > 1:
+        parts = [parts[i].merge(parts[i + 1]) if i + 1 < len(parts) else parts[i] for i in range(0, len(parts), 2)]
+    assert_matches_full_array(parts[0], values)
+
+
+def test_merge_with_empty():
+    values = sample_block(0, 100)
+    running = RunningStats(values.shape[1])
+    running.update(values)
+    RunningStats(values.shape[1]).merge(running)
+    assert_matches_full_array(running.merge(RunningStats(values.shape[1])), values)
+    assert_matches_full_array(RunningStats(values.shape[1]).merge(running), values)
+
+
+def test_session_accumulator_chunks_and_merge():
+    rng = np.random.default_rng(3)
+    features = ['Call Length (s)', 'Tonality', 'Label']
+    calls = pd.DataFrame({'Call Length (s)': rng.gamma(2, 0.02, 400), 'Tonality': rng.random(400),
+                          'Label': rng.choice(['A', 'B'], 400)})
+    whole = SessionAccumulator(features)
+    whole.update(calls)
+    chunked = SessionAccumulator(features)
+    for start in range(0, 150, 50):
+        chunked.update(calls.iloc[start:start + 50])
+    other_worker = SessionAccumulator(features)
+    other_worker.update(calls.iloc[150:])
+    chunked.merge(other_worker)
+
+    for accumulator in (whole, chunked):
+        assert accumulator.total_calls == len(calls)
+        assert accumulator.non_numeric_features == {'Label'}
+        # The non-numeric Label keeps an empty slot
+        assert_matches_full_array(accumulator.stats, calls[features].assign(Label=np.nan).to_numpy(dtype=float))
+        for col in features[:2]:  # Fewer calls than the sketch capacity: exact quantiles
+            np.testing.assert_array_equal(accumulator.sketches[col].quantiles([0.05, 0.5, 0.95]),
+                                          np.quantile(calls[col], [0.05, 0.5, 0.95]))
+
+
+def test_loaded_metrics_equal_full_session_statistics(tmp_path):
+    """Test Data read in 13-row chunks gives the per-session metrics of the whole accepted-call frame."""
+    session = usv_core.USVSession(str(tmp_path), usv_core.AnalysisOptions(store_calls=True))
+    session.CSV_CHUNK_SIZE = 13
+    usv_core.load_data(session, [TEST_DATA], usv_core.Reporter(stream=io.StringIO()))
+    assert session.df_aggregated is not None
+
+    calls = session.df_calls
+    grouped = calls.groupby(['animal_id', 'Timepoint'], observed=True)
+    aggregated = session.df_aggregated.set_index(['animal_id', 'Timepoint'])
+    sizes = grouped.size()
+    np.testing.assert_array_equal(aggregated.loc[sizes.index, 'Total_USVs_Count'], sizes)
+    np.testing.assert_allclose(aggregated.loc[sizes.index, 'Call_Length_s_Sum'],
+                               grouped['Call Length (s)'].sum(), rtol=1e-12)
+    small_sessions = sizes.index[sizes <= 512]  # Sketches are exact below their capacity
+    for feature in session.USV_FEATURE_COLUMNS:
+        name = metric_column_name(feature)
+        np.testing.assert_allclose(aggregated.loc[sizes.index, f'{name}_Mean'], grouped[feature].mean(), rtol=1e-12)
+        np.testing.assert_allclose(aggregated.loc[sizes.index, f'{name}_SD'], grouped[feature].std(), rtol=1e-9)
+        np.testing.assert_allclose(aggregated.loc[sizes.index, f'{name}_SEM'], grouped[feature].sem(), rtol=1e-9)
+        np.testing.assert_allclose(aggregated.loc[small_sessions, f'{name}_Median'],
+                                   grouped[feature].median().loc[small_sessions], rtol=1e-12)
+        np.testing.assert_allclose(aggregated.loc[small_sessions, f'{name}_IQR'],
+                                   (grouped[feature].quantile(0.75) - grouped[feature].quantile(0.25))
+                                   .loc[small_sessions], rtol=1e-9, atol=1e-12)
@@ -0,0 +1,38 @@
+"""SessionCatalog: cohorts with different call columns are stored side by side and read back."""
+import numpy as np
+import pandas as pd
+
+from usv_core import SessionCatalog
+
+
+def cohort_frames(animals, extra_call_columns=None):
+    """Aggregated frame, metadata and calls (two per session) of a small cohort at P4."""
+    df_meta = pd.DataFrame({'animal_id': animals, 'Timepoint': 'P4', 'Sex': 'F', 'Genotype': 'WT',
+                            'Filename': [f'{animal}_P4.csv' for animal in animals]})
+    df_aggregated = df_meta[['animal_id', 'Timepoint']].assign(Total_USVs_Count=2.0)
+    df_calls = pd.DataFrame({'animal_id': np.repeat(animals, 2), 'Timepoint': 'P4',
+                             'Call Length (s)': np.linspace(0.01, 0.08, 2 * len(animals))})
+    return {'all': df_aggregated}, df_meta, df_calls.assign(**(extra_call_columns or {}))
+
+
+def test_cohorts_with_different_call_columns(tmp_path):
+    catalog = SessionCatalog(str(tmp_path / 'catalog.sqlite'))
+    variants_a, meta_a, calls_a = cohort_frames(['A1', 'A2'])
+    variants_b, meta_b, calls_b = cohort_frames(['B1', 'B2', 'B3'],
+                                                {'Is_Outlier': [False, True, False, False, True, False],
+                                                 'Source': 'other export'})
+    catalog.store_cohort('A', variants_a, meta_a, calls_a)
+    catalog.store_cohort('B', variants_b, meta_b, calls_b)
+    catalog.store_cohort('A', variants_a, meta_a, calls_a)  # Restoring a cohort into the widened table
+
+    assert catalog.cohorts() == ['A', 'B']
+    assert len(catalog.query()) == 5
+    calls = catalog.query_calls()
+    assert len(calls) == 10
+    assert {'Is_Outlier', 'Source'} <= set(calls.columns)
+    calls_b_read = catalog.query_calls(cohorts=['B'])
+    np.testing.assert_array_equal(calls_b_read['Is_Outlier'], calls_b['Is_Outlier'].astype(int))
+    assert (calls_b_read['Source'] == 'other export').all()
+    calls_a_read = catalog.query_calls(cohorts=['A'])
+    assert calls_a_read[['Is_Outlier', 'Source']].isna().all().all()
+    np.testing.assert_allclose(calls_a_read['Call Length (s)'], calls_a['Call Length (s)'])
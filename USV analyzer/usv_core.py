@@ -0,0 +1,3918 @@
+"""
+Core of the USV Analyzer: cohort loading and aggregation, statistics and plots, without tkinter.
+
+The state of an analysis lives in a USVSession that plain functions take (load_data, select_dataset,
+analyze_metric, analyze_all_metrics, analyze); they report through a Reporter's callbacks. Code.py
+(the window) calls them like notebooks, scripts and worker processes do:
+
+    import usv_core
+    session = usv_core.load_cohorts(['Test Data'], flag_outliers=True)
+    results, descriptive = usv_core.analyze(session, 'Total_USVs_Count', 'Genotype', 'Sex')
+"""
+import os
+import sys
+import pandas as pd
+import numpy as np
+from itertools import combinations
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import gzip
+import bz2
+import lzma
+import zipfile
+import sqlite3
+import json
+import time
+import threading
+import cProfile
+import pstats
+import io
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+import importlib
+
+try:
+    import resource  # Peak memory of the run profiles (Unix)
+except ImportError:
+    resource = None
+
+
+# --- Helper class importing the heavy scientific modules on first use (the window opens without them) ---
+class LazyModule(object):
+    """Stands in for a module that is only imported when one of its attributes is first used."""
+    _lock = threading.Lock()  # One import at a time (first use vs. background preload)
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            with LazyModule._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+
+stats = LazyModule('scipy.stats')
+special = LazyModule('scipy.special')
+plt = LazyModule('matplotlib.pyplot')
+sns = LazyModule('seaborn')
+pg = LazyModule('pingouin')
+HEAVY_MODULES = [stats, special, pg, sns, plt]  # Preload order (pingouin already pulls in most of the rest)
+
+
+def preload_heavy_modules():
+    """Imports the heavy modules in a daemon thread (started once the window is up); returns the thread."""
+    def preload():
+        for module in HEAVY_MODULES:
+            try:
+                module.load()
+            except Exception:  # Reported again, with a traceback, where the module is really used
+                pass
+    thread = threading.Thread(target=preload, name="preload-heavy-modules", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- Helper class to keep mergeable per-session quantile sketches while streaming the calls ---
+class QuantileSketch(object):
+    """
+    Small KLL-style quantile sketch. Values are kept exactly until a level holds more than
+    `capacity` items; then that level is sorted and every second item is promoted to the next
+    level with twice the weight. Two sketches of the same session (e.g. read by different chunks
+    or workers) can be combined with merge() without going back to the raw calls.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.levels = [np.empty(0)]  # Items in levels[i] each stand for 2**i calls
+        self.count = 0
+        self._promote_odd = False  # Alternates which half is promoted to avoid a systematic bias
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += values.size
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level >= len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.capacity:
+                items = np.sort(items)
+                kept = items[-1:] if items.size % 2 else items[:0]  # An odd leftover stays on this level
+                pairs = items[:items.size - kept.size]
+                promoted = pairs[1::2] if self._promote_odd else pairs[0::2]
+                self._promote_odd = not self._promote_odd
+                self.levels[level] = kept
+                if level + 1 >= len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, qs):
+        """Returns the requested quantiles (0-1). Exact (numpy 'linear') while nothing was compacted."""
+        qs = np.asarray(qs, dtype=float)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(lvl.size, 2.0 ** i) for i, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, weights = items[order], weights[order]
+        positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(qs, positions, items)
+
+
+# --- Helper class for online (Welford/Chan) statistics that merge across chunks and workers ---
+class RunningStats(object):
+    """
+    Keeps count, mean, M2, min, max and sum for several features at once (one array slot per feature).
+    NaNs are ignored per feature. Partial results are combined with Chan's parallel formula, so
+    chunks, workers or incremental updates never need the raw values again.
+    """
+
+    def __init__(self, n_features):
+        self.count = np.zeros(n_features, dtype=np.int64)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.sum = np.zeros(n_features)
+
+    def update(self, values):
+        """Adds a (rows x features) block of values."""
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        valid = ~np.isnan(values)
+        count_b = valid.sum(axis=0)
+        sum_b = np.where(valid, values, 0.0).sum(axis=0)
+        mean_b = np.divide(sum_b, count_b, out=np.zeros_like(sum_b), where=count_b > 0)
+        m2_b = np.where(valid, (values - mean_b) ** 2, 0.0).sum(axis=0)
+        min_b = np.where(valid, values, np.inf).min(axis=0)
+        max_b = np.where(valid, values, -np.inf).max(axis=0)
+        self._combine(count_b, mean_b, m2_b, min_b, max_b, sum_b)
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max, other.sum)
+        return self
+
+    def _combine(self, count_b, mean_b, m2_b, min_b, max_b, sum_b):
+        count = self.count + count_b
+        safe_count = np.where(count > 0, count, 1)
+        delta = mean_b - self.mean
+        self.mean = np.where(count > 0, self.mean + delta * count_b / safe_count, 0.0)
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.count * count_b / safe_count
+        self.min = np.minimum(self.min, min_b)
+        self.max = np.maximum(self.max, max_b)
+        self.sum = self.sum + sum_b
+        self.count = count
+
+    @property
+    def std(self):
+        return np.sqrt(np.divide(self.m2, self.count - 1, out=np.full(self.m2.shape, np.nan),
+                                 where=self.count > 1))
+
+    @property
+    def sem(self):
+        return np.divide(self.std, np.sqrt(self.count), out=np.full(self.m2.shape, np.nan), where=self.count > 1)
+
+
+# --- Helper class holding everything the loader keeps for one session while streaming its calls ---
+class SessionAccumulator(object):
+    """Running statistics and quantile sketches of the accepted calls of one session."""
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.stats = RunningStats(len(self.features))
+        self.sketches = {col: QuantileSketch() for col in self.features}
+        self.total_calls = 0
+        self.non_numeric_features = set()
+
+    def update(self, df_calls):
+        """Adds a block of accepted calls (any DataFrame with the DeepSqueak columns)."""
+        self.total_calls += len(df_calls)
+        block = np.full((len(df_calls), len(self.features)), np.nan)
+        for i, col in enumerate(self.features):
+            if col in df_calls.columns and pd.api.types.is_numeric_dtype(df_calls[col]):
+                block[:, i] = df_calls[col].to_numpy(dtype=float)
+                self.sketches[col].update(block[:, i])
+            else:
+                self.non_numeric_features.add(col)
+        self.stats.update(block)
+
+    def merge(self, other):
+        self.total_calls += other.total_calls
+        self.stats.merge(other.stats)
+        for col in self.features:
+            self.sketches[col].merge(other.sketches[col])
+        self.non_numeric_features |= other.non_numeric_features
+        return self
+
+
+# --- Helper function for robust (median/MAD) outlier flagging of individual calls ---
+def flag_outlier_calls(df_calls, features, session_cols, threshold=3.5):
+    """
+    Flags calls whose modified z-score (0.6745 * |x - median| / MAD, Iglewicz & Hoaglin) exceeds
+    `threshold` on any feature. Medians and MADs are computed per session for all features at once.
+    Features with a MAD of 0 in a session never flag a call. Returns a boolean Series aligned to df_calls.
+    """
+    values = df_calls[features].apply(pd.to_numeric, errors='coerce')
+    sessions = [df_calls[col] for col in session_cols]
+    medians = values.groupby(sessions, observed=True, sort=False).transform('median')
+    abs_dev = (values - medians).abs()
+    mad = abs_dev.groupby(sessions, observed=True, sort=False).transform('median')
+    modified_z = 0.6745 * abs_dev / mad.where(mad > 0)
+    return (modified_z > threshold).any(axis=1)
+
+
+def metric_column_name(feature):
+    """Prefix of a feature's metric columns, e.g. 'Call Length (s)' -> 'Call_Length_s'."""
+    return feature.replace(" ", "_").replace("(", "").replace(")", "").replace("/", "_").replace(".", "")
+
+
+# --- Helper function computing the per-session metrics of calls held in memory with one groupby ---
+def session_metric_columns(df_calls, features, session_cols):
+    """
+    Total_USVs_Count, Call_Length_s_Sum and the Mean/SD/SEM/Median/IQR/P5/P95 columns of every
+    numeric feature, one row per session present in `df_calls` (e.g. the calls left after outlier
+    flagging). Quantiles are exact here; the streaming loader gets them from its sketches.
+    """
+    grouped = df_calls.groupby(session_cols, sort=False, observed=True)
+    columns = {'Total_USVs_Count': grouped.size()}
+    numeric = [col for col in features if col in df_calls.columns and pd.api.types.is_numeric_dtype(df_calls[col])]
+    if numeric:
+        values = grouped[numeric]
+        quantiles = values.quantile([0.05, 0.25, 0.5, 0.75, 0.95])
+        q05, q25, q50, q75, q95 = [quantiles.xs(q, level=-1) for q in [0.05, 0.25, 0.5, 0.75, 0.95]]
+        statistics = {'Mean': values.mean(), 'SD': values.std(), 'SEM': values.sem(), 'Median': q50,
+                      'IQR': q75 - q25, 'P5': q05, 'P95': q95}
+        for col in numeric:
+            for suffix, frame in statistics.items():
+                columns[f'{metric_column_name(col)}_{suffix}'] = frame[col]
+        if 'Call Length (s)' in numeric:
+            columns['Call_Length_s_Sum'] = grouped['Call Length (s)'].sum(min_count=1)
+    return pd.DataFrame(columns).reset_index()
+
+
+# --- Helper function building all Label_X_Count / Label_X_Proportion columns with one crosstab ---
+def label_count_columns(sessions, labels, label_dtype, all_sessions=None):
+    """
+    `sessions` identifies the session of every call (a Series or a list of Series), `labels` holds its Label encoded with the
+    shared `label_dtype` (the vocabulary found across all files). Every label of the vocabulary
+    gets a count column (0 when absent) and a proportion column (NaN for sessions without calls).
+    """
+    counts = pd.crosstab(sessions, labels.astype(label_dtype), dropna=False)
+    counts = counts.reindex(columns=label_dtype.categories, fill_value=0)
+    if all_sessions is not None:
+        counts = counts.reindex(all_sessions, fill_value=0)
+    proportions = counts.div(counts.sum(axis=1).where(lambda total: total > 0), axis=0)
+
+    sanitized = counts.columns.astype(str).str.replace(r'[ /]', '_', regex=True).str.replace(r'[().]', '',
+                                                                                              regex=True)
+    counts.columns = 'Label_' + sanitized + '_Count'
+    proportions.columns = 'Label_' + sanitized + '_Proportion'
+    return pd.concat([counts, proportions], axis=1)
+
+
+# --- Helper classes giving the loader streaming access to plain, compressed or zipped cohort data ---
+COMPRESSION_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+class ClosingStream(object):
+    """A decompressed stream that, when closed, also closes what it reads from (archive, raw file)."""
+
+    mode = 'rb'  # What pandas checks (GzipFile.mode is an int)
+
+    def __init__(self, member, *owners):
+        self.member = member
+        self.owners = owners  # Closed after the member, in this order
+
+    def __getattr__(self, name):
+        return getattr(self.member, name)
+
+    def __iter__(self):
+        return iter(self.member)
+
+    def close(self):
+        try:
+            self.member.close()
+        finally:
+            for owner in self.owners:
+                owner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open_compressed_stream(raw_stream, name):
+    """Wraps a binary stream in a streaming decompressor chosen from the file extension."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in COMPRESSION_OPENERS:  # The decompressors leave a stream they were given open
+        return ClosingStream(COMPRESSION_OPENERS[extension](raw_stream, 'rb'), raw_stream)
+    if extension == '.zip':  # A single compressed session file: use its first .csv member
+        archive = zipfile.ZipFile(raw_stream)
+        members = [m for m in archive.namelist() if m.lower().endswith('.csv')] or archive.namelist()
+        return ClosingStream(archive.open(members[0]), archive, raw_stream)
+    return raw_stream
+
+
+class FolderSource(object):
+    """
+    Session files in a folder. A Filename from the metadata is matched as is, or with a
+    .gz/.bz2/.xz/.zip suffix (e.g. A01_P4_USVs.csv.gz), and is decompressed while it is read.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.name = os.path.basename(os.path.normpath(folder))
+
+    def resolve(self, filename):
+        base_path = os.path.join(self.folder, str(filename))
+        for candidate in [base_path] + [base_path + ext for ext in ('.gz', '.bz2', '.xz', '.zip')]:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def exists(self, filename):
+        return self.resolve(filename) is not None
+
+    def open(self, filename):
+        """Returns a decompressed binary stream (use it as a context manager)."""
+        path = self.resolve(filename)
+        if path is None:
+            raise FileNotFoundError(os.path.join(self.folder, str(filename)))
+        extension = os.path.splitext(path)[1].lower()
+        if extension in COMPRESSION_OPENERS:
+            return COMPRESSION_OPENERS[extension](path, 'rb')
+        return _open_compressed_stream(open(path, 'rb'), path)
+
+    def describe(self, filename):
+        return os.path.join(self.folder, str(filename))
+
+    def identity(self, filename):
+        """Canonical location of a session file (the same file reached from two cohorts is parsed once)."""
+        path = self.resolve(filename)
+        return os.path.realpath(path) if path else None
+
+
+class ZipCohortSource(object):
+    """
+    A whole cohort folder archived as one .zip (animal_metadata.csv plus the session files, which
+    may themselves be compressed). Members are streamed straight out of the archive; nothing is
+    extracted to disk.
+    """
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.name = os.path.splitext(os.path.basename(zip_path))[0]
+        self.archive = zipfile.ZipFile(zip_path)
+        self.members = {}  # basename -> member name (the folder layout inside the archive does not matter)
+        for member in self.archive.namelist():
+            if not member.endswith('/') and not os.path.basename(member).startswith('._'):
+                self.members.setdefault(os.path.basename(member), member)
+
+    def resolve(self, filename):
+        for candidate in [str(filename)] + [f"{filename}{ext}" for ext in ('.gz', '.bz2', '.xz', '.zip')]:
+            if candidate in self.members:
+                return self.members[candidate]
+        return None
+
+    def exists(self, filename):
+        return self.resolve(filename) is not None
+
+    def open(self, filename):
+        member = self.resolve(filename)
+        if member is None:
+            raise FileNotFoundError(f"{filename} not found in {self.zip_path}")
+        return _open_compressed_stream(self.archive.open(member), member)
+
+    def describe(self, filename):
+        return f"{self.zip_path}:{self.resolve(filename) or filename}"
+
+    def identity(self, filename):
+        member = self.resolve(filename)
+        return f"{os.path.realpath(self.zip_path)}:{member}" if member else None
+
+
+def open_data_source(path):
+    """Picks the source type for a selected folder or cohort archive."""
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        return ZipCohortSource(path)
+    return FolderSource(path)
+
+
+def open_cohort_sources(paths):
+    """
+    One source per selected cohort. A folder/archive selected twice is only kept once, and cohorts
+    sharing a folder name get a numbered suffix so their names stay unique.
+    """
+    sources, seen_paths, names = [], set(), set()
+    for path in paths:
+        real_path = os.path.realpath(path)
+        if real_path in seen_paths:
+            continue
+        seen_paths.add(real_path)
+        source = open_data_source(path)
+        base_name, suffix = source.name, 2
+        while source.name in names:
+            source.name = f"{base_name}_{suffix}"
+            suffix += 1
+        names.add(source.name)
+        sources.append(source)
+    return sources
+
+
+# --- Helper function for the header-only pre-flight check of one USV file ---
+def validate_usv_file_header(source, filename, required_columns, expected_columns, n_rows=5):
+    """
+    Reads only the first bytes, the header and the first `n_rows` calls of a USV file.
+    Returns a dict with 'exists', 'bom', 'missing_required', 'missing_expected' and 'error'.
+    """
+    result = {'file': str(filename), 'exists': source.exists(filename), 'bom': False,
+              'missing_required': [], 'missing_expected': [], 'error': None}
+    if not result['exists']:
+        return result
+    try:
+        with io.BufferedReader(source.open(filename)) as f:  # Opened (and decompressed) once
+            result['bom'] = f.peek(3)[:3] == b'\xef\xbb\xbf'
+            df_head = pd.read_csv(f, nrows=n_rows, encoding='utf-8-sig')
+        result['missing_required'] = [col for col in required_columns if col not in df_head.columns]
+        result['missing_expected'] = [col for col in expected_columns if col not in df_head.columns]
+    except UnicodeDecodeError as e:
+        result['error'] = f"not UTF-8 encoded ({e.reason})"
+    except pd.errors.EmptyDataError:
+        result['error'] = "file is empty"
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+# --- Helper class holding everything one cohort load produces (cohorts are ingested concurrently) ---
+class CohortData(object):
+    """
+    Metadata, running statistics, calls and aggregated frames of one cohort. A loader thread only
+    writes to its own CohortData, so several cohorts can be parsed at the same time.
+    """
+
+    def __init__(self, source, name=None):
+        self.source = source
+        self.name = name if name is not None else source.name
+        self.df_metadata = None
+        self.session_accumulators = {}  # (animal_id, Timepoint) -> SessionAccumulator
+        self.df_calls = None
+        self.label_dtype = None
+        self.aggregated_variants = {}  # 'all' / 'without_outliers' -> aggregated DataFrame
+        self.validation_report_text = ""
+        self.load_errors = []
+        self.fatal_error = None  # (title, message) shown by the GUI thread once the workers are done
+        self.files_total = 0
+        self.files_done = 0
+
+
+def namespace_animal_ids(cohort, animal_ids):
+    """'cohort:animal_id', so animals of different cohorts never share an ID."""
+    return cohort + ':' + animal_ids.astype(str)
+
+
+def _with_cohort(df, cohort, add_column=True):
+    df = df.assign(animal_id=namespace_animal_ids(cohort, df['animal_id']))
+    return df.assign(Cohort=cohort) if add_column else df
+
+
+def merge_cohorts(cohorts):
+    """
+    Combines loaded cohorts into one CohortData: animal_id is namespaced by cohort and a Cohort
+    column is added. Label columns are the union over the cohorts; a label a cohort never produced
+    gets a count of 0 and a proportion of 0.0 (still NaN for sessions without calls).
+    """
+    if len(cohorts) == 1:
+        return cohorts[0]
+    merged = CohortData(None, name=", ".join(cohort.name for cohort in cohorts))
+    vocabulary = set().union(*[cohort.label_dtype.categories for cohort in cohorts if cohort.label_dtype is not None])
+    merged.label_dtype = pd.CategoricalDtype(sorted(vocabulary))
+    merged.df_metadata = pd.concat([_with_cohort(cohort.df_metadata, cohort.name) for cohort in cohorts],
+                                   ignore_index=True)
+    for cohort in cohorts:
+        for (animal_id, timepoint), accumulator in cohort.session_accumulators.items():
+            merged.session_accumulators[(f"{cohort.name}:{animal_id}", timepoint)] = accumulator
+        merged.load_errors.extend(f"[{cohort.name}] {error}" for error in cohort.load_errors)
+    call_frames = [_with_cohort(cohort.df_calls, cohort.name, add_column=False) for cohort in cohorts
+                   if cohort.df_calls is not None]
+    if call_frames:
+        merged.df_calls = pd.concat(call_frames, ignore_index=True)
+
+    for variant in cohorts[0].aggregated_variants:
+        if not all(variant in cohort.aggregated_variants for cohort in cohorts):
+            continue
+        df = pd.concat([_with_cohort(cohort.aggregated_variants[variant], cohort.name) for cohort in cohorts],
+                       ignore_index=True)
+        label_cols = [c for c in df.columns if c.startswith('Label_') and c.endswith(('_Count', '_Proportion'))]
+        count_cols = sorted(c for c in label_cols if c.endswith('_Count'))
+        proportion_cols = sorted(c for c in label_cols if c.endswith('_Proportion'))
+        other_cols = [c for c in df.columns if c not in label_cols]
+        position = df.columns.get_loc(label_cols[0]) if label_cols else len(other_cols)
+        df = df[other_cols[:position] + count_cols + proportion_cols + other_cols[position:]]
+        df[count_cols] = df[count_cols].fillna(0).astype(int)
+        has_calls = df[count_cols].sum(axis=1) > 0
+        df.loc[has_calls, proportion_cols] = df.loc[has_calls, proportion_cols].fillna(0.0)
+        merged.aggregated_variants[variant] = df
+    return merged
+
+
+# --- Helper function preparing the analysis view of the aggregated data (built once per dataset) ---
+def prepare_analysis_view(df, sex_labels, genotype_labels, timepoint_order):
+    """
+    Readable, categorical-encoded view used by the statistics, descriptive tables and plots:
+    Sex/Genotype get their display labels as categoricals and Timepoint is an ordered categorical
+    (present timepoints in `timepoint_order`). Metric columns are shared with `df` (copy-on-write),
+    so consumers must treat the view as read-only and never need to copy it.
+    """
+    replacements = {}
+    if 'Sex' in df.columns:
+        replacements['Sex'] = df['Sex'].replace(sex_labels).astype('category')
+    if 'Genotype' in df.columns:
+        replacements['Genotype'] = df['Genotype'].replace(genotype_labels).astype('category')
+    if 'Timepoint' in df.columns:
+        present_timepoints = [tp for tp in timepoint_order if tp in df['Timepoint'].unique()]
+        if present_timepoints:
+            replacements['Timepoint'] = pd.Categorical(df['Timepoint'], categories=present_timepoints, ordered=True)
+        else:
+            replacements['Timepoint'] = df['Timepoint'].astype('category')  # Convert even if no specific order
+    return df.assign(**replacements)
+
+
+# --- Helper class fitting the one/two-way Type II ANOVA of many metrics with shared design matrices ---
+class MultiResponseAnova(object):
+    """
+    Type II ANOVA of `metric ~ C(f1)` or `metric ~ C(f1) * C(f2)` for many metrics at once.
+    The treatment-coded design matrices are built once per factor layout and every metric column
+    is solved in the same least-squares call. Tables match statsmodels' anova_lm(ols(...).fit(), typ=2)
+    (rows 'C(f1)', 'C(f2)', 'C(f1):C(f2)', 'Residual'; columns sum_sq, df, F, PR(>F)).
+    Like the per-metric analysis, a session is only dropped for the metrics it has no value for.
+    """
+
+    def __init__(self, df, factors, required_columns=()):
+        self.df = df
+        self.factors = list(factors)
+        self.required_columns = [col for col in required_columns if col in df.columns]
+        self.terms = [f'C({factor})' for factor in self.factors]
+        if len(self.factors) == 2:
+            self.terms.append(f'C({self.factors[0]}):C({self.factors[1]})')
+
+    @staticmethod
+    def _dummies(values):
+        """Treatment-coded columns (the first level in sorted order is the reference)."""
+        codes, levels = pd.factorize(values, sort=True)
+        return (codes[:, None] == np.arange(1, len(levels))[None, :]).astype(float)
+
+    @staticmethod
+    def _rss(X, Y):
+        beta, _, rank, _ = np.linalg.lstsq(X, Y, rcond=None)
+        residuals = Y - X @ beta
+        return (residuals ** 2).sum(axis=0), rank
+
+    def _fit_rows(self, rows, Y):
+        """Sums of squares and degrees of freedom of every term for the response matrix Y (n x metrics)."""
+        intercept = np.ones((len(Y), 1))
+        blocks = [self._dummies(self.df[factor].to_numpy()[rows]) for factor in self.factors]
+        if len(blocks) == 1:
+            rss_null, rank_null = self._rss(intercept, Y)
+            rss_full, rank_full = self._rss(np.hstack([intercept, blocks[0]]), Y)
+            sums = [rss_null - rss_full]
+            dfs = [rank_full - rank_null]
+        else:
+            block_a, block_b = blocks
+            block_ab = (block_a[:, :, None] * block_b[:, None, :]).reshape(len(Y), -1)
+            rss_a, rank_a = self._rss(np.hstack([intercept, block_a]), Y)
+            rss_b, rank_b = self._rss(np.hstack([intercept, block_b]), Y)
+            rss_main, rank_main = self._rss(np.hstack([intercept, block_a, block_b]), Y)
+            rss_full, rank_full = self._rss(np.hstack([intercept, block_a, block_b, block_ab]), Y)
+            sums = [rss_b - rss_main, rss_a - rss_main, rss_main - rss_full]
+            dfs = [rank_main - rank_b, rank_main - rank_a, rank_full - rank_main]
+        # Differences of residual sums can dip below zero by rounding error when an effect is null
+        return np.maximum(np.array(sums), 0.0), np.array(dfs, dtype=float), rss_full, float(len(Y) - rank_full)
+
+    def _usable_rows(self):
+        return self.df[self.factors + self.required_columns].notna().all(axis=1).to_numpy()
+
+    def _row_patterns(self, values):
+        """(rows, metric columns) blocks: metrics with the same missing sessions share one solve."""
+        masks = ~np.isnan(values) & self._usable_rows()[:, None]
+        patterns, pattern_index = np.unique(masks, axis=1, return_inverse=True)
+        for pattern_number in range(patterns.shape[1]):
+            rows = patterns[:, pattern_number]
+            if rows.sum() > 0:
+                yield rows, np.flatnonzero(pattern_index.ravel() == pattern_number)
+
+    def fit(self, metrics, rank_transform=False):
+        """
+        Returns {metric: ANOVA table}. With rank_transform=True each metric is replaced by its
+        average ranks first (the rank-transformed ANOVA).
+        """
+        values = self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan)
+        tables = {}
+        for rows, columns in self._row_patterns(values):
+            Y = values[rows][:, columns]
+            if rank_transform:
+                Y = stats.rankdata(Y, axis=0, method='average')
+            sums, dfs, rss, df_resid = self._fit_rows(rows, Y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                f_values = (sums / dfs[:, None]) / (rss / df_resid)
+            p_values = stats.f.sf(f_values, dfs[:, None], df_resid)
+            for position, column in enumerate(columns):
+                tables[metrics[column]] = pd.DataFrame(
+                    {'sum_sq': list(sums[:, position]) + [rss[position]],
+                     'df': list(dfs) + [df_resid],
+                     'F': list(f_values[:, position]) + [np.nan],
+                     'PR(>F)': list(p_values[:, position]) + [np.nan]},
+                    index=self.terms + ['Residual'])
+        return tables
+
+    def summary(self, metrics, rank_transform=False):
+        """Tidy frame (Metric, Effect, F, P_Value, Partial_Eta_Squared) of every term of every metric."""
+        rows = []
+        for metric, table in self.fit(metrics, rank_transform).items():
+            for term in self.terms:
+                ss_effect = table.loc[term, 'sum_sq']
+                # ART tables carry the residual of the model each term was read from
+                ss_error = table.loc[term, 'resid_sum_sq'] if 'resid_sum_sq' in table.columns else \
+                    table.loc['Residual', 'sum_sq']
+                rows.append({'Metric': metric, 'Effect': term, 'F': table.loc[term, 'F'],
+                             'P_Value': table.loc[term, 'PR(>F)'],
+                             'Partial_Eta_Squared': ss_effect / (ss_effect + ss_error)
+                             if ss_effect + ss_error else np.nan})
+        return pd.DataFrame(rows)
+
+
+# --- Helper class for the Aligned Rank Transform (ART) ANOVA of many metrics at once ---
+class AlignedRankAnova(MultiResponseAnova):
+    """
+    Non-parametric factorial ANOVA by the Aligned Rank Transform (Wobbrock et al., 2011). For every
+    effect, each metric is stripped of all other effects (residual + estimated effect), ranked, and
+    the full factorial model is fitted to the ranks; only the effect aligned for is read off that
+    fit. The aligned ranks of every effect and metric are solved together against the shared design
+    matrices. Tables have one row per term ('C(f1)', 'C(f2)', 'C(f1):C(f2)') with sum_sq, df, F,
+    PR(>F) and the residual sum of squares/df of the model the term was read from.
+    contrast_ranks() gives the ART-C alignment (Elkin et al., 2021) used for post-hoc contrasts.
+    """
+
+    def _means(self, frame, factors):
+        """Per-row mean of every column over the rows sharing the levels of `factors` (NaN-aware)."""
+        if not factors:
+            return frame.mean().to_numpy()[None, :]
+        return frame.groupby([self.df[factor] for factor in factors], observed=True).transform('mean').to_numpy()
+
+    def _frame(self, metrics):
+        """Metric values of the usable rows (NaN elsewhere) as a frame aligned with df."""
+        values = self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan, copy=True)  # Never a view of df
+        values[~self._usable_rows()] = np.nan
+        return pd.DataFrame(values, index=self.df.index, columns=list(metrics))
+
+    @staticmethod
+    def _ranks(aligned):
+        """
+        Average ranks of every column (NaN stays NaN). Aligned values that differ only by rounding
+        noise (tied counts shifted by estimated effects) are ranked as the ties they are.
+        """
+        scale = np.abs(aligned).max(axis=0, where=~np.isnan(aligned), initial=0.0)
+        snapped = np.round(aligned / np.where(scale > 0, scale, 1.0), 9)
+        return stats.rankdata(snapped, axis=0, nan_policy='omit')
+
+    def _effect_estimates(self, frame):
+        """Estimated effect of every term (rows x metrics), in the order of self.terms."""
+        grand = self._means(frame, [])
+        if len(self.factors) == 1:
+            return [self._means(frame, self.factors) - grand]
+        mean_a, mean_b = self._means(frame, self.factors[:1]), self._means(frame, self.factors[1:])
+        mean_ab = self._means(frame, self.factors)
+        return [mean_a - grand, mean_b - grand, mean_ab - mean_a - mean_b + grand]
+
+    def aligned_ranks(self, metrics):
+        """{term: (rows x metrics) average ranks of the data aligned for that term} (NaN where unused)."""
+        frame = self._frame(metrics)
+        residuals = frame.to_numpy() - self._means(frame, self.factors)
+        return {term: self._ranks(residuals + effect)
+                for term, effect in zip(self.terms, self._effect_estimates(frame))}
+
+    def contrast_ranks(self, metrics, factors):
+        """
+        ART-C aligned ranks for contrasts among the levels of `factors` (one factor, or both for cell
+        comparisons): residual + the means of the `factors` levels, ranked. Returned as a frame with
+        the same index as df (NaN where a metric is unused), ready for Tukey's HSD.
+        """
+        frame = self._frame(metrics)
+        aligned = frame.to_numpy() - self._means(frame, self.factors) + self._means(frame, list(factors))
+        return pd.DataFrame(self._ranks(aligned), index=self.df.index, columns=list(metrics))
+
+    def fit(self, metrics, rank_transform=False):
+        """Returns {metric: ART ANOVA table} (rank_transform is implied and ignored)."""
+        ranks = self.aligned_ranks(metrics)
+        n_terms = len(self.terms)
+        tables = {}
+        for rows, columns in self._row_patterns(self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan)):
+            # One solve for all (term, metric) aligned responses of this missing-data pattern
+            Y = np.hstack([ranks[term][rows][:, columns] for term in self.terms])
+            sums, dfs, rss, df_resid = self._fit_rows(rows, Y)
+            n_columns = len(columns)
+            term_sums = np.array([sums[t, t * n_columns:(t + 1) * n_columns] for t in range(n_terms)])
+            term_rss = np.array([rss[t * n_columns:(t + 1) * n_columns] for t in range(n_terms)])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                f_values = (term_sums / dfs[:, None]) / (term_rss / df_resid)
+            p_values = stats.f.sf(f_values, dfs[:, None], df_resid)
+            for position, column in enumerate(columns):
+                tables[metrics[column]] = pd.DataFrame(
+                    {'sum_sq': term_sums[:, position], 'df': dfs, 'F': f_values[:, position],
+                     'PR(>F)': p_values[:, position], 'resid_sum_sq': term_rss[:, position],
+                     'resid_df': df_resid},
+                    index=self.terms)
+        return tables
+
+
+# --- Helper class for batched repeated-measures / mixed ANOVA of balanced within-subject designs ---
+PINGOUIN_COLUMN_NAMES = {'p_unc': 'p-unc', 'p_corr': 'p-corr', 'p_GG_corr': 'p-GG-corr', 'W_spher': 'W-spher',
+                         'p_spher': 'p-spher', 'p_adjust': 'p-adjust', 'cohen_d': 'cohen-d'}
+
+
+def normalize_pingouin_columns(table):
+    """Newer pingouin releases use underscores (p_unc); the analysis code reads the hyphenated names (p-unc)."""
+    return table.rename(columns=PINGOUIN_COLUMN_NAMES)
+
+
+class RepeatedMeasuresAnova(object):
+    """
+    One-way repeated-measures ANOVA (`within` only) or mixed ANOVA (`between` x `within`) of many
+    metrics at once. The data are pivoted once into a (subject x level x metric) array and every
+    sum of squares, F, p, partial eta-squared, Mauchly's test and the Greenhouse-Geisser /
+    Huynh-Feldt epsilons are computed with array operations. Tables follow pingouin's layout
+    (rm_anova / mixed_anova, interaction row 'Interaction'); like pingouin, a subject is only used
+    for the metrics it has a value for at every level.
+    fit() leaves out the metrics it cannot handle (several rows per subject and level, a subject in
+    several groups, too few subjects), which are then analyzed with pingouin.
+    """
+
+    def __init__(self, df, within, subject='animal_id', between=None):
+        self.df = df
+        self.within = within
+        self.subject = subject
+        self.between = between
+
+    @staticmethod
+    def _contrasts(k):
+        """Orthonormal contrasts (k x k-1) of a k-level within factor."""
+        q, _ = np.linalg.qr(np.hstack([np.ones((k, 1)), np.eye(k)[:, :k - 1]]))
+        return q[:, 1:]
+
+    def _layout(self):
+        """Subject/level codes of the usable rows, or None if the design is not one row per subject and level."""
+        columns = [self.subject, self.within] + ([self.between] if self.between else [])
+        usable = self.df[columns].notna().all(axis=1).to_numpy()
+        subject_codes, subjects = pd.factorize(self.df[self.subject].to_numpy()[usable])
+        level_codes, levels = pd.factorize(self.df[self.within].to_numpy()[usable], sort=True)
+        if len(levels) < 2 or len(subjects) < 3:
+            return None
+        cells = subject_codes * len(levels) + level_codes
+        if len(np.unique(cells)) != len(cells):
+            return None
+        group_codes = None
+        if self.between:
+            row_groups = pd.factorize(self.df[self.between].to_numpy()[usable], sort=True)[0]
+            group_codes = np.full(len(subjects), -1)
+            group_codes[subject_codes] = row_groups
+            if (group_codes[subject_codes] != row_groups).any():  # A subject listed in several groups
+                return None
+        return usable, subject_codes, level_codes, len(subjects), len(levels), group_codes
+
+    def fit(self, metrics):
+        """Returns {metric: ANOVA table} for the metrics the balanced engine could fit."""
+        layout = self._layout()
+        if layout is None:
+            return {}
+        usable, subject_codes, level_codes, n_subjects, k, group_codes = layout
+        values = self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan)[usable]
+        cube = np.full((n_subjects, k, len(metrics)), np.nan)
+        cube[subject_codes, level_codes] = values
+        complete = ~np.isnan(cube).any(axis=1)  # (subjects x metrics): value at every level
+
+        tables = {}
+        patterns, pattern_index = np.unique(complete, axis=1, return_inverse=True)
+        for pattern_number in range(patterns.shape[1]):
+            subjects_used = patterns[:, pattern_number]
+            columns = np.flatnonzero(pattern_index.ravel() == pattern_number)
+            groups = group_codes[subjects_used] if group_codes is not None else None
+            n_groups = len(np.unique(groups)) if groups is not None else 1
+            if subjects_used.sum() - n_groups < 2 or (groups is not None and n_groups < 2):
+                continue
+            Y = cube[subjects_used][:, :, columns]
+            table_rows = self._mixed(Y, groups) if groups is not None else self._one_way(Y)
+            for position, column in enumerate(columns):
+                tables[metrics[column]] = pd.DataFrame(
+                    [{key: (value[position] if isinstance(value, np.ndarray) else value) for key, value in row.items()}
+                     for row in table_rows])
+        return tables
+
+    def _sphericity(self, residuals, df_resid):
+        """GG/HF epsilons and Mauchly's W and p of every metric from (subjects x levels x metrics) residuals."""
+        n, k, m = residuals.shape
+        d = k - 1
+        if d == 1:  # Sphericity always holds with two levels
+            ones = np.ones(m)
+            return ones, ones, np.full(m, np.nan), ones
+        z = np.einsum('nkm,kd->mnd', residuals - residuals.mean(axis=0), self._contrasts(k))
+        cov = np.einsum('mnd,mne->mde', z, z) / (n - 1)
+        trace = np.trace(cov, axis1=1, axis2=2)
+        trace_sq = np.trace(cov @ cov, axis1=1, axis2=2)
+        eps_gg = np.minimum(trace ** 2 / (d * trace_sq), 1.0)
+        eps_hf = np.minimum(((df_resid + 1) * d * eps_gg - 2) / (d * (df_resid - d * eps_gg)), 1.0)
+        sign, logdet = np.linalg.slogdet(cov)
+        log_w = np.where(sign > 0, logdet - d * np.log(trace / d), -np.inf)
+        # Same chi-square approximation as R's mauchly.test (and pingouin)
+        ddof = d * (d + 1) / 2 - 1
+        f = 1 - (2 * d ** 2 + d + 2) / (6 * d * df_resid)
+        w2 = (d + 2) * (d - 1) * (d - 2) * (2 * d ** 3 + 6 * d ** 2 + 3 * k + 2) / (288 * (df_resid * d * f) ** 2)
+        chi_sq = -df_resid * f * log_w
+        p1, p2 = stats.chi2.sf(chi_sq, ddof), stats.chi2.sf(chi_sq, ddof + 4)
+        return eps_gg, eps_hf, np.exp(log_w), p1 + w2 * (p2 - p1)
+
+    @staticmethod
+    def _corrected(f_values, ddof1, ddof2, eps):
+        return stats.f.sf(f_values, np.maximum(ddof1 * eps, 1.0), np.maximum(ddof2 * eps, 1.0))
+
+    def _one_way(self, Y):
+        n, k, _ = Y.shape
+        grand_mean = Y.mean(axis=(0, 1))
+        level_means = Y.mean(axis=0)
+        ss_with = n * ((level_means - grand_mean) ** 2).sum(axis=0)
+        ss_resall = ((Y - level_means) ** 2).sum(axis=(0, 1))
+        ss_resbetw = k * ((Y.mean(axis=1) - grand_mean) ** 2).sum(axis=0)
+        ss_reswith = ss_resall - ss_resbetw
+        ddof1, ddof2 = k - 1, (k - 1) * (n - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f_values = (ss_with / ddof1) / (ss_reswith / ddof2)
+            np2 = ss_with / (ss_with + ss_reswith)
+        eps_gg, eps_hf, w_spher, p_spher = self._sphericity(Y, n - 1)
+        return [{'Source': self.within, 'ddof1': ddof1, 'ddof2': ddof2, 'F': f_values,
+                 'p-unc': stats.f.sf(f_values, ddof1, ddof2),
+                 'p-GG-corr': self._corrected(f_values, ddof1, ddof2, eps_gg),
+                 'p-HF-corr': self._corrected(f_values, ddof1, ddof2, eps_hf), 'np2': np2, 'eps': eps_gg,
+                 'eps-HF': eps_hf, 'sphericity': p_spher > 0.05, 'W-spher': w_spher, 'p-spher': p_spher}]
+
+    def _mixed(self, Y, groups):
+        n, k, _ = Y.shape
+        group_ids, groups = np.unique(groups, return_inverse=True)
+        one_hot = np.eye(len(group_ids))[groups]
+        group_sizes = one_hot.sum(axis=0)
+        grand_mean = Y.mean(axis=(0, 1))
+        cell_means = np.einsum('ng,nkm->gkm', one_hot, Y) / group_sizes[:, None, None]
+        ss_total = ((Y - grand_mean) ** 2).sum(axis=(0, 1))
+        ss_betw = ((cell_means.mean(axis=1) - grand_mean) ** 2 * (group_sizes * k)[:, None]).sum(axis=0)
+        ss_with = n * ((Y.mean(axis=0) - grand_mean) ** 2).sum(axis=0)
+        residuals = Y - cell_means[groups]
+        ss_resall = (residuals ** 2).sum(axis=(0, 1))
+        ss_inter = ss_total - (ss_resall + ss_with + ss_betw)
+        ss_subj = k * ((Y.mean(axis=1) - grand_mean) ** 2).sum(axis=0)
+        ss_resbetw = ss_subj - ss_betw
+        ss_reswith = ss_total - (ss_with + ss_subj + ss_inter)
+
+        df_betw, df_with = len(group_ids) - 1, k - 1
+        df_resbetw = n - len(group_ids)
+        df_inter, df_reswith = df_with * df_betw, df_with * df_resbetw
+        # Epsilons and Mauchly's test use the pooled within-group covariance (as pingouin, SPSS, car)
+        eps_gg, eps_hf, w_spher, p_spher = self._sphericity(residuals, df_resbetw)
+        rows = []
+        for source, ss, ddof1, ss_err, ddof2 in [(self.between, ss_betw, df_betw, ss_resbetw, df_resbetw),
+                                                 (self.within, ss_with, df_with, ss_reswith, df_reswith),
+                                                 ('Interaction', ss_inter, df_inter, ss_reswith, df_reswith)]:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                f_values = (ss / ddof1) / (ss_err / ddof2)
+                np2 = ss / (ss + ss_err)
+            is_within = source != self.between
+            nan = np.full_like(ss, np.nan)
+            rows.append({'Source': source, 'SS': ss, 'DF1': ddof1, 'DF2': ddof2, 'MS': ss / ddof1, 'F': f_values,
+                         'p-unc': stats.f.sf(f_values, ddof1, ddof2),
+                         'p-GG-corr': self._corrected(f_values, ddof1, ddof2, eps_gg) if is_within else nan,
+                         'p-HF-corr': self._corrected(f_values, ddof1, ddof2, eps_hf) if is_within else nan,
+                         'np2': np2, 'eps': eps_gg if is_within else nan, 'eps-HF': eps_hf if is_within else nan,
+                         'sphericity': p_spher > 0.05 if is_within else nan,
+                         'W-spher': w_spher if is_within else nan, 'p-spher': p_spher if is_within else nan})
+        return rows
+
+
+# --- Helper function for the studentized-range p-values of Tukey's HSD (vectorized over all q) ---
+_SRANGE_Z = np.linspace(-8.5, 8.5, 97)
+
+
+def studentized_range_sf(q, k, dof, chunk=256):
+    """
+    P(Q > q) of the studentized range of k means with dof error degrees of freedom, for an array of q.
+    Same integral as scipy.stats.studentized_range.sf (agrees to ~1e-10), but evaluated on a fixed
+    quadrature grid for all q at once instead of one adaptive integration per value.
+    """
+    q = np.asarray(q, dtype=float)
+    if k == 2:  # Exact: the range of two means is sqrt(2) |t|
+        return 2 * stats.t.sf(q / np.sqrt(2), dof)
+    # Outer integral over the log of s = sqrt(chi2(dof) / dof), inner one over the standard normal z
+    half = dof / 2.0
+    center = 0.5 * (special.digamma(half) - np.log(half))
+    spread = 0.5 * np.sqrt(special.polygamma(1, half))
+    log_s = np.linspace(center - 30 * spread, center + 12 * spread, 161)
+    s = np.exp(log_s)
+    weights = np.exp(stats.chi2.logpdf(dof * s ** 2, dof) + np.log(2 * dof * s ** 2)) * (log_s[1] - log_s[0])
+    cdf_z = special.ndtr(_SRANGE_Z)
+    pdf_z = stats.norm.pdf(_SRANGE_Z) * (_SRANGE_Z[1] - _SRANGE_Z[0])
+    flat = q.ravel()
+    out = np.empty(flat.size)
+    for start in range(0, flat.size, chunk):
+        shifted = _SRANGE_Z - flat[start:start + chunk, None, None] * s[None, :, None]
+        inner = cdf_z ** (k - 1) - (cdf_z - special.ndtr(shifted)) ** (k - 1)
+        out[start:start + chunk] = (k * (inner * pdf_z).sum(axis=2)) @ weights
+    return np.clip(out, 0.0, 1.0).reshape(q.shape)
+
+
+# --- Helper class for post-hoc comparisons of many metrics at once (tidy frames, no per-row parsing) ---
+class PairwiseComparisons(object):
+    """
+    Post-hoc comparisons between the levels of `group` (a column, or a list of columns whose levels are
+    combined as 'A x B') for many metrics at once. Tukey HSD and paired t-tests are computed for every
+    metric and level pair in one broadcasted step. Each method returns a tidy frame with one row per
+    (Metric, A, B) and an adjusted p-value in 'p-corr'. Levels follow the category order of the data.
+    Rows without a level of `group` are left out. Tukey HSD and Mann-Whitney leave a row out only of the
+    metrics it has no value for. Paired t-tests first average each subject's rows per level. A subject
+    missing a metric at any level is then left out of every pair of that metric. Comparisons with no
+    computable p-value (a level without values) are not reported.
+    Bonferroni families: the pairs of one metric or, with `by` (simple effects), the pairs of one
+    metric within one level of `by`, as a separate pingouin call per subset corrected them.
+    """
+
+    def __init__(self, df, group, subject='animal_id', required_columns=()):
+        columns = list(group) if isinstance(group, (list, tuple)) else [group]
+        usable = df[columns + [col for col in required_columns if col in df.columns]].notna().all(axis=1)
+        self.df = df[usable]
+        self.subject = subject
+        if len(columns) == 1:
+            labels = self.df[columns[0]]
+            levels = self._levels(labels)
+        else:
+            labels = self.df[columns[0]].astype(str).str.cat([self.df[col].astype(str) for col in columns[1:]],
+                                                             sep=' x ')
+            combos = self.df[columns].drop_duplicates().sort_values(columns)
+            levels = list(combos[columns[0]].astype(str).str.cat([combos[col].astype(str) for col in columns[1:]],
+                                                                 sep=' x '))
+        self.levels = levels
+        self.codes = pd.Categorical(labels, categories=levels).codes
+
+    @staticmethod
+    def _levels(labels):
+        if isinstance(labels.dtype, pd.CategoricalDtype):
+            return [level for level in labels.cat.categories if (labels == level).any()]
+        return sorted(labels.unique())
+
+    def _pairs(self):
+        return np.triu_indices(len(self.levels), 1)
+
+    def _tidy(self, metrics, first, second, columns, by=None):
+        """Frame of (pairs x metrics) arrays, keeping only the comparisons that could be computed."""
+        levels = np.array(self.levels, dtype=object)
+        n_pairs, n_metrics = len(first), len(metrics)
+        table = pd.DataFrame({'Metric': np.tile(np.asarray(metrics, dtype=object), n_pairs)})
+        if by is not None:
+            table[by[0]] = by[1]
+        table['A'] = np.repeat(levels[first], n_metrics)
+        table['B'] = np.repeat(levels[second], n_metrics)
+        for name, values in columns.items():
+            table[name] = np.broadcast_to(values, (n_pairs, n_metrics)).ravel()
+        return table
+
+    def tukey_hsd(self, metrics, alpha=0.05):
+        """Tukey HSD of every metric (as statsmodels' pairwise_tukeyhsd; diff is mean(B) - mean(A))."""
+        values = self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan)
+        present = ~np.isnan(values)
+        one_hot = (self.codes[:, None] == np.arange(len(self.levels))[None, :]).astype(float)
+        filled = np.where(present, values, 0.0)
+        counts = one_hot.T @ present  # (levels x metrics)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = (one_hot.T @ filled) / counts
+            residuals = np.where(present, filled - one_hot @ np.nan_to_num(means), 0.0)
+            n_groups = (counts > 0).sum(axis=0)
+            dof = counts.sum(axis=0) - n_groups
+            mse = (residuals ** 2).sum(axis=0) / dof
+            first, second = self._pairs()
+            diff = means[second] - means[first]
+            se = np.sqrt(mse / 2 * (1 / counts[first] + 1 / counts[second]))
+            q = np.abs(diff) / se
+        usable = (n_groups >= 2) & (dof > 0)
+        p_values = np.full_like(q, np.nan)
+        q_crit = np.full(len(metrics), np.nan)
+        # Metrics sharing (k, dof) share one evaluation of the studentized range
+        for k, df_resid in set(zip(n_groups[usable], dof[usable])):
+            columns = usable & (n_groups == k) & (dof == df_resid)
+            p_values[:, columns] = studentized_range_sf(q[:, columns], k, df_resid)
+            q_crit[columns] = np.sqrt(2) * stats.t.ppf(1 - alpha / 2, df_resid) if k == 2 else \
+                stats.studentized_range.ppf(1 - alpha, k, df_resid)
+        table = self._tidy(metrics, first, second,
+                           {'diff': diff, 'se': se, 'q': q, 'dof': dof, 'p-corr': np.minimum(p_values, 1.0),
+                            'lower': diff - q_crit * se, 'upper': diff + q_crit * se})
+        table['reject'] = table['p-corr'] < alpha
+        return table.dropna(subset=['p-corr']).reset_index(drop=True)
+
+    def paired_tests(self, metrics, by=None):
+        """
+        Paired t-tests between the within-subject levels of every metric, Bonferroni-corrected per metric
+        (with `by`, separately within every level of that between-subject column: the simple effects).
+        As pingouin's pairwise_tests, subjects without a value at every level are left out (listwise)
+        and cohen-d uses the average SD.
+        """
+        keys = [self.subject] + ([by] if by else [])
+        level_codes = pd.Series(self.codes, index=self.df.index, name='__level__')
+        cell_means = self.df[list(metrics)].groupby([self.df[key] for key in keys] + [level_codes],
+                                                    observed=True).mean()
+        wide = cell_means.unstack('__level__').reindex(
+            columns=pd.MultiIndex.from_product([list(metrics), range(len(self.levels))]))
+        cube = wide.to_numpy(dtype=float).reshape(len(wide), len(metrics), len(self.levels))
+        complete = ~np.isnan(cube).any(axis=2)
+        first, second = self._pairs()
+        by_values = wide.index.get_level_values(by).to_numpy() if by else np.zeros(len(wide))
+        tables = []
+        for by_value in (self._levels(self.df[by]) if by else [0.0]):
+            rows = by_values == by_value
+            mask = complete[rows][:, :, None]
+            x, y = cube[rows][:, :, first], cube[rows][:, :, second]  # (subjects x metrics x pairs)
+            n = mask.sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean_x = np.where(mask, x, 0.0).sum(axis=0) / n
+                mean_y = np.where(mask, y, 0.0).sum(axis=0) / n
+                var_x = np.where(mask, (x - mean_x) ** 2, 0.0).sum(axis=0) / (n - 1)
+                var_y = np.where(mask, (y - mean_y) ** 2, 0.0).sum(axis=0) / (n - 1)
+                diff = x - y
+                mean_diff = mean_x - mean_y
+                var_diff = np.where(mask, (diff - mean_diff) ** 2, 0.0).sum(axis=0) / (n - 1)
+                t_values = mean_diff / np.sqrt(var_diff / n)
+                cohen_d = mean_diff / np.sqrt((var_x + var_y) / 2)
+            p_values = 2 * stats.t.sf(np.abs(t_values), n - 1)
+            tables.append(self._tidy(metrics, first, second,
+                                     {'n': n.T, 'T': t_values.T, 'dof': (n - 1).T, 'p-unc': p_values.T,
+                                      'cohen-d': cohen_d.T},
+                                     by=(by, by_value) if by else None))
+        table = pd.concat(tables, ignore_index=True).dropna(subset=['p-unc'])
+        n_tests = table.groupby(['Metric', by] if by else 'Metric', observed=True)['p-unc'].transform('size')
+        table['p-corr'] = np.minimum(table['p-unc'] * n_tests, 1.0)
+        return table.reset_index(drop=True)
+
+    def mann_whitney(self, metrics, by=None):
+        """
+        Pairwise Mann-Whitney U tests with the rank-biserial correlation, Bonferroni-corrected per metric
+        (with `by`, separately within every level of that column: the simple effects).
+        """
+        values = self.df[list(metrics)].to_numpy(dtype=float, na_value=np.nan)
+        first, second = self._pairs()
+        by_values = self.df[by].to_numpy() if by else np.zeros(len(self.df))
+        tables = []
+        for by_value in (self._levels(self.df[by]) if by else [0.0]):
+            rows = by_values == by_value
+            u_values = np.full((len(first), len(metrics)), np.nan)
+            p_values = np.full_like(u_values, np.nan)
+            sizes = np.zeros_like(u_values)
+            for pair, (a, b) in enumerate(zip(first, second)):
+                x, y = values[rows & (self.codes == a)], values[rows & (self.codes == b)]
+                n_x, n_y = (~np.isnan(x)).sum(axis=0), (~np.isnan(y)).sum(axis=0)
+                testable = (n_x > 0) & (n_y > 0)
+                if testable.any():
+                    result = stats.mannwhitneyu(x[:, testable], y[:, testable], alternative='two-sided', axis=0,
+                                                nan_policy='omit')
+                    u_values[pair, testable] = result.statistic
+                    p_values[pair, testable] = result.pvalue
+                sizes[pair] = n_x * n_y
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rbc = 2 * u_values / sizes - 1  # pingouin's sign: positive when A ranks higher
+            tables.append(self._tidy(metrics, first, second, {'U-val': u_values, 'p-unc': p_values, 'RBC': rbc},
+                                     by=(by, by_value) if by else None))
+        table = pd.concat(tables, ignore_index=True).dropna(subset=['p-unc'])
+        n_tests = table.groupby(['Metric', by] if by else 'Metric', observed=True)['p-unc'].transform('size')
+        table['p-corr'] = np.minimum(table['p-unc'] * n_tests, 1.0)
+        return table.reset_index(drop=True)
+
+
+# --- Helper function for family-wide multiple-comparison correction of a combined results table ---
+def adjust_p_values_family(p_values, families=None, method='fdr_bh'):
+    """
+    Adjusted p-values corrected within each family (rows sharing the same `families` value; a single
+    family if None). method: 'fdr_bh' (Benjamini-Hochberg), 'fdr_by' (Benjamini-Yekutieli) or 'holm'.
+    All families are handled in one sorted pass; NaN p-values stay NaN and are not counted.
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    codes = pd.factorize(pd.Series(families))[0] if families is not None else np.zeros(len(p_values), dtype=int)
+    valid = np.flatnonzero(~np.isnan(p_values) & (codes >= 0))
+    order = valid[np.lexsort((p_values[valid], codes[valid]))]  # By family, then ascending p
+    family, p_sorted = codes[order], p_values[order]
+    grouped = pd.Series(family).groupby(family)
+    size = grouped.transform('size').to_numpy()
+    rank = grouped.cumcount().to_numpy() + 1
+    if method == 'holm':  # Step-down: running maximum from the smallest p
+        adjusted = pd.Series((size - rank + 1) * p_sorted).groupby(family).cummax().to_numpy()
+    elif method in ('fdr_bh', 'fdr_by'):  # Step-up: running minimum from the largest p
+        scaled = p_sorted * size / rank
+        if method == 'fdr_by':
+            harmonic = np.cumsum(1.0 / np.arange(1, size.max() + 1)) if len(size) else np.zeros(0)
+            scaled = scaled * harmonic[size - 1]
+        adjusted = pd.Series(scaled[::-1]).groupby(family[::-1]).cummin().to_numpy()[::-1]
+    else:
+        raise ValueError(f"Unknown correction method: {method}")
+    result = np.full(len(p_values), np.nan)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+# --- Helper functions for the descriptive-statistics cube (every subset of the grouping variables) ---
+DESCRIPTIVE_STATISTICS = ['count', 'mean', 'std', 'min', 'max', 'median', 'sem']
+
+
+def build_descriptive_cube(df, metrics, grouping_vars):
+    """
+    Rollup cube of the descriptive statistics: for every subset of `grouping_vars` (including the
+    empty one) a single groupby computes all DESCRIPTIVE_STATISTICS of all `metrics`.
+    Returns {tuple(subset): frame with (metric, statistic) columns}, subsets in `grouping_vars` order.
+    """
+    cube = {}
+    for size in range(len(grouping_vars) + 1):
+        for subset in combinations(grouping_vars, size):
+            # The empty subset groups every row under one 'All' key
+            keys = list(subset) if subset else np.zeros(len(df), dtype=int)
+            grouped = df.groupby(keys, observed=True)[metrics]
+            table = pd.concat({stat: getattr(grouped, stat)() for stat in DESCRIPTIVE_STATISTICS}, axis=1)
+            table = table.swaplevel(axis=1).reindex(columns=pd.MultiIndex.from_product([metrics,
+                                                                                        DESCRIPTIVE_STATISTICS]))
+            cube[subset] = table if subset else table.rename(index={0: 'All'})
+    return cube
+
+
+def descriptive_cube_lookup(cube, metric, grouping_vars):
+    """The descriptive table of one metric by `grouping_vars` (in that order), read from the cube."""
+    key = next(subset for subset in cube if set(subset) == set(grouping_vars) and len(subset) == len(grouping_vars))
+    table = cube[key][metric]
+    if list(key) != list(grouping_vars):
+        table = table.reorder_levels(list(grouping_vars)).sort_index()
+    return table
+
+
+def descriptive_cube_long(cube, grouping_vars):
+    """Flattens the whole cube into one table: a row per (subset, group, metric), 'All' for rolled-up variables."""
+    frames = []
+    for subset, table in cube.items():
+        df_long = table.stack(level=0, future_stack=True).rename_axis(list(table.index.names)[:len(subset)] +
+                                                                      ['Metric'] if subset else [None, 'Metric'])
+        df_long = df_long.reset_index()
+        if not subset:
+            df_long = df_long.drop(columns=df_long.columns[0])
+        for var in grouping_vars:
+            if var not in subset:
+                df_long[var] = 'All'
+        df_long.insert(0, 'Grouping', ' x '.join(subset) or 'Overall')
+        frames.append(df_long[['Grouping'] + list(grouping_vars) + ['Metric'] + DESCRIPTIVE_STATISTICS])
+    df_cube = pd.concat(frames, ignore_index=True)
+    return df_cube.rename(columns={'sem': 'standard_error_of_mean'})
+
+
+# --- Helper class for the local SQLite catalog of sessions (query by factor without rereading CSVs) ---
+class SessionCatalog(object):
+    """
+    Local SQLite store of loaded cohorts: one row per session (metadata), its aggregated metrics in
+    long format (so cohorts with different Label_* columns can live side by side) and, optionally,
+    the accepted calls. Sessions are indexed on animal_id, Timepoint, Sex and Genotype.
+    """
+    SESSION_COLUMNS = ['cohort', 'animal_id', 'Timepoint', 'Sex', 'Genotype', 'Filename']
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                cohort TEXT, animal_id TEXT, Timepoint TEXT, Sex TEXT, Genotype TEXT, Filename TEXT,
+                PRIMARY KEY (cohort, animal_id, Timepoint));
+            CREATE TABLE IF NOT EXISTS session_metrics (
+                cohort TEXT, animal_id TEXT, Timepoint TEXT, variant TEXT, metric TEXT, value REAL,
+                PRIMARY KEY (cohort, animal_id, Timepoint, variant, metric));
+            CREATE INDEX IF NOT EXISTS idx_sessions_animal_id ON sessions (animal_id);
+            CREATE INDEX IF NOT EXISTS idx_sessions_timepoint ON sessions (Timepoint);
+            CREATE INDEX IF NOT EXISTS idx_sessions_sex ON sessions (Sex);
+            CREATE INDEX IF NOT EXISTS idx_sessions_genotype ON sessions (Genotype);
+        """)
+
+    def store_cohort(self, cohort, aggregated_variants, df_meta, df_calls=None):
+        """Replaces everything stored for `cohort`. `aggregated_variants` maps variant name -> aggregated frame."""
+        with self.connection:
+            self.connection.execute("DELETE FROM sessions WHERE cohort = ?", (cohort,))
+            self.connection.execute("DELETE FROM session_metrics WHERE cohort = ?", (cohort,))
+            if self._has_table('calls'):
+                self.connection.execute("DELETE FROM calls WHERE cohort = ?", (cohort,))
+
+            df_all = aggregated_variants['all']
+            df_sessions = df_all[['animal_id', 'Timepoint']].merge(
+                df_meta.drop_duplicates(subset=['animal_id', 'Timepoint']), on=['animal_id', 'Timepoint'], how='left')
+            df_sessions = df_sessions.reindex(columns=self.SESSION_COLUMNS[1:]).assign(cohort=cohort)
+            df_sessions[self.SESSION_COLUMNS].astype(object).where(df_sessions.notna(), None).to_sql(
+                'sessions', self.connection, if_exists='append', index=False)
+
+            for variant, df_variant in aggregated_variants.items():
+                metric_cols = [c for c in df_variant.columns
+                               if c not in self.SESSION_COLUMNS and pd.api.types.is_numeric_dtype(df_variant[c])]
+                df_long = df_variant.melt(id_vars=['animal_id', 'Timepoint'], value_vars=metric_cols,
+                                          var_name='metric', value_name='value').dropna(subset=['value'])
+                df_long.assign(cohort=cohort, variant=variant).to_sql(
+                    'session_metrics', self.connection, if_exists='append', index=False)
+
+            if df_calls is not None:
+                df_calls = df_calls.assign(cohort=cohort)
+                self._add_call_columns(df_calls)
+                df_calls.to_sql('calls', self.connection, if_exists='append', index=False, chunksize=50000)
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_calls_session ON calls (cohort, animal_id, Timepoint)")
+
+    def _has_table(self, name):
+        return self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                       (name,)).fetchone() is not None
+
+    def _add_call_columns(self, df_calls):
+        """
+        Adds the columns of `df_calls` the calls table does not have yet (e.g. Is_Outlier, or an extra
+        column of another export), so cohorts with different call columns share it; missing ones stay NULL.
+        """
+        if not self._has_table('calls'):
+            return  # Created by to_sql from this frame
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(calls)")}
+        for column in df_calls.columns:
+            if column not in existing:
+                dtype = df_calls[column].dtype
+                kind = ('INTEGER' if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype)
+                        else 'REAL' if pd.api.types.is_float_dtype(dtype) else 'TEXT')
+                quoted = '"' + str(column).replace('"', '""') + '"'
+                self.connection.execute(f"ALTER TABLE calls ADD COLUMN {quoted} {kind}")
+
+    def _where(self, cohorts, filters):
+        clauses, params = [], []
+        for column, values in [('cohort', cohorts)] + list(filters.items()):
+            if values:
+                values = [values] if isinstance(values, str) else list(values)
+                clauses.append(f"s.{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def cohorts(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT cohort FROM sessions ORDER BY cohort")]
+
+    def distinct_values(self, column, cohorts=None):
+        where, params = self._where(cohorts, {})
+        return [row[0] for row in self.connection.execute(
+            f"SELECT DISTINCT s.{column} FROM sessions s{where} ORDER BY s.{column}", params) if row[0] is not None]
+
+    def query(self, cohorts=None, variant='all', **filters):
+        """
+        Returns the aggregated (wide) frame of the sessions matching the filters, e.g.
+        query(Sex='F', Genotype='MUT', Timepoint=['P6']). Metric columns keep their original order.
+        """
+        where, params = self._where(cohorts, filters)
+        df_sessions = pd.read_sql_query(f"SELECT s.* FROM sessions s{where}", self.connection, params=params)
+        join_where = where + (" AND " if where else " WHERE ") + "m.variant = ?"
+        df_long = pd.read_sql_query(
+            "SELECT m.cohort, m.animal_id, m.Timepoint, m.metric, m.value FROM session_metrics m "
+            "JOIN sessions s ON s.cohort = m.cohort AND s.animal_id = m.animal_id AND s.Timepoint = m.Timepoint"
+            f"{join_where} ORDER BY m.rowid", self.connection, params=params + [variant])
+        df_wide = df_long.pivot_table(index=['cohort', 'animal_id', 'Timepoint'], columns='metric', values='value',
+                                      aggfunc='first', sort=False).reindex(columns=pd.unique(df_long['metric']))
+        df_wide.columns.name = None
+        return df_sessions.merge(df_wide.reset_index(), on=['cohort', 'animal_id', 'Timepoint'], how='left')
+
+    def query_calls(self, cohorts=None, **filters):
+        """Call-level rows of the matching sessions (empty if no calls were stored)."""
+        if not self._has_table('calls'):
+            return pd.DataFrame()
+        where, params = self._where(cohorts, filters)
+        return pd.read_sql_query(
+            "SELECT c.* FROM calls c JOIN sessions s ON s.cohort = c.cohort AND s.animal_id = c.animal_id "
+            f"AND s.Timepoint = c.Timepoint{where}", self.connection, params=params)
+
+
+# --- Helper class recording wall time, CPU time and peak memory of the pipeline stages ---
+def peak_memory_mb():
+    """Peak resident memory of the process so far (MB), or None where it cannot be read."""
+    try:
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # Bytes on macOS, KiB elsewhere
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                        'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                     ctypes.byref(counters), counters.cb)
+            return counters.PeakWorkingSetSize / 2 ** 20
+    except Exception:
+        pass
+    return None
+
+
+class PerfRecorder(object):
+    """
+    Lightweight spans around the pipeline stages. Spans nest (those opened in worker threads nest
+    under the GUI thread's current span) and are accumulated by path, so a stage run once per file
+    or per metric is one row with its call count. CPU time is the whole process's on the GUI thread
+    (it includes the workers it waits for) and the thread's own in workers; memory is the process
+    peak at the end of the stage and how much the stage raised it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._main_stack = self._stack()
+        self.reset()
+
+    def __getstate__(self):
+        """The stages are pickled; the lock and the per-thread span stacks are made anew on unpickling."""
+        state = self.__dict__.copy()
+        for name in ('_lock', '_local', '_main_stack'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._main_stack = self._stack()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}  # Path -> totals, in the order the stages first started
+            self.started = datetime.now()
+            self._started_clock = time.perf_counter()
+
+    def elapsed(self):
+        """Wall time since the recorder was (re)started."""
+        return time.perf_counter() - self._started_clock
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name):
+        stack = self._stack()
+        parents = stack or (self._main_stack[-1:] if stack is not self._main_stack else [])
+        path = f"{parents[-1]} / {name}" if parents else name
+        with self._lock:
+            stage = self.stages.setdefault(path, {
+                'stage': path, 'name': name, 'depth': path.count(' / '), 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                'max_wall_s': 0.0, 'peak_memory_mb': None, 'memory_growth_mb': None})
+        cpu_clock = time.process_time if threading.current_thread() is threading.main_thread() else time.thread_time
+        stack.append(path)
+        memory_before = peak_memory_mb()
+        wall_start, cpu_start = time.perf_counter(), cpu_clock()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, cpu_clock() - cpu_start
+            memory_after = peak_memory_mb()
+            stack.pop()
+            with self._lock:
+                stage['calls'] += 1
+                stage['wall_s'] += wall
+                stage['cpu_s'] += cpu
+                stage['max_wall_s'] = max(stage['max_wall_s'], wall)
+                if memory_after is not None:
+                    stage['peak_memory_mb'] = max(stage['peak_memory_mb'] or 0.0, memory_after)
+                    stage['memory_growth_mb'] = (stage['memory_growth_mb'] or 0.0) + memory_after - memory_before
+
+    def rows(self):
+        with self._lock:
+            return [dict(stage) for stage in self.stages.values() if stage['calls']]
+
+    def save(self, path, **context):
+        """Writes the run profile (stages plus `context`) as JSON."""
+        profile = {'started': self.started.isoformat(timespec='seconds'),
+                   'saved': datetime.now().isoformat(timespec='seconds'),
+                   'context': context, 'total_wall_s': self.elapsed(), 'peak_memory_mb': peak_memory_mb(),
+                   'stages': self.rows()}
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2, default=str)
+
+
+# --- Helper class tracking the progress of long jobs (loading, batch analyses) from any thread ---
+class ProgressTracker(object):
+    """Done/total counters of the current job, with its rate and ETA. Any thread may update it; the app draws it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.description, self.unit = "", ""
+        self.done, self.total = 0, 0
+        self.started = None
+        self.active = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def start(self, description, total=0, unit='items'):
+        with self._lock:
+            self.description, self.unit = description, unit
+            self.done, self.total = 0, total
+            self.started = time.perf_counter()
+            self.active = True
+
+    def advance(self, n=1):
+        with self._lock:
+            self.done += n
+
+    def update(self, done, total=None):
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+
+    def finish(self):
+        with self._lock:
+            self.active = False
+
+    def snapshot(self):
+        """Fraction done, rate (units/s) and ETA (s, None while unknown) of the current job."""
+        with self._lock:
+            elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            eta = (self.total - self.done) / rate if rate > 0 and self.total > self.done else None
+            return {'description': self.description, 'unit': self.unit, 'done': self.done, 'total': self.total,
+                    'fraction': min(1.0, self.done / self.total) if self.total else 0.0, 'rate': rate,
+                    'eta_s': eta, 'active': self.active}
+
+    def describe(self):
+        """E.g. 'Aggregation: 120/1000 files, 85.3 files/s, ETA 0:10' ('' when no job is running)."""
+        progress = self.snapshot()
+        if not progress['active']:
+            return ""
+        text = f"{progress['description']}: {progress['done']}/{progress['total'] or '?'} {progress['unit']}"
+        if progress['rate'] > 0:
+            text += f", {progress['rate']:.1f} {progress['unit']}/s"
+        if progress['eta_s'] is not None:
+            minutes, seconds = divmod(int(round(progress['eta_s'])), 60)
+            text += f", ETA {minutes}:{seconds:02d}"
+        return text
+
+
+# --- Helper class holding the loading and analysis options as plain values ---
+class AnalysisOptions(object):
+    """
+    The options of the Data Input and Analysis Options tabs by name. `subset_filters` maps a factor
+    to the level analyzed (factors not in it: every level).
+    """
+    DEFAULTS = {'flag_outliers': False, 'outlier_threshold': 3.5, 'store_calls': False, 'exclude_outliers': False,
+                'subset_filters': {}, 'assumption_policy': 'Ask', 'correction_method': 'Benjamini-Hochberg (FDR)',
+                'correction_family': 'Per metric', 'profile_run': False}
+
+    def __init__(self, **options):
+        for name, value in self.DEFAULTS.items():
+            setattr(self, name, dict(value) if isinstance(value, dict) else value)
+        self.update(**options)
+
+    def update(self, **options):
+        for name, value in options.items():
+            if name not in self.DEFAULTS:
+                raise TypeError(f"Unknown option '{name}'")
+            setattr(self, name, value)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+
+# --- Helper class with the callbacks through which loading and analyses report (a stream without a window) ---
+class Reporter(object):
+    """
+    Callbacks of loading and analyses: log(message), status(message), progress(tracker, force) with
+    the ProgressTracker of the running job, notify(kind, title, message) for what needs attention
+    (kind 'info', 'warning' or 'error') and validation_report(text) with the pre-flight report.
+    Those not given write to `stream` (stdout), where the print() output of analyses goes too:
+    the status is only kept (too frequent) and the progress printed every PROGRESS_INTERVAL_S.
+    """
+    PROGRESS_INTERVAL_S = 5
+
+    def __init__(self, stream=None, log=None, status=None, progress=None, notify=None, validation_report=None):
+        self.stream = stream
+        self.on_log, self.on_status, self.on_progress = log, status, progress
+        self.on_notify, self.on_validation_report = notify, validation_report
+        self.last_status = ""
+        self._last_progress_print = 0.0
+
+    def log(self, message):
+        if self.on_log is not None:
+            self.on_log(message)
+        else:
+            print(message, file=self.stream or sys.stdout)
+
+    def status(self, message):
+        self.last_status = message
+        if self.on_status is not None:
+            self.on_status(message)
+
+    def progress(self, tracker, force=False):
+        if self.on_progress is not None:
+            self.on_progress(tracker, force)
+            return
+        now = time.perf_counter()
+        if tracker.active and (force or now - self._last_progress_print >= self.PROGRESS_INTERVAL_S):
+            self._last_progress_print = now
+            print(tracker.describe(), file=self.stream or sys.stdout)
+
+    def notify(self, kind, title, message):
+        if self.on_notify is not None:
+            self.on_notify(kind, title, message)
+        else:
+            self.log(f"[{kind.upper()}] {title}: {message}")
+
+    def validation_report(self, text):
+        if self.on_validation_report is not None:
+            self.on_validation_report(text)
+        else:
+            self.log(text)
+
+
+def assumption_policy(policy, ask=None):
+    """
+    The choose_parametric(title, message) callback of an assumption policy: 'Always parametric' and
+    'Always non-parametric' answer without asking, 'Ask' calls `ask` (e.g. a Yes/No dialog; without
+    one the non-parametric test runs).
+    """
+    if policy == 'Ask':
+        return ask or (lambda title, message: False)
+    return lambda title, message: policy == 'Always parametric'
+
+
+# --- Analysis session: configuration, options, the loaded data and what is derived from it ---
+class USVSession(object):
+    """
+    Everything an analysis session holds: the configuration, the options, the loaded cohorts and the
+    views, statistics and caches derived from them. Plain functions take it (load_data, select_dataset,
+    analyze_metric, ...). Outputs are written to plots/ and analysis_results/ in `output_dir` (by
+    default the folder of this file).
+    """
+
+    def __init__(self, output_dir=None, options=None):
+        self.options = options or AnalysisOptions()  # Loading and analysis options
+
+        # --- Configuration (as class attributes) ---
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.plot_output_dir = os.path.join(output_dir or self.script_dir, 'plots')
+        self.analysis_results_dir = os.path.join(output_dir or self.script_dir, 'analysis_results')
+        self.catalog_path = os.path.join(self.analysis_results_dir, 'usv_catalog.sqlite')
+
+        # Change here if you have other variables to be test or add more subgroups
+        self.SEX_LABELS = {'F': 'Females', 'M': 'Males'}
+        self.GENOTYPE_LABELS = {'WT': 'Wild Type', 'MUT': 'Mutant'}
+        self.TIMEPOINT_ORDER = ['P4', 'P6']
+
+        # USV files are streamed in chunks of this many calls; percentile metrics computed per session
+        self.CSV_CHUNK_SIZE = 50000
+        self.QUANTILE_METRICS = ['Median', 'IQR', 'P5', 'P95']
+        self.USV_FEATURE_COLUMNS = [
+            'Call Length (s)', 'Principal Frequency (kHz)', 'Low Freq (kHz)',
+            'High Freq (kHz)', 'Delta Freq (kHz)', 'Frequency Standard Deviation (kHz)',
+            'Slope (kHz/s)', 'Sinuosity', 'Mean Power (dB/Hz)', 'Tonality', 'Peak Freq (kHz)'
+        ]
+        self.REQUIRED_USV_COLUMNS = ['Accepted']  # Files without these are skipped
+        self.SUBSET_FILTER_FACTORS = ['Sex', 'Genotype', 'Timepoint', 'Cohort']  # Filterable in the Analysis tab
+        self.MAX_COHORT_WORKERS = 4  # Cohorts loaded at the same time
+        self.SUBSET_FILTER_ALL = 'All'
+        # "Run All Metrics": family-wide correction of every p-value in the combined results table
+        self.FAMILY_CORRECTION_METHODS = {'Benjamini-Hochberg (FDR)': 'fdr_bh', 'Benjamini-Yekutieli (FDR)': 'fdr_by',
+                                          'Holm (FWER)': 'holm'}
+        self.CORRECTION_FAMILIES = {'Per metric': 'Metric', 'Per test type': 'Test_Type', 'Global': None}
+        self.ASSUMPTION_POLICIES = ['Ask', 'Always parametric', 'Always non-parametric']
+        self.PROFILE_TOP_N = 40  # Functions in the saved cProfile summary of a profiled run
+        self.PROFILE_DISPLAY_TOP_N = 15  # ...and in the Statistical Output tab
+        self.PROGRESS_MAX_FPS = 10  # Progress updates per second while a job runs (repaints in the app)
+        self.job_queue_path = os.path.join(self.analysis_results_dir, 'usv_jobs.sqlite')  # Queued analyses
+        self.job_output_root = os.path.join(self.analysis_results_dir, 'jobs')  # Outputs of job N in job_N/
+        self.JOB_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))  # Jobs the scheduler runs at once
+        self.JOB_MAX_ATTEMPTS = 3  # Runs of a failing job before it is marked failed
+
+        # Ensure output directories exist
+        os.makedirs(self.plot_output_dir, exist_ok=True)
+        os.makedirs(self.analysis_results_dir, exist_ok=True)
+
+        # --- Data Storage ---
+        self.df_aggregated = None
+        self.session_accumulators = {}  # (animal_id, Timepoint) -> SessionAccumulator of its accepted calls
+        self.label_dtype = None  # Shared categorical of every call Label found in the loaded files
+        self.validation_report_text = ""  # Consolidated pre-flight report shown at the top of the Report tab
+        self.load_errors = []  # Per-file problems met while parsing (reported instead of one messagebox each)
+        self.df_calls = None  # Accepted calls (only kept for outlier flagging or the catalog's call table)
+        self.df_metadata = None  # animal_metadata.csv rows that were loaded
+        self.catalog = None  # SessionCatalog, opened on first use
+        self.job_queue = None  # JobQueue, opened on first use
+        self.loaded_cohorts = []  # Cohort names (in the catalog) of the data currently loaded
+        self.aggregated_variants = {}  # 'all' / 'without_outliers' -> aggregated DataFrame
+        self.selected_cohort_paths = []  # Selected cohort folders/archives (several are merged into one dataset)
+        self.available_metrics = []
+        self.available_grouping_variables = []
+        self.df_prepared = None  # Read-only categorical view of df_aggregated shared by statistics, tables and plots
+        self.descriptive_cube = {}  # Descriptive statistics of every metric for every subset of the grouping variables
+        self.anova_cache = {}  # Per-design ANOVA and post-hoc tables of every metric of the prepared dataset
+        self.perf = PerfRecorder()  # Stage timings of the current load or analysis run
+        self.progress = ProgressTracker()  # Progress of the running job (console, or the app's status bar)
+
+    def __getstate__(self):
+        """Picklable for worker processes: the catalog and job queue connections stay behind."""
+        state = self.__dict__.copy()
+        state.update(catalog=None, job_queue=None)
+        return state
+
+    def get_catalog(self):
+        """Opens the local session catalog on first use."""
+        if self.catalog is None:
+            self.catalog = SessionCatalog(self.catalog_path)
+        return self.catalog
+
+    def get_job_queue(self):
+        """Opens the job queue on first use."""
+        if self.job_queue is None:
+            self.job_queue = JobQueue(self.job_queue_path)
+        return self.job_queue
+
+    def job_spec(self, metric, primary_grouping, secondary_grouping=None):
+        """Job analyzing the selected cohorts with the current options (`metric` None: all metrics)."""
+        return {'data': [os.path.abspath(path) for path in self.selected_cohort_paths], 'metric': metric or None,
+                'primary': primary_grouping, 'secondary': secondary_grouping or None,
+                'options': {name: value for name, value in self.options.as_dict().items() if name != 'subset_filters'},
+                'subset_filters': {factor: value for factor, value in self.options.subset_filters.items()
+                                   if value != self.SUBSET_FILTER_ALL}}
+
+    def submit_job(self, metric, primary_grouping, secondary_grouping=None, priority=0):
+        """Queues the analysis of the selected cohorts (see job_spec); returns the job id."""
+        return self.get_job_queue().submit(self.job_spec(metric, primary_grouping, secondary_grouping), priority,
+                                           max_attempts=self.JOB_MAX_ATTEMPTS)
+
+    def identify_analysis_variables(self):
+        """Identifies the available metrics and grouping variables of the loaded DataFrame."""
+        all_cols = self.df_aggregated.columns.tolist()
+
+        # Define common grouping variables that you expect
+        # NOTE: These names MUST match the columns in your aggregated DataFrame
+        # ('Cohort' only exists when several cohorts were loaded together)
+        common_grouping_vars = ['Sex', 'Genotype', 'Timepoint', 'Cohort']
+
+        # Filter for only those common grouping variables that actually exist in the DataFrame
+        self.available_grouping_variables = [col for col in common_grouping_vars if
+                                             col in self.df_aggregated.columns]
+
+        # Metrics are typically numerical columns that are not 'animal_id' or a grouping variable
+        identifying_cols = ['animal_id', 'Filename'] + self.available_grouping_variables
+        self.available_metrics = [
+            col for col in all_cols
+            if col not in identifying_cols and pd.api.types.is_numeric_dtype(self.df_aggregated[col])
+        ]
+
+    def prepare_analysis_data(self):
+        """
+        Builds, once per dataset, the prepared view of df_aggregated consumed by every analysis
+        and the descriptive statistics cube computed from it.
+        """
+        self.anova_cache = {}
+        if self.df_aggregated is None:
+            self.df_prepared = None
+            self.descriptive_cube = {}
+            return
+        with self.perf.span("Analysis view"):
+            self.df_prepared = prepare_analysis_view(self.df_aggregated, self.SEX_LABELS, self.GENOTYPE_LABELS,
+                                                     self.TIMEPOINT_ORDER)
+        with self.perf.span("Descriptive statistics cube"):
+            self.descriptive_cube = build_descriptive_cube(self.df_prepared, self.available_metrics,
+                                                           self.available_grouping_variables)
+
+    def analysis_view(self, df):
+        """The prepared view for `df`: the cached one for the loaded data, otherwise prepared on the fly."""
+        if df is self.df_prepared or df is self.df_aggregated and self.df_prepared is not None:
+            return self.df_prepared
+        return prepare_analysis_view(df, self.SEX_LABELS, self.GENOTYPE_LABELS, self.TIMEPOINT_ORDER)
+
+
+def restore_catalog_dtypes(df, n_cohorts):
+    """
+    Catalog values come back as REAL: restore integer counts. One cohort drops the cohort column,
+    several get the layout of a multi-cohort load (namespaced animal_id, Cohort column).
+    """
+    for col in df.columns:
+        if (col.endswith('_Count') and pd.api.types.is_float_dtype(df[col]) and df[col].notna().all()):
+            df[col] = df[col].astype(int)
+    if n_cohorts == 1:
+        df = df.drop(columns='cohort')
+    else:
+        df = df.rename(columns={'cohort': 'Cohort'})
+        df['animal_id'] = namespace_animal_ids(df['Cohort'], df['animal_id'])
+    return df
+
+
+# --- Loading: cohorts validated, parsed and aggregated into a session (one worker thread per cohort) ---
+class CohortLoader(object):
+    """
+    Loads cohort folders/zipped cohorts (or the cohorts of the session catalog) into a USVSession
+    with its loading options, and selects the dataset its analyses use. Reports through `reporter`.
+    """
+
+    def __init__(self, session, reporter=None):
+        self.session = session
+        self.reporter = reporter or Reporter()
+        self.perf = session.perf
+        self.log = self.reporter.log
+
+    def load(self, paths):
+        """Loads and merges the cohorts at `paths`, stores them in the session catalog and prepares the analysis."""
+        session = self.session
+        session.selected_cohort_paths = [paths] if isinstance(paths, str) else list(paths)
+        if not session.selected_cohort_paths:
+            self.reporter.notify('warning', "Input Error", "Please select a data folder first.")
+            return
+
+        self.reporter.status("Loading and merging data... This may take a moment.")
+
+        self.perf.reset()
+        session.df_aggregated = None
+        with self.perf.span("Load data"):
+            # --- CALL TO THE INTEGRATED DATA LOADING/MERGING LOGIC ---
+            cohorts = self._load_and_merge_data_backend(session.selected_cohort_paths)
+
+            if cohorts:  # Per-cohort frames are only kept until they are in the catalog
+                with self.perf.span("Catalog"):
+                    self.store_in_catalog(cohorts)
+            self._on_data_loaded()
+        save_run_profile(session, 'load', self.reporter, cohorts=list(session.selected_cohort_paths))
+
+    def store_in_catalog(self, cohorts):
+        """Saves every freshly loaded cohort (metadata, aggregates, optional calls) in the session catalog."""
+        session = self.session
+        try:
+            for cohort in cohorts:
+                self.reporter.status(f"Storing cohort '{cohort.name}' in the session catalog...")
+                calls = cohort.df_calls if session.options.store_calls else None
+                session.get_catalog().store_cohort(cohort.name, cohort.aggregated_variants, cohort.df_metadata, calls)
+            session.loaded_cohorts = [cohort.name for cohort in cohorts]
+        except Exception as e:
+            session.loaded_cohorts = []
+            session.load_errors.append(f"Could not store the cohort in the session catalog: {e}")
+
+    def load_from_catalog(self):
+        """Loads every cohort stored in the session catalog without rereading any CSV file."""
+        session = self.session
+        catalog = session.get_catalog()
+        cohorts = catalog.cohorts()
+        if not cohorts:
+            self.reporter.notify('info', "Session Catalog", f"The session catalog is empty:\n{session.catalog_path}")
+            return
+        self.reporter.status(f"Loading {len(cohorts)} cohort(s) from the session catalog...")
+        self.perf.reset()
+        with self.perf.span("Load from catalog"):
+            session.validation_report_text = f"Loaded from the session catalog ({', '.join(cohorts)}).\n"
+            session.load_errors = []
+            session.df_calls = None
+            session.session_accumulators = {}
+            session.label_dtype = None
+            session.aggregated_variants = {}
+            with self.perf.span("Catalog query"):
+                for variant in ['all', 'without_outliers']:
+                    df_variant = catalog.query(cohorts=cohorts, variant=variant)
+                    if df_variant.shape[1] > len(SessionCatalog.SESSION_COLUMNS):
+                        session.aggregated_variants[variant] = restore_catalog_dtypes(df_variant, len(cohorts))
+            session.loaded_cohorts = cohorts
+            session.df_aggregated = session.aggregated_variants.get('all')
+            self._on_data_loaded()
+        save_run_profile(session, 'load', self.reporter, cohorts=cohorts)
+
+    def _on_data_loaded(self):
+        """Shared follow-up of every load: derive metrics/grouping variables and the analysis view."""
+        session = self.session
+        session.options.exclude_outliers = False  # A fresh load always starts from all accepted calls
+        session.options.subset_filters = {}
+
+        if session.df_aggregated is not None:
+            self.reporter.status("Data loaded and merged successfully!")
+            session.identify_analysis_variables()
+            self.reporter.status("Precomputing descriptive statistics...")
+            session.prepare_analysis_data()
+            self.reporter.status("Data loaded and merged successfully!")
+        else:
+            self.reporter.status("Data loading failed.")
+
+    # --- INTEGRATED CORE BACKBONE FOR DATA LOADING AND MERGING ---
+    def _load_and_merge_data_backend(self, raw_data_folders):
+        """
+        Integrates the original data loading and merging logic for one or several cohorts (folders
+        or zipped cohorts). Every cohort is validated and parsed in its own worker thread into a
+        CohortData; the cohorts are then merged into the session's aggregated DataFrame. Returns the
+        loaded cohorts (None if none could be loaded).
+        """
+        if isinstance(raw_data_folders, str):
+            raw_data_folders = [raw_data_folders]
+        session = self.session
+        session.session_accumulators = {}  # Fresh running statistics for every load
+        session.df_calls = None
+        session.aggregated_variants = {}
+        session.label_dtype = None
+        session.validation_report_text = ""
+        session.load_errors = []
+        # The options are read once here; the workers only see these values
+        options = {'flag_outliers': session.options.flag_outliers,
+                   'outlier_threshold': session.options.outlier_threshold,
+                   'keep_calls': session.options.flag_outliers or session.options.store_calls}
+
+        cohorts = [CohortData(source) for source in open_cohort_sources(raw_data_folders)]
+
+        # Pre-flight: check every listed file's header before any heavy parsing, report once
+        with self.perf.span("Metadata and header checks"):
+            self._run_cohort_workers(self._prepare_cohort_backend, cohorts, "Validating files (headers only)")
+        seen_files = set()
+        for cohort in cohorts:
+            if cohort.df_metadata is None:
+                continue
+            # A session file reachable from two selected cohorts (nested or linked folders) is parsed once
+            identities = [cohort.source.identity(name) for name in cohort.df_metadata['Filename']]
+            shared = np.array([identity in seen_files for identity in identities], dtype=bool)
+            seen_files.update(identities)
+            if shared.any():
+                cohort.validation_report_text += (f"WARNING: {int(shared.sum())} file(s) already loaded by another "
+                                                  f"selected cohort (skipped).\n")
+                cohort.df_metadata = cohort.df_metadata[~shared] if not shared.all() else None
+        if len(cohorts) == 1:
+            session.validation_report_text = cohorts[0].validation_report_text
+        else:
+            session.validation_report_text = "\n".join(f"Cohort '{cohort.name}'\n{cohort.validation_report_text}"
+                                                       for cohort in cohorts)
+        self.reporter.validation_report(session.validation_report_text)
+
+        cohorts = [cohort for cohort in cohorts if cohort.df_metadata is not None and cohort.fatal_error is None]
+        for cohort in cohorts:
+            cohort.files_total = len(cohort.df_metadata)
+        with self.perf.span("Aggregation"):
+            self._run_cohort_workers(self._aggregate_cohort_backend, cohorts, "Aggregating USV files", options)
+        for cohort in cohorts:
+            if cohort.fatal_error is not None:
+                title, message = cohort.fatal_error
+                self.reporter.notify('error', title,
+                                     message if len(cohorts) == 1 else f"Cohort '{cohort.name}':\n{message}")
+        cohorts = [cohort for cohort in cohorts if cohort.fatal_error is None]
+        if not cohorts:
+            return None
+
+        if len(cohorts) > 1:
+            self.reporter.status(f"Merging {len(cohorts)} cohorts...")
+        with self.perf.span("Merge cohorts"):
+            merged = merge_cohorts(cohorts)
+        session.df_metadata = merged.df_metadata
+        session.session_accumulators = merged.session_accumulators
+        session.df_calls = merged.df_calls
+        session.label_dtype = merged.label_dtype
+        session.load_errors = list(merged.load_errors)
+        session.aggregated_variants = merged.aggregated_variants
+        session.df_aggregated = merged.aggregated_variants['all']
+        self.reporter.status("Successfully aggregated and merged data.")
+        return cohorts
+
+    def _run_cohort_workers(self, worker, cohorts, description, *args):
+        """Runs worker(cohort, *args) for every cohort in parallel; the calling thread only reports progress."""
+        if not cohorts:
+            return
+        # Progress in files once the metadata says how many there are (aggregation), in cohorts before that
+        count_files = any(cohort.files_total for cohort in cohorts)
+        self.session.progress.start(description, len(cohorts), unit='files' if count_files else 'cohorts')
+        with ThreadPoolExecutor(max_workers=min(self.session.MAX_COHORT_WORKERS, len(cohorts))) as executor:
+            futures = {executor.submit(worker, cohort, *args): cohort for cohort in cohorts}
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=1 / self.session.PROGRESS_MAX_FPS)
+                if count_files:
+                    self.session.progress.update(sum(cohort.files_done for cohort in cohorts),
+                                                 sum(cohort.files_total for cohort in cohorts))
+                else:
+                    self.session.progress.update(len(futures) - len(pending))
+                self.reporter.status(f"{description}: {len(futures) - len(pending)}/{len(futures)} cohort(s) done")
+                self.reporter.progress(self.session.progress)
+        self.session.progress.finish()
+        self.reporter.progress(self.session.progress, force=True)
+        for future, cohort in futures.items():
+            if future.exception() is not None and cohort.fatal_error is None:
+                cohort.fatal_error = ("Data Loading Error", f"Unexpected error: {future.exception()}")
+
+    def _prepare_cohort_backend(self, cohort):
+        """Worker: loads a cohort's animal_metadata.csv and runs the header-only pre-flight validation."""
+        metadata_file_name = 'animal_metadata.csv'  # Assumed name for metadata file within the folder, change if you need
+        # The folder may also be a zipped cohort; session files may be .gz/.bz2/.xz/.zip compressed
+        source = cohort.source
+
+        # --- Core Backbone 1.1: Load Metadata ---
+        if not source.exists(metadata_file_name):
+            cohort.fatal_error = ("Metadata Error", f"Metadata file not found at expected path: "
+                                                    f"{source.describe(metadata_file_name)}\n"
+                                                    "Please ensure 'animal_metadata.csv' is in the selected folder.")
+            return
+        try:
+            with self.perf.span("Metadata load"), source.open(metadata_file_name) as f:
+                df_meta = pd.read_csv(f, encoding='utf-8-sig')
+            self.log(f"Loaded metadata from: {source.describe(metadata_file_name)}")
+        except Exception as e:
+            cohort.fatal_error = ("Metadata Error", f"Error loading metadata file: {e}")
+            return
+
+        with self.perf.span("Header checks"):
+            cohort.df_metadata, cohort.validation_report_text = self._validate_dataset_backend(df_meta, source)
+
+    def _aggregate_cohort_backend(self, cohort, options):
+        """Worker: parses the validated session files of one cohort into its aggregated frames."""
+        source = cohort.source
+        keep_calls = options['keep_calls']  # Call-level data is only needed for outlier flagging or the catalog
+        feature_columns = self.session.USV_FEATURE_COLUMNS
+        call_frames = []
+
+        # Accepted Labels of every session, collected while parsing (categorical parts with their own categories)
+        session_index, session_codes, label_parts = {}, [], []
+
+        # --- Core Backbone 1.2a: The Label vocabulary of the whole cohort (union of the files' categories) ---
+        def label_table_internal():
+            vocabulary = sorted(set().union(*[part.cat.categories for part in label_parts])) if label_parts else []
+            label_dtype = pd.CategoricalDtype(vocabulary)
+            if label_parts:
+                labels = pd.concat([part.astype(label_dtype) for part in label_parts], ignore_index=True)
+                sessions = pd.Series(np.concatenate(session_codes))
+            else:
+                labels = pd.Series([], dtype=label_dtype)
+                sessions = pd.Series([], dtype=np.int32)
+            label_table = label_count_columns(sessions, labels, label_dtype, all_sessions=range(len(session_index)))
+            label_table.index = pd.MultiIndex.from_tuples(list(session_index), names=['animal_id', 'Timepoint'])
+            return label_dtype, label_table
+
+        # --- Core Backbone 1.2: Process Individual USV Files and Aggregate ---
+        def process_single_usv_file_internal(file_name, animal_id, timepoint):
+            if not source.exists(file_name):
+                return None
+            try:
+                # Stream the (decompressed) file in chunks; only the session's running statistics stay in memory
+                accumulator = SessionAccumulator(feature_columns)
+                file_labels = []  # Kept only once the whole file is parsed
+                with source.open(file_name) as f:
+                    # Labels read as text, like the categories of the cohort vocabulary
+                    for chunk in pd.read_csv(f, chunksize=self.session.CSV_CHUNK_SIZE, dtype={'Label': str},
+                                             encoding='utf-8-sig'):
+                        if 'Accepted' not in chunk.columns:
+                            return None
+                        accepted_mask = chunk['Accepted'].astype(str).str.lower().isin(['true', '1'])
+                        accumulator.update(chunk[accepted_mask])
+                        if 'Label' in chunk.columns:
+                            file_labels.append(chunk.loc[accepted_mask, 'Label'].astype('category'))
+                        if keep_calls:
+                            call_columns = [c for c in feature_columns + ['Label'] if c in chunk.columns]
+                            call_frames.append(
+                                chunk.loc[accepted_mask, call_columns].assign(animal_id=animal_id, Timepoint=timepoint))
+
+                session_key = (animal_id, timepoint)
+                if session_key in cohort.session_accumulators:  # Same session split over several files
+                    accumulator = cohort.session_accumulators[session_key].merge(accumulator)
+                cohort.session_accumulators[session_key] = accumulator
+                if file_labels:
+                    code = session_index.setdefault(session_key, len(session_index))
+                    session_codes.extend(np.full(len(part), code, dtype=np.int32) for part in file_labels)
+                    label_parts.extend(file_labels)
+                return self._session_metrics_series(animal_id, timepoint, accumulator)
+
+            except pd.errors.EmptyDataError:
+                return None
+            except Exception as e:
+                cohort.load_errors.append(
+                    f"Error processing USV file {file_name} for {animal_id} at {timepoint}: {e}. Skipped.")
+                return None
+
+        # --- Core Backbone 1.3: Process All USV Files and Combine into a DataFrame ---
+        def process_all_usv_files_internal(df_meta):
+            all_aggregated_data = []
+
+            for animal_id, timepoint, filename in df_meta[['animal_id', 'Timepoint', 'Filename']].itertuples(
+                    index=False):
+                with self.perf.span("Parse USV file"):
+                    aggregated_series = process_single_usv_file_internal(filename, animal_id, timepoint)
+                cohort.files_done += 1
+
+                if aggregated_series is not None:
+                    all_aggregated_data.append(aggregated_series)
+
+            if not all_aggregated_data:
+                cohort.fatal_error = ("Data Aggregation Error",
+                                      "No data was successfully aggregated from any USV files. Check file names and "
+                                      "structure.")
+                return
+
+            # The Label vocabulary of all files, so every session gets the same Label_* columns
+            with self.perf.span("Label counts"):
+                cohort.label_dtype, label_table = label_table_internal()
+            df_aggregated_raw = pd.DataFrame(all_aggregated_data)
+            df_aggregated_raw = df_aggregated_raw.join(label_table, on=['animal_id', 'Timepoint'])
+            label_cols = [c for c in label_table.columns if c.endswith('_Count')]
+            df_aggregated_raw[label_cols] = df_aggregated_raw[label_cols].fillna(0).astype(int)
+
+            # Merge the metadata columns (Sex, Genotype) into the aggregated DataFrame
+            metadata_cols_for_merge = df_meta[['animal_id', 'Timepoint', 'Sex', 'Genotype']].drop_duplicates()
+            df_final_results = pd.merge(
+                df_aggregated_raw,
+                metadata_cols_for_merge,
+                on=['animal_id', 'Timepoint'],
+                how='left'
+            )
+            cohort.aggregated_variants = {'all': df_final_results}
+
+            if keep_calls and call_frames:
+                cohort.df_calls = pd.concat(call_frames, ignore_index=True)
+
+            # Optional: flag outlier calls and cache the metrics recomputed without them
+            if options['flag_outliers'] and cohort.df_calls is not None:
+                with self.perf.span("Outlier flagging"):
+                    df_calls = cohort.df_calls
+                    df_calls['Is_Outlier'] = flag_outlier_calls(df_calls, feature_columns,
+                                                                ['animal_id', 'Timepoint'],
+                                                                threshold=options['outlier_threshold'])
+
+                    # Metrics of the remaining calls: one groupby over all sessions, like the label columns
+                    df_clean_calls = df_calls[~df_calls['Is_Outlier']]
+                    df_clean_raw = session_metric_columns(df_clean_calls, feature_columns,
+                                                          ['animal_id', 'Timepoint'])
+                    if 'Label' in df_clean_calls.columns:
+                        clean_label_table = label_count_columns(
+                            [df_clean_calls['animal_id'], df_clean_calls['Timepoint']],
+                            df_clean_calls['Label'], cohort.label_dtype)
+                        df_clean_raw = df_clean_raw.join(clean_label_table, on=['animal_id', 'Timepoint'])
+                    # Every session keeps its row (no calls left: count 0, metrics missing)
+                    df_clean_raw = df_aggregated_raw[['animal_id', 'Timepoint']].merge(
+                        df_clean_raw, on=['animal_id', 'Timepoint'], how='left').reindex(columns=df_aggregated_raw.columns)
+                    df_clean_raw['Total_USVs_Count'] = df_clean_raw['Total_USVs_Count'].fillna(0).astype(int)
+                    df_clean_raw[label_cols] = df_clean_raw[label_cols].fillna(0).astype(int)
+                    cohort.aggregated_variants['without_outliers'] = pd.merge(
+                        df_clean_raw, metadata_cols_for_merge, on=['animal_id', 'Timepoint'], how='left')
+
+        process_all_usv_files_internal(cohort.df_metadata)
+
+    def _validate_dataset_backend(self, df_meta, source):
+        """
+        Header-only validation of every file listed in animal_metadata.csv (read in parallel).
+        Returns the metadata rows that are safe to parse (None if nothing can be loaded) and the
+        text of the pre-flight report.
+        """
+        lines = ["Pre-flight validation", "=" * 21]
+        required_meta_cols = ['Filename', 'animal_id', 'Timepoint']
+        missing_meta_cols = [col for col in required_meta_cols + ['Sex', 'Genotype'] if col not in df_meta.columns]
+        if any(col in missing_meta_cols for col in required_meta_cols):
+            lines.append(f"ERROR: animal_metadata.csv is missing the column(s): {', '.join(missing_meta_cols)}.")
+            return None, "\n".join(lines) + "\n"
+        if missing_meta_cols:
+            lines.append(f"WARNING: animal_metadata.csv has no {', '.join(missing_meta_cols)} column(s).")
+
+        duplicated = df_meta['Filename'][df_meta['Filename'].duplicated()].unique()
+        if len(duplicated):
+            lines.append(f"WARNING: {len(duplicated)} Filename(s) listed more than once (only the first entry is "
+                         f"used): {', '.join(map(str, duplicated))}")
+            df_meta = df_meta.drop_duplicates(subset='Filename', keep='first')
+
+        file_names = list(df_meta['Filename'])
+        expected_cols = self.session.USV_FEATURE_COLUMNS + ['Label']
+        with ThreadPoolExecutor(max_workers=min(32, max(1, len(file_names)))) as executor:
+            results = list(executor.map(
+                lambda name: validate_usv_file_header(source, name, self.session.REQUIRED_USV_COLUMNS, expected_cols),
+                file_names))
+
+        usable = []
+        missing_files, broken_files, incomplete_files, bom_files = [], [], [], 0
+        for result in results:
+            bom_files += result['bom']
+            if not result['exists']:
+                missing_files.append(result['file'])
+            elif result['error'] or result['missing_required']:
+                reason = result['error'] or f"missing required column(s) {', '.join(result['missing_required'])}"
+                broken_files.append(f"{result['file']}: {reason}")
+            else:
+                if result['missing_expected']:
+                    incomplete_files.append(f"{result['file']}: {', '.join(result['missing_expected'])}")
+                usable.append(True)
+                continue
+            usable.append(False)
+
+        lines.append(f"Files listed: {len(results)}, ready to load: {sum(usable)}")
+        if bom_files:
+            lines.append(f"INFO: {bom_files} file(s) start with a UTF-8 BOM (handled automatically).")
+        if missing_files:
+            lines.append(f"ERROR: {len(missing_files)} file(s) not found (skipped):")
+            lines.extend(f"  - {name}" for name in missing_files)
+        if broken_files:
+            lines.append(f"ERROR: {len(broken_files)} file(s) unreadable or malformed (skipped):")
+            lines.extend(f"  - {entry}" for entry in broken_files)
+        if incomplete_files:
+            lines.append(f"WARNING: {len(incomplete_files)} file(s) lack expected column(s) (metrics left empty):")
+            lines.extend(f"  - {entry}" for entry in incomplete_files)
+        if not (missing_files or broken_files or incomplete_files):
+            lines.append("All files passed the header checks.")
+        report_text = "\n".join(lines) + "\n"
+
+        if not any(usable):
+            return None, report_text
+        return df_meta[usable], report_text
+
+    def _session_metrics_series(self, animal_id, timepoint, accumulator):
+        """Turns a SessionAccumulator into the per-session row of df_aggregated."""
+        # Initialize all expected metrics with pd.NA or 0 for counts
+        all_expected_metrics_init = {
+            'animal_id': animal_id,
+            'Timepoint': timepoint,
+            'Total_USVs_Count': 0,
+            'Call_Length_s_Sum': pd.NA,
+        }
+        # Percentile metrics come from the per-session sketches (no extra pass over the calls)
+        for col in self.session.USV_FEATURE_COLUMNS:
+            for suffix in ['Mean', 'SD', 'SEM'] + self.session.QUANTILE_METRICS:
+                all_expected_metrics_init[f'{metric_column_name(col)}_{suffix}'] = pd.NA
+        # Label_X_Count / Label_X_Proportion columns are added for the whole cohort at once (see label_count_columns)
+
+        if accumulator.total_calls == 0:
+            return pd.Series(all_expected_metrics_init)
+
+        aggregated_metrics = {
+            'animal_id': animal_id,
+            'Timepoint': timepoint,
+            'Total_USVs_Count': accumulator.total_calls
+        }
+
+        running = accumulator.stats
+        std, sem = running.std, running.sem
+        for i, col in enumerate(self.session.USV_FEATURE_COLUMNS):
+            if col in accumulator.non_numeric_features or running.count[i] == 0:
+                continue
+            sanitized = metric_column_name(col)
+            aggregated_metrics[f'{sanitized}_Mean'] = running.mean[i]
+            aggregated_metrics[f'{sanitized}_SD'] = std[i]
+            aggregated_metrics[f'{sanitized}_SEM'] = sem[i]
+            q05, q25, q50, q75, q95 = accumulator.sketches[col].quantiles([0.05, 0.25, 0.5, 0.75, 0.95])
+            aggregated_metrics[f'{sanitized}_Median'] = q50
+            aggregated_metrics[f'{sanitized}_IQR'] = q75 - q25
+            aggregated_metrics[f'{sanitized}_P5'] = q05
+            aggregated_metrics[f'{sanitized}_P95'] = q95
+            if col == 'Call Length (s)':
+                aggregated_metrics['Call_Length_s_Sum'] = running.sum[i]
+
+        final_series_data = {**all_expected_metrics_init, **aggregated_metrics}
+        return pd.Series(final_series_data)
+
+    def select_dataset(self):
+        """
+        Sets df_aggregated from the metric variant and subset filters of the options (exclude_outliers,
+        subset_filters; a catalog query if filtered).
+        """
+        session = self.session
+        variant = 'without_outliers' if session.options.exclude_outliers else 'all'
+        if variant not in session.aggregated_variants:
+            return
+        filters = {factor: value for factor, value in session.options.subset_filters.items()
+                   if value != session.SUBSET_FILTER_ALL}
+        if not filters:
+            session.df_aggregated = session.aggregated_variants[variant]
+        elif session.loaded_cohorts:
+            session_filters = {factor: value for factor, value in filters.items() if factor != 'Cohort'}
+            cohorts = [filters['Cohort']] if 'Cohort' in filters else session.loaded_cohorts
+            df_subset = session.get_catalog().query(cohorts=cohorts, variant=variant, **session_filters)
+            df_subset = restore_catalog_dtypes(df_subset, len(session.loaded_cohorts))
+            session.df_aggregated = df_subset.reindex(columns=session.aggregated_variants[variant].columns)
+        else:  # Nothing stored in the catalog: filter the cached frame directly
+            mask = np.logical_and.reduce([session.aggregated_variants[variant][factor].astype(str) == value
+                                          for factor, value in filters.items()])
+            session.df_aggregated = session.aggregated_variants[variant][mask].reset_index(drop=True)
+
+        session.prepare_analysis_data()
+
+        description = "without flagged outlier calls" if variant == 'without_outliers' else "from all accepted calls"
+        subset = ", ".join(f"{factor}={value}" for factor, value in filters.items()) or "all sessions"
+        self.reporter.status(f"Using metrics {description}; subset: {subset} ({len(session.df_aggregated)} sessions).")
+
+
+# --- Statistics: assumption checks, tests and post-hocs of one design (all metrics' fits cached in the session) ---
+class StatisticalAnalysis(object):
+    """
+    Descriptive statistics and statistical tests of a session's prepared dataset. The batched fits
+    of all metrics are cached in the session until its data changes. Reports through `reporter`.
+    """
+
+    def __init__(self, session, reporter=None):
+        self.session = session
+        self.reporter = reporter or Reporter()
+        self.perf = session.perf
+        self.log = self.reporter.log
+
+    def get_significance_label(self, p_value):
+        if p_value < 0.001:
+            return '***'
+        elif p_value < 0.01:
+            return '**'
+        elif p_value < 0.05:
+            return '*'
+        else:
+            return 'ns'
+
+    def calculate_cohens_d(self, group1_data, group2_data):
+        n1, n2 = len(group1_data), len(group2_data)
+        if n1 == 0 or n2 == 0: return np.nan
+        s1, s2 = np.std(group1_data, ddof=1), np.std(group2_data, ddof=1)
+        pooled_std = np.sqrt(((n1 - 1) * s1 ** 2 + (n2 - 1) * s2 ** 2) / (n1 + n2 - 2)) if (n1 + n2 - 2) > 0 else 0
+        if pooled_std == 0: return 0.0
+        return (np.mean(group1_data) - np.mean(group2_data)) / pooled_std
+
+    def anova_table(self, df, metric, factors, rank_transform=False):
+        """
+        Type II ANOVA table of `metric` by `factors` (and their interaction). On the prepared dataset
+        the tables of all metrics are fitted together on first use and cached until the data changes.
+        """
+        if df is not self.session.df_prepared:
+            return MultiResponseAnova(df, factors, ['animal_id']).fit([metric], rank_transform)[metric]
+        key = (tuple(factors), rank_transform)
+        if key not in self.session.anova_cache:
+            with self.perf.span("ANOVA fit"):
+                engine = MultiResponseAnova(df, factors, ['animal_id'])
+                self.session.anova_cache[key] = engine.fit(self.session.available_metrics, rank_transform)
+        return self.session.anova_cache[key][metric]
+
+    def aligned_rank_table(self, df, metric, factors):
+        """
+        Aligned Rank Transform ANOVA table of `metric` by `factors`. On the prepared dataset the tables
+        of all metrics are fitted together on first use and cached until the data changes.
+        """
+        if df is not self.session.df_prepared:
+            return AlignedRankAnova(df, factors, ['animal_id']).fit([metric])[metric]
+        key = ('aligned_rank', tuple(factors))
+        if key not in self.session.anova_cache:
+            with self.perf.span("ART ANOVA fit"):
+                engine = AlignedRankAnova(df, factors, ['animal_id'])
+                self.session.anova_cache[key] = engine.fit(self.session.available_metrics)
+        return self.session.anova_cache[key][metric]
+
+    def art_contrast_table(self, df, metric, factors, contrast_factors):
+        """
+        ART-C post-hoc of `metric`: Tukey HSD on the data aligned and ranked for the levels of
+        `contrast_factors` (one factor, or both for cell comparisons labelled 'level1 x level2').
+        """
+        key = ('art_contrast', tuple(factors), tuple(contrast_factors))
+        if df is self.session.df_prepared and key in self.session.anova_cache:
+            table = self.session.anova_cache[key]
+        else:
+            metrics = self.session.available_metrics if df is self.session.df_prepared else [metric]
+            required = list(factors) + ['animal_id']
+            with self.perf.span("Post-hoc: ART-C contrasts"):
+                ranks = AlignedRankAnova(df, factors, ['animal_id']).contrast_ranks(metrics, contrast_factors)
+                group = contrast_factors[0] if len(contrast_factors) == 1 else list(contrast_factors)
+                table = PairwiseComparisons(df[required].join(ranks), group, 'animal_id', required).tukey_hsd(metrics)
+            if df is self.session.df_prepared:
+                self.session.anova_cache[key] = table
+        return table[table['Metric'] == metric].reset_index(drop=True)
+
+    def repeated_measures_table(self, df, metric, within, between=None):
+        """
+        Repeated-measures (or mixed, with `between`) ANOVA table of `metric` in pingouin's layout.
+        Balanced designs use the batched RepeatedMeasuresAnova (all metrics of the prepared dataset
+        fitted on first use and cached); anything it cannot handle falls back to pingouin.
+        """
+        key = ('repeated_measures', within, between)
+        if df is self.session.df_prepared:
+            if key not in self.session.anova_cache:
+                with self.perf.span("Repeated-measures ANOVA fit"):
+                    self.session.anova_cache[key] = RepeatedMeasuresAnova(df, within, 'animal_id', between).fit(
+                        self.session.available_metrics)
+            table = self.session.anova_cache[key].get(metric)
+        else:
+            table = RepeatedMeasuresAnova(df, within, 'animal_id', between).fit([metric]).get(metric)
+        if table is not None:
+            return table
+
+        self.log("  - Design is not balanced for the batched engine; using pingouin.")
+        data = df.dropna(subset=[metric, within, 'animal_id'] + ([between] if between else []))
+        with self.perf.span("Repeated-measures ANOVA fit (pingouin)"):
+            if between is None:
+                table = pg.rm_anova(data=data, dv=metric, within=within, subject='animal_id', effsize='np2',
+                                    correction=True)
+            else:
+                table = pg.mixed_anova(data=data, dv=metric, within=within, between=between, subject='animal_id',
+                                       effsize='np2', correction=True)
+        return normalize_pingouin_columns(table)
+
+    def posthoc_table(self, df, metric, method, group, required_columns=(), **options):
+        """
+        Post-hoc table of `metric` from PairwiseComparisons.<method> ('tukey_hsd', 'paired_tests' or
+        'mann_whitney'). On the prepared dataset the comparisons of all metrics are computed together
+        on first use and cached until the data changes.
+        """
+        if df is not self.session.df_prepared:
+            engine = PairwiseComparisons(df, group, 'animal_id', required_columns)
+            return getattr(engine, method)([metric], **options)
+        key = ('posthoc', method, tuple(group) if isinstance(group, list) else group, tuple(required_columns),
+               tuple(sorted(options.items())))
+        if key not in self.session.anova_cache:
+            with self.perf.span(f"Post-hoc: {method}"):
+                engine = PairwiseComparisons(df, group, 'animal_id', required_columns)
+                self.session.anova_cache[key] = getattr(engine, method)(self.session.available_metrics, **options)
+        table = self.session.anova_cache[key]
+        return table[table['Metric'] == metric].reset_index(drop=True)
+
+    def tukey_details(self, tukey_table):
+        """'Mean Diff: ..., CI: [...]' details of every Tukey comparison (vectorized formatting)."""
+        return ("Mean Diff: " + tukey_table['diff'].map('{:.3f}'.format) + ", CI: [" +
+                tukey_table['lower'].map('{:.3f}'.format) + ", " + tukey_table['upper'].map('{:.3f}'.format) + "]")
+
+    def record_posthoc(self, table, metric, test_type, effect_column, details, results, plot_comparisons,
+                       comparisons=None, plot_groups=None):
+        """
+        Logs one metric's post-hoc table, adds its rows to the results and its significant pairs to the
+        plot annotations. `comparisons` (labels) and `plot_groups` (A/B groups as the plot knows them)
+        default to 'A vs B' and the (A, B) levels.
+        """
+        self.log(table.drop(columns='Metric').to_string(index=False) if not table.empty
+                 else "      (no comparisons could be computed)")
+        p_values = table['p-corr']
+        if comparisons is None:
+            comparisons = table['A'].astype(str) + ' vs ' + table['B'].astype(str)
+        if plot_groups is None:
+            plot_groups = list(zip(table['A'], table['B']))
+        results.extend(pd.DataFrame({
+            'Metric': metric, 'Test_Type': test_type, 'Comparison': comparisons, 'F_Statistic': np.nan,
+            'P_Value': p_values, 'Effect_Size': table[effect_column] if effect_column in table.columns else np.nan,
+            'Significance': p_values.map(self.get_significance_label), 'Details': details}).to_dict('records'))
+        plot_comparisons.extend({'groups': groups, 'p': p, 'label': self.get_significance_label(p)}
+                                for groups, p in zip(plot_groups, p_values) if p < 0.05)
+
+    def calculate_partial_eta_squared(self, anova_table, effect_row_name):
+        ss_effect = anova_table.loc[effect_row_name, 'sum_sq']
+        if 'resid_sum_sq' in anova_table.columns:  # ART: residual of the model the effect was read from
+            ss_error = anova_table.loc[effect_row_name, 'resid_sum_sq']
+        elif 'Residual' in anova_table.index:
+            ss_error = anova_table.loc['Residual', 'sum_sq']
+        else:
+            ss_error = 0  # Fallback
+        if ss_effect + ss_error == 0: return np.nan
+        return ss_effect / (ss_effect + ss_error)
+
+    def check_normality(self, df, group_var, metric):
+        is_normal_all_groups = True
+        normality_results_str = "\n  - Assessing Normality (Shapiro-Wilk Test):\n"
+        for name, group in df.groupby(group_var, observed=False):
+            data = group[metric].dropna()
+            if len(data) >= 3:
+                with self.perf.span("Assumption checks"):
+                    stat, p = stats.shapiro(data)
+                normality_results_str += f"    - Group '{name}' (p={p:.3f}) {'is normally distributed.' if p >= 0.05 else 'is NOT normally distributed.'}\n"
+                if p < 0.05: is_normal_all_groups = False
+            else:
+                normality_results_str += f"    - Group '{name}' has too few samples ({len(data)}) for Shapiro-Wilk test. Skipping normality check.\n"
+                is_normal_all_groups = False
+        return is_normal_all_groups, normality_results_str
+
+    def check_homogeneity_of_variance(self, df, group_var, metric):
+        groups_data = [group[metric].dropna() for name, group in
+                       df.groupby(group_var, observed=False)]
+        groups_data = [g for g in groups_data if len(g) > 1]
+
+        if len(groups_data) < 2:
+            return True, np.nan, "    - Not enough groups or data points per group for Levene's test. Skipping homogeneity of variance check."
+
+        with self.perf.span("Assumption checks"):
+            stat, p = stats.levene(*groups_data)
+        homogeneity_str = f"  - Assessing Homogeneity of Variances (Levene's Test):\n"
+        homogeneity_str += f"    - Levene's test (p={p:.3f}) indicates {'equal variances (homoscedasticity).' if p >= 0.05 else 'unequal variances (heteroscedasticity).'} \n"
+        return p >= 0.05, p, homogeneity_str
+
+    def _ask_parametric_despite_assumptions(self, choose_parametric, title, message):
+        """Asks choose_parametric(title, message) whether to run the parametric test anyway and logs the answer."""
+        run_parametric = bool(choose_parametric(title, message))
+        self.log(f"  - Assumption violation: {'parametric' if run_parametric else 'non-parametric'} test chosen.")
+        return run_parametric
+
+    def perform_statistical_analysis(self, df, metric, group_var1, group_var2=None, choose_parametric=None):
+        """
+        Tests `metric` by one or two grouping variables; returns the result rows and the significant
+        comparisons to annotate on the plot. choose_parametric(title, message) decides whether to run
+        the parametric test when its assumptions are violated (default: the session's assumption policy).
+        """
+        if choose_parametric is None:
+            choose_parametric = assumption_policy(self.session.options.assumption_policy)
+        all_statistical_results = []
+        significant_comparisons_for_plot = []
+
+        self.log(f"\n--- Statistical Analysis for '{metric}' ---")
+
+        # Readable labels and categorical factors come from the prepared view (no per-run copy)
+        df_analysis = self.session.analysis_view(df)
+
+        grouping_vars_for_dropna = [metric] + [gv for gv in [group_var1, group_var2, 'animal_id'] if gv is not None]
+        df_cleaned = df_analysis.dropna(subset=grouping_vars_for_dropna)  # Copy-on-write: the view stays intact
+        posthoc_columns = grouping_vars_for_dropna[1:]  # Rows the post-hoc comparisons may use
+
+        if df_cleaned.empty:
+            self.log(f"Not enough complete data for statistical analysis of '{metric}' after dropping NaNs.")
+            return [], []
+
+        min_samples_per_group = 3
+        actual_grouping_for_counts = [gv for gv in [group_var1, group_var2] if gv is not None]
+        if actual_grouping_for_counts:
+            group_counts = df_cleaned.groupby(actual_grouping_for_counts, observed=False).size()
+            if any(group_counts < min_samples_per_group):
+                self.log(f"Warning: Some groups have fewer than {min_samples_per_group} samples.")
+                self.log("Statistical tests may not be reliable. Group counts:")
+                self.log(group_counts.to_string())
+        else:
+            if len(df_cleaned) < min_samples_per_group:
+                self.log(
+                    f"Warning: Total samples ({len(df_cleaned)}) less than {min_samples_per_group}. Statistical tests may not be reliable.")
+
+        is_time_as_factor = ('Timepoint' == group_var1) or ('Timepoint' == group_var2)
+
+        # Determine if it's a Repeated Measures design based on 'animal_id' and 'Timepoint'
+        is_repeated_measures = False
+        if 'animal_id' in df_cleaned.columns and 'Timepoint' in df_cleaned.columns:
+            # Check if each animal_id has multiple entries across timepoints
+            animal_timepoint_counts = df_cleaned.groupby('animal_id', observed=False)[
+                'Timepoint'].nunique()
+            if (animal_timepoint_counts > 1).any():
+                # For this specific analysis, assuming Timepoint is within-subject
+                if 'Timepoint' == group_var1 or 'Timepoint' == group_var2:  # Only flag as RM if timepoint is a factor being analyzed
+                    is_repeated_measures = True
+
+        # --- Case 1: One-way independent (e.g., Genotype, Sex) or One-way RM (Timepoint only) ---
+        if group_var2 is None:
+            if is_repeated_measures:  # One-way Repeated Measures ANOVA
+                self.log(f"\n  - Considering One-way Repeated Measures ANOVA for '{metric}' by '{group_var1}':")
+                try:
+                    self.log(f"  - Dataframe head for RM ANOVA:\n{df_cleaned.head()}")
+                    self.log(
+                        f"  - Dataframe dtypes for RM ANOVA:\n{df_cleaned[[metric, group_var1, 'animal_id']].dtypes}")
+                    self.log(f"  - Unique subjects: {df_cleaned['animal_id'].nunique()}")
+                    self.log(f"  - Unique within-levels ({group_var1}): {df_cleaned[group_var1].unique()}")
+
+                    aov_rm = self.repeated_measures_table(df_analysis, metric, group_var1)
+                    self.log(str(aov_rm))
+
+                    sphericity_p = aov_rm['p-spher'].iloc[0] if 'p-spher' in aov_rm.columns else np.nan
+
+                    self.log(
+                        f"  - Mauchly's Test for Sphericity (p={sphericity_p:.3f}): {'Sphericity assumed.' if (sphericity_p >= 0.05 or pd.isna(sphericity_p)) else 'Sphericity violated. Greenhouse-Geisser correction applied.'}")
+
+                    # Greenhouse-Geisser corrected p when sphericity is violated
+                    p_value_rm = aov_rm['p-GG-corr'].iloc[0] if sphericity_p < 0.05 else aov_rm['p-unc'].iloc[0]
+                    partial_eta_sq_rm = aov_rm['np2'].iloc[0]
+
+                    all_statistical_results.append({
+                        'Metric': metric, 'Test_Type': 'One-Way Repeated Measures ANOVA', 'Comparison': group_var1,
+                        'F_Statistic': aov_rm['F'].iloc[0], 'P_Value': p_value_rm, 'Effect_Size': partial_eta_sq_rm,
+                        'Significance': self.get_significance_label(p_value_rm),
+                        'Details': f"Sphericity p: {sphericity_p:.3f}"
+                    })
+                    self.log(
+                        f"    - Effect of {group_var1}: F-statistic={aov_rm['F'].iloc[0]:.3f}, p-value={p_value_rm:.3f}, Partial Eta-squared={partial_eta_sq_rm:.3f}")
+                    if p_value_rm < 0.05:
+                        self.log(f"      -> Statistically significant effect of {group_var1}.")
+                        self.log("\n    - Performing pairwise post-hoc tests (Bonferroni corrected):")
+                        posthoc_rm = self.posthoc_table(df_analysis, metric, 'paired_tests', group_var1,
+                                                        posthoc_columns)
+                        self.record_posthoc(posthoc_rm, metric, 'Pairwise t-test (Bonferroni)', 'cohen-d',
+                                            'Post-hoc for RM ANOVA', all_statistical_results,
+                                            significant_comparisons_for_plot)
+                    else:
+                        self.log(
+                            f"      -> No statistically significant effect of {group_var1} (p={p_value_rm:.3f}).")
+
+
+                except Exception as e:
+                    self.log(f"Error performing Repeated Measures ANOVA: {e}")
+                    self.log(traceback.format_exc())  # Log the full traceback
+                    self.reporter.notify('error', "Analysis Error",
+                                         "Failed to perform Repeated Measures ANOVA. Check data structure and raw log output for details. Falling back to non-parametric Friedman test.")
+                    # Fallback to Friedman test
+                    try:
+                        df_friedman = df_cleaned.pivot_table(index='animal_id', columns=group_var1, values=metric,
+                                                             aggfunc='first')
+                        df_friedman = df_friedman.dropna()
+                        if df_friedman.empty:
+                            self.log(
+                                "    - Not enough complete cases for Friedman test after pivoting and dropping NaNs.")
+                            return [], []
+                        with self.perf.span("Friedman test"):
+                            friedman_stat, friedman_p = stats.friedmanchisquare(
+                                *[df_friedman[col].values for col in df_friedman.columns])
+                        self.log(
+                            f"    - Friedman Test: Chi-square={friedman_stat:.3f}, p-value={friedman_p:.3f}")
+
+                        all_statistical_results.append({
+                            'Metric': metric, 'Test_Type': 'Friedman Test', 'Comparison': group_var1,
+                            'F_Statistic': friedman_stat, 'P_Value': friedman_p, 'Effect_Size': np.nan,
+                            'Significance': self.get_significance_label(friedman_p),
+                            'Details': 'Non-parametric alternative due to RM ANOVA failure.'
+                        })
+
+                        if friedman_p < 0.05:
+                            self.log(
+                                f"    - Conclusion: Statistically significant difference in ranks of {metric} across {group_var1} timepoints.")
+                            self.log(
+                                "\n    - Performing post-hoc Wilcoxon signed-rank tests (Bonferroni corrected):")
+                            timepoints = df_friedman.columns.tolist()
+                            num_comparisons = len(list(combinations(timepoints, 2)))
+                            for t1, t2 in combinations(timepoints, 2):
+                                data1 = df_friedman[t1].dropna()
+                                data2 = df_friedman[t2].dropna()
+                                if len(data1) > 0 and len(data2) > 0:
+                                    with self.perf.span("Post-hoc: Wilcoxon signed-rank"):
+                                        wilcox_stat, wilcox_p = stats.wilcoxon(data1, data2, alternative='two-sided')
+                                    corrected_p = min(wilcox_p * num_comparisons, 1.0)
+
+                                    all_statistical_results.append({
+                                        'Metric': metric,
+                                        'Test_Type': 'Wilcoxon Signed-Rank Test (Bonferroni)',
+                                        'Comparison': f"{t1} vs {t2}",
+                                        'F_Statistic': np.nan,
+                                        'P_Value': corrected_p,
+                                        'Effect_Size': np.nan,  # No standard effect size from scipy wilcoxon
+                                        'Significance': self.get_significance_label(corrected_p),
+                                        'Details': 'Post-hoc for Friedman Test'
+                                    })
+
+                                    if corrected_p < 0.05:
+                                        significant_comparisons_for_plot.append({
+                                            'groups': (t1, t2), 'p': corrected_p,
+                                            'label': self.get_significance_label(corrected_p)
+                                        })
+                                    self.log(
+                                        f"      - {t1} vs {t2}: W={wilcox_stat:.3f}, p={wilcox_p:.3f} (Bonferroni corrected p={corrected_p:.3f})")
+                        else:
+                            self.log(
+                                f"    - Conclusion: No statistically significant difference in ranks of {metric} across {group_var1} timepoints.")
+
+                    except Exception as fe:
+                        self.log(f"Error performing Friedman test: {fe}")
+                        self.log(traceback.format_exc())  # Log the full traceback for fallback
+                        self.reporter.notify('error', "Analysis Error",
+                                             "Cannot perform repeated measures analysis (Friedman fallback also failed).")
+                        return [], []
+
+            else:  # One-way independent ANOVA (or t-test)
+                unique_groups = df_cleaned[group_var1].unique()
+                if len(unique_groups) < 2:
+                    self.log(
+                        f"  - Not enough unique groups in {group_var1} for statistical comparison ({len(unique_groups)} groups found).")
+                    return [], []
+
+                self.log(f"\n  - Considering analysis for {metric} by {group_var1}:")
+
+                is_normal_all_groups, normality_str = self.check_normality(df_cleaned, group_var1, metric)
+                self.log(normality_str)
+                is_homogeneous_variance, levene_p, homogeneity_str = self.check_homogeneity_of_variance(df_cleaned,
+                                                                                                        group_var1,
+                                                                                                        metric)
+                self.log(homogeneity_str)
+
+                run_parametric = is_normal_all_groups and is_homogeneous_variance
+
+                if not run_parametric:
+                    self.log("\n  - Assumptions not fully met for parametric test.")
+                    user_choice = self._ask_parametric_despite_assumptions(
+                        choose_parametric,
+                        "Assumption Violation",
+                        "Statistical assumptions (Normality and/or Homogeneity of Variances) were not met.\n"
+                        "Do you want to proceed with the parametric test (ANOVA/t-test) anyway?\n"
+                        "Click 'No' to run a non-parametric alternative (Kruskal-Wallis/Mann-Whitney U)."
+                    )
+                    run_parametric = user_choice
+                    if run_parametric:
+                        self.log(
+                            "  - Proceeding with parametric test despite assumption warnings. Interpret results with caution.")
+                    else:
+                        self.log("  - Proceeding with non-parametric alternative as requested.")
+                else:
+                    self.log("\n  - Assumptions met for parametric test.")
+
+                if run_parametric:
+                    if len(unique_groups) == 2:
+                        self.log("\n  - Performing Independent Samples t-test (parametric):")
+                        group1_data = df_cleaned[df_cleaned[group_var1] == unique_groups[0]][metric]
+                        group2_data = df_cleaned[df_cleaned[group_var1] == unique_groups[1]][metric]
+
+                        test_name_full = "Independent t-test"
+                        t_stat = np.nan
+                        p_value = np.nan
+                        cohens_d_val = np.nan
+
+                        with self.perf.span("t-test"):
+                            t_stat, p_value = stats.ttest_ind(group1_data, group2_data,
+                                                              equal_var=bool(is_homogeneous_variance))
+                        if not is_homogeneous_variance:
+                            test_name_full = "Welch's Independent t-test"
+                            self.log("    (Using Welch's t-test due to unequal variances)")
+
+                        cohens_d_val = self.calculate_cohens_d(group1_data, group2_data)
+
+                        self.log(
+                            f"    - {test_name_full}: t-statistic={t_stat:.3f}, p-value={p_value:.3f}, Cohen's d={cohens_d_val:.3f}")
+
+                        all_statistical_results.append({
+                            'Metric': metric, 'Test_Type': test_name_full,
+                            'Comparison': f'{unique_groups[0]} vs {unique_groups[1]}',
+                            'F_Statistic': t_stat, 'P_Value': p_value, 'Effect_Size': cohens_d_val,
+                            'Significance': self.get_significance_label(p_value),
+                            'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
+                        })
+                        if p_value < 0.05:
+                            self.log(
+                                f"    - Conclusion: Statistically significant difference in {metric} between {unique_groups[0]} and {unique_groups[1]}.")
+                            significant_comparisons_for_plot.append({
+                                'groups': (unique_groups[0], unique_groups[1]), 'p': p_value,
+                                'label': self.get_significance_label(p_value)
+                            })
+                        else:
+                            self.log(
+                                f"    - Conclusion: No statistically significant difference in {metric} between {unique_groups[0]} and {unique_groups[1]}.")
+
+                    else:  # More than 2 unique groups -> One-way ANOVA (parametric)
+                        self.log("\n  - Performing One-way ANOVA (parametric):")
+                        anova_table = self.anova_table(df_analysis, metric, [group_var1])
+                        self.log(str(anova_table))
+
+                        p_value = anova_table['PR(>F)'][f'C({group_var1})']
+                        partial_eta_sq = self.calculate_partial_eta_squared(anova_table, f'C({group_var1})')
+
+                        all_statistical_results.append({
+                            'Metric': metric, 'Test_Type': 'One-Way ANOVA', 'Comparison': group_var1,
+                            'F_Statistic': anova_table['F'][f'C({group_var1})'], 'P_Value': p_value,
+                            'Effect_Size': partial_eta_sq,
+                            'Significance': self.get_significance_label(p_value),
+                            'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
+                        })
+
+                        if p_value < 0.05:
+                            self.log(
+                                f"    - Conclusion: Statistically significant effect of {group_var1} on {metric}.")
+                            self.log("\n    - Performing Tukey HSD post-hoc test:")
+                            tukey_results = self.posthoc_table(df_analysis, metric, 'tukey_hsd', group_var1,
+                                                               posthoc_columns)
+                            # Mean difference is used as the effect size for Tukey
+                            self.record_posthoc(tukey_results, metric, 'Tukey HSD Post-hoc', 'diff',
+                                                self.tukey_details(tukey_results), all_statistical_results,
+                                                significant_comparisons_for_plot)
+                        else:
+                            self.log(
+                                f"    - Conclusion: No statistically significant effect of {group_var1} on {metric} (p={p_value:.3f}).")
+
+                else:  # Non-parametric alternative (if parametric test declined or assumptions not met)
+                    if len(unique_groups) == 2:
+                        self.log("\n  - Performing Mann-Whitney U test (non-parametric):")
+                        group1_data = df_cleaned[df_cleaned[group_var1] == unique_groups[0]][metric]
+                        group2_data = df_cleaned[df_cleaned[group_var1] == unique_groups[1]][metric]
+                        with self.perf.span("Mann-Whitney U test"):
+                            stat, p_value = stats.mannwhitneyu(group1_data, group2_data, alternative='two-sided')
+
+                        # Rank-biserial correlation from the U statistic (positive when the first group ranks higher)
+                        r_effect_size = 2 * stat / (len(group1_data) * len(group2_data)) - 1 \
+                            if not group1_data.empty and not group2_data.empty else np.nan
+
+                        self.log(
+                            f"    - Mann-Whitney U test: U-statistic={stat:.3f}, p-value={p_value:.3f}, Rank-Biserial Correlation={r_effect_size:.3f}")
+                        all_statistical_results.append({
+                            'Metric': metric, 'Test_Type': 'Mann-Whitney U test',
+                            'Comparison': f'{unique_groups[0]} vs {unique_groups[1]}',
+                            'F_Statistic': stat, 'P_Value': p_value, 'Effect_Size': r_effect_size,
+                            'Significance': self.get_significance_label(p_value),
+                            'Details': 'Non-parametric alternative.'
+                        })
+                        if p_value < 0.05:
+                            self.log(
+                                f"    - Conclusion: Statistically significant difference in ranks of {metric} between {unique_groups[0]} and {unique_groups[1]}.")
+                            significant_comparisons_for_plot.append({
+                                'groups': (unique_groups[0], unique_groups[1]), 'p': p_value,
+                                'label': self.get_significance_label(p_value)
+                            })
+                        else:
+                            self.log(
+                                f"    - Conclusion: No statistically significant difference in ranks of {metric} between {unique_groups[0]} and {unique_groups[1]}.")
+
+                    else:  # More than 2 unique groups -> Kruskal-Wallis H-test (non-parametric)
+                        self.log("\n  - Performing Kruskal-Wallis H-test (non-parametric):")
+                        groups_data_kruskal = [df_cleaned[metric][df_cleaned[group_var1] == g].dropna() for g in
+                                               unique_groups]
+                        with self.perf.span("Kruskal-Wallis test"):
+                            stat, p_value = stats.kruskal(*groups_data_kruskal)
+
+                        all_statistical_results.append({
+                            'Metric': metric, 'Test_Type': 'Kruskal-Wallis H-test', 'Comparison': group_var1,
+                            'F_Statistic': stat, 'P_Value': p_value, 'Effect_Size': np.nan,
+                            'Significance': self.get_significance_label(p_value),
+                            'Details': 'Non-parametric alternative due to assumption violation or user choice.'
+                        })
+                        self.log(f"    - Kruskal-Wallis H-test: H-statistic={stat:.3f}, p-value={p_value:.3f}")
+                        if p_value < 0.05:
+                            self.log(
+                                f"    - Conclusion: Statistically significant difference in ranks of {metric} between groups.")
+                            self.log(
+                                "\n    - Performing Dunn's Post-hoc test (using Bonferroni correction for pairwise comparisons):")
+                            posthoc_kw = self.posthoc_table(df_analysis, metric, 'mann_whitney', group_var1,
+                                                            posthoc_columns)
+                            # Rank-Biserial Correlation as the effect size
+                            self.record_posthoc(posthoc_kw, metric, 'Dunn\'s Post-hoc (Bonferroni)', 'RBC',
+                                                'Post-hoc for Kruskal-Wallis', all_statistical_results,
+                                                significant_comparisons_for_plot)
+                        else:
+                            self.log(
+                                f"    - Conclusion: No statistically significant difference in ranks of {metric} between groups.")
+
+        # --- Case 2: Two-way independent ANOVA or Case 3: Mixed ANOVA ---
+        elif group_var2 is not None:
+            if is_repeated_measures:  # Mixed ANOVA (Timepoint as one factor, other as between-subjects)
+                independent_factor = group_var1 if group_var1 != 'Timepoint' else group_var2
+                repeated_factor = 'Timepoint'
+
+                if independent_factor not in df_cleaned.columns:
+                    self.log(f"Independent factor '{independent_factor}' not found in data for mixed ANOVA.")
+                    return [], []
+
+                self.log(
+                    f"\n  - Considering Mixed ANOVA for '{metric}' with between-subject factor '{independent_factor}' and within-subject factor '{repeated_factor}':")
+
+                try:
+                    self.log(f"  - Dataframe head for Mixed ANOVA:\n{df_cleaned.head()}")
+                    self.log(
+                        f"  - Dataframe dtypes for Mixed ANOVA:\n{df_cleaned[[metric, repeated_factor, independent_factor, 'animal_id']].dtypes}")
+                    self.log(f"  - Unique subjects: {df_cleaned['animal_id'].nunique()}")
+                    self.log(
+                        f"  - Unique within-levels ({repeated_factor}): {df_cleaned[repeated_factor].unique()}")
+                    self.log(
+                        f"  - Unique between-levels ({independent_factor}): {df_cleaned[independent_factor].unique()}")
+
+                    aov_mixed = self.repeated_measures_table(df_analysis, metric, repeated_factor,
+                                                             between=independent_factor)
+                    self.log(str(aov_mixed))
+
+                    sphericity_p = np.nan
+                    if 'p-spher' in aov_mixed.columns:
+                        sphericity_p = aov_mixed.loc[aov_mixed['Source'] == repeated_factor, 'p-spher'].iloc[0]
+                    else:
+                        self.log(
+                            "  - Mauchly's Test for Sphericity not reported (two levels or unbalanced data). Assuming sphericity or test not applicable.")
+
+                    self.log(
+                        f"  - Mauchly's Test for Sphericity (p={sphericity_p:.3f}): {'Sphericity assumed.' if (sphericity_p >= 0.05 or pd.isna(sphericity_p)) else 'Sphericity violated. Greenhouse-Geisser correction applied.'}")
+
+                    effects = [independent_factor, repeated_factor, f'{independent_factor} * {repeated_factor}']
+                    for effect in effects:
+                        row_source = effect
+                        if effect == f'{independent_factor} * {repeated_factor}':
+                            row_source = 'Interaction'  # pingouin's name for the interaction row
+
+                        if row_source in aov_mixed['Source'].values:
+                            row_data = aov_mixed[aov_mixed['Source'] == row_source].iloc[0]
+                            p_value = row_data['p-unc']
+                            if row_source != independent_factor and sphericity_p < 0.05:
+                                p_value = row_data['p-GG-corr']  # Greenhouse-Geisser corrected
+                            partial_eta_sq = row_data['np2']
+
+                            all_statistical_results.append({
+                                'Metric': metric, 'Test_Type': 'Mixed ANOVA',
+                                'Comparison': effect.replace(' * ', ' x '),
+                                'F_Statistic': row_data['F'], 'P_Value': p_value,
+                                'Effect_Size': partial_eta_sq, 'Significance': self.get_significance_label(p_value),
+                                'Details': f"Sphericity p: {sphericity_p:.3f}"
+                            })
+                            self.log(
+                                f"    - Effect of {effect}: F-statistic={row_data['F']:.3f}, p-value={p_value:.3f}, Partial Eta-squared={partial_eta_sq:.3f}")
+                            if p_value < 0.05:
+                                self.log(f"      -> Statistically significant effect of {effect}.")
+
+                    # Post-hoc for interaction if significant
+                    interaction_term = 'Interaction'
+                    interaction_row = aov_mixed[aov_mixed['Source'] == interaction_term]
+                    if not interaction_row.empty and interaction_row['p-unc'].iloc[0] < 0.05:
+                        self.log("\n    - Significant interaction detected. Performing post-hoc comparisons:")
+                        posthoc_interaction = self.posthoc_table(df_analysis, metric, 'paired_tests',
+                                                                 repeated_factor, posthoc_columns,
+                                                                 by=independent_factor)
+                        # Only the within-subject level changes in these comparisons. For plotting, the groups
+                        # are (between_group, within_group) tuples, e.g. (Males, P4) vs (Males, P6)
+                        between_levels = posthoc_interaction[independent_factor]
+                        level_a, level_b = posthoc_interaction['A'], posthoc_interaction['B']
+                        self.record_posthoc(posthoc_interaction, metric, 'Pairwise t-test (Mixed ANOVA Post-hoc)',
+                                            'cohen-d',
+                                            f'Post-hoc for significant {independent_factor} x {repeated_factor} interaction',
+                                            all_statistical_results, significant_comparisons_for_plot,
+                                            comparisons=f"{independent_factor} (" + between_levels.astype(str) + "): " +
+                                                        level_a.astype(str) + " vs " + level_b.astype(str),
+                                            plot_groups=[((between, a), (between, b)) for between, a, b in
+                                                         zip(between_levels, level_a, level_b)])
+
+                    else:
+                        self.log("\n    - No significant interaction. Checking main effects for post-hoc:")
+                        # Post-hoc for main effect of independent_factor if significant
+                        independent_effect_row = aov_mixed[aov_mixed['Source'] == independent_factor]
+                        if not independent_effect_row.empty and independent_effect_row['p-unc'].iloc[0] < 0.05:
+                            self.log(
+                                f"\n    - Significant main effect of {independent_factor}. Performing post-hoc (Tukey HSD):")
+                            tukey_results = self.posthoc_table(df_analysis, metric, 'tukey_hsd', independent_factor,
+                                                               posthoc_columns)
+                            self.record_posthoc(tukey_results, metric,
+                                                f'Tukey HSD Post-hoc (Main Effect {independent_factor})', 'diff',
+                                                'Post-hoc for Mixed ANOVA Main Effect', all_statistical_results,
+                                                significant_comparisons_for_plot)
+
+                        # Post-hoc for main effect of repeated_factor if significant
+                        repeated_effect_row = aov_mixed[aov_mixed['Source'] == repeated_factor]
+                        if not repeated_effect_row.empty and repeated_effect_row['p-unc'].iloc[0] < 0.05:
+                            self.log(
+                                f"\n    - Significant main effect of {repeated_factor}. Performing pairwise post-hoc (Bonferroni corrected):")
+                            posthoc_rm_main = self.posthoc_table(df_analysis, metric, 'paired_tests', repeated_factor,
+                                                                 posthoc_columns)
+                            self.record_posthoc(posthoc_rm_main, metric,
+                                                f'Pairwise t-test (Main Effect {repeated_factor}, Bonferroni)',
+                                                'cohen-d', 'Post-hoc for Mixed ANOVA Main Effect',
+                                                all_statistical_results, significant_comparisons_for_plot)
+
+                except Exception as e:
+                    self.log(f"Error performing Mixed ANOVA: {e}")
+                    self.log(traceback.format_exc())  # Log the full traceback
+                    self.reporter.notify('error', "Analysis Error",
+                                         "Failed to perform Mixed ANOVA. Check data structure and raw log output for details.")
+                    return [], []
+
+            else:  # Two-way independent ANOVA
+                self.log(f"\n  - Considering Two-way ANOVA for {metric} by {group_var1} and {group_var2}:")
+
+                df_cleaned['__combined_group__'] = df_cleaned[group_var1].astype(str) + '_' + df_cleaned[
+                    group_var2].astype(str)
+                is_normal_all_groups, normality_str = self.check_normality(df_cleaned, '__combined_group__', metric)
+                self.log(normality_str)
+                is_homogeneous_variance, levene_p, homogeneity_str = self.check_homogeneity_of_variance(df_cleaned,
+                                                                                                        '__combined_group__',
+                                                                                                        metric)
+                self.log(homogeneity_str)
+                df_cleaned = df_cleaned.drop(columns='__combined_group__')
+
+                run_parametric = is_normal_all_groups and is_homogeneous_variance
+                if not run_parametric:
+                    self.log("\n  - Assumptions not fully met for Parametric Two-Way ANOVA.")
+                    user_choice = self._ask_parametric_despite_assumptions(
+                        choose_parametric,
+                        "Assumption Violation",
+                        "Statistical assumptions (Normality and/or Homogeneity of Variances) were not met.\n"
+                        "Do you want to proceed with the parametric Two-Way ANOVA anyway?\n"
+                        "Click 'No' to attempt a non-parametric alternative (Aligned Rank Transform ANOVA)."
+                    )
+                    run_parametric = user_choice
+                    if run_parametric:
+                        self.log(
+                            "  - Proceeding with Two-Way ANOVA despite assumption warnings. Interpret results with caution.")
+                    else:
+                        self.log("  - Proceeding with non-parametric alternative as requested.")
+
+                if run_parametric:
+                    self.log("\n  - Performing Two-way ANOVA (parametric):")
+                    anova_table = self.anova_table(df_analysis, metric, [group_var1, group_var2])
+                    self.log(str(anova_table))
+
+                    effects = [group_var1, group_var2, f'{group_var1}:{group_var2}']
+                    for effect in effects:
+                        effect_col_name = f'C({effect})' if ':' not in effect else f'C({group_var1}):C({group_var2})'
+                        if effect_col_name in anova_table.index:
+                            p_value = anova_table['PR(>F)'][effect_col_name]
+                            partial_eta_sq = self.calculate_partial_eta_squared(anova_table, effect_col_name)
+
+                            all_statistical_results.append({
+                                'Metric': metric, 'Test_Type': 'Two-Way ANOVA',
+                                'Comparison': effect.replace(':', ' x '),
+                                'F_Statistic': anova_table['F'][effect_col_name], 'P_Value': p_value,
+                                'Effect_Size': partial_eta_sq, 'Significance': self.get_significance_label(p_value),
+                                'Details': f"Homogeneity_of_Variance_p: {levene_p:.3f}"
+                            })
+                            self.log(
+                                f"    - Effect of {effect}: F-statistic={anova_table['F'][effect_col_name]:.3f}, p-value={p_value:.3f}, Partial Eta-squared={partial_eta_sq:.3f}")
+                            if p_value < 0.05:
+                                self.log(
+                                    f"      -> Statistically significant effect of {effect.replace(':', ' x ')}.")
+
+                    interaction_term_formula = f'C({group_var1}):C({group_var2})'
+                    interaction_p = anova_table['PR(>F)'][
+                        interaction_term_formula] if interaction_term_formula in anova_table.index else 1.0
+
+                    if interaction_p < 0.05:
+                        self.log(
+                            "\n    - Significant interaction detected. Performing post-hoc comparisons (Tukey HSD) on combined groups:")
+                        # Combined groups are labelled 'level1 x level2'
+                        tukey_results = self.posthoc_table(df_analysis, metric, 'tukey_hsd', [group_var1, group_var2],
+                                                           posthoc_columns)
+                        self.record_posthoc(tukey_results, metric, 'Tukey HSD Post-hoc (Interaction)', 'diff',
+                                            self.tukey_details(tukey_results), all_statistical_results,
+                                            significant_comparisons_for_plot)
+                    else:
+                        self.log("\n    - No significant interaction. Checking main effects for post-hoc:")
+                        for g_var in [group_var1, group_var2]:
+                            main_effect_p = anova_table['PR(>F)'][f'C({g_var})']
+                            if main_effect_p < 0.05:
+                                self.log(
+                                    f"\n    - Significant main effect of {g_var}. Performing post-hoc (Tukey HSD):")
+                                tukey_results = self.posthoc_table(df_analysis, metric, 'tukey_hsd', g_var,
+                                                                   posthoc_columns)
+                                self.record_posthoc(tukey_results, metric, f'Tukey HSD Post-hoc (Main Effect {g_var})',
+                                                    'diff', 'Post-hoc for Non-parametric Two-Way ANOVA Main Effect',
+                                                    all_statistical_results, significant_comparisons_for_plot)
+                else:  # Non-parametric two-way alternative (Aligned Rank Transform ANOVA)
+                    self.log("\n  - Assumptions not met or parametric test declined for Two-Way ANOVA.")
+                    self.log("    Proceeding with Non-parametric Two-way ANOVA (Aligned Rank Transform).")
+
+                    try:
+                        anova_table_non_parametric = self.aligned_rank_table(df_analysis, metric,
+                                                                             [group_var1, group_var2])
+                        self.log(str(anova_table_non_parametric))
+
+                        for effect_name_raw in [group_var1, group_var2, f'{group_var1}:{group_var2}']:
+                            effect_name_formula = f'C({effect_name_raw})' if ':' not in effect_name_raw else f'C({group_var1}):C({group_var2})'
+                            if effect_name_formula in anova_table_non_parametric.index:
+                                p_val = anova_table_non_parametric['PR(>F)'][effect_name_formula]
+                                F_stat = anova_table_non_parametric['F'][effect_name_formula]
+                                partial_eta_sq = self.calculate_partial_eta_squared(anova_table_non_parametric,
+                                                                                    effect_name_formula)
+
+                                all_statistical_results.append({
+                                    'Metric': metric, 'Test_Type': 'Non-parametric Two-Way ANOVA (ART)',
+                                    'Comparison': effect_name_raw.replace(':', ' x '),
+                                    'F_Statistic': F_stat, 'P_Value': p_val, 'Effect_Size': partial_eta_sq,
+                                    'Significance': self.get_significance_label(p_val),
+                                    'Details': 'Non-parametric alternative (Aligned Rank Transform).'
+                                })
+                                self.log(
+                                    f"    - Effect of {effect_name_raw.replace(':', ' x ')}: p-value={p_val:.3f}, Partial Eta Squared={partial_eta_sq:.3f}")
+                                if p_val < 0.05:
+                                    self.log(f"      -> Statistically significant effect (non-parametric).")
+
+                        p_val_interaction = anova_table_non_parametric['PR(>F)'][
+                            f'C({group_var1}):C({group_var2})'] if f'C({group_var1}):C({group_var2})' in anova_table_non_parametric.index else 1.0
+
+                        if p_val_interaction < 0.05:
+                            self.log(
+                                "\n    - Statistically significant interaction (non-parametric). Performing Simple Effects Analysis (ART-C contrasts) for significant interaction:")
+                            posthoc_cells = self.art_contrast_table(df_analysis, metric, [group_var1, group_var2],
+                                                                    [group_var1, group_var2])
+                            # Cell labels are 'level1 x level2'; map them back to (group_var1, group_var2) levels
+                            cells = df_cleaned[[group_var1, group_var2]].drop_duplicates()
+                            cell_levels = dict(zip(cells[group_var1].astype(str) + ' x ' + cells[group_var2].astype(str),
+                                                   zip(cells[group_var1], cells[group_var2])))
+                            cell_a, cell_b = posthoc_cells['A'].map(cell_levels), posthoc_cells['B'].map(cell_levels)
+                            for level_g2 in df_cleaned[group_var2].unique():
+                                self.log(
+                                    f"\n--- Simple Effect of {group_var1} for {group_var2} = {level_g2} ---")
+                                same_level = [a[1] == level_g2 and b[1] == level_g2 for a, b in zip(cell_a, cell_b)]
+                                posthoc_simple = posthoc_cells[same_level]
+
+                                if posthoc_simple.empty:
+                                    self.log(
+                                        f"  Not enough unique groups for simple effect analysis for {group_var1} at {group_var2}={level_g2}.")
+                                    continue
+
+                                # Plot groups are (group_var1 level, group_var2 level) cells
+                                self.record_posthoc(posthoc_simple, metric,
+                                                    f'ART-C Contrast (Simple Effect {group_var1} at {group_var2}={level_g2})',
+                                                    'diff', 'Post-hoc for Non-parametric Two-Way ANOVA Interaction (Tukey-adjusted, aligned ranks)',
+                                                    all_statistical_results, significant_comparisons_for_plot,
+                                                    comparisons=cell_a[same_level].str[0].astype(str) + ' vs ' +
+                                                                cell_b[same_level].str[0].astype(str),
+                                                    plot_groups=list(zip(cell_a[same_level], cell_b[same_level])))
+
+                        elif p_val_interaction >= 0.05:
+                            self.log("\n  - No statistically significant interaction (non-parametric).")
+                            for effect_src in [group_var1, group_var2]:
+                                effect_name_formula = f'C({effect_src})'
+                                p_main_effect = anova_table_non_parametric['PR(>F)'][
+                                    effect_name_formula] if effect_name_formula in anova_table_non_parametric.index else np.nan
+                                if p_main_effect < 0.05:
+                                    self.log(
+                                        f"\n  - Statistically significant main effect of {effect_src} (non-parametric).")
+                                    self.log(
+                                        f"    Performing post-hoc (ART-C contrasts) for main effect of {effect_src}:")
+                                    posthoc_main = self.art_contrast_table(df_analysis, metric, [group_var1, group_var2],
+                                                                           [effect_src])
+                                    self.record_posthoc(posthoc_main, metric, f'ART-C Contrast (Main Effect {effect_src})',
+                                                        'diff', 'Post-hoc for Non-parametric Two-Way ANOVA Main Effect (Tukey-adjusted, aligned ranks)',
+                                                        all_statistical_results, significant_comparisons_for_plot)
+                    except Exception as e:
+                        self.log(f"Error performing Non-parametric Two-way ANOVA: {e}")
+                        self.log(traceback.format_exc())  # Log the full traceback for fallback
+                        self.reporter.notify('error', "Analysis Error",
+                                             "Could not perform non-parametric analysis. Returning no results.")
+                        return [], []
+
+        self.log("\n--- Statistical Analysis Complete ---")
+        return all_statistical_results, significant_comparisons_for_plot
+
+    def calculate_descriptive_statistics(self, df, metric, grouping_vars):
+        """
+        Calculates and prints descriptive statistics for a given metric,
+        grouped by specified variables. Outputs to the GUI's log.
+        """
+        self.log(f"\n--- Descriptive Statistics for '{metric}' ---")
+
+        if not grouping_vars:
+            desc_stats = df[metric].describe()
+            self.log("\nOverall Descriptive Statistics:")
+            self.log(str(desc_stats))
+        elif (self.session.analysis_view(df) is self.session.df_prepared and self.session.descriptive_cube and metric in self.session.available_metrics
+              and set(grouping_vars) <= set(self.session.available_grouping_variables)):
+            # Precomputed at load time: just read the table for this metric and grouping
+            grouped_stats = descriptive_cube_lookup(self.session.descriptive_cube, metric, grouping_vars).round(3)
+            grouped_stats = grouped_stats.rename(columns={'sem': 'standard_error_of_mean'})
+            self.log(f"\nDescriptive Statistics by {', '.join(grouping_vars)}:")
+            self.log(str(grouped_stats))
+        else:
+            df_display = self.session.analysis_view(df)
+
+            # Use original grouping_vars for groupby, then display with labels
+            grouped_stats = df_display.groupby(grouping_vars, observed=True)[metric].agg(
+                ['count', 'mean', 'std', 'min', 'max', 'median', 'sem']).round(3)
+            grouped_stats.rename(columns={'sem': 'standard_error_of_mean'}, inplace=True)
+            self.log(f"\nDescriptive Statistics by {', '.join(grouping_vars)}:")
+            self.log(str(grouped_stats))
+
+        self.log("\n--- Descriptive Statistics Complete ---")
+        return grouped_stats
+
+    def apply_family_correction(self, results_df):
+        """
+        Adds P_Adjusted_Family / Significance_Family: every p-value of the combined results table
+        corrected with the selected method within the selected family (per metric, per test type or global).
+        """
+        method_name, family_name = self.session.options.correction_method, self.session.options.correction_family
+        family_column = self.session.CORRECTION_FAMILIES[family_name]
+        results_df['P_Adjusted_Family'] = adjust_p_values_family(
+            pd.to_numeric(results_df['P_Value'], errors='coerce'),
+            results_df[family_column] if family_column else None, self.session.FAMILY_CORRECTION_METHODS[method_name])
+        results_df['Significance_Family'] = results_df['P_Adjusted_Family'].map(
+            lambda p: self.get_significance_label(p) if pd.notna(p) else '')
+        self.log(f"\n--- Family-wide correction: {method_name}, {family_name.lower()} "
+                 f"({results_df['P_Adjusted_Family'].notna().sum()} p-values) ---")
+        return results_df
+
+
+# --- Plotting: mean/SD dot plot of one metric with its significant comparisons ---
+class MetricPlotter(object):
+    """Plots of a session's dataset (saved as PNG; the figure is returned for display). Logs through `reporter`."""
+
+    def __init__(self, session, reporter=None):
+        self.session = session
+        self.reporter = reporter or Reporter()
+        self.perf = session.perf
+        self.log = self.reporter.log
+
+    def plot_dot_plot_with_mean_sd_reinstated(self, df, metric, primary_grouping, secondary_grouping, output_dir,
+                                              sex_labels, genotype_labels, timepoint_order,
+                                              significant_comparisons=None):
+        """
+        Generates a plot with mean and standard deviation, with
+        optional secondary grouping and significance annotations.
+        Returns the matplotlib Figure object.
+        """
+        self.log(f"Generating plot for {metric} by {primary_grouping}" + (
+            f" and {secondary_grouping}" if secondary_grouping else "") + " (Means and SDs Only)...")
+
+        fig, ax = plt.subplots(figsize=(10, 7))
+        sns.set_style("whitegrid")
+
+        # Readable labels for plotting (the prepared view of the loaded data is reused as is)
+        if df is self.session.df_prepared or df is self.session.df_aggregated and self.session.df_prepared is not None:
+            df_plot = self.session.df_prepared
+        else:
+            df_plot = prepare_analysis_view(df, sex_labels, genotype_labels, timepoint_order)
+
+        # Determine x_axis and hue variables
+        x_axis_var = primary_grouping
+
+        pointplot_hue_var = None
+
+        # Color palettes and marker maps
+        SEX_COLOR_MAP_PLOT = {'Females': 'pink', 'Males': 'blue'}
+        GENOTYPE_COLOR_MAP_PLOT = {'Wild Type': 'green', 'Mutant': 'purple'}
+
+        point_palette_arg = None  # Will be either a dict
+        point_hue_order = None  # Will be explicitly set or left for seaborn to infer
+
+        plot_order_x = None
+        if x_axis_var == 'Timepoint':
+            plot_order_x = timepoint_order
+        else:
+            plot_order_x = sorted(df_plot[x_axis_var].dropna().unique())
+
+        if secondary_grouping:
+            pointplot_hue_var = secondary_grouping
+
+            if secondary_grouping == 'Sex':
+                point_palette_dict = {label: SEX_COLOR_MAP_PLOT.get(label, 'gray') for label in
+                                      self.session.SEX_LABELS.values()}
+                point_palette_arg = point_palette_dict
+                # Ensure hue order matches the palette keys and available data
+                point_hue_order = [lbl for lbl in point_palette_dict.keys() if
+                                   lbl in df_plot[pointplot_hue_var].dropna().unique()]
+            elif secondary_grouping == 'Genotype':
+                point_palette_dict = {label: GENOTYPE_COLOR_MAP_PLOT.get(label, 'gray') for label in
+                                      self.session.GENOTYPE_LABELS.values()}
+                point_palette_arg = point_palette_dict
+                # Ensure hue order matches the palette keys and available data
+                point_hue_order = [lbl for lbl in point_palette_dict.keys() if
+                                   lbl in df_plot[pointplot_hue_var].dropna().unique()]
+            else:
+                # For other secondary grouping variables, generate a palette dynamically
+                unique_hue_levels = sorted(df_plot[pointplot_hue_var].dropna().unique().tolist())
+                if not unique_hue_levels:
+                    self.log(
+                        f"Warning: No valid data for hue variable '{pointplot_hue_var}' to plot. Plotting skipped.")
+                    plt.close(fig)  # Close the empty figure
+                    return None, None
+
+                    # Generate a default color palette if not Sex/Genotype and create a dictionary
+                colors = sns.color_palette("viridis", n_colors=len(unique_hue_levels))
+                point_palette_arg = {level: colors[i] for i, level in enumerate(unique_hue_levels)}
+                point_hue_order = unique_hue_levels  # Set hue order to all unique levels
+
+            # Display Mean and SD only
+            sns.pointplot(x=x_axis_var, y=metric, hue=pointplot_hue_var, data=df_plot,
+                          linestyle='none', estimator=np.mean, errorbar='sd', capsize=0.1,
+                          # Replaced join=False with linestyle='none'
+                          palette=point_palette_arg, dodge=0.6, ax=ax, markers='D',
+                          # Diamond marker for mean, explicit dodge width
+                          order=plot_order_x, hue_order=point_hue_order)
+
+            # --- Calculate x_group_positions for significance bars ---
+            x_group_positions = {}
+
+            num_x_categories = len(plot_order_x)
+            num_hue_categories = len(point_hue_order)
+
+            # Match the dodge width used in sns.pointplot
+            explicit_dodge_width = 0.6
+            if num_hue_categories > 1:
+                point_width_in_dodge = explicit_dodge_width / num_hue_categories
+                # The first point for an x-category is offset from the center of the x-tick
+                start_offset = -(explicit_dodge_width / 2) + (point_width_in_dodge / 2)
+            else:
+                point_width_in_dodge = 0
+                start_offset = 0
+
+            for i, x_cat in enumerate(plot_order_x):
+                for j, hue_cat in enumerate(point_hue_order):
+                    actual_x_pos = i + start_offset + j * point_width_in_dodge
+                    x_group_positions[(x_cat, hue_cat)] = actual_x_pos
+
+            # Create a combined legend for means (diamond)
+            handles = []
+            labels = []
+            for hue_val in point_hue_order:
+                label = f"{hue_val}"
+                handles.append(plt.Line2D([0], [0], marker='D',  # Diamond marker for mean
+                                          color='w', markerfacecolor=point_palette_arg.get(hue_val, 'gray'),
+                                          markeredgecolor='k', markersize=10, linestyle='None'))
+                labels.append(label)
+
+            ax.legend(handles, labels, title=pointplot_hue_var, bbox_to_anchor=(1.05, 1), loc='upper left')
+
+        else:  # Only one grouping variable
+            sns.pointplot(x=x_axis_var, y=metric, data=df_plot,
+                          linestyle='none', estimator=np.mean, errorbar='sd', capsize=0.1,
+                          # Replaced join=False with linestyle='none'
+                          color='black', ax=ax, markers='D',  # Diamond marker for mean
+                          order=plot_order_x)
+
+            # For single grouping variable, x_coords for significance bars are simply 0, 1, 2...
+            x_group_positions = {val: i for i, val in enumerate(plot_order_x)}
+
+            # Add legend for single variable case: mean
+            handles = [
+                plt.Line2D([0], [0], marker='D', color='w', markerfacecolor='black', markeredgecolor='black',
+                           markersize=10, linestyle='None', label='Mean ± SD')
+            ]
+            ax.legend(handles=handles, title="Legend", bbox_to_anchor=(1.05, 1), loc='upper left')
+
+        plt.title(f'{metric} by {primary_grouping}' + (f' and {secondary_grouping}' if secondary_grouping else ''))
+        plt.ylabel(metric)
+        plt.xlabel(primary_grouping)
+        plt.tight_layout(rect=[0, 0, 0.85, 1])  # Adjust layout to make space for legend
+
+        # Add significance annotations
+        if significant_comparisons:
+            # Recalculate y_max_overall based on means + SDs visible in the plot, not just raw data points
+            y_vals_upper_sd = []
+            if secondary_grouping:
+                for x_cat in plot_order_x:
+                    for hue_cat in point_hue_order:
+                        subset = df_plot[(df_plot[x_axis_var] == x_cat) & (df_plot[pointplot_hue_var] == hue_cat)]
+                        if not subset.empty:
+                            mean_val = subset[metric].mean()
+                            std_val = subset[metric].std()
+                            if pd.notna(mean_val) and pd.notna(std_val):
+                                y_vals_upper_sd.append(mean_val + std_val)
+            else:
+                for x_cat in plot_order_x:
+                    subset = df_plot[df_plot[x_axis_var] == x_cat]
+                    if not subset.empty:
+                        mean_val = subset[metric].mean()
+                        std_val = subset[metric].std()
+                        if pd.notna(mean_val) and pd.notna(std_val):
+                            y_vals_upper_sd.append(mean_val + std_val)
+
+            if y_vals_upper_sd:
+                y_max_overall_plot = max(y_vals_upper_sd)
+            else:
+                y_max_overall_plot = df_plot[metric].max() if not df_plot.empty else 1  # Fallback if no data
+
+            y_min_overall = df_plot[metric].min() if not df_plot.empty else 0
+            y_range_overall = y_max_overall_plot - y_min_overall
+            if y_range_overall == 0: y_range_overall = y_max_overall_plot * 0.2 if y_max_overall_plot != 0 else 1  # Avoid division by zero
+
+            # Start position for significance bars
+            y_pos_start = y_max_overall_plot + y_range_overall * 0.1
+
+            # Store the current y-position to avoid overlaps
+            current_y_pos = y_pos_start
+
+            # Filter and sort comparisons to prevent overlap
+            filtered_comparisons = []
+            for comp in significant_comparisons:
+                g1, g2 = comp['groups']
+
+                formatted_g1 = g1
+                formatted_g2 = g2
+
+                if formatted_g1 in x_group_positions and formatted_g2 in x_group_positions:
+                    filtered_comparisons.append(
+                        {'groups': (formatted_g1, formatted_g2), 'p': comp['p'], 'label': comp['label']})
+                else:
+                    self.log(
+                        f"Warning: Comparison groups {g1} and {g2} (formatted as {formatted_g1} and {formatted_g2}) not found in plot positions. Skipping annotation.")
+
+            filtered_comparisons.sort(
+                key=lambda c: abs(x_group_positions[c['groups'][0]] - x_group_positions[c['groups'][1]]))
+
+            for i, comp in enumerate(filtered_comparisons):
+                g1_key, g2_key = comp['groups']
+                p_label = comp['label']
+
+                x1 = x_group_positions[g1_key]
+                x2 = x_group_positions[g2_key]
+
+
+                if secondary_grouping:
+                    group1_primary_level = g1_key[0]
+                    group1_secondary_level = g1_key[1]
+                    group2_primary_level = g2_key[0]
+                    group2_secondary_level = g2_key[1]
+
+
+                    subset_g1 = df_plot[(df_plot[primary_grouping] == group1_primary_level) &
+                                        (df_plot[secondary_grouping] == group1_secondary_level)]
+                    subset_g2 = df_plot[(df_plot[primary_grouping] == group2_primary_level) &
+                                        (df_plot[secondary_grouping] == group2_secondary_level)]
+
+                    mean_g1 = subset_g1[metric].mean() if not subset_g1.empty else np.nan
+                    std_g1 = subset_g1[metric].std() if not subset_g1.empty else np.nan
+                    mean_g2 = subset_g2[metric].mean() if not subset_g2.empty else np.nan
+                    std_g2 = subset_g2[metric].std() if not subset_g2.empty else np.nan
+
+                    y_val1 = mean_g1 + std_g1 if pd.notna(mean_g1) and pd.notna(std_g1) else y_max_overall_plot
+                    y_val2 = mean_g2 + std_g2 if pd.notna(mean_g2) and pd.notna(std_g2) else y_max_overall_plot
+
+                else:  # Only primary grouping
+                    subset_g1 = df_plot[df_plot[primary_grouping] == g1_key]
+                    subset_g2 = df_plot[df_plot[primary_grouping] == g2_key]
+
+                    mean_g1 = subset_g1[metric].mean() if not subset_g1.empty else np.nan
+                    std_g1 = subset_g1[metric].std() if not subset_g1.empty else np.nan
+                    mean_g2 = subset_g2[metric].mean() if not subset_g2.empty else np.nan
+                    std_g2 = subset_g2[metric].std() if not subset_g2.empty else np.nan
+
+                    y_val1 = mean_g1 + std_g1 if pd.notna(mean_g1) and pd.notna(std_g1) else y_max_overall_plot
+                    y_val2 = mean_g2 + std_g2 if pd.notna(mean_g2) and pd.notna(std_g2) else y_max_overall_plot
+
+                # Ensure y_val1 and y_val2 are finite numbers for comparison
+                y_val1 = y_val1 if np.isfinite(y_val1) else y_max_overall_plot
+                y_val2 = y_val2 if np.isfinite(y_val2) else y_max_overall_plot
+
+                potential_bar_level = max(y_val1, y_val2) + y_range_overall * 0.05  # Initial buffer above the points
+
+                # Ensure current_y_pos is always at least the potential bar level
+                current_y_pos = max(current_y_pos + y_range_overall * 0.03, potential_bar_level)
+
+                # Draw the bar
+                ax.plot([x1, x1, x2, x2],
+                        [current_y_pos, current_y_pos + y_range_overall * 0.01, current_y_pos + y_range_overall * 0.01,
+                         current_y_pos],
+                        lw=1.5, c='k')
+                # Add the text label
+                ax.text((x1 + x2) / 2, current_y_pos + y_range_overall * 0.01 + y_range_overall * 0.005, p_label,
+                        ha='center', va='bottom', color='k', fontsize=10)
+
+            # Adjust y-limit to ensure significance bars are visible
+            # Maximize y-limit based on the highest `current_y_pos` used
+            ax.set_ylim(top=current_y_pos + y_range_overall * 0.05)
+            # Add autoscale to ensure all elements fit
+            ax.autoscale_view()
+
+        plt.tight_layout(rect=[0, 0, 0.85, 1])  # Re-adjust layout after adding sig bars
+
+        # Save plot and return Figure object
+        file_name = f'{metric}_by_{primary_grouping}'
+        if secondary_grouping:
+            file_name += f'_{secondary_grouping}'
+        file_name = file_name.replace(' ', '_').replace('/',
+                                                        '_') + '_mean_sd_plot.png'  # Changed filename to reflect plot type
+
+        plot_path = os.path.join(output_dir, file_name)
+        with self.perf.span("Save figure"):
+            fig.savefig(plot_path, dpi=300, bbox_inches='tight')
+        plt.close(fig)  # Close the figure to free memory
+        return fig, plot_path  # Return both the figure and its save path
+
+
+# --- Plain function API (the app, notebooks, scripts, worker processes) ---
+class AnalysisOutput(object):
+    """What an analysis produced: results and descriptive statistics tables, and the plot of a single metric."""
+
+    def __init__(self):
+        self.results = pd.DataFrame()
+        self.descriptive = pd.DataFrame()
+        self.figure = None
+        self.plot_path = None
+
+
+def load_data(session, paths, reporter=None):
+    """Loads the cohort folders/zipped cohorts at `paths` into `session` (df_aggregated stays None if that fails)."""
+    CohortLoader(session, reporter).load(paths)
+    return session
+
+
+def load_from_catalog(session, reporter=None):
+    """Loads every cohort stored in the session catalog into `session` without rereading any CSV file."""
+    CohortLoader(session, reporter).load_from_catalog()
+    return session
+
+
+def select_dataset(session, reporter=None):
+    """Applies the metric variant and subset filters of session.options to the analyzed dataset."""
+    CohortLoader(session, reporter).select_dataset()
+    return session
+
+
+def load_cohorts(paths, reporter=None, output_dir=None, **options):
+    """
+    A new USVSession with the cohort folders/zipped cohorts at `paths` loaded (its df_aggregated is
+    None if loading failed). `options` are AnalysisOptions by name, e.g. flag_outliers=True or
+    assumption_policy='Always parametric'.
+    """
+    return load_data(USVSession(output_dir, AnalysisOptions(**options)), paths, reporter)
+
+
+def analyze_metric(session, metric, primary_grouping, secondary_grouping=None, reporter=None, choose_parametric=None):
+    """
+    Descriptive statistics, statistical tests and plot of one metric (results saved to
+    analysis_results/, the plot to plots/). `choose_parametric` answers assumption violations
+    (see assumption_policy; default: the session's policy).
+    """
+    reporter = reporter or Reporter()
+    return run_with_profiler(session, 'analysis', reporter, _analyze_metric, session, metric, primary_grouping,
+                             secondary_grouping, reporter, choose_parametric)
+
+
+def analyze_all_metrics(session, primary_grouping, secondary_grouping=None, reporter=None, choose_parametric=None):
+    """Every metric by the given grouping variables (no plots), with all p-values corrected family-wide."""
+    reporter = reporter or Reporter()
+    return run_with_profiler(session, 'all_metrics', reporter, _analyze_all_metrics, session, primary_grouping,
+                             secondary_grouping, reporter, choose_parametric)
+
+
+def analyze(session, metric=None, primary_grouping='Genotype', secondary_grouping=None, reporter=None,
+            choose_parametric=None):
+    """
+    Analyzes one metric (with its plot) or, without `metric`, every metric with the family-wide
+    correction; returns the statistical results and the descriptive statistics as DataFrames.
+    """
+    if metric:
+        output = analyze_metric(session, metric, primary_grouping, secondary_grouping, reporter, choose_parametric)
+    else:
+        output = analyze_all_metrics(session, primary_grouping, secondary_grouping, reporter, choose_parametric)
+    return output.results, output.descriptive
+
+
+@contextmanager
+def _print_to(stream):
+    """print() output goes to `stream` (where the log goes) while an analysis runs."""
+    if stream is None:
+        yield
+    else:
+        with redirect_stdout(stream):
+            yield
+
+
+def _analyze_metric(session, selected_metric, primary_grouping, secondary_grouping, reporter, choose_parametric):
+    output = AnalysisOutput()
+    perf, log = session.perf, reporter.log
+    perf.reset()
+    log(f"Starting analysis for Metric: {selected_metric}, Primary Group: {primary_grouping}" +
+        (f", Secondary Group: {secondary_grouping}" if secondary_grouping else ""))
+
+    try:
+        with _print_to(reporter.stream):
+            statistics = StatisticalAnalysis(session, reporter)
+            # 1. Calculate Descriptive Statistics
+            grouping_for_desc_stats = [primary_grouping]
+            if secondary_grouping:
+                grouping_for_desc_stats.append(secondary_grouping)
+
+            with perf.span("Descriptive statistics"):
+                output.descriptive = statistics.calculate_descriptive_statistics(session.df_prepared, selected_metric,
+                                                                                 grouping_for_desc_stats)
+
+            # 2. Perform Statistical Analysis
+            with perf.span("Statistical analysis"):
+                statistical_results_list, significant_comparisons = statistics.perform_statistical_analysis(
+                    session.df_prepared, selected_metric, primary_grouping, secondary_grouping, choose_parametric
+                )
+
+            # 3. Generate Plot
+            # Only attempt to generate plot if analysis was successful or didn't explicitly fail
+            try:
+                with perf.span("Plotting"):
+                    output.figure, output.plot_path = MetricPlotter(session, reporter).plot_dot_plot_with_mean_sd_reinstated(
+                        session.df_prepared, selected_metric, primary_grouping, secondary_grouping,
+                        session.plot_output_dir, session.SEX_LABELS, session.GENOTYPE_LABELS,
+                        session.TIMEPOINT_ORDER, significant_comparisons
+                    )
+            except Exception as plot_e:
+                log(f"\nAn error occurred during plot generation: {plot_e}")
+                log(traceback.format_exc())
+                reporter.notify('warning', "Plotting Error",
+                                f"Failed to generate plot: {plot_e}\nCheck 'Statistical Output' tab for details.")
+
+            if output.plot_path:
+                log(f"\nPlot saved to: {output.plot_path}")
+            else:
+                log("\nPlot generation skipped due to previous errors or no valid data.")
+
+            if statistical_results_list:
+                output.results = pd.DataFrame(statistical_results_list)
+                # Save statistical results to CSV
+                output_file = os.path.join(session.analysis_results_dir, f'statistical_results_{selected_metric}.csv')
+                with perf.span("Export"):
+                    output.results.to_csv(output_file, index=False)
+                log(f"\n--- Statistical results saved to '{output_file}' ---")
+            else:
+                log("\nNo statistical results to display or save.")
+
+        reporter.status("Analysis complete!")
+
+    except Exception as e:
+        log(f"\nAn unexpected error occurred during analysis: {e}")
+        log(traceback.format_exc())  # Log the full traceback
+        reporter.notify('error', "Analysis Error",
+                        f"An error occurred during analysis: {e}\nCheck the 'Statistical Output' tab for details.")
+    finally:
+        save_run_profile(session, 'analysis', reporter, metric=selected_metric, primary_grouping=primary_grouping,
+                         secondary_grouping=secondary_grouping)
+    return output
+
+
+def _analyze_all_metrics(session, primary_grouping, secondary_grouping, reporter, choose_parametric):
+    output = AnalysisOutput()
+    perf, log = session.perf, reporter.log
+    perf.reset()
+    metrics = list(session.available_metrics)
+    log(f"Starting analysis of all {len(metrics)} metrics, Primary Group: {primary_grouping}" +
+        (f", Secondary Group: {secondary_grouping}" if secondary_grouping else ""))
+
+    try:
+        with _print_to(reporter.stream):
+            statistics = StatisticalAnalysis(session, reporter)
+            grouping_for_desc_stats = [primary_grouping] + ([secondary_grouping] if secondary_grouping else [])
+            all_results = []
+            descriptive_tables = {}
+            session.progress.start("Run All Metrics", len(metrics), 'metrics')
+            for index, metric in enumerate(metrics, start=1):
+                reporter.status(f"Analyzing metric {index}/{len(metrics)}: {metric}")
+                with perf.span("Descriptive statistics"):
+                    descriptive_tables[metric] = statistics.calculate_descriptive_statistics(session.df_prepared, metric,
+                                                                                             grouping_for_desc_stats)
+                with perf.span("Statistical analysis"):
+                    results, _ = statistics.perform_statistical_analysis(session.df_prepared, metric, primary_grouping,
+                                                                         secondary_grouping, choose_parametric)
+                all_results.extend(results)
+                session.progress.advance()
+                reporter.progress(session.progress)
+
+            output.descriptive = pd.concat(descriptive_tables, names=['Metric']).reset_index()
+
+            if all_results:
+                with perf.span("Family-wide correction"):
+                    output.results = statistics.apply_family_correction(pd.DataFrame(all_results))
+                output_file = os.path.join(session.analysis_results_dir, 'statistical_results_all_metrics.csv')
+                with perf.span("Export"):
+                    output.results.to_csv(output_file, index=False)
+                log(f"\n--- Statistical results saved to '{output_file}' ---")
+            else:
+                log("\nNo statistical results to display or save.")
+
+        reporter.status("Analysis of all metrics complete!")
+
+    except Exception as e:
+        log(f"\nAn unexpected error occurred during analysis: {e}")
+        log(traceback.format_exc())
+        reporter.notify('error', "Analysis Error",
+                        f"An error occurred during analysis: {e}\nCheck the 'Statistical Output' tab for details.")
+    finally:
+        session.progress.finish()
+        reporter.progress(session.progress, force=True)
+        save_run_profile(session, 'all_metrics', reporter, metrics=len(metrics), primary_grouping=primary_grouping,
+                         secondary_grouping=secondary_grouping)
+    return output
+
+
+def run_with_profiler(session, run, reporter, function, *args):
+    """Runs function(*args), under cProfile when the session's profile_run option is set."""
+    if not session.options.profile_run:
+        return function(*args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        save_profile(session, profiler, run, reporter)
+
+
+def save_profile(session, profiler, run, reporter=None):
+    """
+    Saves the raw profile (.prof, for snakeviz/pstats) and a top-N cumulative-time summary (.txt)
+    to analysis_results/, and logs the hottest functions.
+    """
+    log = (reporter or Reporter()).log
+    base_path = os.path.join(session.analysis_results_dir, f"profile_{run}_{datetime.now():%Y%m%d_%H%M%S}")
+    summary = io.StringIO()
+    stats_profile = pstats.Stats(profiler, stream=summary).sort_stats('cumulative')
+    stats_profile.print_stats(session.PROFILE_TOP_N)
+    hottest = io.StringIO()
+    stats_profile.stream = hottest
+    stats_profile.print_stats(session.PROFILE_DISPLAY_TOP_N)
+    try:
+        profiler.dump_stats(base_path + '.prof')
+        with open(base_path + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+    except OSError as e:
+        log(f"Could not save the profile: {e}")
+        return
+    # Only the table of the summary (pstats' header lists the profile's source)
+    table = hottest.getvalue()
+    table = table[table.find('   ncalls'):] if '   ncalls' in table else table
+    log(f"\n--- Profile: {session.PROFILE_DISPLAY_TOP_N} hottest functions by cumulative time ---")
+    log(table.rstrip())
+    log(f"--- Profile saved to '{base_path}.prof' (summary: '{base_path}.txt') ---")
+
+
+def save_run_profile(session, run, reporter=None, **context):
+    """Saves the stage timings of the last load/analysis run as a JSON run profile."""
+    log = (reporter or Reporter()).log
+    file_path = os.path.join(session.analysis_results_dir,
+                             f"run_profile_{run}_{session.perf.started:%Y%m%d_%H%M%S}.json")
+    sessions = len(session.df_aggregated) if session.df_aggregated is not None else 0
+    try:
+        session.perf.save(file_path, run=run, sessions=sessions, **context)
+        log(f"\n--- Run profile saved to '{file_path}' ---")
+    except (OSError, TypeError, ValueError) as e:
+        log(f"Could not save the run profile: {e}")
+
+
+# --- Job queue: analyses queued in SQLite and run unattended by a pool of worker processes ---
+class JobQueue(object):
+    """
+    Persistent queue of analysis jobs (SQLite). A job is a spec (cohorts, metric, groupings, options,
+    see USVSession.job_spec) with a priority: higher priorities run first, then the oldest job.
+    Failed jobs are queued again after a growing delay until they used up max_attempts; jobs left
+    'running' by a scheduler that stopped sending heartbeats (crash, killed process) are queued again.
+    The result rows of completed jobs are indexed by metric, test and significance.
+    """
+    STATUSES = ['queued', 'running', 'done', 'failed', 'cancelled']
+    RETRY_DELAY_S = 30  # Delay before the first retry of a failed job, doubled at every further attempt
+    JOB_COLUMNS = ['id', 'name', 'priority', 'status', 'attempts', 'max_attempts', 'submitted', 'started',
+                   'finished', 'output_dir', 'error']
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()  # One connection for the app's Tk thread and its scheduler thread
+        self.connection.execute("PRAGMA journal_mode=WAL")  # Status views read while a scheduler writes
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, spec TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL DEFAULT 3,
+                not_before REAL NOT NULL DEFAULT 0, heartbeat REAL, worker TEXT,
+                submitted TEXT, started TEXT, finished TEXT, output_dir TEXT, error TEXT);
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, id);
+            CREATE TABLE IF NOT EXISTS job_results (
+                job_id INTEGER, metric TEXT, test_type TEXT, comparison TEXT, p_value REAL, p_adjusted REAL,
+                effect_size REAL, significance TEXT, row TEXT);
+            CREATE INDEX IF NOT EXISTS idx_job_results_job ON job_results (job_id);
+            CREATE INDEX IF NOT EXISTS idx_job_results_metric ON job_results (metric);
+            CREATE INDEX IF NOT EXISTS idx_job_results_significance ON job_results (significance);
+            CREATE TABLE IF NOT EXISTS job_outputs (job_id INTEGER, kind TEXT, path TEXT);
+            CREATE INDEX IF NOT EXISTS idx_job_outputs_job ON job_outputs (job_id);
+        """)
+
+    def _write(self, sql, params=()):
+        with self._lock, self.connection:
+            return self.connection.execute(sql, params)
+
+    def submit(self, spec, priority=0, name=None, max_attempts=3):
+        """Adds a job and returns its id."""
+        if name is None:
+            design = spec['primary'] + (f" x {spec['secondary']}" if spec.get('secondary') else "")
+            cohorts = ", ".join(os.path.basename(os.path.normpath(path)) for path in spec['data'])
+            name = f"{spec.get('metric') or 'All metrics'} by {design} ({cohorts})"
+        return self._write(
+            "INSERT INTO jobs (name, spec, priority, max_attempts, submitted) VALUES (?, ?, ?, ?, ?)",
+            (name, json.dumps(spec), int(priority), int(max_attempts),
+             datetime.now().isoformat(timespec='seconds'))).lastrowid
+
+    def claim(self, worker):
+        """Marks the next due job as running for `worker`; returns (id, spec) or None if no job is due."""
+        while True:
+            with self._lock:
+                row = self.connection.execute(
+                    "SELECT id, spec FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                    "ORDER BY priority DESC, id LIMIT 1", (time.time(),)).fetchone()
+            if row is None:
+                return None
+            # Another scheduler on the same queue may have taken it in between: only one UPDATE succeeds
+            claimed = self._write(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, heartbeat = ?, started = ?, "
+                "error = NULL WHERE id = ? AND status = 'queued'",
+                (worker, time.time(), datetime.now().isoformat(timespec='seconds'), row[0])).rowcount
+            if claimed:
+                return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_ids):
+        """Tells other schedulers that these running jobs are still alive."""
+        if job_ids:
+            self._write(f"UPDATE jobs SET heartbeat = ? WHERE id IN ({', '.join('?' * len(job_ids))})",
+                        [time.time()] + list(job_ids))
+
+    def complete(self, job_id, outcome):
+        """Marks a job done and indexes its result rows and output files (`outcome` of run_job)."""
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            self.connection.execute("DELETE FROM job_outputs WHERE job_id = ?", (job_id,))
+            self.connection.executemany(
+                "INSERT INTO job_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, row.get('Metric'), row.get('Test_Type'), row.get('Comparison'), row.get('P_Value'),
+                  row.get('P_Adjusted_Family'), row.get('Effect_Size'),
+                  row.get('Significance_Family') or row.get('Significance'), json.dumps(row))
+                 for row in outcome['results']])
+            self.connection.executemany("INSERT INTO job_outputs VALUES (?, ?, ?)",
+                                        [(job_id, kind, path) for kind, path in outcome['files']])
+            self.connection.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, output_dir = ?, error = NULL WHERE id = ?",
+                (datetime.now().isoformat(timespec='seconds'), outcome['output_dir'], job_id))
+
+    def fail(self, job_id, error, retry_delay_s=None):
+        """Queues a failed job again (after a delay growing with its attempts) or marks it failed for good."""
+        with self._lock:
+            attempts, max_attempts = self.connection.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if retry_delay_s is None:
+            retry_delay_s = self.RETRY_DELAY_S * 2 ** max(0, attempts - 1)
+        if attempts < max_attempts:
+            self._write("UPDATE jobs SET status = 'queued', not_before = ?, error = ? WHERE id = ?",
+                        (time.time() + retry_delay_s, error, job_id))
+        else:
+            self._write("UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                        (datetime.now().isoformat(timespec='seconds'), error, job_id))
+
+    def requeue_stale(self, stale_after_s):
+        """Running jobs without a heartbeat for `stale_after_s` (their scheduler died): retried right away."""
+        with self._lock:
+            stale = [row[0] for row in self.connection.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                (time.time() - stale_after_s,))]
+        for job_id in stale:
+            self.fail(job_id, "Interrupted: its scheduler stopped before the job finished.", retry_delay_s=0)
+        return stale
+
+    def retry(self, job_ids):
+        """Queues failed or cancelled jobs again, with a fresh set of attempts."""
+        for job_id in job_ids:
+            self._write("UPDATE jobs SET status = 'queued', attempts = 0, not_before = 0, finished = NULL "
+                        "WHERE id = ? AND status IN ('failed', 'cancelled')", (job_id,))
+
+    def cancel(self, job_ids):
+        """Cancels jobs that have not started (running jobs finish)."""
+        for job_id in job_ids:
+            self._write("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                        (datetime.now().isoformat(timespec='seconds'), job_id))
+
+    def pending(self):
+        """Number of jobs queued (due or waiting for a retry) or running."""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self._lock:
+            counts = dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {status: counts.get(status, 0) for status in self.STATUSES}
+
+    def jobs(self, status=None):
+        """The jobs (newest first) as a DataFrame, optionally only those with `status`."""
+        where, params = (" WHERE status = ?", [status]) if status else ("", [])
+        with self._lock:
+            return pd.read_sql_query(f"SELECT {', '.join(self.JOB_COLUMNS)} FROM jobs{where} ORDER BY id DESC",
+                                     self.connection, params=params)
+
+    def outputs(self, job_id):
+        """(kind, path) of the files written by a completed job."""
+        with self._lock:
+            return self.connection.execute("SELECT kind, path FROM job_outputs WHERE job_id = ? ORDER BY path",
+                                           (job_id,)).fetchall()
+
+    def results(self, job_ids=None, metric=None, significant_only=False):
+        """
+        Result rows of completed jobs (the full statistical results tables, with a job_id column),
+        e.g. results(metric='Total_USVs_Count', significant_only=True) across every job.
+        """
+        clauses, params = [], []
+        if job_ids is not None:
+            job_ids = [job_ids] if isinstance(job_ids, int) else list(job_ids)
+            clauses.append(f"job_id IN ({', '.join('?' * len(job_ids))})")
+            params.extend(job_ids)
+        if metric:
+            clauses.append("metric = ?")
+            params.append(metric)
+        if significant_only:
+            clauses.append("significance NOT IN ('ns', '')")
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self._lock:
+            rows = self.connection.execute(f"SELECT job_id, row FROM job_results{where} ORDER BY job_id, rowid",
+                                           params).fetchall()
+        return pd.DataFrame([{'job_id': job_id, **json.loads(row)} for job_id, row in rows])
+
+    def close(self):
+        self.connection.close()
+
+
+def run_job(spec, output_dir):
+    """
+    Runs one queued analysis (in a worker process): loads the cohorts, applies the subset filters and
+    analyzes one metric or all of them. Plots, tables and the job log go to `output_dir`; returns
+    the result rows and the files written, as JobQueue.complete expects them.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'job.log'), 'a', encoding='utf-8') as log, redirect_stdout(log):
+        print(f"--- Job started {datetime.now().isoformat(timespec='seconds')} ---")
+        reporter = Reporter(stream=log)  # Jobs cannot ask: under 'Ask' violations get the non-parametric test
+        session = load_cohorts(spec['data'], reporter, output_dir, **spec.get('options', {}))
+        if session.df_aggregated is None:
+            raise RuntimeError(f"Loading failed: {reporter.last_status}")
+        if spec.get('subset_filters'):
+            session.options.subset_filters = dict(spec['subset_filters'])
+            select_dataset(session, reporter)
+        for grouping in [spec['primary'], spec.get('secondary')]:
+            if grouping and grouping not in session.available_grouping_variables:
+                raise ValueError(f"Unknown grouping variable '{grouping}'")
+        if spec.get('metric') and spec['metric'] not in session.available_metrics:
+            raise ValueError(f"Unknown metric '{spec['metric']}'")
+        df_results, df_descriptive = analyze(session, spec.get('metric'), spec['primary'], spec.get('secondary'),
+                                             reporter)
+        if df_results.empty:
+            raise RuntimeError("The analysis gave no results (see job.log).")
+    df_results.to_csv(os.path.join(output_dir, 'results.csv'), index=False)
+    df_descriptive.to_csv(os.path.join(output_dir, 'descriptive_statistics.csv'))
+
+    kinds = {'.png': 'plot', '.csv': 'table', '.xlsx': 'table', '.json': 'profile', '.txt': 'profile',
+             '.log': 'log'}
+    files = [(kinds.get(os.path.splitext(name)[1], 'other'), os.path.join(folder, name))
+             for folder, _, names in os.walk(output_dir) for name in names if not name.endswith('.sqlite')]
+    return {'output_dir': output_dir, 'results': json.loads(df_results.to_json(orient='records')), 'files': files}
+
+
+class JobScheduler(object):
+    """
+    Runs the jobs of a JobQueue, at most `max_workers` at a time, each in its own process (a crashing
+    analysis cannot take the scheduler down). run() works in the calling thread; start() runs it in a
+    background thread (the app) until stop(), which lets the running jobs finish.
+    """
+
+    def __init__(self, queue, output_root, max_workers=2, console=None, poll_interval_s=1.0,
+                 heartbeat_interval_s=10.0, stale_after_s=60.0):
+        self.queue = queue
+        self.output_root = output_root  # Job N writes to output_root/job_N
+        self.max_workers = max(1, int(max_workers))
+        self.console = console
+        self.poll_interval_s = poll_interval_s
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self.stale_after_s = stale_after_s
+        self.worker = f"{os.uname().nodename if hasattr(os, 'uname') else 'local'}:{os.getpid()}"
+        self.running = {}  # Future -> (job id, executor it was submitted to)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, message):
+        print(f"[{datetime.now():%H:%M:%S}] {message}", file=self.console or sys.stdout, flush=True)
+
+    def _executor(self):
+        # Fresh interpreters: forking a process that runs Tk and worker threads is not safe
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def run(self, until_empty=True):
+        """Runs jobs until stop() (or, with `until_empty`, until no job is queued or running)."""
+        self._stop.clear()
+        executor = self._executor()
+        last_heartbeat = 0.0
+        try:
+            while self.running or not self._stop.is_set():
+                if time.time() - last_heartbeat >= self.heartbeat_interval_s:
+                    for job_id in self.queue.requeue_stale(self.stale_after_s):
+                        self.log(f"Job {job_id} was interrupted; queued again.")
+                    self.queue.heartbeat([job_id for job_id, _ in self.running.values()])
+                    last_heartbeat = time.time()
+                while not self._stop.is_set() and len(self.running) < self.max_workers:
+                    job = self.queue.claim(self.worker)
+                    if job is None:
+                        break
+                    job_id, spec = job
+                    future = executor.submit(run_job, spec, os.path.join(self.output_root, f"job_{job_id}"))
+                    self.running[future] = (job_id, executor)
+                    self.log(f"Job {job_id} started.")
+                if not self.running:
+                    if until_empty and not self.queue.pending():
+                        break
+                    self._stop.wait(self.poll_interval_s)  # Queue empty or waiting for a retry
+                    continue
+                done, _ = wait(self.running, timeout=self.poll_interval_s, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, submitted_to = self.running.pop(future)
+                    try:
+                        self.queue.complete(job_id, future.result())
+                        self.log(f"Job {job_id} done.")
+                    except Exception as e:
+                        self.queue.fail(job_id, "".join(traceback.format_exception_only(type(e), e)).strip())
+                        self.log(f"Job {job_id} failed: {e}")
+                        # A dead worker breaks every future of its pool at once: replace that pool a single time
+                        # (futures of an already replaced pool must not shut down the new one)
+                        if isinstance(e, BrokenProcessPool) and submitted_to is executor:
+                            executor.shutdown(wait=False)
+                            executor = self._executor()
+        finally:
+            executor.shutdown(wait=True)
+
+    def start(self):
+        """Runs the scheduler in a background thread (new jobs are picked up until stop())."""
+        if not self.is_alive():
+            self._thread = threading.Thread(target=self.run, kwargs={'until_empty': False}, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops taking jobs; the running ones finish first."""
+        self._stop.set()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stopping(self):
+        """stop() was called but running jobs are still finishing."""
+        return self._stop.is_set() and self.is_alive()